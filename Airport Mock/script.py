@@ -1,34 +1,20 @@
 from flask import Flask, request, jsonify, render_template_string, redirect
+from state_store import create_state_store
 
 app = Flask(__name__)
 
-# Dummy cargo delay status
-CARGO_DELAY_STATUS = {
-    "d0bea113-d248-457e-80b4-f4a2bf8703a5": True,
-    "fc6c885c-f897-412d-a408-9ba9108a5887": False,
-    "7752d9bb-4baa-4781-aeeb-d754924b81b6": True,
-    "349e514c-7ae5-4d45-992f-d0167b202254": False,
-    "97f91c16-700a-420d-8fec-04fb8dd89927": True,
-    "00168a2b-2593-4ec1-8623-64a27f6c897f": False,
-    "4fde4c75-d97c-41c2-8735-6adfe2c7f11c": True,
-    "3e77150a-2fc3-4fdb-a211-13948aa69abd": False,
-    "72ec6484-33e9-4f20-b42a-703ade53e00d": True,
-}
-
-# Terminal -> Parking Availability
-TERMINAL_PARKING = {
-    "A": 10,
-    "B": 0,
-    "C": 1,
-    "D": 100,
-    "E": 5
-}
+# Cargo delay status and terminal parking availability, shared by every
+# worker when MOCK_STATE_BACKEND is sqlite or shm
+store = create_state_store()
+
+# Upper bound on cargo IDs per /get-cargo-status/batch request
+MAX_BATCH_SIZE = 1000
 
 # Generate message logic
 def generate_status(cargo_id, terminal):
-    delayed = CARGO_DELAY_STATUS.get(cargo_id, False)
+    delayed = store.is_delayed(cargo_id)
     terminal = terminal.upper()
-    parking_available = TERMINAL_PARKING.get(terminal, 0) > 0
+    parking_available = store.parking(terminal) > 0
 
     if not delayed and parking_available:
         return {
@@ -107,26 +93,73 @@ TEMPLATE = """
 def dashboard():
     return render_template_string(
         TEMPLATE,
-        terminal_parking=TERMINAL_PARKING,
-        cargo_delay_status=CARGO_DELAY_STATUS
+        terminal_parking=store.terminal_parking(),
+        cargo_delay_status=store.cargo_delay_status()
     )
 
 # POST: Update Parking Spots
 @app.route('/update-parking', methods=['POST'])
 def update_parking():
-    for terminal in TERMINAL_PARKING:
+    for terminal in store.terminal_parking():
         val = request.form.get(f'parking_{terminal}')
         if val and val.isdigit():
-            TERMINAL_PARKING[terminal] = int(val)
+            store.set_parking(terminal, int(val))
     return redirect('/')
 
 # POST: Update Cargo Delay Status
 @app.route('/update-delay', methods=['POST'])
 def update_delay():
-    for cid in CARGO_DELAY_STATUS:
-        CARGO_DELAY_STATUS[cid] = f'delay_{cid}' in request.form
+    store.set_delays({cid: f'delay_{cid}' in request.form for cid in store.cargo_delay_status()})
     return redirect('/')
 
+# POST: Atomically take one parking spot at a terminal
+@app.route('/reserve-parking', methods=['POST'])
+def reserve_parking():
+    terminal = (request.get_json(silent=True) or {}).get('terminal') or request.form.get('terminal')
+    if not terminal:
+        return jsonify({"error": "Missing terminal parameter"}), 400
+
+    try:
+        remaining = store.reserve(terminal.upper())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if remaining is None:
+        return jsonify({"reserved": False, "message": f"No parking available at Terminal {terminal.upper()}."}), 409
+    return jsonify({"reserved": True, "remaining": remaining}), 200
+
+# POST: Give a parking spot back
+@app.route('/release-parking', methods=['POST'])
+def release_parking():
+    terminal = (request.get_json(silent=True) or {}).get('terminal') or request.form.get('terminal')
+    if not terminal:
+        return jsonify({"error": "Missing terminal parameter"}), 400
+
+    try:
+        available = store.release(terminal.upper())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"available": available}), 200
+
+# POST: Bulk import cargo IDs and their delay status
+@app.route('/import-cargo', methods=['POST'])
+def import_cargo():
+    data = request.get_json(silent=True)
+
+    # Either {"cargo_id": delayed, ...} or [{"cargo_id": ..., "delayed": ...}, ...]
+    if isinstance(data, dict):
+        delays = {cid: bool(delayed) for cid, delayed in data.items()}
+    elif isinstance(data, list) and all(isinstance(row, dict) and row.get('cargo_id') for row in data):
+        delays = {row['cargo_id']: bool(row.get('delayed', False)) for row in data}
+    else:
+        return jsonify({"error": "Expected an object or a list of {cargo_id, delayed}"}), 400
+
+    try:
+        store.set_delays(delays)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"imported": len(delays)}), 200
+
 # ✅ GET Endpoint for External System
 @app.route('/get-cargo-status', methods=['GET'])
 def get_cargo_status():
@@ -139,5 +172,27 @@ def get_cargo_status():
     result = generate_status(cargo_id, terminal)
     return jsonify(result), 200
 
+# ✅ POST Endpoint for fleet-wide polling: many cargo IDs in one request
+@app.route('/get-cargo-status/batch', methods=['POST'])
+def get_cargo_status_batch():
+    data = request.get_json(silent=True)
+    cargo = data.get('cargo') if isinstance(data, dict) else data
+
+    if not isinstance(cargo, list) or not cargo:
+        return jsonify({"error": "Expected a list of {cargo_id, terminal}"}), 400
+    if len(cargo) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} cargo IDs per request"}), 400
+
+    statuses = []
+    for item in cargo:
+        if not isinstance(item, dict) or not item.get('cargo_id') or not item.get('terminal'):
+            return jsonify({"error": "Each entry needs cargo_id and terminal"}), 400
+        if not isinstance(item['cargo_id'], str) or not isinstance(item['terminal'], str):
+            return jsonify({"error": "cargo_id and terminal must be strings"}), 400
+        status = generate_status(item['cargo_id'], item['terminal'])
+        statuses.append(dict(status, cargo_id=item['cargo_id'], terminal=item['terminal'].upper()))
+
+    return jsonify({"statuses": statuses}), 200
+
 if __name__ == '__main__':
     app.run(debug=True, port=5010)
@@ -0,0 +1,401 @@
+import os
+import sys
+import time
+import uuid
+import sqlite3
+import struct
+import threading
+from multiprocessing import shared_memory
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: only the shm backend needs it
+    fcntl = None
+
+# Defaults the mock starts with when a backend holds no state yet
+DEFAULT_TERMINAL_PARKING = {
+    "A": 10,
+    "B": 0,
+    "C": 1,
+    "D": 100,
+    "E": 5
+}
+
+DEFAULT_CARGO_DELAY_STATUS = {
+    "d0bea113-d248-457e-80b4-f4a2bf8703a5": True,
+    "fc6c885c-f897-412d-a408-9ba9108a5887": False,
+    "7752d9bb-4baa-4781-aeeb-d754924b81b6": True,
+    "349e514c-7ae5-4d45-992f-d0167b202254": False,
+    "97f91c16-700a-420d-8fec-04fb8dd89927": True,
+    "00168a2b-2593-4ec1-8623-64a27f6c897f": False,
+    "4fde4c75-d97c-41c2-8735-6adfe2c7f11c": True,
+    "3e77150a-2fc3-4fdb-a211-13948aa69abd": False,
+    "72ec6484-33e9-4f20-b42a-703ade53e00d": True,
+}
+
+
+class MemoryStateStore:
+    """Single-process store. Writers build a new dict and swap the reference,
+    so readers never take a lock and never see a half-applied update."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parking = {}
+        self._delays = {}
+
+    def seed(self, parking, delays):
+        with self._lock:
+            self._parking = dict(parking, **self._parking)
+            self._delays = dict(delays, **self._delays)
+
+    def is_delayed(self, cargo_id):
+        return self._delays.get(cargo_id, False)
+
+    def parking(self, terminal):
+        return self._parking.get(terminal, 0)
+
+    def terminal_parking(self):
+        return dict(self._parking)
+
+    def cargo_delay_status(self):
+        return dict(self._delays)
+
+    def set_parking(self, terminal, spots):
+        with self._lock:
+            parking = dict(self._parking)
+            parking[terminal] = spots
+            self._parking = parking
+
+    def set_delays(self, delays):
+        with self._lock:
+            updated = dict(self._delays)
+            updated.update(delays)
+            self._delays = updated
+
+    def reserve(self, terminal):
+        """Take one parking spot; returns the spots left, or None if there were none"""
+        with self._lock:
+            spots = self._parking.get(terminal, 0)
+            if spots <= 0:
+                return None
+            self._parking = dict(self._parking, **{terminal: spots - 1})
+            return spots - 1
+
+    def release(self, terminal):
+        with self._lock:
+            spots = self._parking.get(terminal, 0) + 1
+            self._parking = dict(self._parking, **{terminal: spots})
+            return spots
+
+
+class SQLiteStateStore:
+    """State in a SQLite database in WAL mode, shared by every worker process.
+
+    Readers never wait for writers under WAL. Reserve/release are single
+    conditional UPDATEs, so two workers cannot both take the last spot.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS terminal_parking (terminal TEXT PRIMARY KEY, spots INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS cargo_delay_status (cargo_id TEXT PRIMARY KEY, delayed INTEGER NOT NULL)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def seed(self, parking, delays):
+        with self._connection() as conn:
+            conn.executemany("INSERT OR IGNORE INTO terminal_parking VALUES (?, ?)", parking.items())
+            conn.executemany("INSERT OR IGNORE INTO cargo_delay_status VALUES (?, ?)",
+                             ((cid, int(d)) for cid, d in delays.items()))
+
+    def is_delayed(self, cargo_id):
+        row = self._connection().execute(
+            "SELECT delayed FROM cargo_delay_status WHERE cargo_id = ?", (cargo_id,)).fetchone()
+        return bool(row[0]) if row else False
+
+    def parking(self, terminal):
+        row = self._connection().execute(
+            "SELECT spots FROM terminal_parking WHERE terminal = ?", (terminal,)).fetchone()
+        return row[0] if row else 0
+
+    def terminal_parking(self):
+        return dict(self._connection().execute("SELECT terminal, spots FROM terminal_parking ORDER BY terminal"))
+
+    def cargo_delay_status(self):
+        rows = self._connection().execute("SELECT cargo_id, delayed FROM cargo_delay_status ORDER BY rowid")
+        return {cid: bool(delayed) for cid, delayed in rows}
+
+    def set_parking(self, terminal, spots):
+        with self._connection() as conn:
+            conn.execute("INSERT INTO terminal_parking VALUES (?, ?) "
+                         "ON CONFLICT (terminal) DO UPDATE SET spots = excluded.spots", (terminal, spots))
+
+    def set_delays(self, delays):
+        with self._connection() as conn:
+            conn.executemany("INSERT INTO cargo_delay_status VALUES (?, ?) "
+                             "ON CONFLICT (cargo_id) DO UPDATE SET delayed = excluded.delayed",
+                             ((cid, int(d)) for cid, d in delays.items()))
+
+    def reserve(self, terminal):
+        with self._connection() as conn:
+            row = conn.execute("UPDATE terminal_parking SET spots = spots - 1 "
+                               "WHERE terminal = ? AND spots > 0 RETURNING spots", (terminal,)).fetchone()
+            return row[0] if row else None
+
+    def release(self, terminal):
+        with self._connection() as conn:
+            row = conn.execute("INSERT INTO terminal_parking VALUES (?, 1) "
+                               "ON CONFLICT (terminal) DO UPDATE SET spots = spots + 1 RETURNING spots",
+                               (terminal,)).fetchone()
+            return row[0]
+
+
+class SharedMemoryStateStore:
+    """State in a named shared-memory block that every worker on the host maps.
+
+    Parking is one int64 per terminal letter (-1 = unknown terminal). Delays
+    live in an open-addressing hash table keyed by the 16-byte cargo UUID.
+    Writers serialise on an flock and bump a sequence number around each
+    change; readers take no lock and retry if the sequence moved under them.
+
+    A writer that dies between its two bumps leaves the sequence odd. Its
+    flock goes with it, so the next writer to take the lock evens the
+    sequence again; a reader stuck for READ_TIMEOUT seconds takes the lock
+    to do the same, and raises if the sequence is still odd after that.
+    Whatever the dead writer had half-applied is kept.
+    """
+
+    MAGIC = b"CCMOCK02"
+    HEADER = struct.Struct("<8sQQQ")      # magic, sequence, slots, used
+    SLOT = struct.Struct("<16sB")         # cargo uuid, 0 empty / 1 on time / 2 delayed
+    TERMINALS = 26
+    # A write holds the sequence odd for microseconds; this long means a stuck writer
+    READ_TIMEOUT = 1.0
+
+    def __init__(self, name, slots=65536):
+        if fcntl is None:
+            raise RuntimeError("The shm state backend needs fcntl (Linux or macOS); use memory or sqlite")
+        self.name = name
+        self._lock_path = os.path.join(os.getenv("TMPDIR", "/tmp"), f"{name}.lock")
+        self._lock_file = None
+        self._thread_lock = threading.Lock()
+        self._buf = None
+
+        slots = 1 << (max(slots, 16) - 1).bit_length()
+        self._parking_offset = self.HEADER.size
+        self._table_offset = self._parking_offset + 8 * self.TERMINALS
+
+        with self._write_lock():
+            try:
+                self._shm = self._attach(create=True, size=self._table_offset + slots * self.SLOT.size)
+                self._buf = self._shm.buf
+                for i in range(self.TERMINALS):
+                    struct.pack_into("<q", self._buf, self._parking_offset + 8 * i, -1)
+                self.HEADER.pack_into(self._buf, 0, self.MAGIC, 0, slots, 0)
+                self.created = True
+            except FileExistsError:
+                self._shm = self._attach(create=False)
+                self._buf = self._shm.buf
+                self.created = False
+                if self.HEADER.unpack_from(self._buf, 0)[0] != self.MAGIC:
+                    raise RuntimeError(f"Shared memory block {name} is not a mock state store")
+        self._slots = self.HEADER.unpack_from(self._buf, 0)[2]
+
+    def _attach(self, create, size=0):
+        if sys.version_info >= (3, 13):
+            return shared_memory.SharedMemory(self.name, create=create, size=size, track=False)
+        shm = shared_memory.SharedMemory(self.name, create=create, size=size)
+        # Older Pythons unlink the block when any attached process exits
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+    class _Locked:
+        def __init__(self, store):
+            self.store = store
+
+        def __enter__(self):
+            store = self.store
+            store._thread_lock.acquire()
+            if store._lock_file is None or store._lock_pid != os.getpid():
+                store._lock_file = open(store._lock_path, "a+")
+                store._lock_pid = os.getpid()
+            fcntl.flock(store._lock_file, fcntl.LOCK_EX)
+            # Odd with the lock held: the last writer died mid-change
+            if store._buf is not None and store._sequence() % 2:
+                print(f"Shared memory block {store.name}: recovering from a writer that died mid-change")
+                store._bump()
+
+        def __exit__(self, *exc):
+            fcntl.flock(self.store._lock_file, fcntl.LOCK_UN)
+            self.store._thread_lock.release()
+
+    def _write_lock(self):
+        return self._Locked(self)
+
+    def _sequence(self):
+        return struct.unpack_from("<Q", self._buf, 8)[0]
+
+    def _bump(self):
+        struct.pack_into("<Q", self._buf, 8, self._sequence() + 1)
+
+    def _read(self, fn):
+        deadline = time.monotonic() + self.READ_TIMEOUT
+        recovered = False
+        while True:
+            before = self._sequence()
+            if not before % 2:
+                value = fn()
+                if self._sequence() == before:
+                    return value
+            if time.monotonic() > deadline:
+                if recovered:
+                    raise RuntimeError(f"Shared memory block {self.name} is stuck mid-write")
+                # Waits for a live writer, or evens the sequence a dead one left odd
+                with self._write_lock():
+                    pass
+                recovered = True
+                deadline = time.monotonic() + self.READ_TIMEOUT
+            time.sleep(0)
+
+    @staticmethod
+    def _key(cargo_id):
+        try:
+            return uuid.UUID(cargo_id).bytes
+        except (TypeError, ValueError):
+            raise ValueError(f"Shared-memory state needs UUID cargo ids, got {cargo_id!r}")
+
+    def _terminal_offset(self, terminal):
+        index = ord(terminal.upper()) - ord("A") if len(terminal) == 1 else -1
+        if not 0 <= index < self.TERMINALS:
+            raise ValueError(f"Unknown terminal: {terminal}")
+        return self._parking_offset + 8 * index
+
+    def _find(self, key):
+        """Slot offset holding key, or the empty slot where it would go"""
+        mask = self._slots - 1
+        # Fibonacci hash of both halves: time-ordered ids share leading bytes, sequential ones differ only at the end
+        folded = int.from_bytes(key[:8], "big") ^ int.from_bytes(key[8:], "big")
+        i = ((folded * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> (64 - self._slots.bit_length() + 1)
+        for _ in range(self._slots):
+            offset = self._table_offset + i * self.SLOT.size
+            slot_key, state = self.SLOT.unpack_from(self._buf, offset)
+            if state == 0 or slot_key == key:
+                return offset, state
+            i = (i + 1) & mask
+        return None, 0
+
+    def seed(self, parking, delays):
+        if self.created:
+            for terminal, spots in parking.items():
+                self.set_parking(terminal, spots)
+            self.set_delays(delays)
+
+    def is_delayed(self, cargo_id):
+        try:
+            key = self._key(cargo_id)
+        except ValueError:
+            return False
+        return self._read(lambda: self._find(key)[1]) == 2
+
+    def parking(self, terminal):
+        try:
+            offset = self._terminal_offset(terminal)
+        except ValueError:
+            return 0
+        return max(struct.unpack_from("<q", self._buf, offset)[0], 0)
+
+    def terminal_parking(self):
+        def read():
+            values = struct.unpack_from(f"<{self.TERMINALS}q", self._buf, self._parking_offset)
+            return {chr(ord("A") + i): spots for i, spots in enumerate(values) if spots >= 0}
+        return self._read(read)
+
+    def cargo_delay_status(self):
+        def read():
+            status = {}
+            for i in range(self._slots):
+                key, state = self.SLOT.unpack_from(self._buf, self._table_offset + i * self.SLOT.size)
+                if state:
+                    status[str(uuid.UUID(bytes=key))] = state == 2
+            return status
+        return self._read(read)
+
+    def set_parking(self, terminal, spots):
+        offset = self._terminal_offset(terminal)
+        with self._write_lock():
+            self._bump()
+            struct.pack_into("<q", self._buf, offset, spots)
+            self._bump()
+
+    def set_delays(self, delays):
+        keys = [(self._key(cid), 2 if delayed else 1) for cid, delayed in delays.items()]
+        with self._write_lock():
+            _, _, slots, used = self.HEADER.unpack_from(self._buf, 0)
+            self._bump()
+            try:
+                for key, state in keys:
+                    offset, current = self._find(key)
+                    if offset is None or (current == 0 and used + 1 > slots * 3 // 4):
+                        raise ValueError("Shared-memory cargo table is full; raise MOCK_SHM_SLOTS")
+                    if current == 0:
+                        used += 1
+                    self.SLOT.pack_into(self._buf, offset, key, state)
+            finally:
+                struct.pack_into("<Q", self._buf, 24, used)
+                self._bump()
+
+    def reserve(self, terminal):
+        offset = self._terminal_offset(terminal)
+        with self._write_lock():
+            spots = struct.unpack_from("<q", self._buf, offset)[0]
+            if spots <= 0:
+                return None
+            self._bump()
+            struct.pack_into("<q", self._buf, offset, spots - 1)
+            self._bump()
+            return spots - 1
+
+    def release(self, terminal):
+        offset = self._terminal_offset(terminal)
+        with self._write_lock():
+            spots = max(struct.unpack_from("<q", self._buf, offset)[0], 0) + 1
+            self._bump()
+            struct.pack_into("<q", self._buf, offset, spots)
+            self._bump()
+            return spots
+
+    def unlink(self):
+        """Remove the block once no worker needs it any more"""
+        if sys.version_info < (3, 13):
+            # unlink() unregisters the block, so it has to be registered again first
+            from multiprocessing import resource_tracker
+            resource_tracker.register(self._shm._name, "shared_memory")
+        self._shm.unlink()
+
+
+def create_state_store(backend=None):
+    """Build the backend named by MOCK_STATE_BACKEND (memory, sqlite or shm) and seed the defaults"""
+    backend = (backend or os.getenv("MOCK_STATE_BACKEND", "memory")).lower()
+    if backend == "memory":
+        store = MemoryStateStore()
+    elif backend == "sqlite":
+        store = SQLiteStateStore(os.getenv("MOCK_STATE_PATH", "mock_state.db"))
+    elif backend == "shm":
+        store = SharedMemoryStateStore(os.getenv("MOCK_SHM_NAME", "cargo_mock_state"),
+                                       slots=int(os.getenv("MOCK_SHM_SLOTS", "65536")))
+    else:
+        raise ValueError(f"Unknown MOCK_STATE_BACKEND: {backend}")
+
+    store.seed(DEFAULT_TERMINAL_PARKING, DEFAULT_CARGO_DELAY_STATUS)
+    return store
@@ -1,40 +1,343 @@
 import sys
 import os
+import json
+import datetime
+import itertools
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
-from flask import Flask, jsonify, request
-from dotenv import load_dotenv
+from flask import Flask, Response, current_app, jsonify, request
 from flask_cors import CORS
-from services.cargo_scheduler import CargoScheduler
+from services.cargo_scheduler import (
+    CargoScheduler, cargo_detail_key, parse_schedule_filters, schedule_items_key, schedule_page_key,
+)
 from services.auth_routes import auth_bp, token_required
+from services.db_pool import get_pool
+from services.location_routes import location_bp, position_index, start_location_ingestor
+from services.dock_routes import dock_bp
+from services.event_routes import events_bp, start_event_relay
+from services.pickup_routes import pickup_bp, start_pickup_ticks
+from services.traffic_routes import start_traffic_follower, traffic_bp, traffic_state
+from services.routing_routes import routing_bp
+from services.directions_routes import directions_bp
+from services.metrics import METRICS_ENABLED, errors
+from services.metrics_routes import install_request_metrics, metrics_bp
+from services.eta_engine import get_eta_engine
+from services.process_local import ProcessLocal
+from services.schedule_cache import get_schedule_cache, schedule_version, start_schedule_cache_listener
+from services.schedule_serializers import get_serializer
+from services.schedule_snapshot import snapshot_from_env
 
-load_dotenv()
+# Nothing below connects to the database or starts a thread: connections open
+# on first use and background work starts with each worker's first request
+schedule_cache = get_schedule_cache()
+# Columnar copy of the schedules around now, refreshed from the change log; None when disabled
+schedule_snapshot = snapshot_from_env(version=schedule_version)
+cargo_scheduler = CargoScheduler(cache=schedule_cache, snapshot=schedule_snapshot)
+eta_engine = get_eta_engine()
+# Delivery legs slow down with the congestion DALI agents report on their corridor
+eta_engine.set_traffic(traffic_state.congestion_levels)
 
-cargo_scheduler = CargoScheduler()
+# Encoder for schedule pages and cargo details: tuple (default), dict or pg
+schedule_serializer = get_serializer(os.getenv("SCHEDULE_SERIALIZER", "tuple"))
+
+CARGO_BATCH_MAX = int(os.getenv("CARGO_BATCH_MAX", "500"))
+
+SCHEDULE_SORT_ORDERS = ("pickup", "eta", "urgency")
+# eta/urgency rank pickups still to come; without pickupFrom, rows older than this are left out
+SCHEDULE_RANK_LOOKBACK_MINUTES = float(os.getenv("SCHEDULE_RANK_LOOKBACK_MINUTES", "60"))
+
+SCHEDULE_PAGE_SIZE = int(os.getenv("SCHEDULE_PAGE_SIZE", "500"))
+SCHEDULE_MAX_PAGE_SIZE = int(os.getenv("SCHEDULE_MAX_PAGE_SIZE", "5000"))
+SCHEDULE_STREAM_CHUNK_SIZE = int(os.getenv("SCHEDULE_STREAM_CHUNK_SIZE", "1000"))
+
+def _stream_schedule(items, fmt):
+    try:
+        if fmt == "ndjson":
+            for item in items:
+                yield json.dumps(item) + "\n"
+            return
+
+        yield "["
+        first = True
+        for item in items:
+            yield ("" if first else ",") + json.dumps(item)
+            first = False
+        yield "]"
+    except Exception as e:
+        # Headers are already sent; ending early leaves a truncated body
+        print(f"Error streaming schedule items: {e}")
+        errors.labels("schedule_stream").inc()
+
+def is_schedule_page(args):
+    """Whether /schedule was asked for one page; otherwise every schedule is returned, as before paging"""
+    return "stream" not in args and any(name in args for name in ("limit", "cursor", "sort"))
+
+def parse_schedule_args(args):
+    """Validate the /schedule query string; returns (filters, sort, stream, limit), ValueError on bad input.
+
+    Neither a stream nor a limit means the whole list at once.
+    """
+    filters = parse_schedule_filters(args)
+
+    sort = args.get("sort", "pickup")
+    if sort not in SCHEDULE_SORT_ORDERS:
+        raise ValueError(f"sort must be one of {', '.join(SCHEDULE_SORT_ORDERS)}")
+
+    stream = args.get("stream")
+    if stream:
+        if sort != "pickup":
+            raise ValueError("sort is not supported with stream")
+        if stream not in ("ndjson", "json"):
+            raise ValueError("stream must be 'ndjson' or 'json'")
+        return filters, sort, stream, None
+    if sort != "pickup" and "pickup_from" not in filters:
+        # Ranking past pickups by how late they would be fills the page with history
+        filters["pickup_from"] = datetime.datetime.utcnow() - datetime.timedelta(minutes=SCHEDULE_RANK_LOOKBACK_MINUTES)
+    if not is_schedule_page(args):
+        # Clients from before paging, such as the driver app, expect the whole list in one array
+        return filters, sort, None, None
+
+    try:
+        limit = int(args.get("limit", SCHEDULE_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= SCHEDULE_MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {SCHEDULE_MAX_PAGE_SIZE}")
+
+    return filters, sort, None, limit
+
+def cache_etag(key):
+    """ETag for a cached read, or None while the schedule cache cannot vouch for it"""
+    return schedule_cache.etag(key) if schedule_cache is not None else None
+
+def is_not_modified(etag, if_none_match):
+    if etag and etag in if_none_match:
+        schedule_cache.not_modified += 1
+        return True
+    return False
+
+def not_modified_response(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+def tag_response(response, etag):
+    if etag:
+        response.set_etag(etag)
+        # Let clients keep the body but revalidate it on every poll
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def use_encoded_json():
+    """Serializer output is compact, so debug mode's pretty-printed jsonify keeps the dict path"""
+    compact = current_app.json.compact
+    return not ((compact is None and current_app.debug) or compact is False)
+
+def json_body_response(body):
+    # Same bytes and headers jsonify would produce for the decoded value
+    return Response(f"{body}\n", mimetype=current_app.json.mimetype)
+
+def _page_response(response, next_cursor, etag):
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return tag_response(response, etag)
+
+def schedule_error_response(error):
+    print(f"Error fetching schedule items: {error}")
+    errors.labels("schedule").inc()
+    return jsonify({"error": "Failed to fetch schedule items"}), 500
+
+def schedule_page_response(items, next_cursor, sort, etag=None):
+    if sort != "pickup":
+        # Ranks within the page; the cursor still walks pickup order
+        positions = position_index.positions(item["id"] for item in items)
+        items = eta_engine.rank(items, positions, by=sort)
+
+    return _page_response(jsonify(items), next_cursor, etag)
+
+def schedule_body_response(body, next_cursor, etag=None):
+    return _page_response(json_body_response(body), next_cursor, etag)
+
+def cargo_detail_response(result, encoded, etag=None):
+    if not result:
+        return jsonify({"error": "Cargo not found"}), 404
+    return tag_response(json_body_response(result) if encoded else jsonify(result), etag)
+
+def schedule_items_response(filters):
+    """Every schedule matching ``filters``, read through the snapshot and cache and tagged like a page"""
+    etag = cache_etag(schedule_items_key(filters))
+    if is_not_modified(etag, request.if_none_match):
+        return not_modified_response(etag)
+
+    try:
+        if use_encoded_json():
+            response = json_body_response(cargo_scheduler.get_schedule_items_body(schedule_serializer, filters))
+        else:
+            response = jsonify(cargo_scheduler.get_schedule_items(filters))
+    except Exception as e:
+        return schedule_error_response(e)
+    return tag_response(response, etag)
+
+def schedule_page_etag(limit, cursor, filters, sort):
+    # eta/urgency ordering follows live driver positions, so only pickup order is tagged
+    return cache_etag(schedule_page_key(limit, cursor, filters)) if sort == "pickup" else None
+
+def parse_cargo_batch(data):
+    """Cargo ids from a /cargo/batch body, raising ValueError on bad input"""
+    cargo_ids = data.get("cargoIds") if isinstance(data, dict) else data
+
+    if not isinstance(cargo_ids, list) or not cargo_ids:
+        raise ValueError("cargoIds must be a non-empty list")
+    if len(cargo_ids) > CARGO_BATCH_MAX:
+        raise ValueError(f"At most {CARGO_BATCH_MAX} cargo ids per request")
+    return cargo_ids
+
+def start_worker_services():
+    """Background work for this process: location flushes, pickup ticks, DALI, schedule changes and events"""
+    start_location_ingestor()
+    start_pickup_ticks()
+    start_traffic_follower()
+    start_schedule_cache_listener()
+    start_event_relay()
+
+# Once per worker, after any fork, so a preloading master never owns these threads
+_worker_services = ProcessLocal(start_worker_services)
+
+def ensure_worker_services():
+    _worker_services.get()
 
 def create_app():
     app = Flask(__name__)
     
     # Allow frontend calls
     CORS(app, resources={r"/*": {"origins": "*"}})
+
+    # Background threads start with the first request this worker serves
+    app.before_request(ensure_worker_services)
     
     # Authentication Components
     app.register_blueprint(auth_bp)
 
+    # Driver location ingestion
+    app.register_blueprint(location_bp)
+
+    # Terminal bay/parking assignment
+    app.register_blueprint(dock_bp)
+
+    # Server-sent events for drivers
+    app.register_blueprint(events_bp)
+
+    # Dock windows and trucks for upcoming pickups, dispatched on a background tick
+    app.register_blueprint(pickup_bp)
+
+    # DALI agent states and per-corridor congestion, kept in memory
+    app.register_blueprint(traffic_bp)
+
+    # Server-side routes over the road graph, weighted by live DALI states
+    app.register_blueprint(routing_bp)
+
+    # Cached, coalesced proxy for the Directions API calls the app makes
+    app.register_blueprint(directions_bp)
+
+    # Prometheus metrics and sampled request profiles
+    if METRICS_ENABLED:
+        install_request_metrics(app, schedule_cache, schedule_snapshot)
+    app.register_blueprint(metrics_bp)
+
     # Get Schedules data
     @app.route("/schedule", methods=["GET"])
     def get_schedule_data():
-        items = cargo_scheduler.get_schedule_items()
-        return jsonify(items)
+        try:
+            filters, sort, stream, limit = parse_schedule_args(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if stream:
+            items = cargo_scheduler.stream_schedule_items(filters, chunk_size=SCHEDULE_STREAM_CHUNK_SIZE)
+            # Pull the first row before committing to a 200 so connection
+            # and query errors still surface as a proper error response
+            try:
+                first = next(items, None)
+            except Exception as e:
+                print(f"Error fetching schedule items: {e}")
+                errors.labels("schedule").inc()
+                return jsonify({"error": "Failed to fetch schedule items"}), 500
+            if first is not None:
+                items = itertools.chain([first], items)
+            mimetype = "application/x-ndjson" if stream == "ndjson" else "application/json"
+            return Response(_stream_schedule(items, stream), mimetype=mimetype)
+
+        if limit is None:
+            return schedule_items_response(filters)
+
+        cursor = request.args.get("cursor")
+        etag = schedule_page_etag(limit, cursor, filters, sort)
+        if is_not_modified(etag, request.if_none_match):
+            return not_modified_response(etag)
+
+        try:
+            if sort == "pickup" and use_encoded_json():
+                body, next_cursor = cargo_scheduler.get_schedule_page_body(
+                    schedule_serializer, limit, cursor=cursor, filters=filters
+                )
+                return schedule_body_response(body, next_cursor, etag)
+
+            items, next_cursor = cargo_scheduler.get_schedule_page(limit, cursor=cursor, filters=filters)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            # No ETag: a client must not keep a page that was never read
+            return schedule_error_response(e)
+
+        return schedule_page_response(items, next_cursor, sort, etag)
 
     # Get the Cargo data
     @app.route("/cargo/<string:cargo_id>", methods=["GET"])
     def get_cargo_detail(cargo_id):
-        result = cargo_scheduler.get_cargo_detail(cargo_id)
-        if result:
-            return result
-            
-        return jsonify({"error": "Cargo not found"}), 404
+        etag = cache_etag(cargo_detail_key(cargo_id))
+        if is_not_modified(etag, request.if_none_match):
+            return not_modified_response(etag)
+
+        encoded = use_encoded_json()
+        if encoded:
+            result = cargo_scheduler.get_cargo_detail_body(schedule_serializer, cargo_id)
+        else:
+            result = cargo_scheduler.get_cargo_detail(cargo_id)
+        return cargo_detail_response(result, encoded, etag)
     
+    # Get details for many cargo ids in one request
+    @app.route("/cargo/batch", methods=["POST"])
+    def get_cargo_details():
+        try:
+            cargo_ids = parse_cargo_batch(request.get_json(silent=True))
+            items, missing = cargo_scheduler.get_cargo_details(cargo_ids)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            print(f"Error fetching cargo details: {e}")
+            errors.labels("cargo_batch").inc()
+            return jsonify({"error": "Failed to fetch cargo details"}), 500
+
+        return jsonify({"items": items, "missing": missing})
+
+    # Connection pool utilisation and wait times, for sizing DB_POOL_MAX
+    @app.route("/health/db", methods=["GET"])
+    def get_db_pool_stats():
+        return jsonify(get_pool().stats())
+
+    # Schedule read cache hit ratio, invalidations and 304s
+    @app.route("/health/cache", methods=["GET"])
+    def get_schedule_cache_stats():
+        if schedule_cache is None:
+            return jsonify({"enabled": False})
+        return jsonify(dict(schedule_cache.stats(), enabled=True))
+
+    # In-process schedule snapshot size, memory and refreshes
+    @app.route("/health/snapshot", methods=["GET"])
+    def get_schedule_snapshot_stats():
+        if schedule_snapshot is None:
+            return jsonify({"enabled": False})
+        return jsonify(dict(schedule_snapshot.stats(), enabled=True))
+
     # Secure endpoint example
     @app.route("/protected", methods=["GET"])
     @token_required
@@ -0,0 +1,320 @@
+import os
+import re
+import sys
+import time
+import asyncio
+from urllib.parse import parse_qs
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from asgiref.wsgi import WsgiToAsgi
+from flask import jsonify, request
+from werkzeug.test import EnvironBuilder
+import app as backend
+from services import auth_routes, event_routes
+from services.async_db import async_available, close_async_pool, get_async_pool
+from services.auth_service import AsyncAuthService
+from services.cargo_scheduler import AsyncCargoScheduler, cargo_detail_key
+from services.event_hub import HubFull, KEEPALIVE_FRAME
+from services.metrics import METRICS_ENABLED, auth_failures, errors, observe_request
+
+flask_app = backend.create_app()
+wsgi_app = WsgiToAsgi(flask_app)
+
+# Set to 0 to serve every route through the WSGI bridge
+ASGI_NATIVE_ROUTES = os.getenv("ASGI_NATIVE_ROUTES", "1") != "0"
+
+CARGO_DETAIL_PATH = re.compile(r"^/cargo/([^/]+)$")
+
+# Flask rule served by each native handler, so /metrics labels match the WSGI path
+NATIVE_ROUTE_RULES = {
+    "schedule": "/schedule",
+    "cargo_detail": "/cargo/<string:cargo_id>",
+    "cargo_batch": "/cargo/batch",
+    "profile": "/auth/me",
+    "events": "/events",
+}
+
+
+def _environ(scope, body=b""):
+    """WSGI environ for an ASGI request, so Flask parses and post-processes it as usual"""
+    headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in scope["headers"]]
+    builder = EnvironBuilder(
+        path=scope["path"],
+        base_url=f"{scope.get('scheme', 'http')}://{dict(headers).get('host', 'localhost')}{scope.get('root_path', '')}",
+        method=scope["method"],
+        headers=headers,
+        query_string=scope.get("query_string", b"").decode("latin-1"),
+        data=body,
+    )
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    client = scope.get("client")
+    if client:
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = client[0], str(client[1])
+    return environ
+
+
+def _render(environ, build):
+    """Turn a view return value into a finished Flask response (CORS and all)"""
+    with flask_app.request_context(environ):
+        try:
+            response = flask_app.make_response(build())
+        except Exception as e:
+            response = flask_app.make_response(flask_app.handle_exception(e))
+        return flask_app.process_response(response)
+
+
+async def _send_response(send, response, body=True):
+    await send({
+        "type": "http.response.start",
+        "status": response.status_code,
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in response.headers.items()],
+    })
+    if body:
+        await send({"type": "http.response.body", "body": response.get_data()})
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+class AsyncRoutes:
+    """Native handlers for the hot read paths.
+
+    Each mirrors the Flask view of the same path: arguments are validated
+    by the same helpers and responses go through ``_render``, so the
+    bytes on the wire match, but database work awaits the async pool
+    instead of holding a worker thread.
+    """
+
+    def __init__(self, pool):
+        self.scheduler = AsyncCargoScheduler(pool, cache=backend.schedule_cache, snapshot=backend.schedule_snapshot)
+        auth_service = auth_routes.get_auth_service()
+        self.auth = AsyncAuthService(auth_service, pool) if auth_service else None
+
+    def match(self, scope):
+        method, path = scope["method"], scope["path"]
+        if method == "GET" and path == "/schedule":
+            # Streamed exports keep their server-side cursor, and unpaged lists their cached read, on the sync path
+            if backend.is_schedule_page(parse_qs(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)):
+                return self.schedule
+        elif method == "POST" and path == "/cargo/batch":
+            return self.cargo_batch
+        elif method == "GET" and CARGO_DETAIL_PATH.match(path):
+            return self.cargo_detail
+        elif method == "GET" and path == "/auth/me" and self.auth is not None:
+            return self.profile
+        elif method == "GET" and path == "/events":
+            return self.events
+        return None
+
+    async def schedule(self, scope, receive, send):
+        environ = _environ(scope)
+        with flask_app.request_context(environ):
+            args = request.args
+            try:
+                filters, sort, _, limit = backend.parse_schedule_args(args)
+                cursor = args.get("cursor")
+            except ValueError as e:
+                error = str(e)
+                return await _send_response(send, _render(environ, lambda: (jsonify({"error": error}), 400)))
+            etag = backend.schedule_page_etag(limit, cursor, filters, sort)
+            if backend.is_not_modified(etag, request.if_none_match):
+                return await _send_response(send, _render(environ, lambda: backend.not_modified_response(etag)))
+            encoded = sort == "pickup" and backend.use_encoded_json()
+
+        try:
+            if encoded:
+                body, next_cursor = await self.scheduler.get_schedule_page_body(
+                    backend.schedule_serializer, limit, cursor=cursor, filters=filters
+                )
+                build = lambda: backend.schedule_body_response(body, next_cursor, etag)
+            else:
+                items, next_cursor = await self.scheduler.get_schedule_page(limit, cursor=cursor, filters=filters)
+                build = lambda: backend.schedule_page_response(items, next_cursor, sort, etag)
+        except ValueError as e:
+            error = str(e)
+            return await _send_response(send, _render(environ, lambda: (jsonify({"error": error}), 400)))
+        except Exception as e:
+            failure = e
+            return await _send_response(send, _render(environ, lambda: backend.schedule_error_response(failure)))
+
+        await _send_response(send, _render(environ, build))
+
+    async def cargo_detail(self, scope, receive, send):
+        cargo_id = CARGO_DETAIL_PATH.match(scope["path"]).group(1)
+        environ = _environ(scope)
+        with flask_app.request_context(environ):
+            etag = backend.cache_etag(cargo_detail_key(cargo_id))
+            if backend.is_not_modified(etag, request.if_none_match):
+                return await _send_response(send, _render(environ, lambda: backend.not_modified_response(etag)))
+            encoded = backend.use_encoded_json()
+
+        if encoded:
+            result = await self.scheduler.get_cargo_detail_body(backend.schedule_serializer, cargo_id)
+        else:
+            result = await self.scheduler.get_cargo_detail(cargo_id)
+
+        await _send_response(send, _render(environ, lambda: backend.cargo_detail_response(result, encoded, etag)))
+
+    async def cargo_batch(self, scope, receive, send):
+        environ = _environ(scope, await _read_body(receive))
+        try:
+            with flask_app.request_context(environ):
+                cargo_ids = backend.parse_cargo_batch(request.get_json(silent=True))
+            items, missing = await self.scheduler.get_cargo_details(cargo_ids)
+            rv = {"items": items, "missing": missing}, 200
+        except ValueError as e:
+            rv = {"error": str(e)}, 400
+        except Exception as e:
+            print(f"Error fetching cargo details: {e}")
+            errors.labels("cargo_batch").inc()
+            rv = {"error": "Failed to fetch cargo details"}, 500
+
+        await _send_response(send, _render(environ, lambda: (jsonify(rv[0]), rv[1])))
+
+    async def profile(self, scope, receive, send):
+        environ = _environ(scope)
+        with flask_app.request_context(environ):
+            token = auth_routes.bearer_token(request.headers.get("Authorization"))
+
+        user = await self.auth.verify_token(token) if token else None
+
+        def build():
+            if not token:
+                auth_failures.labels("missing_token").inc()
+                return jsonify({"error": "Authentication token is missing"}), 401
+            if not user:
+                auth_failures.labels("invalid_token").inc()
+                return jsonify({"error": "Invalid or expired token"}), 401
+            return jsonify({"user": user}), 200
+
+        await _send_response(send, _render(environ, build))
+
+    async def events(self, scope, receive, send):
+        environ = _environ(scope)
+        with flask_app.request_context(environ):
+            try:
+                topics, last_event_id = event_routes.parse_subscription(request.args, request.headers)
+            except ValueError as e:
+                error = str(e)
+                return await _send_response(send, _render(environ, lambda: (jsonify({"error": error}), 400)))
+
+        try:
+            subscription = event_routes.event_hub.subscribe(topics, last_event_id)
+        except HubFull as e:
+            return await _send_response(send, _render(environ, lambda: event_routes.hub_full_response(e)))
+
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        # Publishers run on worker threads; wake this task without blocking them
+        subscription.on_ready = lambda: loop.call_soon_threadsafe(ready.set)
+
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+            ready.set()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            response = _render(environ, lambda: event_routes.event_stream_response(iter(())))
+            await _send_response(send, response, body=False)
+            await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+
+            while not (subscription.closed or disconnected.is_set()):
+                try:
+                    await asyncio.wait_for(ready.wait(), event_routes.EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                ready.clear()
+                if subscription.closed or disconnected.is_set():
+                    break
+                frames = subscription.drain()
+                await send({"type": "http.response.body", "body": b"".join(frames) or KEEPALIVE_FRAME,
+                            "more_body": True})
+        finally:
+            watcher.cancel()
+            event_routes.event_hub.unsubscribe(subscription)
+
+
+class AsgiApp:
+    """ASGI entry point: native async handlers for hot routes, Flask for the rest"""
+
+    def __init__(self):
+        self.routes = None
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Native routes bypass Flask's before_request, so start this worker's threads here
+                backend.ensure_worker_services()
+                if ASGI_NATIVE_ROUTES and async_available():
+                    try:
+                        pool = get_async_pool()
+                        await pool.open()
+                        self.routes = AsyncRoutes(pool)
+                    except Exception as e:
+                        print(f"Error opening async database pool, serving through WSGI: {e}")
+                elif ASGI_NATIVE_ROUTES:
+                    print("psycopg 3 is not installed, serving every route through WSGI")
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await close_async_pool()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        handler = self.routes.match(scope) if self.routes and scope["type"] == "http" else None
+        if handler is None:
+            return await wsgi_app(scope, receive, send)
+        if not METRICS_ENABLED:
+            return await handler(scope, receive, send)
+        await self.timed(handler, scope, receive, send)
+
+    @staticmethod
+    async def timed(handler, scope, receive, send):
+        """Run a native handler, recording time to response start like the Flask hooks do.
+
+        Statements on the async pool are not counted, so native routes
+        report latency only.
+        """
+        started = time.perf_counter()
+        route = NATIVE_ROUTE_RULES[handler.__name__]
+        observed = False
+
+        async def timed_send(message):
+            nonlocal observed
+            if message["type"] == "http.response.start" and not observed:
+                observed = True
+                observe_request(scope["method"], route, message["status"], time.perf_counter() - started)
+            await send(message)
+
+        try:
+            await handler(scope, receive, timed_send)
+        finally:
+            if not observed:
+                observe_request(scope["method"], route, 500, time.perf_counter() - started)
+
+
+app = AsgiApp()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, port=8800)
@@ -0,0 +1,97 @@
+"""Per-request cost of the /metrics instrumentation and the cost of a scrape.
+
+Serves a trivial JSON route from two in-process Flask apps, one plain and
+one with install_request_metrics, and reports the added microseconds per
+request with profiling off and at a given sample rate. Also times
+rendering /metrics once many route/status label sets exist. Example:
+
+    python benchmarks/bench_metrics.py --requests 20000 --sample-rate 0.01
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask, jsonify
+
+from services.metrics import registry, request_seconds
+from services.metrics_routes import install_request_metrics
+from services.profiling import get_profiler
+
+
+def make_app(instrumented):
+    app = Flask(__name__)
+
+    @app.route("/ping/<string:item_id>")
+    def ping(item_id):
+        return jsonify({"id": item_id})
+
+    if instrumented:
+        install_request_metrics(app)
+    return app
+
+
+def per_request_us(clients, count, rounds=10):
+    """Best per-request time for each client, alternating batches so noise hits both alike"""
+    best = [float("inf")] * len(clients)
+    batch = max(1, count // rounds)
+    for client in clients:
+        client.get("/ping/warmup")
+    for _ in range(rounds):
+        for index, client in enumerate(clients):
+            start = time.perf_counter()
+            for i in range(batch):
+                client.get(f"/ping/{i}")
+            best[index] = min(best[index], (time.perf_counter() - start) / batch * 1e6)
+    return best
+
+
+def render_ms(label_sets, repeat=20):
+    for i in range(label_sets):
+        request_seconds.labels("GET", f"/bench/{i}", 200).observe(0.01)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        registry.render()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--sample-rate", type=float, default=0.01, help="profiling rate for the third run")
+    parser.add_argument("--label-sets", type=int, default=200, help="route/status combinations for the scrape")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    plain_client, instrumented_client = make_app(False).test_client(), make_app(True).test_client()
+    plain, instrumented = per_request_us([plain_client, instrumented_client], args.requests)
+    get_profiler().set_sample_rate(args.sample_rate)
+    plain_again, profiled = per_request_us([plain_client, instrumented_client], args.requests)
+    get_profiler().set_sample_rate(0.0)
+    plain = min(plain, plain_again)
+
+    results = [
+        {"run": "plain", "us_per_request": round(plain, 2), "overhead_us": 0.0},
+        {"run": "metrics", "us_per_request": round(instrumented, 2), "overhead_us": round(instrumented - plain, 2)},
+        {"run": f"metrics+profile@{args.sample_rate}", "us_per_request": round(profiled, 2),
+         "overhead_us": round(profiled - plain, 2)},
+    ]
+    scrape = {"label_sets": args.label_sets, "render_ms": round(render_ms(args.label_sets), 3)}
+
+    if args.json:
+        print(json.dumps({"requests": results, "scrape": scrape}, indent=2))
+        return
+
+    print(f"{'run':<24} {'us/request':>12} {'overhead us':>12}")
+    for r in results:
+        print(f"{r['run']:<24} {r['us_per_request']:>12} {r['overhead_us']:>12}")
+    print(f"\n/metrics render with {scrape['label_sets']} label sets: {scrape['render_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Login throughput per core for each password hashing work factor.
+
+Runs check_password_hash through the same PasswordHasher process pool the
+app uses, so the numbers include pool dispatch overhead. Example:
+
+    python benchmarks/bench_password_hashing.py --workers 4 --logins 200
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.password_hasher import PasswordHasher
+
+DEFAULT_METHODS = [
+    "pbkdf2:sha256:260000",
+    "pbkdf2:sha256:600000",
+    "pbkdf2:sha256:1000000",
+    "scrypt:16384:8:1",
+    "scrypt:32768:8:1",
+    "scrypt:65536:8:1",
+]
+
+
+def bench_method(method, workers, logins, concurrency):
+    hasher = PasswordHasher(method=method, workers=workers, max_pending=concurrency, queue_timeout=60)
+    pwhash = hasher.hash("demo123")
+
+    # Warm the worker processes so start-up cost is not counted
+    hasher.verify(pwhash, "demo123")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: hasher.verify(pwhash, "demo123"), range(logins)))
+    elapsed = time.perf_counter() - start
+    hasher.shutdown()
+
+    assert all(results), f"verification failed for {method}"
+    throughput = logins / elapsed
+    return {
+        "method": method,
+        "workers": workers,
+        "logins": logins,
+        "seconds": round(elapsed, 3),
+        "logins_per_sec": round(throughput, 1),
+        "logins_per_sec_per_core": round(throughput / max(workers, 1), 1),
+        "ms_per_login": round(elapsed * 1000 * max(workers, 1) / logins, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--methods", nargs="+", default=DEFAULT_METHODS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="hashing processes (0 runs inline in one thread)")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="simultaneous login requests (default: 2x workers)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    concurrency = args.concurrency or max(args.workers, 1) * 2
+    results = [bench_method(method, args.workers, args.logins, concurrency) for method in args.methods]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'method':<24} {'logins/s':>10} {'per core':>10} {'ms/login':>10}")
+    for r in results:
+        print(f"{r['method']:<24} {r['logins_per_sec']:>10} {r['logins_per_sec_per_core']:>10} {r['ms_per_login']:>10}")
+
+
+if __name__ == "__main__":
+    main()
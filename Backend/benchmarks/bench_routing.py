@@ -0,0 +1,82 @@
+"""Route tree repair vs rebuild, and tree lookups vs A*, on the synthetic street grid.
+
+Changes one random edge weight at a time and times the incremental repair
+of every destination tree against rebuilding them all, then times routes
+read from a tree against A* searches for the same trips. Examples:
+
+    python benchmarks/bench_routing.py
+    python benchmarks/bench_routing.py --spacing-km 0.25 0.5 1 --changes 500 --json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.routing import RoadGraph, Router
+from services.sites import DROPOFF_SITES
+from services.synthetic_data import road_graph
+
+
+def bench(spacing_km, changes, trips, seed=1):
+    graph = RoadGraph.from_dict(road_graph(seed, spacing_km=spacing_km))
+    router = Router(graph)
+    rng = random.Random(seed)
+
+    started = time.perf_counter()
+    for _ in range(changes):
+        e = rng.randrange(graph.edge_count)
+        router.set_edge_factor(graph.sources[e], graph.targets[e], rng.choice([1.0, 1.5, 3.0, 10.0]))
+    repair_ms = (time.perf_counter() - started) * 1000 / changes
+
+    started = time.perf_counter()
+    router.rebuild()
+    rebuild_ms = (time.perf_counter() - started) * 1000
+
+    origins = [rng.randrange(graph.node_count) for _ in range(trips)]
+    names = [rng.choice(list(DROPOFF_SITES)) for _ in range(trips)]
+    timings = {}
+    for label, destination in (("tree", lambda name: name), ("astar", lambda name: DROPOFF_SITES[name])):
+        started = time.perf_counter()
+        for node, name in zip(origins, names):
+            router.route(graph.lat[node], graph.lon[node], destination(name))
+        timings[label] = (time.perf_counter() - started) * 1000 / trips
+
+    return {
+        "spacing_km": spacing_km,
+        "nodes": graph.node_count,
+        "edges": graph.edge_count,
+        "repair_ms": round(repair_ms, 3),
+        "rebuild_ms": round(rebuild_ms, 3),
+        "avg_repaired_nodes": round(router.repaired_nodes / max(router.repairs, 1), 1),
+        "tree_route_ms": round(timings["tree"], 3),
+        "astar_route_ms": round(timings["astar"], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spacing-km", type=float, nargs="+", default=[1.0, 0.5])
+    parser.add_argument("--changes", type=int, default=300, help="edge weight changes to repair")
+    parser.add_argument("--trips", type=int, default=200, help="routes to time each way")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = [bench(spacing, args.changes, args.trips) for spacing in args.spacing_km]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'spacing':>8} {'nodes':>7} {'edges':>7} {'repair ms':>10} {'rebuild ms':>11} "
+          f"{'nodes/repair':>13} {'tree ms':>8} {'A* ms':>8}")
+    for r in results:
+        print(f"{r['spacing_km']:>8} {r['nodes']:>7} {r['edges']:>7} {r['repair_ms']:>10} {r['rebuild_ms']:>11} "
+              f"{r['avg_repaired_nodes']:>13} {r['tree_route_ms']:>8} {r['astar_route_ms']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Memory per 100k schedules and page encode time: dict rows vs the columnar snapshot.
+
+Builds the same synthetic schedules three ways and measures what each
+holds with tracemalloc: the list of dicts get_schedule_items returns, the
+row tuples a fetchall returns, and a ScheduleSnapshot. Then times one
+page from each: jsonify over dicts, TupleSerializer over tuples, and the
+snapshot writing JSON from its columns. No database is needed. Examples:
+
+    python benchmarks/bench_schedule_snapshot.py --rows 100000
+    python benchmarks/bench_schedule_snapshot.py --rows 100000 500000 --page 500 --json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask, jsonify
+
+from services.cargo_scheduler import CargoScheduler
+from services.schedule_serializers import TupleSerializer
+from services.schedule_snapshot import ScheduleSnapshot
+from services.synthetic_data import CHUNK_SIZE, GeneratorConfig, criticality_mix, schedule_chunk, terminal_weights
+
+
+def make_rows(count, seed=1):
+    """Snapshot rows (SCHEDULE_COLUMNS plus location names) in pickup order, fresh objects per row as a fetch gives"""
+    config = GeneratorConfig(seed, count, criticality_mix(None), terminal_weights(None),
+                             datetime.datetime(2025, 5, 1), 3, (0, 24), 0.0, 30, 0.0)
+    rows = []
+    for index in range(-(-count // CHUNK_SIZE)):
+        for row in schedule_chunk(config, index):
+            pickup, dropoff = row[4], row[5]
+            rows.append((row[0], row[1], row[2], row[3], "".join(pickup), "".join(dropoff),
+                         pickup.rpartition("_(")[0], dropoff.rpartition("_(")[0]))
+    rows.sort(key=lambda row: (row[2], row[0]))
+    return rows
+
+
+def measured(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return value, held
+
+
+def timed(fn, repeat):
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def bench(count, page, repeat):
+    rows = make_rows(count)
+    # Copies, so each layout is charged for its own strings and datetimes
+    dicts, dict_bytes = measured(lambda: [CargoScheduler._schedule_item(row) for row in rows])
+    tuples, tuple_bytes = measured(lambda: [
+        (str(r[0]), str(r[1]), r[2].replace(), "".join(r[3]), "".join(r[4]), "".join(r[5])) for r in rows])
+
+    def build_snapshot():
+        snapshot = ScheduleSnapshot()
+        snapshot.load_rows(rows)
+        return snapshot
+    snapshot, snapshot_bytes = measured(build_snapshot)
+
+    app = Flask(__name__)
+    serializer = TupleSerializer()
+    with app.app_context():
+        jsonify_ms = timed(lambda: jsonify(dicts[:page]).get_data(), repeat)
+    results = []
+    for layout, held, ms in (
+        ("dicts", dict_bytes, jsonify_ms),
+        ("tuples", tuple_bytes, timed(lambda: serializer.encode_page(tuples[:page + 1], page), repeat)),
+        ("snapshot", snapshot_bytes, timed(lambda: snapshot.page_body(page), repeat)),
+    ):
+        results.append({
+            "layout": layout,
+            "rows": count,
+            "mb_per_100k": round(held / count * 100_000 / 2 ** 20, 2),
+            "bytes_per_row": round(held / count, 1),
+            "page_rows": page,
+            "page_ms": ms,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--page", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    for count in args.rows:
+        results.extend(bench(count, args.page, args.repeat))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'layout':<10} {'rows':>8} {'MB/100k':>9} {'B/row':>8} {'page ms':>9}")
+    for r in results:
+        print(f"{r['layout']:<10} {r['rows']:>8} {r['mb_per_100k']:>9} {r['bytes_per_row']:>8} {r['page_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
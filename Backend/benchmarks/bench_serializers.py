@@ -0,0 +1,99 @@
+"""Encode time per schedule page for each serializer, with and without the database.
+
+Offline mode times encoding alone on synthetic row tuples, against the
+original dict + jsonify path. With --database each serializer runs its
+own page query against the configured database, so the pg encoder's
+server-side work is included. Examples:
+
+    python benchmarks/bench_serializers.py --rows 500 5000
+    python benchmarks/bench_serializers.py --rows 5000 --database
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask, jsonify
+
+from services.cargo_scheduler import CargoScheduler
+from services.schedule_serializers import SERIALIZERS, get_serializer
+
+OFFLINE = [name for name in SERIALIZERS if name != "pg"]
+
+
+def make_rows(count):
+    start = datetime.datetime(2025, 1, 1, 8, 0, 0, 123456)
+    return [
+        (str(uuid.uuid4()), str(uuid.uuid4()), start + datetime.timedelta(seconds=37 * i),
+         ("high", "medium", "low")[i % 3],
+         f"dfw-terminal-{'abc'[i % 3]}_(32.90534203342366, -97.04491644516602)",
+         "Amazon-warehouse-2_(32.990626003517455, -96.78415098302702)")
+        for i in range(count)
+    ]
+
+
+def timed(fn, repeat):
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def bench_offline(rows, repeat):
+    app = Flask(__name__)
+    results = []
+    with app.app_context():
+        # The path every request took before serializers existed
+        results.append({"encoder": "jsonify", "rows": len(rows), "ms": timed(
+            lambda: jsonify([CargoScheduler._schedule_item(row) for row in rows]).get_data(), repeat)})
+    for name in OFFLINE:
+        serializer = get_serializer(name)
+        results.append({"encoder": name, "rows": len(rows),
+                        "ms": timed(lambda: serializer.encode_page(rows, len(rows)), repeat)})
+    return results
+
+
+def bench_database(limit, repeat):
+    scheduler = CargoScheduler()
+    results = []
+    for name in SERIALIZERS:
+        serializer = get_serializer(name)
+        body, _ = scheduler.get_schedule_page_body(serializer, limit)
+        results.append({"encoder": name, "rows": len(json.loads(body)),
+                        "ms": timed(lambda: scheduler.get_schedule_page_body(serializer, limit), repeat)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[500, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database", action="store_true",
+                        help="query the configured database (first N rows in pickup order)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    for count in args.rows:
+        results.extend(bench_database(count, args.repeat) if args.database
+                       else bench_offline(make_rows(count), args.repeat))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'encoder':<10} {'rows':>8} {'best ms':>10}")
+    for r in results:
+        print(f"{r['encoder']:<10} {r['rows']:>8} {r['ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Cold start: importing the app, create_app() and the first request, each in a fresh interpreter.
+
+Every run starts a new Python process, as a worker would, and times the
+import of app.py, building the Flask app and serving the first request
+(which also starts the worker's background threads) through the test
+client. --slowest adds the modules that took longest to import in one
+extra run with -X importtime. Examples:
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --path /routing/stats --slowest 10 --json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PHASES = ("import_ms", "create_app_ms", "first_request_ms", "second_request_ms", "process_ms")
+
+# Runs in the child; the app's own messages go to stderr so stdout carries only the timings
+PROBE = """
+import sys, json, time
+timings, sys.stdout = sys.stdout, sys.stderr
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.create_app().test_client()
+created = time.perf_counter()
+status = client.get(sys.argv[1]).status_code
+first = time.perf_counter()
+client.get(sys.argv[1])
+second = time.perf_counter()
+timings.write(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (first - created) * 1000,
+    "second_request_ms": (second - first) * 1000,
+    "status": status,
+}))
+"""
+
+
+def run_once(path):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", PROBE, path], cwd=BACKEND, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"startup probe failed:\n{result.stderr}")
+    timings = json.loads(result.stdout)
+    timings["process_ms"] = elapsed
+    return timings
+
+
+def slowest_imports(count):
+    """(module, cumulative ms) for the modules that took longest to import"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=BACKEND,
+                            capture_output=True, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, _, cumulative, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        modules.append((name, round(int(cumulative) / 1000, 1)))
+    return sorted(modules, key=lambda m: -m[1])[:count]
+
+
+def bench(runs, path):
+    samples = [run_once(path) for _ in range(runs)]
+    summary = {
+        phase: {
+            "min": round(min(s[phase] for s in samples), 1),
+            "median": round(statistics.median(s[phase] for s in samples), 1),
+            "max": round(max(s[phase] for s in samples), 1),
+        }
+        for phase in PHASES
+    }
+    return {"runs": runs, "path": path, "status": samples[-1]["status"], "phases": summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters to start")
+    parser.add_argument("--path", default="/location/stats", help="first request to serve")
+    parser.add_argument("--slowest", type=int, default=0, help="also list the N slowest imports")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    result = bench(args.runs, args.path)
+    if args.slowest:
+        result["slowest_imports"] = slowest_imports(args.slowest)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"{args.runs} runs, first request GET {args.path} -> {result['status']}")
+    print(f"{'phase':>18} {'min ms':>8} {'median ms':>10} {'max ms':>8}")
+    for phase in PHASES:
+        s = result["phases"][phase]
+        print(f"{phase:>18} {s['min']:>8} {s['median']:>10} {s['max']:>8}")
+    if args.slowest:
+        print(f"\n{'cumulative ms':>14}  module")
+        for name, ms in result["slowest_imports"]:
+            print(f"{ms:>14}  {name}")
+
+
+if __name__ == "__main__":
+    main()
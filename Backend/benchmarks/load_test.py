@@ -0,0 +1,314 @@
+"""Latency, throughput and DB queries per request for the Backend and the Airport Mock.
+
+Seeds schedules and users into the configured PostgreSQL database, serves
+the Backend and the Airport Mock in-process on local ports, and drives each
+scenario with concurrent virtual drivers. Nothing leaves the machine.
+Results are JSON, so runs from two versions can be diffed:
+
+    python benchmarks/load_test.py --schedules 5000 --users 200 --drivers 32 --duration 10 --output new.json
+    python benchmarks/load_test.py --compare old.json new.json
+
+Seeded rows are tagged with the run id and deleted afterwards unless --keep
+is given. Run `python script.py` first to create the schema.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import datetime
+import platform
+import threading
+import importlib.util
+from typing import Any, Callable, Dict, List
+
+# Count statements on every pooled connection; must be set before the app builds its pool
+os.environ.setdefault("DB_COUNT_QUERIES", "1")
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MOCK_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "Airport Mock")
+sys.path.append(BACKEND_DIR)
+
+import requests
+from psycopg2.extras import execute_values
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+from services.db_pool import get_pool
+from services.dock_assignment import terminal_code
+from services.sites import DROPOFF_SITES, TERMINALS, format_location
+
+SCENARIOS = ("login", "schedule", "cargo", "location", "cargo_status", "mixed")
+LOADTEST_PASSWORD = "loadtest-password"
+
+
+def seed(pool, run_id: str, schedules: int, users: int, rng: random.Random) -> Dict[str, list]:
+    """Insert tagged users and schedules; returns what the drivers need to address them"""
+    # One hash for every user: seeding should not take longer than the test
+    password_hash = generate_password_hash(LOADTEST_PASSWORD)
+    now = datetime.datetime.utcnow()
+    emails = [f"loadtest-{run_id}-{i}@example.test" for i in range(users)]
+    rows = []
+    for _ in range(schedules):
+        rows.append((
+            str(uuid.uuid4()), str(uuid.uuid4()),
+            now + datetime.timedelta(minutes=rng.randrange(0, 48 * 60)),
+            rng.choice(("high", "medium", "low")),
+            format_location(rng.choice(list(TERMINALS))),
+            format_location(rng.choice(list(DROPOFF_SITES))),
+            f"loadtest {run_id}",
+            round(rng.uniform(5, 50), 2),
+        ))
+
+    with pool.cursor() as cursor:
+        execute_values(cursor, """
+            INSERT INTO users (id, email, password_hash, full_name, is_google_account)
+            VALUES %s
+        """, [(str(uuid.uuid4()), email, password_hash, "Load Test Driver", False) for email in emails])
+        execute_values(cursor, """
+            INSERT INTO cargo_schedule (
+                id, cargo_id, pickup_time, criticality,
+                pickup_location, dropoff_location, description, weight
+            ) VALUES %s
+        """, rows, page_size=1000)
+
+    return {
+        "emails": emails,
+        "schedules": [(row[0], row[1], row[4]) for row in rows],
+    }
+
+
+def cleanup(pool, run_id: str):
+    with pool.cursor() as cursor:
+        cursor.execute("DELETE FROM cargo_schedule WHERE description = %s", (f"loadtest {run_id}",))
+        cursor.execute("DELETE FROM users WHERE email LIKE %s", (f"loadtest-{run_id}-%",))
+
+
+def load_mock_app():
+    """The Airport Mock's Flask app, imported from its directory without a package"""
+    sys.path.insert(0, MOCK_DIR)
+    spec = importlib.util.spec_from_file_location("airport_mock", os.path.join(MOCK_DIR, "script.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+class LocalServer:
+    """Threaded WSGI server on an ephemeral local port"""
+
+    def __init__(self, app):
+        # One log line per request would cost more than some of the handlers
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        self._server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Driver:
+    """One virtual driver: a session, a random cargo to follow and a position"""
+
+    def __init__(self, backend: str, mock: str, data: Dict[str, list], rng: random.Random):
+        self.backend = backend
+        self.mock = mock
+        self.data = data
+        self.rng = rng
+        self.session = requests.Session()
+        self.schedule_id, self.cargo_id, self.pickup = rng.choice(data["schedules"])
+        self.lat, self.lon = 32.8 + rng.random() * 0.2, -97.1 + rng.random() * 0.3
+
+    def login(self):
+        email = self.rng.choice(self.data["emails"])
+        return self.session.post(f"{self.backend}/auth/login",
+                                 json={"email": email, "password": LOADTEST_PASSWORD})
+
+    def schedule(self):
+        # Different windows so the read cache sees a realistic spread of keys
+        start = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        start += datetime.timedelta(hours=self.rng.randrange(0, 48))
+        return self.session.get(f"{self.backend}/schedule",
+                                params={"limit": 50, "pickupFrom": start.isoformat()})
+
+    def cargo(self):
+        _, cargo_id, _ = self.rng.choice(self.data["schedules"])
+        return self.session.get(f"{self.backend}/cargo/{cargo_id}")
+
+    def location(self):
+        self.lat += self.rng.uniform(-0.001, 0.001)
+        self.lon += self.rng.uniform(-0.001, 0.001)
+        return self.session.post(f"{self.backend}/location/update", json={
+            "scheduleId": self.schedule_id, "cargoId": self.cargo_id,
+            "latitude": self.lat, "longitude": self.lon,
+        })
+
+    def cargo_status(self):
+        return self.session.get(f"{self.mock}/get-cargo-status",
+                                params={"cargo_id": self.cargo_id, "terminal": terminal_code(self.pickup)})
+
+    def mixed(self):
+        # Roughly what a driver app does between logins
+        action = self.rng.choices(
+            (self.location, self.schedule, self.cargo, self.cargo_status), weights=(6, 2, 1, 1)
+        )[0]
+        return action()
+
+
+def run_scenario(name: str, drivers: List[Driver], duration: float, flush: Callable[[], None]) -> Dict[str, Any]:
+    pool = get_pool()
+    latencies: List[List[float]] = [[] for _ in drivers]
+    errors = [0] * len(drivers)
+    deadline = time.perf_counter() + duration
+
+    def drive(index: int):
+        action = getattr(drivers[index], name)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = action().status_code < 400
+            except requests.RequestException:
+                ok = False
+            latencies[index].append(time.perf_counter() - start)
+            if not ok:
+                errors[index] += 1
+
+    queries_before = pool.stats()["queries"]
+    started = time.perf_counter()
+    threads = [threading.Thread(target=drive, args=(i,)) for i in range(len(drivers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    # Buffered location points are written after the response; count their inserts too
+    flush()
+    queries = pool.stats()["queries"] - queries_before if queries_before is not None else None
+
+    samples = sorted(value * 1000 for driver in latencies for value in driver)
+    count = len(samples)
+    return {
+        "scenario": name,
+        "requests": count,
+        "errors": sum(errors),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(count / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(samples) / count, 3) if count else 0.0,
+            "p50": round(percentile(samples, 50), 3),
+            "p95": round(percentile(samples, 95), 3),
+            "p99": round(percentile(samples, 99), 3),
+            "max": round(samples[-1], 3) if count else 0.0,
+        },
+        "db_queries_per_request": round(queries / count, 3) if count and queries is not None else None,
+    }
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = {r["scenario"]: r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = {r["scenario"]: r for r in json.load(f)["results"]}
+
+    def change(before, after):
+        if before in (None, 0) or after is None:
+            return "n/a"
+        return f"{(after - before) / before * 100:+.1f}%"
+
+    print(f"{'scenario':<14} {'rps':>10} {'p50':>10} {'p95':>10} {'p99':>10} {'queries/req':>12}")
+    for name in (s for s in SCENARIOS if s in old and s in new):
+        o, n = old[name], new[name]
+        print(f"{name:<14} {change(o['throughput_rps'], n['throughput_rps']):>10} "
+              f"{change(o['latency_ms']['p50'], n['latency_ms']['p50']):>10} "
+              f"{change(o['latency_ms']['p95'], n['latency_ms']['p95']):>10} "
+              f"{change(o['latency_ms']['p99'], n['latency_ms']['p99']):>10} "
+              f"{change(o['db_queries_per_request'], n['db_queries_per_request']):>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--schedules", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--drivers", type=int, default=16, help="concurrent virtual drivers")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1, help="random seed for data and driver behaviour")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--keep", action="store_true", help="leave the seeded rows in the database")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    import app as backend
+    from services.location_routes import location_ingestor
+
+    def flush_locations():
+        while location_ingestor.flush():
+            pass
+
+    rng = random.Random(args.seed)
+    run_id = uuid.uuid4().hex[:8]
+    pool = get_pool()
+    data = seed(pool, run_id, args.schedules, args.users, rng)
+
+    mock_app = load_mock_app()
+    try:
+        with LocalServer(backend.create_app()) as api, LocalServer(mock_app) as mock:
+            # Register every seeded cargo with the mock, about a fifth of them delayed
+            cargo_ids = [cargo_id for _, cargo_id, _ in data["schedules"]]
+            for i in range(0, len(cargo_ids), 1000):
+                requests.post(f"{mock.url}/import-cargo", json={
+                    cargo_id: rng.random() < 0.2 for cargo_id in cargo_ids[i:i + 1000]
+                }).raise_for_status()
+
+            drivers = [Driver(api.url, mock.url, data, random.Random(args.seed * 1000 + i))
+                       for i in range(args.drivers)]
+            results = []
+            for name in args.scenarios:
+                print(f"Running {name} for {args.duration}s with {args.drivers} drivers...", file=sys.stderr)
+                results.append(run_scenario(name, drivers, args.duration, flush_locations))
+    finally:
+        if not args.keep:
+            cleanup(pool, run_id)
+
+    report = {
+        "meta": {
+            "run_id": run_id,
+            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "schedules": args.schedules,
+            "users": args.users,
+            "drivers": args.drivers,
+            "duration_seconds": args.duration,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,486 @@
+"""Accelerated-time replay of the DALI scenarios against the Backend and the Airport Mock.
+
+A discrete-event simulation of a truck fleet on a virtual clock. Each truck
+asks the Backend for a pickup (POST /pickups), polls for its dock window,
+takes routes from /routing, checks its cargo with the Airport Mock's
+/get-cargo-status when it reaches the terminal, and follows DALI agents with
+/traffic/next while loaded. A feed replays app:simulate-traffic (two agents
+per second) on top of the chosen scenario through POST /traffic/events, and
+the pickup tick runs on the virtual clock. Everything is called in-process
+through Flask test clients, with no database or network.
+
+Each fleet size runs in a fresh process, so server state and peak RSS do not
+carry over. The server is saturated at the first fleet size the replay
+cannot run at --target-speed times real time. Examples:
+
+    python benchmarks/scenario_replay.py
+    python benchmarks/scenario_replay.py --scenario edge-accident --fleet 500 2000 8000 --hours 2
+    python benchmarks/scenario_replay.py --fleet 1000 --speed 100 --json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import heapq
+import random
+import argparse
+import datetime
+import contextlib
+import itertools
+import resource
+import importlib.util
+import multiprocessing
+from array import array
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MOCK_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "Airport Mock")
+sys.path.append(BACKEND_DIR)
+
+from services.dock_assignment import terminal_code
+from services.geo import haversine_km
+from services.sites import DROPOFF_SITES, TERMINALS
+from services.synthetic_data import AGENT_STATES, dali_agents
+
+START = datetime.datetime(2025, 5, 1, 6, 0)
+
+Scenario = namedtuple("Scenario", ["states", "parking", "delay_rate"])
+
+# DALI's scenario classes by their app:simulate-scenario names: the agent
+# states each run() sets (every other agent goes G), and the Airport Mock
+# parking and share of delayed cargo that go with the same story
+SCENARIOS = {
+    "happy": Scenario({}, {}, 0.0),
+    "edge-accident": Scenario({"Agent3": "R"}, {}, 0.0),
+    "edge-delay": Scenario({"driver-waiting-area": "Y"}, {}, 0.3),
+    "edge-parking": Scenario({"dfw-airport-terminal-a": "R", "alternate-parking": "Y"}, {"A": 0}, 0.0),
+}
+
+# Agents the scenarios name that DALI's seeded agents do not include
+SCENARIO_AGENTS = {
+    "dfw-airport-terminal-a": TERMINALS["dfw-terminal-a"],
+    "alternate-parking": (32.9025, -97.0405),
+    "driver-waiting-area": (32.8945, -97.0395),
+}
+
+ReplayConfig = namedtuple("ReplayConfig", [
+    "scenario", "fleet", "hours", "seed", "speed", "agents", "traffic_per_second", "delay_rate",
+    "docks", "tick_seconds", "poll_seconds", "feed_seconds",
+])
+
+# Driver-side planning speed, used only to pick a pickup time before the route is asked for
+ESTIMATE_KMH = 40.0
+UNLOAD_MINUTES = 20.0
+PULL_UP_MINUTES = 10.0
+DELAY_MINUTES = 30.0
+# Trucks come on shift over the first quarter hour
+STAGGER_SECONDS = 900.0
+
+Job = namedtuple("Job", ["schedule_id", "cargo_id", "terminal", "site", "criticality"])
+
+
+class Truck:
+    __slots__ = ("id", "lat", "lon", "job", "requested_at", "arrived_at", "slot_start", "slot_end",
+                 "parked", "busy")
+
+    def __init__(self, truck_id: int, lat: float, lon: float):
+        self.id = truck_id
+        self.lat, self.lon = lat, lon
+        self.job = None
+        self.requested_at = self.arrived_at = self.slot_start = self.slot_end = 0.0
+        self.parked = False
+        self.busy = 0.0
+
+
+def load_mock_app():
+    """The Airport Mock's Flask app, imported from its directory without a package"""
+    sys.path.insert(0, MOCK_DIR)
+    spec = importlib.util.spec_from_file_location("airport_mock", os.path.join(MOCK_DIR, "script.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Replay:
+    """One fleet on one scenario, driven through the apps' test clients"""
+
+    def __init__(self, config: ReplayConfig, backend, mock, scheduler, notify, publish_key=None):
+        self.config = config
+        self.backend = backend
+        self.mock = mock
+        self.scheduler = scheduler
+        self.notify = notify
+        self.headers = {"X-Publish-Key": publish_key} if publish_key else {}
+        self.scenario = SCENARIOS[config.scenario]
+        self.delay_rate = self.scenario.delay_rate if config.delay_rate is None else config.delay_rate
+        self.rng = random.Random(config.seed)
+        self.end = config.hours * 3600
+        self.now = 0.0
+
+        self._queue: List[tuple] = []
+        self._seq = itertools.count()
+        self.latency: Dict[str, array] = defaultdict(lambda: array("d"))
+        self.errors = Counter()
+        self.counts = Counter()
+        self.assign_latency = array("d")
+        self.dock_wait = array("d")
+        self.max_lag = 0.0
+
+        self.states: Dict[str, str] = {}
+        sites = list(DROPOFF_SITES.values())
+        self.trucks = [Truck(i, *self.rng.choice(sites)) for i in range(config.fleet)]
+
+    def at(self, t: float, fn, *args):
+        heapq.heappush(self._queue, (t, next(self._seq), fn, args))
+
+    def clock(self, t: float) -> datetime.datetime:
+        return START + datetime.timedelta(seconds=t)
+
+    def sim_seconds(self, iso: str) -> float:
+        return (datetime.datetime.fromisoformat(iso) - START).total_seconds()
+
+    def call(self, client, label: str, method: str, path: str, expect=(200,), **kwargs):
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        self.latency[label].append(time.perf_counter() - started)
+        if response.status_code not in expect:
+            self.errors[label] += 1
+        return response
+
+    def work(self, truck: Truck, seconds: float):
+        """Count time driving, loading or unloading, up to the end of the replay"""
+        truck.busy += max(0.0, min(self.now + seconds, self.end) - self.now)
+
+    # Traffic feed and pickup tick
+
+    def start_traffic(self):
+        agents = [dict(agent._asdict(), state="G") for agent in dali_agents(self.config.seed, self.config.agents, START)]
+        for code, (lat, lon) in SCENARIO_AGENTS.items():
+            agents.append({"code": code, "name": code, "type": "checkpoint", "latitude": lat, "longitude": lon,
+                           "state": "G", "updated_at": START.isoformat()})
+        for agent in agents:
+            agent["state"] = self.scenario.states.get(agent["code"], "G")
+            self.states[agent["code"]] = agent["state"]
+        self.call(self.backend, "traffic_events", "POST", "/traffic/events", expect=(202,),
+                  json={"agents": agents}, headers=self.headers)
+
+        for code, spots in self.scenario.parking.items():
+            self.call(self.mock, "mock_admin", "POST", "/update-parking", expect=(302,),
+                      data={f"parking_{code}": str(spots)})
+
+    def feed(self):
+        """app:simulate-traffic: random agents move to a different state, posted in batches"""
+        changes = []
+        codes = list(self.states)
+        expected = self.config.traffic_per_second * self.config.feed_seconds
+        count = int(expected) + (self.rng.random() < expected - int(expected))
+        for offset in sorted(self.rng.uniform(0, self.config.feed_seconds) for _ in range(count)):
+            code = self.rng.choice(codes)
+            state = self.rng.choice([s for s in AGENT_STATES if s != self.states[code]])
+            self.states[code] = state
+            at = self.clock(self.now - self.config.feed_seconds + offset)
+            changes.append({"code": code, "state": state, "timestamp": at.isoformat()})
+        if changes:
+            self.call(self.backend, "traffic_events", "POST", "/traffic/events", expect=(202,),
+                      json=changes, headers=self.headers)
+        self.at(self.now + self.config.feed_seconds, self.feed)
+
+    def tick(self):
+        started = time.perf_counter()
+        self.notify(self.scheduler.tick(self.clock(self.now)))
+        self.latency["pickup_tick"].append(time.perf_counter() - started)
+        self.at(self.now + self.config.tick_seconds, self.tick)
+
+    # Truck lifecycle
+
+    def ready(self, truck: Truck):
+        """Take the next job and ask the Backend for a dock window"""
+        rng = self.rng
+        terminal = rng.choice(list(TERMINALS))
+        job = truck.job = Job(
+            str(uuid.UUID(int=rng.getrandbits(128), version=4)), str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            terminal, rng.choice(list(DROPOFF_SITES)), rng.choice(("high", "medium", "low")),
+        )
+        if rng.random() < self.delay_rate:
+            self.call(self.mock, "mock_import", "POST", "/import-cargo", json={job.cargo_id: True})
+        travel = haversine_km(truck.lat, truck.lon, *TERMINALS[terminal]) / ESTIMATE_KMH * 3600
+        self.request_pickup(truck, self.now + travel + rng.uniform(10, 30) * 60)
+
+    def request_pickup(self, truck: Truck, pickup_at: float):
+        job = truck.job
+        self.call(self.backend, "pickups_upsert", "POST", "/pickups", json={
+            "scheduleId": job.schedule_id, "cargoId": job.cargo_id, "terminal": job.terminal,
+            "criticality": job.criticality, "pickupTime": self.clock(pickup_at).isoformat(),
+        })
+        truck.requested_at = self.now
+        self.at(self.now + self.config.poll_seconds, self.poll, truck)
+
+    def poll(self, truck: Truck):
+        body = self.call(self.backend, "pickups_get", "GET", f"/pickups/{truck.job.schedule_id}").get_json()
+        if body.get("status") != "dispatched":
+            self.at(self.now + self.config.poll_seconds, self.poll, truck)
+            return
+
+        self.assign_latency.append(self.now - truck.requested_at)
+        truck.slot_start, truck.slot_end = self.sim_seconds(body["slotStart"]), self.sim_seconds(body["slotEnd"])
+        lat, lon = TERMINALS[truck.job.terminal]
+        if (truck.lat, truck.lon) == (lat, lon):
+            # Re-dispatched after a delay while waiting at the terminal
+            self.arrive(truck)
+            return
+        seconds = self.route(truck, f"toLat={lat}&toLon={lon}", lat, lon)
+        truck.lat, truck.lon = lat, lon
+        self.at(self.now + seconds, self.reach, truck)
+
+    def route(self, truck: Truck, destination: str, lat: float, lon: float) -> float:
+        response = self.call(self.backend, "routing_route", "GET",
+                             f"/routing/route?fromLat={truck.lat}&fromLon={truck.lon}&{destination}")
+        if response.status_code == 200:
+            seconds = response.get_json()["durationSeconds"]
+        else:
+            seconds = haversine_km(truck.lat, truck.lon, lat, lon) / ESTIMATE_KMH * 3600
+        self.work(truck, seconds)
+        return seconds
+
+    def reach(self, truck: Truck):
+        truck.arrived_at = self.now
+        self.arrive(truck)
+
+    def arrive(self, truck: Truck):
+        """At the terminal: check the cargo with the Airport Mock, then wait for the dock window"""
+        job = truck.job
+        if self.now >= truck.slot_end:
+            self.counts["missed_slots"] += 1
+            self.request_pickup(truck, self.now)
+            return
+
+        code = terminal_code(job.terminal)
+        status = self.call(self.mock, "cargo_status", "GET",
+                           f"/get-cargo-status?cargo_id={job.cargo_id}&terminal={code}").get_json()
+        if "delayed" in status["message"]:
+            self.counts["delays"] += 1
+            self.call(self.backend, "pickups_delay", "POST", f"/pickups/{job.schedule_id}/delay",
+                      json={"minutes": DELAY_MINUTES})
+            self.at(self.now + DELAY_MINUTES * 60, self.cargo_landed, job.cargo_id)
+            truck.requested_at = self.now
+            self.at(self.now + self.config.poll_seconds, self.poll, truck)
+            return
+
+        if status["action"] == "Parking" and not truck.parked:
+            reserved = self.call(self.mock, "reserve_parking", "POST", "/reserve-parking", expect=(200, 409),
+                                 json={"terminal": code})
+            truck.parked = reserved.status_code == 200
+            self.counts["parked" if truck.parked else "pull_ups"] += 1
+        elif status["action"] == "Pull_Up":
+            self.counts["pull_ups"] += 1
+
+        if status["action"] != "Bay_Area" and not truck.parked and self.now + PULL_UP_MINUTES * 60 < truck.slot_start:
+            # Wait at the rest area and ask again
+            self.at(self.now + PULL_UP_MINUTES * 60, self.arrive, truck)
+            return
+        self.at(max(self.now, truck.slot_start), self.load, truck)
+
+    def cargo_landed(self, cargo_id: str):
+        self.call(self.mock, "mock_import", "POST", "/import-cargo", json={cargo_id: False})
+
+    def load(self, truck: Truck):
+        self.dock_wait.append(self.now - truck.arrived_at)
+        if truck.parked:
+            self.call(self.mock, "release_parking", "POST", "/release-parking",
+                      json={"terminal": terminal_code(truck.job.terminal)})
+            truck.parked = False
+        seconds = truck.slot_end - self.now
+        self.work(truck, seconds)
+        self.at(self.now + seconds, self.loaded, truck)
+
+    def loaded(self, truck: Truck):
+        job = truck.job
+        self.call(self.backend, "pickups_complete", "POST", f"/pickups/{job.schedule_id}/complete")
+        lat, lon = DROPOFF_SITES[job.site]
+        origin = (truck.lat, truck.lon)
+        seconds = self.route(truck, f"to={job.site}", lat, lon)
+        # The app asks for the next DALI agent as it goes
+        steps = int(seconds // self.config.poll_seconds)
+        for step in range(1, steps + 1):
+            fraction = step / (steps + 1)
+            self.at(self.now + step * self.config.poll_seconds, self.follow, job,
+                    origin[0] + (lat - origin[0]) * fraction, origin[1] + (lon - origin[1]) * fraction)
+        truck.lat, truck.lon = lat, lon
+        self.at(self.now + seconds, self.deliver, truck)
+
+    def follow(self, job: Job, lat: float, lon: float):
+        self.call(self.backend, "traffic_next", "POST", "/traffic/next", json={"drivers": [
+            {"pickup": job.terminal, "dropoff": job.site, "latitude": lat, "longitude": lon},
+        ]})
+
+    def deliver(self, truck: Truck):
+        self.counts["trips"] += 1
+        self.work(truck, UNLOAD_MINUTES * 60)
+        self.at(self.now + UNLOAD_MINUTES * 60, self.ready, truck)
+
+    # Replay
+
+    def run(self) -> Dict[str, Any]:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.start_traffic()
+        for truck in self.trucks:
+            self.at(self.rng.uniform(0, STAGGER_SECONDS), self.ready, truck)
+        self.at(0.0, self.tick)
+        self.at(self.config.feed_seconds, self.feed)
+
+        speed = self.config.speed
+        started = time.perf_counter()
+        while self._queue and self._queue[0][0] < self.end:
+            t, _, fn, args = heapq.heappop(self._queue)
+            if speed:
+                ahead = started + t / speed - time.perf_counter()
+                if ahead > 0:
+                    time.sleep(ahead)
+                else:
+                    self.max_lag = max(self.max_lag, -ahead)
+            self.now = t
+            fn(*args)
+        wall = time.perf_counter() - started
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        return self.report(wall, after.ru_utime + after.ru_stime - usage.ru_utime - usage.ru_stime,
+                           after.ru_maxrss / 1024)
+
+    def report(self, wall: float, cpu: float, peak_rss_mb: float) -> Dict[str, Any]:
+        latency, server = {}, 0.0
+        for label, values in sorted(self.latency.items()):
+            ordered = sorted(values)
+            server += sum(ordered)
+            latency[label] = {
+                "count": len(ordered),
+                "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+                "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+                "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+            }
+        requests = sorted(itertools.chain.from_iterable(
+            values for label, values in self.latency.items() if label != "pickup_tick"))
+        assign, dock = sorted(self.assign_latency), sorted(self.dock_wait)
+        busy = sum(truck.busy for truck in self.trucks)
+        pickups = self.scheduler.stats()
+        return {
+            "scenario": self.config.scenario,
+            "fleet": self.config.fleet,
+            "sim_hours": self.config.hours,
+            "wall_seconds": round(wall, 2),
+            "speed": round(self.end / wall, 1) if wall else 0.0,
+            "max_lag_seconds": round(self.max_lag, 3),
+            "trips": self.counts["trips"],
+            "idle_pct": round(100 * (1 - busy / (self.config.fleet * self.end)), 1) if self.config.fleet else 0.0,
+            "assign_latency_s": {"p50": round(percentile(assign, 50), 1), "p95": round(percentile(assign, 95), 1)},
+            "dock_wait_min": {"p50": round(percentile(dock, 50) / 60, 1), "p95": round(percentile(dock, 95) / 60, 1)},
+            "delays": self.counts["delays"],
+            "parked": self.counts["parked"],
+            "pull_ups": self.counts["pull_ups"],
+            "missed_slots": self.counts["missed_slots"],
+            "requests": len(requests),
+            "request_p95_ms": round(percentile(requests, 95) * 1000, 3),
+            "errors": dict(self.errors),
+            "server_seconds": round(server, 3),
+            "server_busy_pct": round(100 * server / wall, 1) if wall else 0.0,
+            "cpu_seconds": round(cpu, 3),
+            "peak_rss_mb": round(peak_rss_mb, 1),
+            "latency": latency,
+            "pickups": {key: pickups[key] for key in ("pending", "dispatched", "unplaced", "last_tick_ms")},
+        }
+
+
+def run_replay(config: ReplayConfig) -> Dict[str, Any]:
+    """Replay in this process against the apps' module-level state, configured for the replay"""
+    # Ticks come from the virtual clock; the simulated fleet is the truck pool
+    os.environ["PICKUP_TICK_SECONDS"] = "0"
+    os.environ["PICKUP_TRUCKS"] = "0"
+    os.environ["PICKUP_DEFAULT_DOCKS"] = str(config.docks)
+    # The replay is the only scheduler; there is no database to elect one in
+    os.environ["PICKUP_SCHEDULER_ENABLED"] = "1"
+    os.environ["PICKUP_SCHEDULER_LOCK"] = "0"
+    os.environ.pop("PICKUP_DOCKS", None)
+    os.environ.pop("DALI_DATABASE", None)
+    os.environ["MOCK_STATE_BACKEND"] = "memory"
+    # Traffic events are published; the apps refuse that without a key
+    os.environ.setdefault("EVENTS_PUBLISH_KEY", "scenario-replay")
+
+    # The services print their diagnostics; keep them off stdout so --json stays parseable
+    with contextlib.redirect_stdout(sys.stderr):
+        from flask import Flask
+        from services.event_routes import EVENTS_PUBLISH_KEY
+        from services.pickup_routes import notify_assignments, pickup_bp, pickup_scheduler
+        from services.routing_routes import routing_bp
+        from services.traffic_routes import traffic_bp
+
+        backend = Flask(__name__)
+        for blueprint in (pickup_bp, traffic_bp, routing_bp):
+            backend.register_blueprint(blueprint)
+        replay = Replay(config, backend.test_client(), load_mock_app().test_client(), pickup_scheduler,
+                        notify_assignments, publish_key=EVENTS_PUBLISH_KEY)
+        return replay.run()
+
+
+def run_isolated(config: ReplayConfig) -> Dict[str, Any]:
+    """Replay in a fresh process, so no state or memory carries over between fleet sizes"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_replay, config).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="happy")
+    parser.add_argument("--fleet", type=int, nargs="+", default=[250, 1000, 4000], help="trucks per run")
+    parser.add_argument("--hours", type=float, default=2.0, help="simulated hours per run")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="pace the replay at this multiple of real time (0 runs as fast as it can)")
+    parser.add_argument("--target-speed", type=float, default=100.0,
+                        help="a fleet saturates the server once the replay falls below this speed")
+    parser.add_argument("--agents", type=int, default=50, help="DALI agents besides the scenario ones")
+    parser.add_argument("--traffic-per-second", type=float, default=2.0, help="agent state changes per second")
+    parser.add_argument("--delay-rate", type=float, help="share of delayed cargo (default: the scenario's)")
+    parser.add_argument("--docks", type=int, default=50, help="docks per terminal")
+    parser.add_argument("--tick-seconds", type=float, default=30.0, help="pickup tick interval")
+    parser.add_argument("--poll-seconds", type=float, default=60.0, help="driver app polling interval")
+    parser.add_argument("--feed-seconds", type=float, default=10.0, help="traffic feed batch interval")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    for fleet in args.fleet:
+        results.append(run_isolated(ReplayConfig(
+            args.scenario, fleet, args.hours, args.seed, args.speed, args.agents, args.traffic_per_second,
+            args.delay_rate, args.docks, args.tick_seconds, args.poll_seconds, args.feed_seconds,
+        )))
+    saturated = next((r["fleet"] for r in results if r["speed"] < args.target_speed), None)
+
+    if args.json:
+        print(json.dumps({"target_speed": args.target_speed, "saturated_at": saturated, "results": results},
+                         indent=2))
+        return
+
+    print(f"scenario {args.scenario}, {args.hours} simulated hours per run")
+    print(f"{'fleet':>6} {'speed':>7} {'trips':>6} {'idle %':>7} {'assign p95 s':>13} {'dock wait p95':>14} "
+          f"{'requests':>9} {'p95 ms':>7} {'busy %':>7} {'cpu s':>7} {'rss MB':>7}")
+    for r in results:
+        print(f"{r['fleet']:>6} {r['speed']:>7} {r['trips']:>6} {r['idle_pct']:>7} "
+              f"{r['assign_latency_s']['p95']:>13} {r['dock_wait_min']['p95']:>13}m {r['requests']:>9} "
+              f"{r['request_p95_ms']:>7} {r['server_busy_pct']:>7} {r['cpu_seconds']:>7} {r['peak_rss_mb']:>7}")
+    if saturated is None:
+        print(f"Kept {args.target_speed:g}x real time up to {args.fleet[-1]} trucks")
+    else:
+        print(f"Fell below {args.target_speed:g}x real time at {saturated} trucks")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,9 @@ from pathlib import Path
 # Ensure the script can find other modules in the project
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
+from services.db_pool import close_pool, connection_params, get_pool
+from services.migrations import check_query_plans, run_migrations
+
 # Direct path to .env file to ensure it's loaded correctly
 env_path = Path(".") / ".env"
 print(f"Loading environment from: {os.path.abspath(env_path)}")
@@ -23,13 +26,9 @@ def create_database_if_not_exists():
         
     # Connect to postgres to check/create database
     try:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST", "localhost"),
-            port=os.getenv("DB_PORT", "5432"),
-            user=os.getenv("DB_USER", "postgres"),
-            password=os.getenv("DB_PASSWORD", ""),
-            database="postgres"
-        )
+        # CREATE DATABASE cannot run inside a transaction, so this one
+        # bypasses the pool and uses a short-lived autocommit connection
+        conn = psycopg2.connect(**connection_params(database="postgres"))
         conn.autocommit = True
         cursor = conn.cursor()
         
@@ -50,58 +49,28 @@ def create_database_if_not_exists():
         return False
 
 def setup_database():
-    """Sets up the Cargo Connect database by executing SQL files"""
+    """Sets up the Cargo Connect database by applying pending migrations"""
     print("Setting up Cargo Connect database...")
     
     if not create_database_if_not_exists():
         sys.exit(1)
     
-    # Database connection parameters - get directly from env
-    db_name = os.getenv("DB_NAME")
-    db_host = os.getenv("DB_HOST", "localhost")
-    db_port = os.getenv("DB_PORT", "5432")
-    db_user = os.getenv("DB_USER", "postgres")
-    db_pass = os.getenv("DB_PASSWORD", "")
+    # Database connection parameters - shared with the application pool
+    params = connection_params()
     
-    print(f"Connecting to database '{db_name}' on {db_host}:{db_port} as user '{db_user}'...")
+    print(f"Connecting to database '{params['database']}' on {params['host']}:{params['port']} as user '{params['user']}'...")
     
     try:
-        # Connect to the database
-        conn = psycopg2.connect(
-            host=db_host,
-            port=db_port,
-            user=db_user,
-            password=db_pass,
-            database=db_name
-        )
-        conn.autocommit = True
-        cursor = conn.cursor()
-        
-        # Execute SQL files
-        sql_dir = Path("sql")
-        
-        # First create users table
-        users_sql_path = sql_dir / "users.sql"
-        if users_sql_path.exists():
-            print(f"Executing {users_sql_path}...")
-            with open(users_sql_path, 'r') as f:
-                cursor.execute(f.read())
-            print("Users table setup complete.")
-        else:
-            print(f"Warning: {users_sql_path} not found.")
+        pool = get_pool()
         
-        # Then create cargo_schedule table
-        cargo_sql_path = sql_dir / "cargo_schedule.sql"
-        if cargo_sql_path.exists():
-            print(f"Executing {cargo_sql_path}...")
-            with open(cargo_sql_path, 'r') as f:
-                cursor.execute(f.read())
-            print("Cargo schedule table setup complete.")
+        # Apply versioned migrations from sql/migrations in order
+        applied = run_migrations(pool)
+        if applied:
+            print(f"Applied {len(applied)} migration(s).")
         else:
-            print(f"Warning: {cargo_sql_path} not found.")
+            print("Schema is up to date.")
         
-        cursor.close()
-        conn.close()
+        close_pool()
         
         print("Database setup completed successfully.")
         
@@ -109,7 +78,19 @@ def setup_database():
         print(f"Database setup failed: {e}")
         sys.exit(1)
 
+def check_plans():
+    """EXPLAIN the hot schedule queries and fail if any of them cannot use its index"""
+    print("Checking query plans for hot cargo_schedule queries...")
+    try:
+        ok = check_query_plans(get_pool())
+    finally:
+        close_pool()
+    sys.exit(0 if ok else 1)
+
 if __name__ == "__main__":
+    if "--check-plans" in sys.argv:
+        check_plans()
+
     setup_database()
     
     print("""
@@ -1,65 +1,268 @@
+"""Deterministic synthetic data for development and performance work.
+
+Streams cargo schedules, driver accounts and GPS traces into PostgreSQL with
+COPY FROM STDIN from parallel worker processes, and writes the matching
+Airport Mock delay/parking state and DALI traffic agents and events, so
+every component can be loaded from the same seed:
+
+    python seed_data.py                      # 10 schedules, like the old seeder
+    python seed_data.py --schedules 2000000 --drivers 3000 --days 21 --trace-rate 0.1 \\
+        --criticality high=0.2,medium=0.5,low=0.3 --terminals A=4,B=1,C=2,D=4,E=1 \\
+        --start 2025-05-01 --output-dir generated --mock-db "../Airport Mock/mock_state.db"
+
+The same seed and options produce the same rows whatever --workers is.
+Run `python script.py` first to create the schema.
+"""
 import os
-import psycopg2
-from dotenv import load_dotenv, find_dotenv
-from faker import Faker
- 
-load_dotenv(find_dotenv())
-fake = Faker()
-
-# Connect to PostgreSQL database
-conn = psycopg2.connect(
-    host=os.getenv("DB_HOST"),
-    port=os.getenv("DB_PORT"),
-    database=os.getenv("DB_NAME"),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD")
+import sys
+import csv
+import json
+import time
+import sqlite3
+import argparse
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from werkzeug.security import generate_password_hash
+
+from services.db_pool import ConnectionPool, close_pool, get_pool
+from services.dock_assignment import DEFAULT_TERMINAL_CAPACITY, parse_capacity
+from services.location_ingest import PostgresLocationSink
+from services.synthetic_data import (
+    SCHEDULE_COLUMNS, GeneratorConfig, chunk_count, criticality_mix, dali_agents, dali_events,
+    dali_log_rows, delay_status, driver_rows, road_graph, schedule_chunk, terminal_weights, trace_points,
 )
-cur = conn.cursor()
-
-for _ in range(10):
-    criticality = fake.random_element(elements=["high", "medium", "low"])
-    
-    if criticality == "high":
-        description = "Perishable goods/ medicines requiring immediate delivery."
-    elif criticality == "medium":
-        description = "Standard shipment. Handle with care as it contains delicate items."
-    else:  # low
-        description = "Low priority shipment. Non-perishable items. Can be delivered with no urgency."
- 
-    pickup_location = fake.random_element(elements=[
-        "dfw-terminal-a_(32.90499459590296, -97.03632986050778)",
-        "dfw-terminal-b_(32.90534203342366, -97.04491644516602)",
-        "dfw-terminal-c_(32.89774624126012, -97.03576044516623)",
-        "dfw-terminal-d_(32.89824196997102, -97.04478174516632)",
-        "dfw-terminal-e_(32.890938252888326, -97.03569488515262)",
-    ])
- 
-    dropoff_location = fake.random_element(elements=[
-        "Ups-station_(32.99859322829199, -96.77238661872248)",
-        "Fedex-store_(33.024281196004594, -96.79414555014056)",
-        "Amazon-warehouse_(32.9801807167563, -96.73806753096646)",
-        "Amazon-warehouse-2_(32.990626003517455, -96.78415098302702)",
-        "Ups-store2_(32.82222393256571, -96.80966655288424)",
-    ])
- 
-    cur.execute("""
-        INSERT INTO cargo_schedule (
-            id, cargo_id, pickup_time, criticality,
-            pickup_location, dropoff_location, description, weight
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-    """, (
-        fake.uuid4(),
-        fake.uuid4(),
-        fake.date_time_this_month(),
-        criticality,
-        pickup_location,
-        dropoff_location,
-        description,
-        round(fake.pyfloat(min_value=5, max_value=50, right_digits=2), 2)
-    ))
- 
-conn.commit()
-cur.close()
-conn.close()
-
-print("Seeded data added to the database successfully.")
\ No newline at end of file
+
+MOCK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Airport Mock")
+TRACE_BATCH = 50_000
+
+COPY_SCHEDULES = f"COPY cargo_schedule ({', '.join(SCHEDULE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+COPY_USERS = "COPY users (id, email, password_hash, full_name, is_google_account) FROM STDIN WITH (FORMAT csv)"
+
+# One connection per worker process, opened by the pool initializer
+_worker_pool = None
+
+
+def copy_rows(cursor, sql, rows):
+    buffer = _CsvBuffer(rows)
+    cursor.copy_expert(sql, buffer)
+
+
+class _CsvBuffer:
+    """File-like reader that renders rows as CSV only as COPY asks for more"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._pending = ""
+        self._line = _CsvLine()
+        self._writer = csv.writer(self._line)
+
+    def read(self, size=-1):
+        size = size if size and size > 0 else 1 << 16
+        parts, length = [self._pending], len(self._pending)
+        for row in self._rows:
+            self._writer.writerow(row)
+            parts.append(self._line.value)
+            length += len(self._line.value)
+            if length >= size:
+                break
+        data = "".join(parts)
+        self._pending = data[size:]
+        return data[:size]
+
+    readline = read
+
+
+class _CsvLine:
+    value = ""
+
+    def write(self, line):
+        self.value = line
+
+
+def _init_worker():
+    global _worker_pool
+    _worker_pool = ConnectionPool(minconn=1, maxconn=1)
+
+
+def load_chunk(config, index, output_dir=None, mock_db=None):
+    """Generate chunk ``index`` and write it everywhere; returns row counts"""
+    pool = _worker_pool or get_pool()
+    rows = schedule_chunk(config, index)
+    with pool.cursor() as cursor:
+        copy_rows(cursor, COPY_SCHEDULES, rows)
+
+    points = 0
+    sink = PostgresLocationSink(pool)
+    traces = trace_points(config, index, rows)
+    while True:
+        batch = list(islice(traces, TRACE_BATCH))
+        if not batch:
+            break
+        sink(batch)
+        points += len(batch)
+
+    delays = delay_status(config, index, rows)
+    if output_dir:
+        with open(os.path.join(output_dir, "airport_mock", f"cargo_delay_status-{index:05d}.json"), "w") as f:
+            json.dump(delays, f)
+    if mock_db:
+        mock_state_store(mock_db).set_delays(delays)
+    return len(rows), points, sum(delays.values())
+
+
+def mock_state_store(path):
+    """The Airport Mock's SQLite state store (MOCK_STATE_BACKEND=sqlite) at ``path``"""
+    if MOCK_DIR not in sys.path:
+        sys.path.insert(0, MOCK_DIR)
+    from state_store import SQLiteStateStore
+    return SQLiteStateStore(path)
+
+
+def seed_drivers(pool, seed, count, password):
+    # One hash for every account: hashing thousands would dominate the run
+    with pool.cursor() as cursor:
+        copy_rows(cursor, COPY_USERS, driver_rows(seed, count, generate_password_hash(password)))
+
+
+def write_dali(args, output_dir):
+    agents = dali_agents(args.seed, args.agents, args.start)
+    agents, events = dali_events(args.seed, agents, args.start, args.days, args.agent_events_per_hour)
+    event_logs, notification_logs = dali_log_rows(agents, events)
+    tables = {
+        "agents": (("id", "name", "code", "type", "latitude", "longitude", "state", "created_at", "updated_at"),
+                   agents),
+        "event_logs": (("id", "agent_id", "event_type", "metadata", "created_at", "updated_at"), event_logs),
+        "notification_logs": (("id", "agent_id", "type", "message", "created_at", "updated_at"),
+                              notification_logs),
+    }
+
+    if output_dir:
+        for table, (columns, rows) in tables.items():
+            with open(os.path.join(output_dir, "dali", f"{table}.csv"), "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                writer.writerows(rows)
+
+    if args.dali_db:
+        # Replaces the seeded agents; log rows go first because of their foreign keys
+        conn = sqlite3.connect(args.dali_db)
+        with conn:
+            for table in ("notification_logs", "event_logs", "agents"):
+                conn.execute(f"DELETE FROM {table}")
+            for table in ("agents", "event_logs", "notification_logs"):
+                columns, rows = tables[table]
+                conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) "
+                                 f"VALUES ({', '.join('?' * len(columns))})", rows)
+        conn.close()
+    return len(agents), len(events)
+
+
+def reset(pool):
+    with pool.cursor() as cursor:
+        cursor.execute("TRUNCATE driver_locations, cargo_schedule")
+        cursor.execute("DELETE FROM users WHERE email LIKE %s", ("driver-%@synthetic.example",))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--schedules", type=int, default=10)
+    parser.add_argument("--criticality", help="weights such as high=0.2,medium=0.5,low=0.3 (default: equal)")
+    parser.add_argument("--terminals", help="pickup weights per terminal such as A=4,B=1 (default: equal)")
+    parser.add_argument("--start", type=datetime.datetime.fromisoformat,
+                        default=datetime.datetime.combine(datetime.date.today(), datetime.time()),
+                        help="first pickup day, ISO format (default: today)")
+    parser.add_argument("--days", type=int, default=30, help="pickup window length in days")
+    parser.add_argument("--hours", default="0-24", help="daily pickup hours, e.g. 6-22")
+    parser.add_argument("--drivers", type=int, default=0, help="driver accounts to create")
+    parser.add_argument("--driver-password", default="driver-password")
+    parser.add_argument("--trace-rate", type=float, default=0.0,
+                        help="share of schedules with a GPS trace from terminal to dropoff")
+    parser.add_argument("--gps-interval", type=int, default=30, help="seconds between GPS fixes")
+    parser.add_argument("--delay-rate", type=float, default=0.2, help="share of cargo the mock reports delayed")
+    parser.add_argument("--parking", default=",".join(f"{t}={n}" for t, n in DEFAULT_TERMINAL_CAPACITY.items()),
+                        help="Airport Mock parking spots per terminal")
+    parser.add_argument("--agents", type=int, default=50, help="DALI traffic agents")
+    parser.add_argument("--agent-events-per-hour", type=float, default=2.0,
+                        help="state changes per agent per hour")
+    parser.add_argument("--road-graph", help="write the synthetic street grid for ROUTING_GRAPH_PATH to this file")
+    parser.add_argument("--output-dir", help="write Airport Mock and DALI files here")
+    parser.add_argument("--mock-db", help="also load delays and parking into this Airport Mock SQLite store")
+    parser.add_argument("--dali-db", help="also replace agents and logs in this migrated DALI SQLite database")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (0 = generate in this process)")
+    parser.add_argument("--reset", action="store_true",
+                        help="truncate cargo_schedule and driver_locations and drop generated drivers first")
+    args = parser.parse_args(argv)
+
+    first_hour, _, last_hour = args.hours.partition("-")
+    args.hours = (int(first_hour), int(last_hour))
+    if not 0 <= args.hours[0] < args.hours[1] <= 24:
+        parser.error("--hours must look like 6-22 within 0-24")
+    try:
+        args.criticality = criticality_mix(args.criticality)
+        args.terminals = terminal_weights(args.terminals)
+        args.parking = parse_capacity(args.parking)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = GeneratorConfig(
+        args.seed, args.schedules, args.criticality, args.terminals, args.start, args.days, args.hours,
+        args.trace_rate, args.gps_interval, args.delay_rate,
+    )
+    if args.output_dir:
+        for sub in ("airport_mock", "dali"):
+            os.makedirs(os.path.join(args.output_dir, sub), exist_ok=True)
+        with open(os.path.join(args.output_dir, "airport_mock", "terminal_parking.json"), "w") as f:
+            json.dump(args.parking, f)
+    if args.mock_db:
+        store = mock_state_store(args.mock_db)
+        for terminal, spots in args.parking.items():
+            store.set_parking(terminal, spots)
+
+    if args.road_graph:
+        with open(args.road_graph, "w") as f:
+            json.dump(road_graph(args.seed), f, separators=(",", ":"))
+
+    started = time.perf_counter()
+    pool = get_pool()
+    if args.reset:
+        reset(pool)
+    if args.drivers:
+        seed_drivers(pool, args.seed, args.drivers, args.driver_password)
+
+    chunks = range(chunk_count(config))
+    workers = min(args.workers, len(chunks))
+    if workers > 1:
+        # Spawned, so workers never share the parent's open database socket
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as executor:
+            futures = [executor.submit(load_chunk, config, i, args.output_dir, args.mock_db) for i in chunks]
+            counts = [future.result() for future in futures]
+    else:
+        counts = [load_chunk(config, i, args.output_dir, args.mock_db) for i in chunks]
+    schedules, points, delayed = (sum(column) for column in zip(*counts)) if counts else (0, 0, 0)
+
+    agents = events = 0
+    if args.output_dir or args.dali_db:
+        agents, events = write_dali(args, args.output_dir)
+    close_pool()
+
+    elapsed = time.perf_counter() - started
+    print(f"Seeded {schedules} schedules, {args.drivers} drivers and {points} GPS fixes "
+          f"with {max(workers, 1)} worker(s) in {elapsed:.1f}s ({schedules / elapsed:,.0f} schedules/s).")
+    print(f"Airport Mock: {delayed} delayed cargo, parking {args.parking}. "
+          f"DALI: {agents} agents, {events} state changes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+# Backend/.env is loaded once, here, before any service module reads its settings
+from dotenv import find_dotenv, load_dotenv
+
+load_dotenv(find_dotenv())
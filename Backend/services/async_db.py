@@ -0,0 +1,82 @@
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+from .db_pool import connection_params
+
+try:
+    from psycopg.conninfo import make_conninfo
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:  # ASGI mode falls back to serving everything through Flask
+    AsyncConnectionPool = None
+
+
+def async_available() -> bool:
+    return AsyncConnectionPool is not None
+
+
+class AsyncPool:
+    """psycopg 3 connection pool for the event loop, with the same
+    commit-on-success / rollback-on-error contract as ``ConnectionPool``."""
+
+    def __init__(self, minconn: int = 1, maxconn: int = 10, timeout: float = 5.0, **params):
+        if not async_available():
+            raise RuntimeError("psycopg and psycopg_pool are required for the async database path")
+        params = connection_params(**params)
+        params["dbname"] = params.pop("database")
+        self._pool = AsyncConnectionPool(
+            make_conninfo(**{k: v for k, v in params.items() if v not in (None, "")}),
+            min_size=minconn,
+            max_size=maxconn,
+            timeout=timeout,
+            open=False,
+        )
+
+    async def open(self):
+        await self._pool.open()
+
+    async def close(self):
+        await self._pool.close()
+
+    @asynccontextmanager
+    async def cursor(self, dict_rows: bool = False):
+        # pool.connection() commits when the block succeeds and rolls back otherwise
+        async with self._pool.connection() as conn:
+            async with conn.cursor(row_factory=dict_row if dict_rows else None) as cur:
+                yield cur
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._pool.get_stats()
+        return {
+            "size": stats.get("pool_size", 0),
+            "max_size": self._pool.max_size,
+            "idle": stats.get("pool_available", 0),
+            "waiting": stats.get("requests_waiting", 0),
+            "checkouts": stats.get("requests_num", 0),
+            "timeouts": stats.get("requests_errors", 0),
+        }
+
+
+_async_pool: Optional[AsyncPool] = None
+
+
+def get_async_pool() -> AsyncPool:
+    """Process-wide async pool, sized from the same DB_POOL_* settings as the sync one.
+
+    Only touched from the event loop thread, so it needs no lock.
+    """
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = AsyncPool(
+            minconn=int(os.getenv("DB_POOL_MIN", "1")),
+            maxconn=int(os.getenv("DB_POOL_MAX", "10")),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+        )
+    return _async_pool
+
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
@@ -1,29 +1,42 @@
 from flask import Blueprint, request, jsonify
 from .auth_service import AuthService
+from .password_hasher import HasherBusy
+from .metrics import auth_failures
+from .process_local import ProcessLocal
 from functools import wraps
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
-try:
-    auth_service = AuthService()
-except Exception as e:
-    auth_service = None
-    print(f"Error initializing AuthService: {e}")
-    
+def _auth_service_from_env():
+    try:
+        return AuthService()
+    except Exception as e:
+        print(f"Error initializing AuthService: {e}")
+        return None
+
+# Built on the first auth request in each worker, not when the app is imported
+_auth_service = ProcessLocal(_auth_service_from_env)
+
+def get_auth_service():
+    return _auth_service.get()
+
+def bearer_token(auth_header):
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header[7:]
+    return None
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        auth_header = request.headers.get('Authorization')
-        
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header[7:]
+        token = bearer_token(request.headers.get('Authorization'))
         
         if not token:
+            auth_failures.labels("missing_token").inc()
             return jsonify({"error": "Authentication token is missing"}), 401
         
-        user = auth_service.verify_token(token)
+        user = get_auth_service().verify_token(token)
         if not user:
+            auth_failures.labels("invalid_token").inc()
             return jsonify({"error": "Invalid or expired token"}), 401
         
         request.user = user
@@ -32,6 +45,12 @@ def token_required(f):
     
     return decorated
 
+def _busy_response():
+    auth_failures.labels("hasher_busy").inc()
+    response = jsonify({"error": "Server busy, please retry shortly"})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -49,11 +68,14 @@ def register():
     if len(data['password']) < 6:
         return jsonify({"error": "Password must be at least 6 characters long"}), 400
     
-    result = auth_service.register_user(
-        email=data['email'],
-        password=data['password'],
-        full_name=data['fullName']
-    )
+    try:
+        result = get_auth_service().register_user(
+            email=data['email'],
+            password=data['password'],
+            full_name=data['fullName']
+        )
+    except HasherBusy:
+        return _busy_response()
     
     if not result:
         return jsonify({"error": "Email already registered"}), 409
@@ -70,12 +92,16 @@ def login():
     if 'email' not in data or 'password' not in data:
         return jsonify({"error": "Email and password are required"}), 400
     
-    result = auth_service.login_user(
-        email=data['email'],
-        password=data['password']
-    )
+    try:
+        result = get_auth_service().login_user(
+            email=data['email'],
+            password=data['password']
+        )
+    except HasherBusy:
+        return _busy_response()
     
     if not result:
+        auth_failures.labels("invalid_credentials").inc()
         return jsonify({"error": "Invalid email or password"}), 401
     
     return jsonify(result), 200
@@ -85,3 +111,24 @@ def login():
 def get_user_profile():
     return jsonify({"user": request.user}), 200
 
+@auth_bp.route('/me', methods=['PATCH'])
+@token_required
+def update_user_profile():
+    data = request.get_json()
+    
+    if not data or not data.get('fullName'):
+        return jsonify({"error": "Missing required field: fullName"}), 400
+    
+    user = get_auth_service().update_user_profile(request.user['id'], data['fullName'])
+    if not user:
+        return jsonify({"error": "Profile update failed"}), 500
+    
+    return jsonify({"user": user}), 200
+
+@auth_bp.route('/logout-all', methods=['POST'])
+@token_required
+def logout_all_sessions():
+    if not get_auth_service().revoke_user_tokens(request.user['id']):
+        return jsonify({"error": "Could not revoke tokens"}), 500
+    
+    return jsonify({"message": "All tokens revoked"}), 200
@@ -2,179 +2,344 @@ import os
 import jwt
 import uuid
 import datetime
-import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import Optional, Dict, Any
-from werkzeug.security import generate_password_hash, check_password_hash
-from dotenv import load_dotenv, find_dotenv
-
-load_dotenv(find_dotenv())
+from typing import Optional, Dict, Any, Tuple
+from .db_pool import get_pool
+from .ttl_cache import TTLCache
+from .password_hasher import HasherBusy, get_hasher
 
 JWT_SECRET = os.getenv("JWT_SECRET", "dev_secret_key")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_DELTA = datetime.timedelta(days=1)
 
+# Verified profiles are served from memory; the TTL bounds how long another
+# worker's revocation or profile change can take to be seen by this one.
+USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+
+# Columns kept out of API responses
+PRIVATE_USER_FIELDS = ("password_hash", "token_version")
+
 class AuthService:
-    def __init__(self):
-        try:
-            self.conn = psycopg2.connect(
-                host=os.getenv("DB_HOST", "localhost"),
-                port=os.getenv("DB_PORT", "5432"),
-                database=os.getenv("DB_NAME", "cargo_db"),
-                user=os.getenv("DB_USER", "smitpatel"),
-                password=os.getenv("DB_PASSWORD", ""),
-                cursor_factory=RealDictCursor
-            )
-            self.cursor = self.conn.cursor()
-            print("Connected to PostgreSQL database!")
-        except Exception as e:
-            print(f"Database connection failed: {e}")
-            self.cursor = None
-        
+    def __init__(self, pool=None, user_cache=None, hasher=None):
+        self.pool = pool or get_pool()
+        self.hasher = hasher or get_hasher()
+        self.user_cache = user_cache or TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
         self._ensure_demo_user_exists()
 
+    def _cursor(self):
+        return self.pool.cursor(cursor_factory=RealDictCursor)
+
     def _ensure_demo_user_exists(self):
         try:
-            self.cursor.execute(
-                "SELECT * FROM users WHERE email = %s",
-                ("demo@cargolive.com",)
-            )
-            demo_user = self.cursor.fetchone()
-            
-            if not demo_user:
-                demo_id = str(uuid.uuid4())
-                password_hash = generate_password_hash("demo123")
-                
-                self.cursor.execute(
-                    """
-                    INSERT INTO users (id, email, password_hash, full_name, is_google_account)
-                    VALUES (%s, %s, %s, %s, %s)
-                    """,
-                    (demo_id, "demo@cargolive.com", password_hash, "Demo User", False)
-                )
-                self.conn.commit()
-            elif demo_user and demo_user["password_hash"] == "placeholder_hash":
-                password_hash = generate_password_hash("demo123")
-                
-                self.cursor.execute(
-                    """
-                    UPDATE users 
-                    SET password_hash = %s
-                    WHERE email = %s
-                    """,
-                    (password_hash, "demo@cargolive.com")
+            with self._cursor() as cursor:
+                cursor.execute(
+                    "SELECT * FROM users WHERE email = %s",
+                    ("demo@cargolive.com",)
                 )
-                self.conn.commit()
+                demo_user = cursor.fetchone()
+
+            if demo_user and demo_user["password_hash"] != "placeholder_hash":
+                return
+
+            # Hashed with no connection checked out, like every other hash
+            password_hash = self.hasher.hash("demo123")
+
+            with self._cursor() as cursor:
+                if not demo_user:
+                    cursor.execute(
+                        """
+                        INSERT INTO users (id, email, password_hash, full_name, is_google_account)
+                        VALUES (%s, %s, %s, %s, %s)
+                        ON CONFLICT (email) DO NOTHING
+                        """,
+                        (str(uuid.uuid4()), "demo@cargolive.com", password_hash, "Demo User", False)
+                    )
+                else:
+                    cursor.execute(
+                        """
+                        UPDATE users 
+                        SET password_hash = %s
+                        WHERE email = %s AND password_hash = 'placeholder_hash'
+                        """,
+                        (password_hash, "demo@cargolive.com")
+                    )
         except Exception as e:
             print(f"Error with demo user: {e}")
 
     def register_user(self, email: str, password: str, full_name: str, is_google_account: bool = False) -> Optional[Dict[str, Any]]:
         try:
             email = email.lower()
-            self.cursor.execute(
-                "SELECT * FROM users WHERE email = %s",
-                (email,)
-            )
-            if self.cursor.fetchone():
+            # Cheap check first, so a taken email costs no hash
+            with self._cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM users WHERE email = %s",
+                    (email,)
+                )
+                if cursor.fetchone():
+                    return None
+
+            # No pooled connection is held while the hash runs or waits for a slot
+            password_hash = self.hasher.hash(password) if not is_google_account else "google_auth"
+
+            with self._cursor() as cursor:
+                # The unique constraint settles two registrations racing for one email
+                cursor.execute(
+                    """
+                    INSERT INTO users (id, email, password_hash, full_name, is_google_account)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (email) DO NOTHING
+                    RETURNING id, email, full_name, is_google_account, created_at, updated_at, token_version
+                    """,
+                    (str(uuid.uuid4()), email, password_hash, full_name, is_google_account)
+                )
+                user = cursor.fetchone()
+            if not user:
                 return None
-            
-            user_id = str(uuid.uuid4())
-            password_hash = generate_password_hash(password) if not is_google_account else "google_auth"
-            
-            self.cursor.execute(
-                """
-                INSERT INTO users (id, email, password_hash, full_name, is_google_account)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id, email, full_name, is_google_account, created_at, updated_at
-                """,
-                (user_id, email, password_hash, full_name, is_google_account)
-            )
-            self.conn.commit()
-            
-            user_data = self.cursor.fetchone()
-            token = self._generate_token(user_data)
+
+            token = self._generate_token(user)
+            user_data = self._cache_user(user)
             
             return {
-                "user": dict(user_data),
+                "user": user_data,
                 "token": token
             }
+        except HasherBusy:
+            raise
         except Exception as e:
+            # The pool rolls the transaction back before returning the connection
             print(f"Registration error: {e}")
-            if hasattr(self, 'conn') and self.conn:
-                self.conn.rollback()
             return None
 
     def login_user(self, email: str, password: str) -> Optional[Dict[str, Any]]:
         try:
             email = email.lower()
-            self.cursor.execute(
-                "SELECT * FROM users WHERE email = %s",
-                (email,)
-            )
-            user = self.cursor.fetchone()
+            with self._cursor() as cursor:
+                cursor.execute(
+                    "SELECT * FROM users WHERE email = %s",
+                    (email,)
+                )
+                user = cursor.fetchone()
             
             if not user:
                 return None
             
             if not user["is_google_account"]:
-                if not check_password_hash(user["password_hash"], password):
+                if not self.hasher.verify(user["password_hash"], password):
                     return None
+                if self.hasher.needs_rehash(user["password_hash"]):
+                    self._rehash_password(user["id"], password)
             
             token = self._generate_token(user)
             
-            user_data = dict(user)
-            del user_data["password_hash"]
+            # Warm the cache so the client's first authenticated call skips the DB
+            user_data = self._cache_user(user)
             
             return {
                 "user": user_data,
                 "token": token
             }
+        except HasherBusy:
+            raise
         except Exception as e:
             print(f"Login error: {e}")
             return None
 
-    def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+    def _rehash_password(self, user_id: str, password: str):
+        """Upgrade a stored hash to the current work factor after a successful login"""
         try:
-            self.cursor.execute(
+            password_hash = self.hasher.hash(password)
+            with self._cursor() as cursor:
+                cursor.execute(
+                    "UPDATE users SET password_hash = %s WHERE id = %s",
+                    (password_hash, user_id)
+                )
+        except Exception as e:
+            # The old hash still works, so a failed upgrade must not fail the login
+            print(f"Password rehash error: {e}")
+
+    def _public_profile(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        user_data = dict(user)
+        for field in PRIVATE_USER_FIELDS:
+            user_data.pop(field, None)
+        return user_data
+
+    def _cache_user(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        user_data = self._public_profile(user)
+        self.user_cache.set(str(user["id"]), (user_data, user.get("token_version", 0)))
+        return user_data
+
+    def _load_user(self, user_id: str):
+        """Fetch a user from the database and refresh its cache entry"""
+        with self._cursor() as cursor:
+            cursor.execute(
                 "SELECT * FROM users WHERE id = %s",
                 (user_id,)
             )
-            user = self.cursor.fetchone()
-            
-            if user:
-                user_data = dict(user)
-                del user_data["password_hash"]
-                return user_data
-            
+            user = cursor.fetchone()
+
+        if not user:
+            self.user_cache.invalidate(str(user_id))
             return None
+
+        return self._cache_user(user), user.get("token_version", 0)
+
+    def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            cached = self.user_cache.get(str(user_id))
+            if cached is None:
+                cached = self._load_user(user_id)
+            return dict(cached[0]) if cached else None
         except Exception as e:
             print(f"User lookup error: {e}")
             return None
 
+    def invalidate_user(self, user_id: str):
+        """Drop a cached profile; call after any change to the user's row"""
+        self.user_cache.invalidate(str(user_id))
+
+    def update_user_profile(self, user_id: str, full_name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE users
+                    SET full_name = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                    RETURNING *
+                    """,
+                    (full_name, user_id)
+                )
+                user = cursor.fetchone()
+
+            self.invalidate_user(user_id)
+            return self._cache_user(user) if user else None
+        except Exception as e:
+            print(f"Profile update error: {e}")
+            return None
+
+    def revoke_user_tokens(self, user_id: str) -> bool:
+        """Invalidate every token issued to the user so far"""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE users
+                    SET token_version = token_version + 1, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                    """,
+                    (user_id,)
+                )
+                revoked = cursor.rowcount > 0
+
+            self.invalidate_user(user_id)
+            return revoked
+        except Exception as e:
+            print(f"Token revocation error: {e}")
+            return False
+
+    def _token_claims(self, token: str) -> Optional[Tuple[str, int]]:
+        """(user id, token version) from a signed, unexpired token; raises on a bad signature"""
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        
+        exp = payload.get("exp", 0)
+        if datetime.datetime.fromtimestamp(exp) < datetime.datetime.utcnow():
+            return None
+        
+        user_id = payload.get("sub")
+        if not user_id:
+            return None
+        
+        return str(user_id), payload.get("ver", 0)
+
+    @staticmethod
+    def _needs_reload(cached, token_version: int) -> bool:
+        # A token newer than the cached entry means this worker missed a
+        # revocation made elsewhere; that and cache misses go to the DB.
+        return cached is None or token_version > cached[1]
+
+    @staticmethod
+    def _verified_profile(cached, token_version: int) -> Optional[Dict[str, Any]]:
+        user_data, current_version = cached
+        if token_version != current_version:
+            return None
+        return dict(user_data)
+
     def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
         try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-            
-            exp = payload.get("exp", 0)
-            if datetime.datetime.fromtimestamp(exp) < datetime.datetime.utcnow():
-                return None
-            
-            user_id = payload.get("sub")
-            if not user_id:
+            claims = self._token_claims(token)
+            if claims is None:
                 return None
             
-            return self.get_user_by_id(user_id)
+            user_id, token_version = claims
+            cached = self.user_cache.get(user_id)
+
+            if self._needs_reload(cached, token_version):
+                cached = self._load_user(user_id)
+                if cached is None:
+                    return None
+
+            return self._verified_profile(cached, token_version)
         except Exception as e:
             print(f"Token verification error: {e}")
             return None
 
     def _generate_token(self, user: Dict[str, Any]) -> str:
         payload = {
-            "sub": user["id"],
+            "sub": str(user["id"]),
             "exp": datetime.datetime.utcnow() + JWT_EXPIRATION_DELTA,
             "iat": datetime.datetime.utcnow(),
-            "email": user["email"]
+            "email": user["email"],
+            "name": user["full_name"],
+            "google": bool(user["is_google_account"]),
+            "ver": user.get("token_version", 0)
         }
         
         return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+
+class AsyncAuthService:
+    """Token verification for the ASGI app.
+
+    Shares the synchronous service's user cache, so a profile cached by
+    either side serves both, and loads misses through the async pool.
+    """
+
+    def __init__(self, service: AuthService, pool):
+        self.service = service
+        self.pool = pool
+
+    async def _load_user(self, user_id: str):
+        async with self.pool.cursor(dict_rows=True) as cursor:
+            await cursor.execute(
+                "SELECT * FROM users WHERE id = %s",
+                (user_id,)
+            )
+            user = await cursor.fetchone()
+
+        if not user:
+            self.service.user_cache.invalidate(str(user_id))
+            return None
+
+        # psycopg 3 returns UUID objects where psycopg2 returns strings
+        user = {key: str(value) if isinstance(value, uuid.UUID) else value for key, value in user.items()}
+        return self.service._cache_user(user), user.get("token_version", 0)
+
+    async def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
+        try:
+            claims = self.service._token_claims(token)
+            if claims is None:
+                return None
+
+            user_id, token_version = claims
+            cached = self.service.user_cache.get(user_id)
+
+            if AuthService._needs_reload(cached, token_version):
+                cached = await self._load_user(user_id)
+                if cached is None:
+                    return None
+
+            return AuthService._verified_profile(cached, token_version)
+        except Exception as e:
+            print(f"Token verification error: {e}")
+            return None
@@ -1,70 +1,441 @@
-import os
-import psycopg2
-from dotenv import load_dotenv, find_dotenv
+import json
+import uuid
+import asyncio
+import base64
+import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .db_pool import get_pool
+from .metrics import errors
+from .schedule_cache import cache_key
+
+CRITICALITY_LEVELS = ("high", "medium", "low")
+
+_UNCACHED = object()
+
+SCHEDULE_COLUMNS = """
+    id, cargo_id, pickup_time, criticality,
+    pickup_location, dropoff_location
+"""
+
+CARGO_DETAIL_QUERY = """
+    SELECT cargo_id, description, weight, pickup_location,
+            dropoff_location, criticality, pickup_time
+    FROM cargo_schedule
+    WHERE cargo_id = %s
+"""
+
+# One row per cargo for the whole batch, in a single round trip
+CARGO_BATCH_DETAIL_QUERY = """
+    SELECT DISTINCT ON (cargo_id)
+            cargo_id, description, weight, pickup_location,
+            dropoff_location, criticality, pickup_time
+    FROM cargo_schedule
+    WHERE cargo_id = ANY(%s::uuid[])
+    ORDER BY cargo_id, pickup_time
+"""
+
+
+def encode_cursor(pickup_time: datetime.datetime, schedule_id: str) -> str:
+    raw = json.dumps([pickup_time.isoformat(), str(schedule_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        pickup_time, schedule_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.datetime.fromisoformat(pickup_time), str(uuid.UUID(schedule_id))
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def parse_schedule_filters(args) -> Dict[str, Any]:
+    """Validate the /schedule query string filters, raising ValueError on bad input"""
+    filters: Dict[str, Any] = {}
+
+    for key, arg in (("pickup_from", "pickupFrom"), ("pickup_to", "pickupTo")):
+        value = args.get(arg)
+        if value:
+            try:
+                filters[key] = datetime.datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"{arg} must be an ISO-8601 timestamp")
+
+    criticality = args.get("criticality")
+    if criticality:
+        levels = [level.strip().lower() for level in criticality.split(",") if level.strip()]
+        unknown = [level for level in levels if level not in CRITICALITY_LEVELS]
+        if unknown:
+            raise ValueError(f"Unknown criticality: {', '.join(unknown)}")
+        filters["criticality"] = levels
+
+    for key, arg in (("pickup_location", "pickupLocation"), ("dropoff_location", "dropoffLocation")):
+        value = args.get(arg)
+        if value:
+            filters[key] = value
+
+    return filters
+
+
+def split_page(rows, limit: int, time_index: int = 2, id_index: int = 0) -> Tuple[list, Optional[str]]:
+    """Trim a limit + 1 fetch to one page and build the cursor for the next, if any"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1][time_index], rows[-1][id_index])
+
+
+def schedule_page_key(limit: int, cursor: Optional[str], filters: Optional[Dict[str, Any]]) -> tuple:
+    return cache_key("page", limit, cursor, filters or {})
+
+
+def schedule_items_key(filters: Optional[Dict[str, Any]]) -> tuple:
+    return cache_key("items", filters or {})
+
+
+def schedule_items_body_key(serializer, filters: Optional[Dict[str, Any]]) -> tuple:
+    return cache_key("items-body", serializer.name, filters or {})
+
+
+def cargo_detail_key(cargo_id: str) -> tuple:
+    return cache_key("cargo", cargo_id)
+
+
+def schedule_body_key(serializer, limit: int, cursor: Optional[str], filters: Optional[Dict[str, Any]]) -> tuple:
+    return cache_key("page-body", serializer.name, limit, cursor, filters or {})
+
+
+def cargo_detail_body_key(serializer, cargo_id: str) -> tuple:
+    return cache_key("cargo-body", serializer.name, cargo_id)
 
-load_dotenv(find_dotenv())
 
 class CargoScheduler:
-    def __init__(self):
+    def __init__(self, pool=None, cache=None, snapshot=None):
+        # None means this process's shared pool, looked up on each use so a forked worker gets its own
+        self._pool = pool
+        # Optional ScheduleCache; reads go through it and database errors are never cached
+        self.cache = cache
+        # Optional ScheduleSnapshot; schedule reads inside its window skip the database and the cache
+        self.snapshot = snapshot
+
+    @property
+    def pool(self):
+        return self._pool if self._pool is not None else get_pool()
+
+    def _read_through(self, key, load):
+        if self.cache is None:
+            return load()
+        return self.cache.fetch(key, load)
+
+    @staticmethod
+    def _schedule_query(filters: Dict[str, Any], after: Optional[Tuple[datetime.datetime, str]] = None,
+                        limit: Optional[int] = None, columns: str = SCHEDULE_COLUMNS) -> Tuple[str, List[Any]]:
+        clauses = ["pickup_time IS NOT NULL"]
+        params: List[Any] = []
+
+        if "pickup_from" in filters:
+            clauses.append("pickup_time >= %s")
+            params.append(filters["pickup_from"])
+        if "pickup_to" in filters:
+            clauses.append("pickup_time < %s")
+            params.append(filters["pickup_to"])
+        if "criticality" in filters:
+            clauses.append("criticality = ANY(%s)")
+            params.append(list(filters["criticality"]))
+        if "pickup_location" in filters:
+            clauses.append("pickup_name = %s")
+            params.append(filters["pickup_location"])
+        if "dropoff_location" in filters:
+            clauses.append("dropoff_name = %s")
+            params.append(filters["dropoff_location"])
+        if after:
+            clauses.append("(pickup_time, id) > (%s, %s)")
+            params.extend(after)
+
+        query = f"""
+            SELECT {columns}
+            FROM cargo_schedule
+            WHERE {' AND '.join(clauses)}
+            ORDER BY pickup_time, id
+        """
+        if limit is not None:
+            query += " LIMIT %s"
+            params.append(limit)
+        return query, params
+
+    @staticmethod
+    def _schedule_item(row) -> Dict[str, Any]:
+        return {
+            "id": str(row[0]),
+            "cargoId": str(row[1]),
+            "pickupTime": row[2].isoformat(),
+            "criticality": row[3],
+            "pickupLocation": row[4],
+            "dropoffLocation": row[5],
+        }
+
+    def _load_schedule_items(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        query, params = self._schedule_query(filters)
+        with self.pool.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        return [self._schedule_item(row) for row in rows]
+
+    def get_schedule_items(self, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Every schedule matching ``filters`` in pickup order; database errors are raised, like a page's"""
+        filters = filters or {}
+        if self.snapshot is not None:
+            items = self.snapshot.serve("items", filters)
+            if items is not None:
+                return items
+        return self._read_through(schedule_items_key(filters), lambda: self._load_schedule_items(filters))
+
+    def get_schedule_items_body(self, serializer, filters: Optional[Dict[str, Any]] = None) -> str:
+        """Like get_schedule_items, but returns them already encoded as a JSON array by ``serializer``"""
+        filters = filters or {}
+        if self.snapshot is not None:
+            body = self.snapshot.serve("items_body", filters)
+            if body is not None:
+                return body
+        return self._read_through(schedule_items_body_key(serializer, filters),
+                                  lambda: self._load_schedule_items_body(serializer, filters))
+
+    def _load_schedule_items_body(self, serializer, filters: Dict[str, Any]) -> str:
+        query, params = self._schedule_query(filters, columns=serializer.page_columns)
+        with self.pool.cursor() as db_cursor:
+            db_cursor.execute(query, params)
+            rows = db_cursor.fetchall()
+        return serializer.encode_page(rows, len(rows))[0]
+
+    def get_schedule_page(self, limit: int, cursor: Optional[str] = None,
+                          filters: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return one keyset page ordered by (pickup_time, id) and the cursor for the next one.
+
+        Raises ValueError for a malformed cursor, and database errors as they
+        are: an empty page would be tagged and cached by clients as the schedule.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        if self.snapshot is not None:
+            page = self.snapshot.serve("page", limit, after, filters)
+            if page is not None:
+                return page
+        return self._read_through(
+            schedule_page_key(limit, cursor, filters),
+            lambda: self._load_schedule_page(limit, after, filters or {})
+        )
+
+    def _load_schedule_page(self, limit: int, after, filters: Dict[str, Any]):
+        # Fetch one extra row to learn whether another page exists
+        query, params = self._schedule_query(filters, after=after, limit=limit + 1)
+        with self.pool.cursor() as db_cursor:
+            db_cursor.execute(query, params)
+            rows = db_cursor.fetchall()
+        return self._page(rows, limit)
+
+    @classmethod
+    def _page(cls, rows, limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        rows, next_cursor = split_page(rows, limit)
+        return [cls._schedule_item(row) for row in rows], next_cursor
+
+    def get_schedule_page_body(self, serializer, limit: int, cursor: Optional[str] = None,
+                               filters: Optional[Dict[str, Any]] = None) -> Tuple[str, Optional[str]]:
+        """Like get_schedule_page, but returns the page already encoded as a JSON array by ``serializer``"""
+        after = decode_cursor(cursor) if cursor else None
+        if self.snapshot is not None:
+            body = self.snapshot.serve("page_body", limit, after, filters)
+            if body is not None:
+                return body
+        return self._read_through(
+            schedule_body_key(serializer, limit, cursor, filters),
+            lambda: self._load_schedule_page_body(serializer, limit, after, filters or {})
+        )
+
+    def _load_schedule_page_body(self, serializer, limit: int, after, filters: Dict[str, Any]):
+        query, params = self._schedule_query(filters, after=after, limit=limit + 1, columns=serializer.page_columns)
+        with self.pool.cursor() as db_cursor:
+            db_cursor.execute(query, params)
+            rows = db_cursor.fetchall()
+        return serializer.encode_page(rows, limit)
+
+    def stream_schedule_items(self, filters: Optional[Dict[str, Any]] = None,
+                              chunk_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Yield schedule items through a server-side cursor, chunk_size rows per round trip"""
+        query, params = self._schedule_query(filters or {})
+        with self.pool.connection() as conn:
+            with conn.cursor(name=f"schedule_stream_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = chunk_size
+                cursor.execute(query, params)
+                for row in cursor:
+                    yield self._schedule_item(row)
+
+    @staticmethod
+    def _cargo_detail(row) -> Dict[str, Any]:
+        return {
+            "cargoId": str(row[0]),
+            "description": row[1],
+            "weight": row[2],
+            "pickupLocation": row[3],
+            "dropoffLocation": row[4],
+            "criticality": row[5],
+            "pickupTime": row[6].isoformat()
+        }
+
+    def _load_cargo_detail(self, cargo_id):
+        with self.pool.cursor() as cursor:
+            cursor.execute(CARGO_DETAIL_QUERY, (cargo_id,))
+            row = cursor.fetchone()
+        if row:
+            return self._cargo_detail(row)
+        else:
+            return None
+
+    def get_cargo_detail(self, cargo_id):
         try:
-            self.conn = psycopg2.connect(
-                host=os.getenv("DB_HOST", "localhost"),
-                port=os.getenv("DB_PORT", "5432"),
-                database=os.getenv("DB_NAME", "cargo_db"),
-                user=os.getenv("DB_USER", "smitpatel"),
-                password=os.getenv("DB_PASSWORD", "")
+            # Unknown ids are cached too, until the next change to the table
+            return self._read_through(cargo_detail_key(cargo_id), lambda: self._load_cargo_detail(cargo_id))
+        except Exception as e:
+            # Handle the case where cargo_id is not found
+            print(f"Error fetching cargo detail: {e}")
+            errors.labels("cargo_detail").inc()
+            return None
+
+    def get_cargo_detail_body(self, serializer, cargo_id) -> Optional[str]:
+        """Cargo detail encoded as a JSON object by ``serializer``, or None if not found"""
+        try:
+            return self._read_through(
+                cargo_detail_body_key(serializer, cargo_id),
+                lambda: self._load_cargo_detail_body(serializer, cargo_id)
             )
-            self.cursor = self.conn.cursor()
-            print("Connected to PostgreSQL for cargo scheduling")
         except Exception as e:
-            print(f"Error connecting to PostgreSQL: {e}")
-            self.cursor = None
+            print(f"Error fetching cargo detail: {e}")
+            errors.labels("cargo_detail").inc()
+            return None
 
-    def get_schedule_items(self):
+    def _load_cargo_detail_body(self, serializer, cargo_id):
+        with self.pool.cursor() as cursor:
+            cursor.execute(serializer.detail_query, (cargo_id,))
+            return serializer.encode_detail(cursor.fetchone())
+
+    @staticmethod
+    def _normalise_cargo_ids(cargo_ids: List[str]) -> List[str]:
         try:
-            self.cursor.execute("""
-                SELECT id, cargo_id, pickup_time, criticality, 
-                        pickup_location, dropoff_location
-                FROM cargo_schedule
-            """)
-            rows = self.cursor.fetchall()
-            return [
-                {
-                    "id": str(row[0]),
-                    "cargoId": str(row[1]),
-                    "pickupTime": row[2].isoformat(),
-                    "criticality": row[3],
-                    "pickupLocation": row[4],
-                    "dropoffLocation": row[5],
-                }
-                for row in rows
-            ]
+            return list(dict.fromkeys(str(uuid.UUID(str(cargo_id))) for cargo_id in cargo_ids))
+        except ValueError:
+            raise ValueError("cargoIds must be UUIDs")
+
+    @classmethod
+    def _batch_result(cls, cargo_ids: List[str], rows) -> Tuple[List[Dict[str, Any]], List[str]]:
+        details = {str(row[0]): cls._cargo_detail(row) for row in rows}
+        items = [details[cargo_id] for cargo_id in cargo_ids if cargo_id in details]
+        missing = [cargo_id for cargo_id in cargo_ids if cargo_id not in details]
+        return items, missing
+
+    def get_cargo_details(self, cargo_ids: List[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Details for many cargo ids with one query, as (found items, missing ids) in request order.
+
+        Raises ValueError if any id is not a UUID.
+        """
+        normalised = self._normalise_cargo_ids(cargo_ids)
+        if not normalised:
+            return [], []
+
+        with self.pool.cursor() as cursor:
+            cursor.execute(CARGO_BATCH_DETAIL_QUERY, (normalised,))
+            rows = cursor.fetchall()
+        return self._batch_result(normalised, rows)
+
+
+class AsyncCargoScheduler:
+    """Event-loop counterpart of CargoScheduler for the ASGI app.
+
+    Runs the same SQL through a psycopg 3 ``AsyncPool`` and builds the same
+    items, so responses match the synchronous routes exactly.
+    """
+
+    def __init__(self, pool, cache=None, snapshot=None):
+        self.pool = pool
+        self.cache = cache
+        self.snapshot = snapshot
+
+    async def _from_snapshot(self, read: str, *args):
+        # Off the event loop: a stale snapshot refreshes from the database before answering
+        if self.snapshot is None:
+            return None
+        return await asyncio.to_thread(self.snapshot.serve, read, *args)
+
+    async def _read_through(self, key, load):
+        if self.cache is None:
+            return await load()
+        value = self.cache.get(key, _UNCACHED)
+        if value is not _UNCACHED:
+            return value
+        generation = self.cache.generation()
+        value = await load()
+        self.cache.put(key, value, generation)
+        return value
+
+    async def _fetch(self, query, params, many: bool = True):
+        async with self.pool.cursor() as db_cursor:
+            await db_cursor.execute(query, params)
+            return await (db_cursor.fetchall() if many else db_cursor.fetchone())
+
+    async def get_schedule_page(self, limit: int, cursor: Optional[str] = None,
+                                filters: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        query, params = CargoScheduler._schedule_query(filters or {}, after=after, limit=limit + 1)
+
+        async def load():
+            return CargoScheduler._page(await self._fetch(query, params), limit)
+
+        page = await self._from_snapshot("page", limit, after, filters)
+        if page is not None:
+            return page
+        return await self._read_through(schedule_page_key(limit, cursor, filters), load)
+
+    async def get_schedule_page_body(self, serializer, limit: int, cursor: Optional[str] = None,
+                                     filters: Optional[Dict[str, Any]] = None) -> Tuple[str, Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        query, params = CargoScheduler._schedule_query(
+            filters or {}, after=after, limit=limit + 1, columns=serializer.page_columns
+        )
+
+        async def load():
+            return serializer.encode_page(await self._fetch(query, params), limit)
+
+        body = await self._from_snapshot("page_body", limit, after, filters)
+        if body is not None:
+            return body
+        return await self._read_through(schedule_body_key(serializer, limit, cursor, filters), load)
+
+    async def get_cargo_detail(self, cargo_id):
+        async def load():
+            row = await self._fetch(CARGO_DETAIL_QUERY, (cargo_id,), many=False)
+            return CargoScheduler._cargo_detail(row) if row else None
+
+        try:
+            return await self._read_through(cargo_detail_key(cargo_id), load)
         except Exception as e:
-            print(f"Error fetching schedule items: {e}")
-            return []
+            print(f"Error fetching cargo detail: {e}")
+            errors.labels("cargo_detail").inc()
+            return None
+
+    async def get_cargo_detail_body(self, serializer, cargo_id) -> Optional[str]:
+        async def load():
+            return serializer.encode_detail(await self._fetch(serializer.detail_query, (cargo_id,), many=False))
 
-    def get_cargo_detail(self, cargo_id):
         try:
-            self.cursor.execute("""
-                SELECT cargo_id, description, weight, pickup_location,
-                        dropoff_location, criticality, pickup_time
-                FROM cargo_schedule
-                WHERE cargo_id = %s
-            """, (cargo_id,))
-            row = self.cursor.fetchone()
-            if row:
-                return {
-                    "cargoId": row[0],
-                    "description": row[1],
-                    "weight": row[2],
-                    "pickupLocation": row[3],
-                    "dropoffLocation": row[4],
-                    "criticality": row[5],
-                    "pickupTime": row[6].isoformat()
-                }
-            else:
-                return None
+            return await self._read_through(cargo_detail_body_key(serializer, cargo_id), load)
         except Exception as e:
-            # Handle the case where cargo_id is not found
             print(f"Error fetching cargo detail: {e}")
-            return None
\ No newline at end of file
+            errors.labels("cargo_detail").inc()
+            return None
+
+    async def get_cargo_details(self, cargo_ids: List[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        normalised = CargoScheduler._normalise_cargo_ids(cargo_ids)
+        if not normalised:
+            return [], []
+
+        async with self.pool.cursor() as cursor:
+            await cursor.execute(CARGO_BATCH_DETAIL_QUERY, (normalised,))
+            rows = await cursor.fetchall()
+        return CargoScheduler._batch_result(normalised, rows)
@@ -0,0 +1,337 @@
+import os
+import time
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+from .process_local import ProcessLocal
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+def connection_params(**overrides) -> Dict[str, Any]:
+    params = {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": os.getenv("DB_PORT", "5432"),
+        "database": os.getenv("DB_NAME", "cargo_db"),
+        "user": os.getenv("DB_USER", "smitpatel"),
+        "password": os.getenv("DB_PASSWORD", ""),
+    }
+    params.update(overrides)
+    return params
+
+
+@functools.lru_cache(maxsize=None)
+def _counting_cursor(base):
+    """Subclass of a cursor factory that reports each statement and its duration to its connection"""
+    class CountingCursor(base):
+        def execute(self, query, vars=None):
+            start = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                self.connection.on_query(time.perf_counter() - start)
+
+        def executemany(self, query, vars_list):
+            start = time.perf_counter()
+            try:
+                return super().executemany(query, vars_list)
+            finally:
+                self.connection.on_query(time.perf_counter() - start)
+
+        def copy_expert(self, sql, file, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().copy_expert(sql, file, *args, **kwargs)
+            finally:
+                self.connection.on_query(time.perf_counter() - start)
+
+    return CountingCursor
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    """Connection whose cursors, whatever their cursor_factory, count executed statements"""
+
+    on_query: Callable[[float], None] = staticmethod(lambda seconds: None)
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.pop("cursor_factory", None) or self.cursor_factory or psycopg2.extensions.cursor
+        return super().cursor(*args, cursor_factory=_counting_cursor(factory), **kwargs)
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of PostgreSQL connections.
+
+    Connections are checked out per operation with ``pool.connection()``.
+    The transaction is committed when the block exits cleanly and rolled
+    back otherwise, so one failed request can never poison the next one.
+    Broken connections are discarded and replaced on the next checkout.
+    """
+
+    def __init__(
+        self,
+        minconn: int = 1,
+        maxconn: int = 10,
+        timeout: float = 5.0,
+        health_check_interval: float = 30.0,
+        connect: Optional[Callable[[], Any]] = None,
+        count_queries: bool = False,
+        **params,
+    ):
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise ValueError("Invalid pool bounds: need 0 <= minconn <= maxconn and maxconn >= 1")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._params = connection_params(**params)
+        # Statement counting feeds /metrics and benchmarks; it costs a timer and a lock per execute
+        self.count_queries = count_queries
+        if count_queries:
+            self._params["connection_factory"] = CountingConnection
+        self._connect = connect or (lambda: psycopg2.connect(**self._params))
+        self._queries = 0
+        self._query_seconds = 0.0
+        self._queries_lock = threading.Lock()
+        # Called with each statement's duration, e.g. to charge it to the current request
+        self.query_observer: Optional[Callable[[float], None]] = None
+
+        self._cond = threading.Condition()
+        self._idle: List[Any] = []
+        self._last_used: Dict[int, float] = {}
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._health_check_failures = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._waiting = 0
+        self._peak_in_use = 0
+
+        for _ in range(minconn):
+            try:
+                self._idle.append(self._open())
+                self._size += 1
+            except Exception as e:
+                print(f"Error opening pooled connection: {e}")
+                break
+
+    def _open(self):
+        conn = self._connect()
+        if isinstance(conn, CountingConnection):
+            conn.on_query = self._count_query
+        self._last_used[id(conn)] = time.monotonic()
+        return conn
+
+    def _count_query(self, seconds: float):
+        with self._queries_lock:
+            self._queries += 1
+            self._query_seconds += seconds
+        observer = self.query_observer
+        if observer is not None:
+            observer(seconds)
+
+    def _close_quietly(self, conn):
+        self._last_used.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn) -> bool:
+        if getattr(conn, "closed", 0):
+            return False
+
+        idle_for = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle_for < self.health_check_interval:
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            self._health_check_failures += 1
+            return False
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        conn = None
+
+        with self._cond:
+            if self._closed:
+                raise PoolTimeout("Connection pool is closed")
+
+            self._waiting += 1
+            try:
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Timed out after {self.timeout}s waiting for a database connection"
+                        )
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    # Reserve the slot before connecting outside the lock
+                    self._size += 1
+            finally:
+                self._waiting -= 1
+
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+        # The slot is held by this thread from here on, so (re)connecting
+        # happens outside the lock without letting the pool grow past maxconn.
+        try:
+            if conn is None:
+                conn = self._open()
+            elif not self._is_healthy(conn):
+                self._close_quietly(conn)
+                with self._cond:
+                    self._reconnects += 1
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+            self._release_slot()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        return conn
+
+    def putconn(self, conn, broken: bool = False):
+        with self._cond:
+            self._in_use -= 1
+
+        if broken or self._closed or getattr(conn, "closed", 0):
+            self._close_quietly(conn)
+            self._release_slot()
+            return
+
+        self._last_used[id(conn)] = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except BaseException:
+            # BaseException also covers GeneratorExit from abandoned streams
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.putconn(conn, broken=broken)
+
+    @contextmanager
+    def cursor(self, **kwargs):
+        with self.connection() as conn:
+            with conn.cursor(**kwargs) as cur:
+                yield cur
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                "size": self._size,
+                "max_size": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "peak_in_use": self._peak_in_use,
+                "utilisation": self._in_use / self.maxconn,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+                "health_check_failures": self._health_check_failures,
+                "wait_time_total_ms": round(self._wait_total * 1000, 3),
+                "wait_time_avg_ms": round(self._wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                "wait_time_max_ms": round(self._wait_max * 1000, 3),
+                "queries": self._queries if self.count_queries else None,
+                "query_time_total_ms": round(self._query_seconds * 1000, 3) if self.count_queries else None,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+            self._release_slot()
+
+
+# Handed to the shared pool whenever this process builds it
+_query_observer: Optional[Callable[[float], None]] = None
+
+
+def _pool_from_env() -> ConnectionPool:
+    pool = ConnectionPool(
+        minconn=int(os.getenv("DB_POOL_MIN", "1")),
+        maxconn=int(os.getenv("DB_POOL_MAX", "10")),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+        health_check_interval=float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30")),
+        count_queries=os.getenv("DB_COUNT_QUERIES", "1") == "1",
+    )
+    pool.query_observer = _query_observer
+    return pool
+
+
+# Per process: a forked worker opens its own connections on first use
+_pool: ProcessLocal[ConnectionPool] = ProcessLocal(_pool_from_env)
+
+
+def get_pool() -> ConnectionPool:
+    """Return this process's pool, creating it from the environment on first use."""
+    return _pool.get()
+
+
+def close_pool():
+    pool = _pool.reset()
+    if pool is not None:
+        pool.close()
+
+
+def set_query_observer(observer: Optional[Callable[[float], None]]):
+    """Observe statement times on the shared pool, whether or not it has been built yet"""
+    global _query_observer
+    _query_observer = observer
+    pool = _pool.peek()
+    if pool is not None:
+        pool.query_observer = observer
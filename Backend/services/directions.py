@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import threading
+from collections import namedtuple
+from typing import Any, Callable, Dict, Optional, Tuple
+from .single_flight import SingleFlight
+from .ttl_cache import TTLCache
+
+GOOGLE_DIRECTIONS_URL = "https://maps.googleapis.com/maps/api/directions/json"
+
+# Worth remembering: the same trip will get the same answer for a while
+CACHED_STATUSES = {"OK"}
+# Also remembered, but only for the short negative TTL
+NEGATIVE_STATUSES = {"ZERO_RESULTS", "NOT_FOUND"}
+
+AVOIDABLE = {"highways", "tolls", "ferries", "indoor"}
+
+DirectionsKey = namedtuple("DirectionsKey", ["origin", "destination", "avoid"])
+
+# An upstream takes the quantised origin and destination as (lat, lon) and
+# the avoid string, and returns a Directions API shaped response
+Upstream = Callable[[Tuple[float, float], Tuple[float, float], str], Dict[str, Any]]
+
+
+class DirectionsUnavailable(Exception):
+    """The upstream failed or refused; nothing was cached"""
+
+
+def parse_point(value: Optional[str], field: str) -> Tuple[float, float]:
+    """'lat,lon' as the Directions API takes it"""
+    if not value:
+        raise ValueError(f"{field} is required")
+    try:
+        lat, lon = (float(part) for part in value.split(","))
+    except ValueError:
+        raise ValueError(f"{field} must be 'lat,lon'")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"{field} is out of range")
+    return lat, lon
+
+
+def normalise_avoid(value: Optional[str]) -> str:
+    """Sorted, de-duplicated 'a|b' so equivalent requests share a key"""
+    parts = sorted({part.strip().lower() for part in (value or "").split("|") if part.strip()})
+    unknown = [part for part in parts if part not in AVOIDABLE]
+    if unknown:
+        raise ValueError(f"Cannot avoid: {', '.join(unknown)}")
+    return "|".join(parts)
+
+
+def quantise(point: Tuple[float, float], quantum: float) -> Tuple[float, float]:
+    """Snap a point to a ``quantum``-degree grid (0.001 is about 110 m of latitude)"""
+    return round(round(point[0] / quantum) * quantum, 6), round(round(point[1] / quantum) * quantum, 6)
+
+
+def trim_response(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep the parts of a Directions response the app reads, to keep cache entries small.
+
+    RouteManager decodes ``routes[0].overview_polyline`` and walks
+    ``legs[0].steps`` for maneuvers and their start locations; leg totals
+    are kept for ETAs. HTML instructions and per-step polylines are dropped.
+    """
+    routes = []
+    for route in body.get("routes", [])[:1]:
+        legs = []
+        for leg in route.get("legs", []):
+            legs.append({
+                "distance": leg.get("distance"),
+                "duration": leg.get("duration"),
+                "start_location": leg.get("start_location"),
+                "end_location": leg.get("end_location"),
+                "steps": [
+                    {key: step[key] for key in ("maneuver", "start_location", "end_location", "distance", "duration")
+                     if key in step}
+                    for step in leg.get("steps", [])
+                ],
+            })
+        routes.append({
+            "summary": route.get("summary", ""),
+            "overview_polyline": route.get("overview_polyline"),
+            "legs": legs,
+        })
+    return {"status": body.get("status", "UNKNOWN_ERROR"), "routes": routes}
+
+
+class GoogleDirectionsUpstream:
+    """The Directions web service, or anything that speaks it at ``url``"""
+
+    def __init__(self, api_key: str, url: str = GOOGLE_DIRECTIONS_URL, timeout: float = 5.0,
+                 session=None):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        # A requests.Session; made with the first lookup so requests is not imported at startup
+        self.session = session
+
+    def __call__(self, origin: Tuple[float, float], destination: Tuple[float, float], avoid: str) -> Dict[str, Any]:
+        import requests
+        if self.session is None:
+            self.session = requests.Session()
+        params = {
+            "origin": f"{origin[0]},{origin[1]}",
+            "destination": f"{destination[0]},{destination[1]}",
+            "key": self.api_key,
+        }
+        if avoid:
+            params["avoid"] = avoid
+        try:
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise DirectionsUnavailable(f"Directions upstream failed: {e}")
+
+
+class DirectionsProxy:
+    """Caches and coalesces Directions lookups in front of a paid upstream.
+
+    Requests are keyed on origin and destination snapped to a ``quantum``
+    degree grid plus the normalised ``avoid`` list, and it is the snapped
+    points that are sent upstream, so every request sharing a key gets an
+    answer for exactly the same trip. Cached values are the trimmed response
+    already encoded as JSON; concurrent misses for one key make a single
+    upstream call.
+    """
+
+    def __init__(self, upstream: Upstream, cache: Optional[TTLCache] = None, quantum: float = 0.001,
+                 negative_ttl: float = 60.0, wait_timeout: Optional[float] = 30.0):
+        if quantum <= 0:
+            raise ValueError("quantum must be positive")
+        self.upstream = upstream
+        self.cache = cache if cache is not None else TTLCache(maxsize=10000, ttl=600)
+        self.quantum = quantum
+        self.negative_ttl = negative_ttl
+        self._flight = SingleFlight(wait_timeout=wait_timeout)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.upstream_seconds = 0.0
+
+    def key(self, origin: Tuple[float, float], destination: Tuple[float, float], avoid: str = "") -> DirectionsKey:
+        return DirectionsKey(quantise(origin, self.quantum), quantise(destination, self.quantum),
+                             normalise_avoid(avoid))
+
+    def get(self, origin: Tuple[float, float], destination: Tuple[float, float], avoid: str = "") -> Tuple[bytes, str]:
+        """``(json_body, how)`` where ``how`` is 'hit', 'miss' or 'coalesced'.
+
+        Raises DirectionsUnavailable when the upstream fails or answers with
+        a status that is not worth caching (quota, denied, unknown error).
+        """
+        key = self.key(origin, destination, avoid)
+        with self._lock:
+            self.requests += 1
+
+        body = self.cache.get(key)
+        if body is not None:
+            return body, "hit"
+
+        body, shared = self._flight.do(key, lambda: self._fetch(key))
+        return body, "coalesced" if shared else "miss"
+
+    def _fetch(self, key: DirectionsKey) -> bytes:
+        started = time.perf_counter()
+        try:
+            response = self.upstream(key.origin, key.destination, key.avoid)
+        except DirectionsUnavailable:
+            with self._lock:
+                self.upstream_errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.upstream_calls += 1
+                self.upstream_seconds += time.perf_counter() - started
+
+        trimmed = trim_response(response)
+        status = trimmed["status"]
+        if status not in CACHED_STATUSES and status not in NEGATIVE_STATUSES:
+            with self._lock:
+                self.upstream_errors += 1
+            raise DirectionsUnavailable(f"Directions upstream answered {status}")
+
+        body = json.dumps(trimmed, separators=(",", ":")).encode()
+        if status in CACHED_STATUSES:
+            self.cache.set(key, body)
+        elif self.negative_ttl > 0:
+            self.cache.set(key, body, ttl=self.negative_ttl)
+        return body
+
+    def stats(self) -> Dict[str, Any]:
+        flight = self._flight.stats()
+        with self._lock:
+            stats = {
+                "requests": self.requests,
+                "upstream_calls": self.upstream_calls,
+                "upstream_errors": self.upstream_errors,
+                "avg_upstream_ms": round(self.upstream_seconds * 1000 / self.upstream_calls, 3)
+                if self.upstream_calls else 0.0,
+                "coalesced": flight["shared"],
+                "in_flight": flight["in_flight"],
+                "quantum_degrees": self.quantum,
+            }
+        stats.update({f"cache_{name}": value for name, value in self.cache.stats().items()})
+        return stats
+
+
+def proxy_from_env() -> DirectionsProxy:
+    """DirectionsProxy in front of the Directions API configured by DIRECTIONS_* variables"""
+    upstream = GoogleDirectionsUpstream(
+        api_key=os.getenv("DIRECTIONS_API_KEY", ""),
+        url=os.getenv("DIRECTIONS_UPSTREAM_URL", GOOGLE_DIRECTIONS_URL),
+        timeout=float(os.getenv("DIRECTIONS_TIMEOUT", "5")),
+    )
+    if not upstream.api_key and upstream.url == GOOGLE_DIRECTIONS_URL:
+        print("DIRECTIONS_API_KEY is not set; the directions upstream will likely refuse requests")
+    cache = TTLCache(
+        maxsize=int(os.getenv("DIRECTIONS_CACHE_SIZE", "10000")),
+        ttl=float(os.getenv("DIRECTIONS_CACHE_TTL", "600")),
+    )
+    return DirectionsProxy(
+        upstream,
+        cache=cache,
+        quantum=float(os.getenv("DIRECTIONS_QUANTUM_DEGREES", "0.001")),
+        negative_ttl=float(os.getenv("DIRECTIONS_NEGATIVE_TTL", "60")),
+    )
@@ -0,0 +1,32 @@
+from flask import Blueprint, Response, request, jsonify
+from .auth_routes import token_required
+from .directions import DirectionsUnavailable, parse_point, proxy_from_env
+
+directions_bp = Blueprint('directions', __name__, url_prefix='/directions')
+
+directions_proxy = proxy_from_env()
+
+@directions_bp.route('/json', methods=['GET'])
+@token_required
+def get_directions():
+    """Directions API compatible: the app swaps the Google host for ours and its key for the user's token.
+
+    Signed-in users only, as every miss is paid for with DIRECTIONS_API_KEY.
+    """
+    try:
+        origin = parse_point(request.args.get('origin'), 'origin')
+        destination = parse_point(request.args.get('destination'), 'destination')
+        body, how = directions_proxy.get(origin, destination, request.args.get('avoid', ''))
+    except ValueError as e:
+        return jsonify({"status": "INVALID_REQUEST", "error": str(e)}), 400
+    except (DirectionsUnavailable, TimeoutError) as e:
+        print(f"Directions lookup failed: {e}")
+        return jsonify({"status": "UNKNOWN_ERROR", "error": "Directions are unavailable"}), 502
+
+    response = Response(body, status=200, mimetype='application/json')
+    response.headers['X-Cache'] = how
+    return response
+
+@directions_bp.route('/stats', methods=['GET'])
+def get_directions_stats():
+    return jsonify(directions_proxy.stats()), 200
@@ -0,0 +1,49 @@
+import re
+from typing import Dict
+
+# Same three outcomes the Airport Mock answers with
+BAY_AREA = "Bay_Area"
+PARKING = "Parking"
+PULL_UP = "Pull_Up"
+
+# Lower sorts first when terminals hand out docks
+CRITICALITY_RANK = {"high": 0, "medium": 1, "low": 2}
+
+_TERMINAL_NAME_RE = re.compile(r"terminal[-_ ]?([A-Za-z])(?![A-Za-z])", re.IGNORECASE)
+
+
+def terminal_code(location: str) -> str:
+    """Terminal letter from a packed pickup location, a terminal site name or a bare letter"""
+    match = _TERMINAL_NAME_RE.search(location or "")
+    if match:
+        return match.group(1).upper()
+    code = (location or "").strip().upper()
+    if len(code) != 1 or not code.isalpha():
+        raise ValueError(f"Unknown terminal: {location}")
+    return code
+
+
+def parse_capacity(spec: str) -> Dict[str, int]:
+    """Parse a PICKUP_DOCKS value such as A=10,B=0,C=1"""
+    capacity = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        terminal, _, spots = part.partition("=")
+        capacity[terminal_code(terminal)] = int(spots)
+    return capacity
+
+
+def dock_action(has_window: bool, delayed: bool) -> str:
+    """Where a truck heads: the bay once it holds a dock window, parking or the rest area while it waits"""
+    if has_window:
+        return PARKING if delayed else BAY_AREA
+    return PULL_UP if delayed else PARKING
+
+
+def dock_message(action: str, terminal: str, delayed: bool) -> str:
+    if action == BAY_AREA:
+        return f"Aircraft is on time. Proceed to Bay Area at Terminal {terminal}."
+    if action == PARKING and delayed:
+        return f"Aircraft delayed. Parking available at Terminal {terminal}."
+    if action == PARKING:
+        return f"Aircraft is on time but no bay available. Parking available at Terminal {terminal}."
+    return "Aircraft delayed & no parking available. Pull over near rest area!"
@@ -0,0 +1,109 @@
+import math
+import datetime
+from flask import Blueprint, request, jsonify
+from .dock_assignment import terminal_code
+from .pickup_routes import pickup_feed, pickup_scheduler, run_pickup_tick, serve_from_scheduler
+from .pickup_scheduler import Pickup
+
+dock_bp = Blueprint('docks', __name__, url_prefix='/docks')
+
+# A view of the pickup scheduler's dock windows, so it is served by the elected scheduler process too
+serve_from_scheduler(dock_bp)
+
+def _parse_arrival(raw, now):
+    if not isinstance(raw, dict):
+        raise ValueError("arrival must be an object")
+    schedule_id = raw.get("scheduleId")
+    if not schedule_id or not isinstance(schedule_id, str):
+        raise ValueError("scheduleId is required")
+    if not raw.get("terminal"):
+        raise ValueError("terminal is required")
+
+    eta = raw.get("etaMinutes")
+    if eta is not None:
+        eta = float(eta)
+        if not math.isfinite(eta) or not 0 <= eta <= 24 * 60:
+            raise ValueError("etaMinutes must be between 0 and 1440")
+        pickup_time = now + datetime.timedelta(minutes=eta)
+    else:
+        # Without an ETA the truck keeps the pickup time it already has
+        current = pickup_scheduler.assignment(schedule_id)
+        pickup_time = datetime.datetime.fromisoformat(current["pickupTime"]) if current else now
+    return Pickup(
+        schedule_id,
+        raw.get("cargoId"),
+        terminal_code(raw["terminal"]),
+        raw.get("criticality", "low"),
+        pickup_time,
+        bool(raw.get("delayed", False)),
+    )
+
+@dock_bp.route('/plan', methods=['GET'])
+def get_dock_plan():
+    terminal = request.args.get('terminal')
+    try:
+        assignments = pickup_scheduler.plan(terminal) + pickup_scheduler.queue(None, terminal)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"assignments": assignments, "stats": pickup_feed.stats()}), 200
+
+@dock_bp.route('/assignment/<string:schedule_id>', methods=['GET'])
+def get_dock_assignment(schedule_id):
+    assignment = pickup_scheduler.assignment(schedule_id)
+    if not assignment:
+        return jsonify({"error": "No assignment for this schedule"}), 404
+
+    return jsonify(assignment), 200
+
+@dock_bp.route('/capacity', methods=['PUT'])
+def update_dock_capacity():
+    data = request.get_json(silent=True)
+
+    if not isinstance(data, dict) or not data:
+        return jsonify({"error": "Body must map terminals to docks"}), 400
+
+    try:
+        docks = {}
+        for terminal, count in data.items():
+            if not isinstance(count, int) or isinstance(count, bool) or count < 0:
+                raise ValueError(f"Docks for {terminal} must be a non-negative integer")
+            docks[terminal_code(terminal)] = count
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    for terminal, count in docks.items():
+        pickup_scheduler.set_docks(terminal, count)
+    # Released pickups get their new windows, and drivers hear about it, straight away
+    changed = run_pickup_tick()
+    return jsonify({"capacity": pickup_scheduler.docks(), "changed": changed}), 200
+
+@dock_bp.route('/arrivals', methods=['POST'])
+def update_dock_arrivals():
+    data = request.get_json(silent=True)
+
+    if data is None:
+        return jsonify({"error": "No input data provided"}), 400
+
+    now = datetime.datetime.utcnow()
+    raw_arrivals = data if isinstance(data, list) else [data]
+    try:
+        pickups = [_parse_arrival(raw, now) for raw in raw_arrivals]
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    for pickup in pickups:
+        pickup_scheduler.upsert(pickup)
+    return jsonify({"changed": run_pickup_tick()}), 200
+
+@dock_bp.route('/arrivals/<string:schedule_id>', methods=['DELETE'])
+def remove_dock_arrival(schedule_id):
+    pickup_scheduler.complete(schedule_id)
+    return jsonify({"changed": run_pickup_tick()}), 200
+
+@dock_bp.route('/replan', methods=['POST'])
+def replan_docks():
+    """Re-read every pickup in the planning horizon and dispatch what is due"""
+    pickup_feed.invalidate()
+    changed = run_pickup_tick()
+    return jsonify({"changed": changed, "stats": pickup_feed.stats()}), 200
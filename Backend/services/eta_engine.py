@@ -0,0 +1,233 @@
+import os
+import math
+import datetime
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from .geo import EARTH_RADIUS_KM, haversine_km
+from .sites import SITES, parse_location
+from .traffic_state import corridor_name
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only where numpy is absent
+    np = None
+
+# Straight-line distance is scaled up to approximate the road network
+DETOUR_FACTOR = float(os.getenv("ETA_DETOUR_FACTOR", "1.3"))
+AVERAGE_SPEED_KMH = float(os.getenv("ETA_AVERAGE_SPEED_KMH", "45"))
+# Extra delivery time on a corridor whose DALI agents are all red, as a fraction of the
+# free-flow time; partly congested corridors are slowed in proportion
+CONGESTION_SLOWDOWN = float(os.getenv("ETA_CONGESTION_SLOWDOWN", "1.0"))
+
+# Minutes of slack credited per criticality when ranking by urgency, so a
+# high-criticality load outranks a low one with up to an hour more slack.
+CRITICALITY_PRIORITY_MINUTES = {"high": 60.0, "medium": 20.0, "low": 0.0}
+
+
+@lru_cache(maxsize=4096)
+def _cached_location(packed: str) -> Tuple[str, float, float]:
+    name, lat, lon = parse_location(packed)
+    if lat is None:
+        lat, lon = SITES.get(name, (math.nan, math.nan))
+    return name, lat, lon
+
+
+def _minutes_until(iso: str, now: datetime.datetime) -> float:
+    value = datetime.datetime.fromisoformat(iso)
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (value - now).total_seconds() / 60.0
+
+
+def _rounded(value: float, digits: int) -> Optional[float]:
+    return None if math.isnan(value) else round(value, digits)
+
+
+def _rounded_list(values, digits: int) -> List[Optional[float]]:
+    rounded = np.round(values, digits)
+    if not np.isnan(rounded).any():
+        return rounded.tolist()
+    return [None if math.isnan(v) else v for v in rounded.tolist()]
+
+
+def haversine_matrix(lat1, lon1, lat2, lon2):
+    """Pairwise great-circle distances in km between two sets of points, shape (len1, len2)"""
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(lon1, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(lon2, dtype=np.float64))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_pairs(lat1, lon1, lat2, lon2):
+    """Element-wise great-circle distances in km between two equal-length point arrays"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class EtaEngine:
+    """Batch distance and travel-time estimates for schedules, terminals and sites.
+
+    Travel time is road-distance (haversine times ``detour_factor``) over
+    ``speed_kmh``. The delivery leg is multiplied by a congestion factor per
+    (from site, to site): 1 + ``congestion_slowdown`` times the live corridor
+    congestion read from ``set_traffic``, unless ``set_congestion`` fixed it.
+    Everything is computed as whole arrays with NumPy; a pure-Python path
+    gives the same answers when NumPy is unavailable.
+    """
+
+    def __init__(self, speed_kmh: float = AVERAGE_SPEED_KMH, detour_factor: float = DETOUR_FACTOR,
+                 use_numpy: Optional[bool] = None, congestion_slowdown: float = CONGESTION_SLOWDOWN):
+        self.speed_kmh = speed_kmh
+        self.detour_factor = detour_factor
+        self.use_numpy = np is not None if use_numpy is None else use_numpy and np is not None
+        self.congestion_slowdown = congestion_slowdown
+        self._congestion: Dict[Tuple[str, str], float] = {}
+        self._traffic: Optional[Callable[[], Dict[str, float]]] = None
+
+    def set_traffic(self, levels: Callable[[], Dict[str, float]]):
+        """Read congestion (0 to 1) per corridor name from ``levels`` once per estimate"""
+        self._traffic = levels
+
+    def set_congestion(self, origin: str, destination: str, multiplier: float):
+        """Fix the multiplier for one segment, over live traffic; 1 hands it back to traffic"""
+        if multiplier <= 0:
+            raise ValueError("Congestion multiplier must be positive")
+        if multiplier == 1.0:
+            self._congestion.pop((origin, destination), None)
+        else:
+            self._congestion[(origin, destination)] = multiplier
+
+    def congestion(self, origin: str, destination: str, levels: Optional[Dict[str, float]] = None) -> float:
+        fixed = self._congestion.get((origin, destination))
+        if fixed is not None:
+            return fixed
+        if levels is None:
+            levels = self._levels()
+        return 1.0 + self.congestion_slowdown * levels.get(corridor_name(origin, destination), 0.0)
+
+    def _levels(self) -> Dict[str, float]:
+        if self._traffic is None:
+            return {}
+        try:
+            return self._traffic()
+        except Exception as e:
+            print(f"Error reading corridor congestion, estimating at free flow: {e}")
+            return {}
+
+    def _minutes(self, distance_km):
+        return distance_km * self.detour_factor / self.speed_kmh * 60.0
+
+    def site_distance_matrix(self, lats: Sequence[float], lons: Sequence[float],
+                             site_names: Optional[Sequence[str]] = None):
+        """Distances from every point to every named site, shape (points, sites)"""
+        names = list(site_names or SITES)
+        site_lat = [SITES[name][0] for name in names]
+        site_lon = [SITES[name][1] for name in names]
+        if self.use_numpy:
+            return haversine_matrix(lats, lons, site_lat, site_lon), names
+        return [[haversine_km(a, b, c, d) for c, d in zip(site_lat, site_lon)] for a, b in zip(lats, lons)], names
+
+    def site_eta_matrix(self, lats: Sequence[float], lons: Sequence[float],
+                        site_names: Optional[Sequence[str]] = None):
+        """Travel minutes from every point to every named site, shape (points, sites)"""
+        distances, names = self.site_distance_matrix(lats, lons, site_names)
+        if self.use_numpy:
+            return self._minutes(distances), names
+        return [[self._minutes(d) for d in row] for row in distances], names
+
+    def estimate(self, items: List[Dict[str, Any]], positions: Optional[Dict[str, Tuple[float, float]]] = None):
+        """Distances and minutes for each schedule item's approach and delivery legs.
+
+        ``positions`` maps schedule id to the truck's last known (lat, lon);
+        trucks without a fix are assumed to be at the pickup already.
+        Returns (approach_km, approach_min, delivery_km, delivery_min) sequences.
+        """
+        positions = positions or {}
+        pickups = [_cached_location(item["pickupLocation"]) for item in items]
+        dropoffs = [_cached_location(item["dropoffLocation"]) for item in items]
+        trucks = [positions.get(item["id"], (p[1], p[2])) for item, p in zip(items, pickups)]
+        levels = self._levels()
+        segments = {}
+        for p, d in zip(pickups, dropoffs):
+            if (p[0], d[0]) not in segments:
+                segments[(p[0], d[0])] = self.congestion(p[0], d[0], levels)
+        delivery_factor = [segments[(p[0], d[0])] for p, d in zip(pickups, dropoffs)]
+
+        if self.use_numpy:
+            p_lat = np.fromiter((p[1] for p in pickups), np.float64, len(items))
+            p_lon = np.fromiter((p[2] for p in pickups), np.float64, len(items))
+            d_lat = np.fromiter((d[1] for d in dropoffs), np.float64, len(items))
+            d_lon = np.fromiter((d[2] for d in dropoffs), np.float64, len(items))
+            t_lat = np.fromiter((t[0] for t in trucks), np.float64, len(items))
+            t_lon = np.fromiter((t[1] for t in trucks), np.float64, len(items))
+
+            approach_km = haversine_pairs(t_lat, t_lon, p_lat, p_lon)
+            delivery_km = haversine_pairs(p_lat, p_lon, d_lat, d_lon)
+            approach_min = self._minutes(approach_km)
+            delivery_min = self._minutes(delivery_km) * np.asarray(delivery_factor)
+            return approach_km, approach_min, delivery_km, delivery_min
+
+        approach_km = [haversine_km(t[0], t[1], p[1], p[2]) for t, p in zip(trucks, pickups)]
+        delivery_km = [haversine_km(p[1], p[2], d[1], d[2]) for p, d in zip(pickups, dropoffs)]
+        approach_min = [self._minutes(km) for km in approach_km]
+        delivery_min = [self._minutes(km) * f for km, f in zip(delivery_km, delivery_factor)]
+        return approach_km, approach_min, delivery_km, delivery_min
+
+    def rank(self, items: List[Dict[str, Any]], positions: Optional[Dict[str, Tuple[float, float]]] = None,
+             now: Optional[datetime.datetime] = None, by: str = "urgency") -> List[Dict[str, Any]]:
+        """Annotate items with ETA fields and sort them by "eta" or "urgency".
+
+        Urgency is the slack between the truck's ETA at pickup and the pickup
+        time, less the criticality credit; the most urgent loads come first.
+        """
+        if not items:
+            return []
+
+        now = now or datetime.datetime.utcnow()
+        approach_km, approach_min, delivery_km, delivery_min = self.estimate(items, positions)
+        minutes_to_pickup = [_minutes_until(item["pickupTime"], now) for item in items]
+        credit = [CRITICALITY_PRIORITY_MINUTES.get(item.get("criticality"), 0.0) for item in items]
+
+        if self.use_numpy:
+            eta = approach_min + delivery_min
+            slack = np.asarray(minutes_to_pickup) - approach_min
+            score = eta if by == "eta" else slack - np.asarray(credit)
+            order = np.argsort(score, kind="stable").tolist()
+            distance = _rounded_list(approach_km + delivery_km, 2)
+            eta, slack = _rounded_list(eta, 1), _rounded_list(slack, 1)
+        else:
+            eta = [a + d for a, d in zip(approach_min, delivery_min)]
+            slack = [m - a for m, a in zip(minutes_to_pickup, approach_min)]
+            score = eta if by == "eta" else [s - c for s, c in zip(slack, credit)]
+            # Unknown locations give NaN; keep them last like argsort does
+            order = sorted(range(len(items)), key=lambda i: (math.isnan(score[i]), score[i]))
+            distance = [_rounded(a + d, 2) for a, d in zip(approach_km, delivery_km)]
+            eta = [_rounded(v, 1) for v in eta]
+            slack = [_rounded(v, 1) for v in slack]
+
+        ranked = []
+        for i in order:
+            item = dict(items[i])
+            item["distanceKm"] = distance[i]
+            item["etaMinutes"] = eta[i]
+            item["slackMinutes"] = slack[i]
+            ranked.append(item)
+        return ranked
+
+
+_engine: Optional[EtaEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_eta_engine() -> EtaEngine:
+    """Return the process-wide engine, so congestion set in one place applies everywhere"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = EtaEngine()
+    return _engine
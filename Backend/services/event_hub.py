@@ -0,0 +1,233 @@
+import json
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+
+class HubFull(Exception):
+    """Raised when the hub already holds its maximum number of subscribers."""
+
+
+def format_event(event_id: Optional[int], event_type: str, data: Any) -> bytes:
+    """One Server-Sent Events frame; without an id the client's Last-Event-ID is left alone"""
+    payload = json.dumps(data, separators=(",", ":"), default=str)
+    id_line = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{id_line}event: {event_type}\ndata: {payload}\n\n".encode()
+
+
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+
+class Subscription:
+    """One connected client: the topics it follows and a bounded queue of frames.
+
+    When a slow client lets ``max_queue`` frames pile up, the oldest are
+    dropped and the next read starts with a ``resync`` event so the client
+    knows to refetch state instead of trusting a gappy stream. Nothing here
+    owns a thread; readers block in ``get`` or register ``on_ready``.
+    """
+
+    def __init__(self, topics: Iterable[str], max_queue: int = 100):
+        self.topics: Set[str] = set(topics)
+        self.max_queue = max_queue
+        self.on_ready: Optional[Callable[[], None]] = None
+        self.closed = False
+
+        self._frames: Deque[bytes] = deque()
+        self._cond = threading.Condition()
+        self._lagged = False
+        self.delivered = 0
+        self.dropped = 0
+
+    def push(self, frame: bytes) -> bool:
+        """Queue a frame; returns False if an older frame had to be dropped to make room"""
+        with self._cond:
+            if self.closed:
+                return True
+            dropped = len(self._frames) >= self.max_queue
+            if dropped:
+                self._frames.popleft()
+                self.dropped += 1
+                self._lagged = True
+            self._frames.append(frame)
+            self._cond.notify()
+        if self.on_ready is not None:
+            self.on_ready()
+        return not dropped
+
+    def drain(self) -> List[bytes]:
+        """Every queued frame, without waiting"""
+        with self._cond:
+            return self._take()
+
+    def _take(self) -> List[bytes]:
+        frames = list(self._frames)
+        self._frames.clear()
+        if self._lagged:
+            self._lagged = False
+            frames.insert(0, format_event(None, "resync", {"dropped": self.dropped}))
+        self.delivered += len(frames)
+        return frames
+
+    def get(self, timeout: Optional[float] = None) -> List[bytes]:
+        """Wait up to ``timeout`` seconds for frames; an empty list means none arrived"""
+        with self._cond:
+            if not self._frames and not self.closed:
+                self._cond.wait(timeout)
+            return self._take()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self.on_ready is not None:
+            self.on_ready()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+class EventHub:
+    """Fans events out to every subscription following a topic.
+
+    Each event is encoded once and the same bytes are queued for every
+    subscriber. The last ``history`` events of the ``history_topics`` most
+    recently active topics are kept so a client reconnecting with
+    ``Last-Event-ID`` receives what it missed.
+
+    On its own a hub reaches only this process's subscribers. With a
+    ``relay`` (see event_relay.py) event ids come from the database and
+    every event is passed on to the hubs in the other workers.
+    """
+
+    def __init__(self, max_subscribers: int = 50000, max_queue: int = 100, history: int = 50,
+                 history_topics: int = 10000):
+        self.max_subscribers = max_subscribers
+        self.max_queue = max_queue
+        self.history = history
+        self.history_topics = history_topics
+
+        self._lock = threading.Lock()
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._history: "OrderedDict[str, Deque[Tuple[int, bytes]]]" = OrderedDict()
+        self._subscribers = 0
+        self._next_id = 1
+        # Set once this process relays events to and from the other workers
+        self.relay = None
+
+        self._published = 0
+        self._relayed = 0
+        self._relay_failures = 0
+        self._fanout = 0
+        self._dropped = 0
+        self._rejected = 0
+
+    def subscribe(self, topics: Iterable[str], last_event_id: Optional[int] = None) -> Subscription:
+        subscription = Subscription(topics, self.max_queue)
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                self._rejected += 1
+                raise HubFull("Too many event subscribers")
+            self._subscribers += 1
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+
+            if last_event_id is not None:
+                missed = sorted(
+                    item for topic in subscription.topics
+                    for item in self._history.get(topic, ()) if item[0] > last_event_id
+                )
+                for _, frame in missed[-self.max_queue:]:
+                    subscription.push(frame)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription.closed:
+                return
+            self._subscribers -= 1
+            for topic in subscription.topics:
+                members = self._topics.get(topic)
+                if members is not None:
+                    members.discard(subscription)
+                    if not members:
+                        del self._topics[topic]
+        subscription.close()
+
+    def publish(self, topic: str, event_type: str, data: Any) -> int:
+        """Send an event to everyone following ``topic``; returns the number of this process's subscribers reached"""
+        relay = self.relay
+        if relay is None:
+            with self._lock:
+                event_id = self._next_id
+                self._next_id += 1
+        else:
+            try:
+                event_id = relay.publish(topic, event_type, data)
+            except Exception as e:
+                # Still reach this worker's drivers; without an id the event is not replayed on reconnect
+                print(f"Error relaying event, delivering in this worker only: {e}")
+                event_id = None
+                with self._lock:
+                    self._relay_failures += 1
+        with self._lock:
+            self._published += 1
+        return self._fan_out(topic, event_id, format_event(event_id, event_type, data))
+
+    def deliver(self, topic: str, event_id: int, event_type: str, data: Any) -> int:
+        """Fan out an event another worker published"""
+        with self._lock:
+            self._relayed += 1
+        return self._fan_out(topic, event_id, format_event(event_id, event_type, data))
+
+    def _fan_out(self, topic: str, event_id: Optional[int], frame: bytes) -> int:
+        with self._lock:
+            if self.history and event_id is not None:
+                self._history.setdefault(topic, deque(maxlen=self.history)).append((event_id, frame))
+                self._history.move_to_end(topic)
+                if len(self._history) > self.history_topics:
+                    self._history.popitem(last=False)
+            targets = list(self._topics.get(topic, ()))
+
+        dropped = sum(1 for subscription in targets if not subscription.push(frame))
+        with self._lock:
+            self._fanout += len(targets)
+            self._dropped += dropped
+        return len(targets)
+
+    def resync_all(self):
+        """Tell every subscriber to refetch state, e.g. after events may have been missed"""
+        with self._lock:
+            targets = {subscription for members in self._topics.values() for subscription in members}
+        frame = format_event(None, "resync", {"dropped": 0})
+        for subscription in targets:
+            subscription.push(frame)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "subscribers": self._subscribers,
+                "max_subscribers": self.max_subscribers,
+                "topics": len(self._topics),
+                "published": self._published,
+                "relayed": self._relayed,
+                "relay_failures": self._relay_failures,
+                "fanout": self._fanout,
+                "dropped": self._dropped,
+                "rejected": self._rejected,
+                "last_event_id": self._next_id - 1,
+            }
+
+
+def schedule_topic(schedule_id: str) -> str:
+    return f"schedule:{schedule_id}"
+
+
+def stream_frames(subscription: Subscription, keepalive: float, retry_ms: int = 3000):
+    """Blocking SSE body generator for a subscription, with keepalive comments"""
+    yield f"retry: {retry_ms}\n\n".encode()
+    while not subscription.closed:
+        frames = subscription.get(timeout=keepalive)
+        # A comment line keeps proxies from timing out idle streams and
+        # surfaces disconnected clients on the next write
+        yield b"".join(frames) if frames else KEEPALIVE_FRAME
@@ -0,0 +1,236 @@
+import json
+import uuid
+import select
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg2
+
+from .db_pool import connection_params, get_pool
+
+EVENTS_CHANNEL = "cargo_events"
+STATE_CHANNEL = "worker_state"
+
+# PostgreSQL refuses NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7999
+
+
+class PgListener:
+    """Follows one LISTEN/NOTIFY channel on a dedicated connection from a background thread.
+
+    A listener that lost its connection may have missed notifications, so
+    after reconnecting it calls ``_resync``. Subclasses decide what a
+    notification means in ``_deliver``.
+    """
+
+    thread_name = "pg-listener"
+
+    def __init__(self, channel: str, pool=None, poll_interval: float = 5.0, max_retry_delay: float = 30.0,
+                 connect: Callable[[], Any] = None):
+        self.channel = channel
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.max_retry_delay = max_retry_delay
+        self._connect = connect or (lambda: psycopg2.connect(**connection_params()))
+        # Tells this process's own notifications apart from other workers'
+        self.origin = uuid.uuid4().hex
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.connected = False
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+        self.reconnects = 0
+
+    def _deliver(self, payload: str):
+        raise NotImplementedError
+
+    def _resync(self):
+        pass
+
+    def _listen(self, conn):
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        self.connected = True
+        if self.reconnects:
+            self._resync()
+
+        while not self._stopping.is_set():
+            if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                continue
+            conn.poll()
+            notifies = [notify.payload for notify in conn.notifies if notify.channel == self.channel]
+            conn.notifies.clear()
+            for payload in notifies:
+                try:
+                    self._deliver(payload)
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"Ignoring malformed notification on {self.channel}: {e}")
+
+    def _run(self):
+        delay = 1.0
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                delay = 1.0
+                self._listen(conn)
+            except Exception as e:
+                print(f"Listener error on {self.channel}: {e}")
+                self.connected = False
+                self.reconnects += 1
+                self._stopping.wait(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "connected": self.connected,
+                "published": self.published,
+                "received": self.received,
+                "errors": self.errors,
+                "reconnects": self.reconnects,
+            }
+
+
+class PgEventRelay(PgListener):
+    """Carries EventHub events between worker processes over LISTEN/NOTIFY.
+
+    ``publish`` takes the event's id from the cargo_event_ids sequence and
+    announces it on one NOTIFY; the hub delivers it to this process's
+    subscribers straight away and every other worker's listener delivers it
+    to theirs. A listener that lost its connection may have missed events,
+    so on reconnecting it sends its subscribers a ``resync`` event.
+    """
+
+    thread_name = "event-relay"
+
+    def __init__(self, hub, pool=None, channel: str = EVENTS_CHANNEL, poll_interval: float = 5.0,
+                 max_retry_delay: float = 30.0, connect: Callable[[], Any] = None):
+        super().__init__(channel, pool, poll_interval, max_retry_delay, connect)
+        self.hub = hub
+
+    def publish(self, topic: str, event_type: str, data: Any) -> int:
+        """Announce an event to the other workers; returns its id, raises if it could not be sent"""
+        body = json.dumps({"origin": self.origin, "topic": topic, "type": event_type, "data": data},
+                          separators=(",", ":"), default=str)
+        pool = self.pool if self.pool is not None else get_pool()
+        try:
+            with pool.cursor() as cursor:
+                cursor.execute("SELECT nextval('cargo_event_ids')")
+                event_id = cursor.fetchone()[0]
+                payload = f"{event_id} {body}"
+                if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+                    raise ValueError(f"Event is too large to relay ({len(payload)} bytes)")
+                # Sent when the transaction commits on leaving the block
+                cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        with self._lock:
+            self.published += 1
+        return event_id
+
+    def _deliver(self, payload: str):
+        event_id, body = payload.split(" ", 1)
+        event = json.loads(body)
+        if event["origin"] == self.origin:
+            return
+        self.hub.deliver(event["topic"], int(event_id), event["type"], event["data"])
+        with self._lock:
+            self.received += 1
+
+    def _resync(self):
+        self.hub.resync_all()
+
+
+class PgStateRelay(PgListener):
+    """Replays changes to one worker's in-memory state in every other worker.
+
+    ``publish(kind, items)`` sends the items, split across as many NOTIFYs
+    as their size needs, in one transaction; every other worker's listener
+    hands them to ``handlers[kind]``. Handlers must accept items twice or
+    out of order. Changes sent while a listener was reconnecting are lost to
+    it; its ``resync`` callback, if any, runs once it is back.
+    """
+
+    thread_name = "state-relay"
+
+    def __init__(self, handlers: Dict[str, Callable[[List[Any]], Any]], pool=None, channel: str = STATE_CHANNEL,
+                 poll_interval: float = 5.0, max_retry_delay: float = 30.0, connect: Callable[[], Any] = None,
+                 resync: Callable[[], Any] = None):
+        super().__init__(channel, pool, poll_interval, max_retry_delay, connect)
+        self.handlers = handlers
+        self.resync = resync
+
+    def _payloads(self, kind: str, items: List[Any]) -> List[str]:
+        """The items as NOTIFY payloads, each under PostgreSQL's size limit"""
+        head = f'{{"origin":"{self.origin}","kind":{json.dumps(kind)},"items":['
+        budget = MAX_PAYLOAD_BYTES - len(head.encode()) - len("]}")
+        payloads, chunk, used = [], [], 0
+        for item in items:
+            encoded = json.dumps(item, separators=(",", ":"), default=str)
+            size = len(encoded.encode())
+            if size > budget:
+                raise ValueError(f"A {kind} item is too large to relay ({size} bytes)")
+            if chunk and used + 1 + size > budget:
+                payloads.append(head + ",".join(chunk) + "]}")
+                chunk, used = [], 0
+            used += size + (1 if chunk else 0)
+            chunk.append(encoded)
+        if chunk:
+            payloads.append(head + ",".join(chunk) + "]}")
+        return payloads
+
+    def publish(self, kind: str, items: List[Any]) -> int:
+        """Send items to the other workers; returns the number of notifications, raises if not sent"""
+        payloads = self._payloads(kind, items)
+        if not payloads:
+            return 0
+        pool = self.pool if self.pool is not None else get_pool()
+        try:
+            with pool.cursor() as cursor:
+                for payload in payloads:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        with self._lock:
+            self.published += len(payloads)
+        return len(payloads)
+
+    def _deliver(self, payload: str):
+        message = json.loads(payload)
+        if message["origin"] == self.origin:
+            return
+        handler = self.handlers.get(message["kind"])
+        if handler is None:
+            raise ValueError(f"no handler for {message['kind']!r}")
+        handler(message["items"])
+        with self._lock:
+            self.received += 1
+
+    def _resync(self):
+        if self.resync is not None:
+            self.resync()
@@ -0,0 +1,177 @@
+import os
+import hmac
+from flask import Blueprint, Response, current_app, request, jsonify
+from .event_hub import EventHub, HubFull, schedule_topic, stream_frames
+from .event_relay import PgEventRelay, PgStateRelay
+from .metrics import errors
+from .process_local import ProcessLocal
+
+events_bp = Blueprint('events', __name__, url_prefix='/events')
+
+event_hub = EventHub(
+    max_subscribers=int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "50000")),
+    max_queue=int(os.getenv("EVENTS_QUEUE_SIZE", "100")),
+    history=int(os.getenv("EVENTS_HISTORY", "50")),
+)
+
+# postgres passes events between worker processes over LISTEN/NOTIFY; none
+# keeps them in the publishing process, which is only right with one worker
+EVENTS_RELAY = os.getenv("EVENTS_RELAY", "postgres").lower()
+
+def _relay_for_hub():
+    if EVENTS_RELAY == "none":
+        return None
+    if EVENTS_RELAY != "postgres":
+        print(f"Unknown EVENTS_RELAY {EVENTS_RELAY!r}; events reach this worker's subscribers only")
+        return None
+    relay = PgEventRelay(event_hub)
+    event_hub.relay = relay
+    relay.start()
+    return relay
+
+# Per process: each worker listens on its own connection
+_event_relay = ProcessLocal(_relay_for_hub)
+
+# What to do with each kind of state change the other workers relay; see relay_state
+state_handlers = {}
+
+def _relay_for_state():
+    if EVENTS_RELAY != "postgres":
+        return None
+    relay = PgStateRelay(state_handlers)
+    relay.start()
+    return relay
+
+# Per process, like the event relay
+_state_relay = ProcessLocal(_relay_for_state)
+
+def start_event_relay():
+    """Relay events and state changes to and from the other workers, once per process"""
+    _event_relay.get()
+    _state_relay.get()
+
+def relay_state(kind, items):
+    """Replay a change this worker made to its in-memory state in the other workers"""
+    relay = _state_relay.peek()
+    if relay is None or not items:
+        return
+    try:
+        relay.publish(kind, items)
+    except Exception as e:
+        print(f"Error relaying {kind}, applied in this worker only: {e}")
+        errors.labels("state_relay").inc()
+
+def event_relay_stats():
+    relay = _event_relay.peek()
+    return relay.stats() if relay is not None else None
+
+def state_relay_stats():
+    relay = _state_relay.peek()
+    return relay.stats() if relay is not None else None
+
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+EVENTS_MAX_TOPICS = int(os.getenv("EVENTS_MAX_TOPICS", "100"))
+
+# Shared secret for the mocks and dispatcher tools that publish events; unset refuses them outside debug
+EVENTS_PUBLISH_KEY = os.getenv("EVENTS_PUBLISH_KEY")
+
+# Event types pushed to drivers
+EVENT_TYPES = ("assignment", "delay", "parking", "traffic", "reassignment")
+
+def publish_denied():
+    """The error response for a request that may not publish, or None if it may.
+
+    Publishing needs an X-Publish-Key header matching EVENTS_PUBLISH_KEY.
+    With no key configured only a debug app (python app.py) accepts it.
+    """
+    if not EVENTS_PUBLISH_KEY:
+        if current_app.debug:
+            return None
+        return jsonify({"error": "Publishing is disabled until EVENTS_PUBLISH_KEY is set"}), 403
+    if not hmac.compare_digest(request.headers.get('X-Publish-Key', '').encode(), EVENTS_PUBLISH_KEY.encode()):
+        return jsonify({"error": "Invalid publish key"}), 401
+    return None
+
+def _split_ids(value):
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+def parse_subscription(args, headers):
+    """Topics and resume point for an /events request, raising ValueError on bad input"""
+    schedule_ids = _split_ids(args.get('schedules'))
+    
+    if not schedule_ids:
+        raise ValueError("schedules is required")
+    if len(schedule_ids) > EVENTS_MAX_TOPICS:
+        raise ValueError(f"At most {EVENTS_MAX_TOPICS} schedules per stream")
+    
+    last_event_id = headers.get('Last-Event-ID') or args.get('lastEventId')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        raise ValueError("Last-Event-ID must be an integer")
+    
+    return [schedule_topic(s) for s in schedule_ids], last_event_id
+
+def hub_full_response(error):
+    response = jsonify({"error": str(error)})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def event_stream_response(body):
+    response = Response(body, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@events_bp.route('', methods=['GET'])
+def subscribe_events():
+    try:
+        topics, last_event_id = parse_subscription(request.args, request.headers)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        subscription = event_hub.subscribe(topics, last_event_id)
+    except HubFull as e:
+        return hub_full_response(e)
+    
+    def body():
+        try:
+            yield from stream_frames(subscription, EVENTS_KEEPALIVE_SECONDS)
+        finally:
+            # Runs when the client disconnects and the server closes the generator
+            event_hub.unsubscribe(subscription)
+    
+    return event_stream_response(body())
+
+@events_bp.route('/publish', methods=['POST'])
+def publish_event():
+    denied = publish_denied()
+    if denied:
+        return denied
+    
+    data = request.get_json(silent=True)
+    
+    if not isinstance(data, dict):
+        return jsonify({"error": "No input data provided"}), 400
+    
+    schedule_ids = data.get('scheduleIds') or ([data['scheduleId']] if data.get('scheduleId') else [])
+    event_type = data.get('type')
+    
+    if not schedule_ids or not isinstance(schedule_ids, list):
+        return jsonify({"error": "scheduleId or scheduleIds is required"}), 400
+    if event_type not in EVENT_TYPES:
+        return jsonify({"error": f"type must be one of {', '.join(EVENT_TYPES)}"}), 400
+    
+    payload = data.get('data', {})
+    delivered = sum(
+        event_hub.publish(schedule_topic(str(s)), event_type, dict(payload, scheduleId=str(s)) if isinstance(payload, dict) else payload)
+        for s in schedule_ids
+    )
+    return jsonify({"published": len(schedule_ids), "delivered": delivered}), 202
+
+@events_bp.route('/stats', methods=['GET'])
+def get_event_stats():
+    stats = event_hub.stats()
+    stats["relay"] = event_relay_stats()
+    return jsonify(stats), 200
@@ -0,0 +1,134 @@
+import time
+import zlib
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import psycopg2
+
+from .db_pool import connection_params, get_pool
+
+
+class LeaderLock:
+    """Elects one process among many with a PostgreSQL session advisory lock.
+
+    The lock is held on one dedicated connection outside the pool, so it is
+    released by the server as soon as the holder exits or its connection
+    drops. ``is_leader`` answers from memory; ``refresh`` checks a held
+    connection is still alive, or tries to take the lock, at most every
+    ``retry_seconds`` unless forced. Without a database nobody leads.
+
+    With ``advertise``, a new leader records the address it returns in
+    scheduler_leaders, and ``leader_url`` tells any process where the
+    current leader can be reached.
+    """
+
+    def __init__(self, name: str, retry_seconds: float = 5.0, connect: Callable[[], Any] = None,
+                 clock: Callable[[], float] = time.monotonic, advertise: Callable[[], str] = None, pool=None):
+        self.name = name
+        # Advisory locks are keyed by a bigint; every process derives the same one from the name
+        self.key = zlib.crc32(name.encode())
+        self.retry_seconds = retry_seconds
+        self._connect = connect or (lambda: psycopg2.connect(**connection_params()))
+        self._clock = clock
+        self._advertise = advertise
+        self.pool = pool
+        self._url: Optional[str] = None
+        self._url_checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._conn = None
+        self._checked_at: Optional[float] = None
+        self.acquired = 0
+        self.lost = 0
+
+    def is_leader(self) -> bool:
+        if self._conn is None:
+            self.refresh()
+        return self._conn is not None
+
+    def refresh(self, force: bool = False) -> bool:
+        with self._lock:
+            now = self._clock()
+            if not force and self._checked_at is not None and now - self._checked_at < self.retry_seconds:
+                return self._conn is not None
+            self._checked_at = now
+            if self._conn is not None:
+                try:
+                    with self._conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                    return True
+                except Exception as e:
+                    print(f"Lost the {self.name} lock: {e}")
+                    self.lost += 1
+                    self._close()
+            return self._try_acquire()
+
+    def _try_acquire(self) -> bool:
+        conn = None
+        try:
+            conn = self._connect()
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", (self.key,))
+                held = cursor.fetchone()[0]
+        except Exception as e:
+            print(f"Could not try the {self.name} lock: {e}")
+            held = False
+        if not held:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            return False
+        print(f"This process now holds the {self.name} lock")
+        self._conn = conn
+        self.acquired += 1
+        if self._advertise is not None:
+            try:
+                url = self._advertise()
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO scheduler_leaders (name, url) VALUES (%s, %s) "
+                        "ON CONFLICT (name) DO UPDATE SET url = EXCLUDED.url, updated_at = now()",
+                        (self.name, url))
+            except Exception as e:
+                # Still the leader; the others cannot reach it until the next takeover
+                print(f"Could not advertise the {self.name} leader: {e}")
+        return True
+
+    def leader_url(self) -> Optional[str]:
+        """The current leader's advertised address, looked up at most every ``retry_seconds``"""
+        now = self._clock()
+        if self._url_checked_at is not None and now - self._url_checked_at < self.retry_seconds:
+            return self._url
+        pool = self.pool if self.pool is not None else get_pool()
+        try:
+            with pool.cursor() as cursor:
+                cursor.execute("SELECT url FROM scheduler_leaders WHERE name = %s", (self.name,))
+                row = cursor.fetchone()
+            self._url = row[0] if row else None
+        except Exception as e:
+            print(f"Could not look up the {self.name} leader: {e}")
+            self._url = None
+        self._url_checked_at = now
+        return self._url
+
+    def forget_leader_url(self):
+        """Look the address up again on the next call, e.g. after it stopped answering"""
+        self._url_checked_at = None
+
+    def _close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def release(self):
+        with self._lock:
+            self._close()
+            self._checked_at = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"leader": self._conn is not None, "acquired": self.acquired, "lost": self.lost}
@@ -0,0 +1,78 @@
+import threading
+from typing import Iterable, Optional
+
+from flask import Blueprint, Flask, Response, request
+
+from .process_local import ProcessLocal
+
+# Set on forwarded requests, so a process that has just lost the lock does not pass them on again
+FORWARDED_HEADER = "X-Forwarded-To-Leader"
+
+# Connection-level headers belong to each hop, and requests has already decoded the body
+_HOP_HEADERS = frozenset(("host", "connection", "keep-alive", "transfer-encoding", "content-length",
+                          "content-encoding", "date", "server"))
+
+
+def _session():
+    # Imported on first use, like the directions client, so the app does not import requests at startup
+    import requests
+    return requests.Session()
+
+
+_sessions = ProcessLocal(_session)
+
+
+class LeaderServer:
+    """Internal HTTP listener for the blueprints whose state lives in the elected process.
+
+    The public port is shared by every worker, so another worker cannot
+    choose to reach the leader through it. The leader also serves these
+    blueprints on ``bind``:``port`` (0 picks a free port) from a background
+    thread, and advertises ``http://<host>:<port>``.
+    """
+
+    def __init__(self, blueprints: Iterable[Blueprint], bind: str = "127.0.0.1", port: int = 0,
+                 host: Optional[str] = None):
+        self.blueprints = list(blueprints)
+        self.bind = bind
+        self.port = port
+        self.host = host or bind
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> str:
+        """Start serving once; returns the address to advertise"""
+        from werkzeug.serving import make_server
+
+        with self._lock:
+            if self._server is None:
+                app = Flask(__name__)
+                for blueprint in self.blueprints:
+                    app.register_blueprint(blueprint)
+                self._server = make_server(self.bind, self.port, app, threaded=True)
+                self._thread = threading.Thread(target=self._server.serve_forever, name="leader-server", daemon=True)
+                self._thread.start()
+            return f"http://{self.host}:{self._server.server_port}"
+
+    def stop(self):
+        with self._lock:
+            if self._server is not None:
+                self._server.shutdown()
+                self._server = None
+
+
+def forward(url: str, timeout: float) -> Optional[Response]:
+    """Send the current request to the leader at ``url``; None if it could not be reached"""
+    import requests
+
+    headers = {name: value for name, value in request.headers.items() if name.lower() not in _HOP_HEADERS}
+    headers[FORWARDED_HEADER] = "1"
+    try:
+        upstream = _sessions.get().request(request.method, url + request.full_path.rstrip("?"),
+                                           data=request.get_data(), headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        print(f"Error forwarding {request.method} {request.path} to the leader at {url}: {e}")
+        return None
+    headers = [(name, value) for name, value in upstream.headers.items() if name.lower() not in _HOP_HEADERS]
+    return Response(upstream.content, status=upstream.status_code, headers=headers)
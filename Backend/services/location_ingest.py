@@ -0,0 +1,336 @@
+import io
+import os
+import csv
+import time
+import datetime
+import threading
+from collections import deque, namedtuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import psycopg2
+
+from .db_pool import get_pool
+
+LOCATION_MAX_BATCH = int(os.getenv("LOCATION_MAX_BATCH", "1000"))
+
+# Fixes further ahead of the server clock than this are refused as a broken device clock
+MAX_CLOCK_SKEW = datetime.timedelta(days=1)
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+LocationPoint = namedtuple(
+    "LocationPoint",
+    ["schedule_id", "cargo_id", "latitude", "longitude", "recorded_at", "received_at", "received_monotonic"],
+)
+
+
+class RejectedBatch(Exception):
+    """Raised by a sink when the database refuses the rows themselves, so retrying cannot help"""
+
+
+def _parse_timestamp(value) -> datetime.datetime:
+    now = datetime.datetime.utcnow()
+    if value is None:
+        return now
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # The Android client sends System.currentTimeMillis()
+        seconds = value / 1000 if value > 1e11 else value
+        if not 0 <= seconds <= (now + MAX_CLOCK_SKEW - _EPOCH).total_seconds():
+            raise ValueError("timestamp must be after 1970 and not in the future")
+        return _EPOCH + datetime.timedelta(seconds=seconds)
+    if isinstance(value, str):
+        parsed = datetime.datetime.fromisoformat(value)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        if not _EPOCH <= parsed <= now + MAX_CLOCK_SKEW:
+            raise ValueError("timestamp must be after 1970 and not in the future")
+        return parsed
+    raise ValueError("timestamp must be epoch milliseconds or an ISO-8601 string")
+
+
+def _identifier(value, field: str) -> str:
+    # Control characters, NUL above all, are refused by PostgreSQL text columns and would fail the whole COPY
+    if not value or not isinstance(value, str) or len(value) > 64 or not value.isprintable():
+        raise ValueError(f"{field} must be a printable string of at most 64 characters")
+    return value
+
+
+def parse_location_points(payload) -> List[LocationPoint]:
+    """Validate a single point, a list of points or {"points": [...]}, raising ValueError on bad input"""
+    if isinstance(payload, dict) and "points" in payload:
+        payload = payload["points"]
+    raw_points = payload if isinstance(payload, list) else [payload]
+
+    if not raw_points:
+        raise ValueError("No location points provided")
+    if len(raw_points) > LOCATION_MAX_BATCH:
+        raise ValueError(f"At most {LOCATION_MAX_BATCH} points per request")
+
+    received_at = datetime.datetime.utcnow()
+    received_monotonic = time.monotonic()
+    points = []
+
+    for index, raw in enumerate(raw_points):
+        try:
+            if not isinstance(raw, dict):
+                raise ValueError("point must be an object")
+
+            schedule_id = raw.get("scheduleId") or raw.get("cargoId")
+            if not schedule_id:
+                raise ValueError("scheduleId is required")
+            schedule_id = _identifier(schedule_id, "scheduleId")
+            cargo_id = raw.get("cargoId")
+            if cargo_id is not None:
+                cargo_id = _identifier(cargo_id, "cargoId")
+
+            latitude = float(raw["latitude"])
+            longitude = float(raw["longitude"])
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValueError("latitude/longitude out of range")
+
+            points.append(LocationPoint(
+                schedule_id,
+                cargo_id,
+                latitude,
+                longitude,
+                _parse_timestamp(raw.get("timestamp")),
+                received_at,
+                received_monotonic,
+            ))
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            detail = f"missing {e}" if isinstance(e, KeyError) else str(e)
+            raise ValueError(f"Invalid point at index {index}: {detail}")
+
+    return points
+
+
+class PostgresLocationSink:
+    """Writes a batch of points with a single COPY ... FROM STDIN"""
+
+    COPY_SQL = """
+        COPY driver_locations (schedule_id, cargo_id, latitude, longitude, recorded_at, received_at)
+        FROM STDIN WITH (FORMAT csv)
+    """
+
+    def __init__(self, pool=None):
+        # None means this process's shared pool, looked up at flush time
+        self.pool = pool
+
+    def __call__(self, points: List[LocationPoint]):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for p in points:
+            writer.writerow((
+                p.schedule_id,
+                p.cargo_id if p.cargo_id is not None else "",
+                repr(p.latitude),
+                repr(p.longitude),
+                p.recorded_at.isoformat(),
+                p.received_at.isoformat(),
+            ))
+        buffer.seek(0)
+
+        pool = self.pool if self.pool is not None else get_pool()
+        try:
+            with pool.cursor() as cursor:
+                cursor.copy_expert(self.COPY_SQL, buffer)
+        except psycopg2.DataError as e:
+            raise RejectedBatch(str(e)) from e
+
+
+class LocationIngestor:
+    """Buffers location points in memory and flushes them to a sink in batches.
+
+    A background thread flushes whenever ``batch_size`` points are waiting or
+    ``flush_interval`` seconds have passed. The buffer is bounded by
+    ``max_buffer``: once full, new points are rejected and counted as dropped,
+    and ``backpressure`` turns on above ``high_watermark`` so callers can ask
+    clients to slow down. Failed flushes are retried with backoff while the
+    points still fit in the buffer. A batch the sink rejects as bad data is
+    split in halves until the offending points are found; those are kept in
+    ``dead_letters`` instead of being retried forever.
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[List[LocationPoint]], None],
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_buffer: int = 50000,
+        high_watermark: float = 0.8,
+        delay_threshold: float = 5.0,
+        dead_letter_size: int = 100,
+        autostart: bool = True,
+    ):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.high_watermark = high_watermark
+        self.delay_threshold = delay_threshold
+
+        self._buffer: deque = deque()
+        # The most recent points the sink refused, for inspection
+        self.dead_letters: deque = deque(maxlen=dead_letter_size)
+        self._cond = threading.Condition()
+        self._listeners: List[Callable[[List[LocationPoint]], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._retry_delay = 0.0
+
+        self._accepted = 0
+        self._dropped = 0
+        self._flushed = 0
+        self._flushes = 0
+        self._flush_failures = 0
+        self._rejected = 0
+        self._flush_seconds = 0.0
+        self._delayed = 0
+        self._max_delay = 0.0
+        self._last_flush_size = 0
+
+        if autostart:
+            self.start()
+
+    def add_listener(self, callback: Callable[[List[LocationPoint]], None]):
+        """Register a callback that sees every accepted batch before it is persisted"""
+        self._listeners.append(callback)
+
+    @property
+    def backpressure(self) -> bool:
+        return len(self._buffer) >= self.max_buffer * self.high_watermark
+
+    def submit(self, points: Iterable[LocationPoint]) -> Tuple[int, int]:
+        """Queue points for persistence; returns (accepted, dropped)"""
+        points = list(points)
+        with self._cond:
+            room = max(self.max_buffer - len(self._buffer), 0)
+            accepted = points[:room]
+            dropped = len(points) - len(accepted)
+
+            self._buffer.extend(accepted)
+            self._accepted += len(accepted)
+            self._dropped += dropped
+
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+        for listener in self._listeners:
+            try:
+                listener(accepted)
+            except Exception as e:
+                print(f"Error in location listener: {e}")
+
+        return len(accepted), dropped
+
+    def _take_batch(self) -> List[LocationPoint]:
+        count = min(self.batch_size, len(self._buffer))
+        return [self._buffer.popleft() for _ in range(count)]
+
+    def _write(self, batch: List[LocationPoint]) -> Tuple[int, List[LocationPoint], Optional[Exception]]:
+        """Send a batch, bisecting rejected ones; returns (written, unsent points, error that stopped it)"""
+        written = 0
+        chunks = [batch]
+        while chunks:
+            chunk = chunks.pop()
+            try:
+                self.sink(chunk)
+                written += len(chunk)
+            except RejectedBatch as e:
+                if len(chunk) == 1:
+                    print(f"Dropping location point the database refused: {e}")
+                    with self._cond:
+                        self._rejected += 1
+                        self.dead_letters.append(chunk[0])
+                    continue
+                middle = len(chunk) // 2
+                chunks.extend((chunk[middle:], chunk[:middle]))
+            except Exception as e:
+                unsent = chunk + [point for rest in reversed(chunks) for point in rest]
+                return written, unsent, e
+        return written, [], None
+
+    def flush(self) -> int:
+        """Write one batch synchronously; returns the number of points persisted"""
+        with self._cond:
+            batch = self._take_batch()
+        if not batch:
+            return 0
+
+        start = time.monotonic()
+        written, unsent, error = self._write(batch)
+        if error is not None:
+            print(f"Error flushing location batch: {error}")
+            with self._cond:
+                self._flush_failures += 1
+                self._flushed += written
+                # Put what was not written back in front, keeping whatever still fits
+                room = max(self.max_buffer - len(self._buffer), 0)
+                keep = unsent[:room]
+                self._dropped += len(unsent) - len(keep)
+                self._buffer.extendleft(reversed(keep))
+                self._retry_delay = min(max(self._retry_delay * 2, 0.1), 5.0)
+            return 0
+
+        finished = time.monotonic()
+        oldest_delay = finished - batch[0].received_monotonic
+        with self._cond:
+            self._retry_delay = 0.0
+            self._flushes += 1
+            self._flushed += written
+            self._last_flush_size = len(batch)
+            self._flush_seconds += finished - start
+            self._max_delay = max(self._max_delay, oldest_delay)
+            self._delayed += sum(1 for p in batch if finished - p.received_monotonic > self.delay_threshold)
+        return written
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if self._stopping and not self._buffer:
+                    return
+                retry_delay = self._retry_delay
+
+            if retry_delay:
+                time.sleep(retry_delay)
+            while self.flush() == self.batch_size:
+                pass
+            if self._stopping and self._retry_delay:
+                # Give up on a sink that keeps failing during shutdown
+                return
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="location-ingestor", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = len(self._buffer)
+            oldest_age = time.monotonic() - self._buffer[0].received_monotonic if pending else 0.0
+            return {
+                "accepted": self._accepted,
+                "dropped": self._dropped,
+                "flushed": self._flushed,
+                "pending": pending,
+                "buffer_capacity": self.max_buffer,
+                "backpressure": pending >= self.max_buffer * self.high_watermark,
+                "flushes": self._flushes,
+                "flush_failures": self._flush_failures,
+                "rejected": self._rejected,
+                "avg_flush_ms": round(self._flush_seconds * 1000 / self._flushes, 3) if self._flushes else 0.0,
+                "last_flush_size": self._last_flush_size,
+                "oldest_pending_seconds": round(oldest_age, 3),
+                "max_delay_seconds": round(self._max_delay, 3),
+                "delayed_points": self._delayed,
+            }
@@ -0,0 +1,120 @@
+import os
+import math
+import atexit
+from flask import Blueprint, request, jsonify
+from .location_ingest import LocationIngestor, PostgresLocationSink, parse_location_points
+from .position_index import PositionIndex
+from .sites import SITES
+
+location_bp = Blueprint('location', __name__, url_prefix='/location')
+
+# The flush thread starts with the first request each worker serves (start_location_ingestor)
+location_ingestor = LocationIngestor(
+    PostgresLocationSink(),
+    batch_size=int(os.getenv("LOCATION_FLUSH_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("LOCATION_FLUSH_INTERVAL", "1.0")),
+    max_buffer=int(os.getenv("LOCATION_BUFFER_SIZE", "50000")),
+    autostart=False,
+)
+
+def start_location_ingestor():
+    """Start flushing in this process; a no-op while the thread is running"""
+    location_ingestor.start()
+
+# Flush whatever is still buffered when the worker exits
+atexit.register(location_ingestor.stop)
+
+# Latest fix per schedule, kept in step with every accepted point
+position_index = PositionIndex(cell_deg=float(os.getenv("POSITION_INDEX_CELL_DEG", "0.01")))
+location_ingestor.add_listener(position_index.update_points)
+
+@location_bp.route('/update', methods=['POST'])
+def update_location():
+    data = request.get_json(silent=True)
+    
+    if data is None:
+        return jsonify({"error": "No input data provided"}), 400
+    
+    try:
+        points = parse_location_points(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    accepted, dropped = location_ingestor.submit(points)
+    body = {
+        "accepted": accepted,
+        "dropped": dropped,
+        "backpressure": location_ingestor.backpressure
+    }
+    
+    if accepted == 0:
+        response = jsonify(dict(body, error="Location buffer is full"))
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    
+    response = jsonify(body)
+    if body["backpressure"]:
+        # Ask clients to back off before the buffer starts dropping points
+        response.headers['Retry-After'] = '1'
+    return response, 202
+
+@location_bp.route('/stats', methods=['GET'])
+def get_location_stats():
+    return jsonify(location_ingestor.stats()), 200
+
+@location_bp.route('/latest/<string:tracking_id>', methods=['GET'])
+def get_latest_location(tracking_id):
+    position = position_index.latest(tracking_id)
+    if not position:
+        return jsonify({"error": "No position reported"}), 404
+    
+    return jsonify(position), 200
+
+def _finite(value, name):
+    try:
+        value = float(value)
+    except ValueError:
+        value = math.nan
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
+
+def _optional_finite(args, name):
+    value = args.get(name)
+    return None if value is None else _finite(value, name)
+
+@location_bp.route('/nearby', methods=['GET'])
+def get_nearby_trucks():
+    site = request.args.get('site')
+    try:
+        if site:
+            if site not in SITES:
+                return jsonify({"error": f"Unknown site: {site}"}), 400
+            lat, lon = SITES[site]
+        else:
+            lat = _finite(request.args['lat'], 'lat')
+            lon = _finite(request.args['lon'], 'lon')
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                return jsonify({"error": "lat/lon out of range"}), 400
+        
+        radius_km = _optional_finite(request.args, 'radiusKm')
+        limit = request.args.get('limit', 10, type=int)
+        max_age = _optional_finite(request.args, 'maxAgeSeconds')
+    except KeyError:
+        return jsonify({"error": "Provide a known site or numeric lat and lon"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    if radius_km is not None and radius_km <= 0:
+        return jsonify({"error": "radiusKm must be positive"}), 400
+    if max_age is not None and max_age < 0:
+        return jsonify({"error": "maxAgeSeconds must not be negative"}), 400
+    
+    if radius_km is not None:
+        trucks = position_index.within_radius(lat, lon, radius_km, limit=limit, max_age_seconds=max_age)
+    else:
+        trucks = position_index.nearest(lat, lon, n=limit, max_age_seconds=max_age)
+    
+    return jsonify({"trucks": trucks}), 200
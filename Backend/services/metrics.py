@@ -0,0 +1,267 @@
+import os
+import math
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("_lock", "_bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        # One slot per bucket plus the +Inf overflow; made cumulative on render
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        # Keyed by the values as given; they are only turned into strings on render
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def children(self) -> List[Tuple[Tuple[Any, ...], Any]]:
+        with self._lock:
+            return sorted(self._children.items(), key=lambda item: tuple(map(str, item[0])))
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in self.children():
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Bucketed observations per label set; observe() is a bisect and one lock"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in self.children():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+def stats_collector(prefix: str, stats: Callable[[], Optional[Dict[str, Any]]], counters: Iterable[str] = ()):
+    """Exports the numeric fields of an existing ``stats()`` dict at scrape time.
+
+    Fields named in ``counters`` become ``<prefix>_<field>_total`` counters,
+    other numbers and booleans become gauges. Nothing is recorded between
+    scrapes, so the hot paths keep their existing bookkeeping only.
+    """
+    counters = frozenset(counters)
+
+    def collect() -> List[str]:
+        lines = []
+        for field, value in sorted((stats() or {}).items()):
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            if field in counters:
+                name, kind = f"{prefix}_{field}_total", "counter"
+            else:
+                name, kind = f"{prefix}_{field}", "gauge"
+            lines.extend((f"# TYPE {name} {kind}", f"{name} {_number(value)}"))
+        return lines
+
+    return collect
+
+
+class MetricsRegistry:
+    """Named metrics plus scrape-time collectors, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, name: str, collect: Callable[[], List[str]]):
+        # Keyed by name, so building the app twice replaces rather than duplicates
+        with self._lock:
+            self._collectors[name] = collect
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for name, collect in collectors:
+            try:
+                lines.extend(collect())
+            except Exception as e:
+                print(f"Error collecting {name} metrics: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Time to build the response, per route", ("method", "route", "status"))
+request_db_queries = registry.histogram(
+    "http_request_db_queries", "Database statements executed per request", ("route",), QUERY_COUNT_BUCKETS)
+request_db_seconds = registry.histogram(
+    "http_request_db_seconds", "Time spent in database statements per request", ("route",))
+auth_failures = registry.counter(
+    "auth_failures_total", "Rejected logins and tokens, by reason", ("reason",))
+errors = registry.counter(
+    "backend_errors_total", "Errors caught and logged instead of raised, by operation", ("operation",))
+
+
+class RequestStats:
+    """Database work attributed to the request running in the current context"""
+
+    __slots__ = ("started", "queries", "db_seconds", "status", "profile")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.status = 500
+        self.profile = None
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def begin_request() -> RequestStats:
+    stats = RequestStats()
+    _current.set(stats)
+    return stats
+
+
+def current_request() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def end_request() -> Optional[RequestStats]:
+    stats = _current.get()
+    _current.set(None)
+    return stats
+
+
+def record_query(seconds: float):
+    """Pool query observer: charges a statement to the current request, if any"""
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+
+
+def observe_request(method: str, route: str, status: int, seconds: float, stats: Optional[RequestStats] = None):
+    request_seconds.labels(method, route, status).observe(seconds)
+    if stats is not None:
+        request_db_queries.labels(route).observe(stats.queries)
+        request_db_seconds.labels(route).observe(stats.db_seconds)
@@ -0,0 +1,142 @@
+import os
+import hmac
+import time
+from flask import Blueprint, Response, current_app, request, jsonify
+from .db_pool import get_pool, set_query_observer
+from .directions_routes import directions_proxy
+from .event_routes import event_hub, event_relay_stats, relay_state, state_handlers
+from .location_routes import location_ingestor
+from .metrics import (
+    begin_request, current_request, end_request, observe_request, record_query, registry, stats_collector,
+)
+from .password_hasher import get_hasher
+from .pickup_routes import pickup_feed
+from .profiling import get_profiler
+from .routing_routes import router
+from .traffic_routes import traffic_state
+
+metrics_bp = Blueprint('metrics', __name__, url_prefix='/metrics')
+
+# Shared secret for scrapers and operators, sent as a bearer token; unset allows anyone to read,
+# and nobody outside debug to change settings
+METRICS_KEY = os.getenv("METRICS_KEY")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# A sample rate set on one worker is set on every other one too; the profiles stay per worker
+state_handlers["profiling"] = lambda items: get_profiler().set_sample_rate(items[-1])
+
+def _denied(changes=False):
+    """The error response for a request without access, or None if it may go ahead"""
+    if not METRICS_KEY:
+        if not changes or current_app.debug:
+            return None
+        return jsonify({"error": "Changing settings is disabled until METRICS_KEY is set"}), 403
+    header = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(header.encode(), f"Bearer {METRICS_KEY}".encode()):
+        return jsonify({"error": "Invalid metrics key"}), 401
+    return None
+
+def route_label(req):
+    # The rule, not the path, so ids in URLs do not explode the label set
+    return req.url_rule.rule if req.url_rule is not None else "unmatched"
+
+def install_request_metrics(app, schedule_cache=None, schedule_snapshot=None):
+    """Time every request, charge pool statements to it and export service stats"""
+    profiler = get_profiler()
+    # Nothing here builds the pool; each worker opens its own on first use
+    set_query_observer(record_query)
+
+    # State lives in a context variable rather than flask.g, which costs a proxy lookup per access
+    @app.before_request
+    def _begin_request_metrics():
+        begin_request().profile = profiler.start()
+
+    @app.after_request
+    def _note_response_status(response):
+        stats = current_request()
+        if stats is not None:
+            stats.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _end_request_metrics(error=None):
+        # Requests rendered outside full dispatch (the ASGI handlers) never began
+        stats = end_request()
+        if stats is None:
+            return
+        seconds = time.perf_counter() - stats.started
+        req = request._get_current_object()
+        observe_request(req.method, route_label(req), stats.status, seconds, stats)
+        if stats.profile is not None:
+            profiler.finish(stats.profile, req.method, req.path, stats.status, seconds)
+
+    registry.register_collector("db_pool", stats_collector(
+        "db_pool", lambda: get_pool().stats(),
+        counters=("checkouts", "timeouts", "reconnects", "health_check_failures", "queries")))
+    if schedule_cache is not None:
+        registry.register_collector("schedule_cache", stats_collector(
+            "schedule_cache", schedule_cache.stats,
+            counters=("hits", "misses", "evictions", "invalidations", "bypassed", "not_modified")))
+    if schedule_snapshot is not None:
+        registry.register_collector("schedule_snapshot", stats_collector(
+            "schedule_snapshot", schedule_snapshot.stats,
+            counters=("full_loads", "refreshes", "rows_changed", "served", "fallbacks")))
+    registry.register_collector("password_hasher", stats_collector(
+        "password_hasher", lambda: get_hasher().stats(), counters=("completed", "rejected")))
+    registry.register_collector("event_hub", stats_collector(
+        "event_hub", event_hub.stats, counters=("published", "fanout", "dropped", "rejected", "relayed", "relay_failures")))
+    registry.register_collector("event_relay", stats_collector(
+        "event_relay", event_relay_stats, counters=("published", "received", "errors", "reconnects")))
+    registry.register_collector("location_ingest", stats_collector(
+        "location_ingest", location_ingestor.stats,
+        counters=("accepted", "dropped", "flushed", "flushes", "flush_failures", "delayed_points")))
+    registry.register_collector("pickups", stats_collector(
+        "pickups", pickup_feed.stats,
+        counters=("ticks", "assigned", "unplaced", "stale_skipped", "full_loads", "partial_loads", "load_failures")))
+    registry.register_collector("traffic", stats_collector(
+        "traffic", traffic_state.stats, counters=("events", "applied", "stale", "unknown")))
+    registry.register_collector("routing", stats_collector(
+        "routing", router.stats, counters=("repairs", "repaired_nodes", "tree_routes", "searches")))
+    registry.register_collector("directions", stats_collector(
+        "directions", directions_proxy.stats,
+        counters=("requests", "upstream_calls", "upstream_errors", "coalesced", "cache_hits", "cache_misses",
+                  "cache_evictions")))
+    registry.register_collector("profiler", stats_collector("profiler", profiler.stats, counters=("sampled",)))
+
+@metrics_bp.route('', methods=['GET'])
+def get_metrics():
+    denied = _denied()
+    if denied:
+        return denied
+    return Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@metrics_bp.route('/profiling', methods=['GET'])
+def get_profiling():
+    denied = _denied()
+    if denied:
+        return denied
+    profiler = get_profiler()
+    return jsonify(dict(profiler.stats(), worker=os.getpid(), reports=profiler.reports())), 200
+
+@metrics_bp.route('/profiling', methods=['POST'])
+def set_profiling():
+    denied = _denied(changes=True)
+    if denied:
+        return denied
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or 'sampleRate' not in data:
+        return jsonify({"error": "Missing required field: sampleRate"}), 400
+
+    try:
+        rate = float(data['sampleRate'])
+    except (TypeError, ValueError):
+        return jsonify({"error": "sampleRate must be a number"}), 400
+
+    try:
+        get_profiler().set_sample_rate(rate)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    relay_state("profiling", [rate])
+    return jsonify(get_profiler().stats()), 200
@@ -0,0 +1,146 @@
+import re
+import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+from .cargo_scheduler import CargoScheduler, CARGO_BATCH_DETAIL_QUERY, CARGO_DETAIL_QUERY
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "sql" / "migrations"
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+# Arbitrary key so concurrent setup runs apply migrations one at a time
+MIGRATION_LOCK_ID = 72731001
+
+# Migrations that predate the runner and may already exist in a database
+# created from the raw .sql files; they are recorded instead of re-run.
+BASELINE_TABLES = {1: "users", 2: "cargo_schedule"}
+
+
+def discover_migrations(directory: Path = MIGRATIONS_DIR) -> List[Tuple[int, str, Path]]:
+    migrations = []
+    for path in sorted(directory.glob("*.sql")):
+        match = MIGRATION_FILE_RE.match(path.name)
+        if not match:
+            print(f"Warning: skipping {path.name}, expected NNNN_name.sql")
+            continue
+        migrations.append((int(match.group(1)), match.group(2), path))
+
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _table_exists(cursor, table: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s)", (table,))
+    return cursor.fetchone()[0] is not None
+
+
+def run_migrations(pool, directory: Path = MIGRATIONS_DIR) -> List[int]:
+    """Apply pending migrations in version order, one transaction each.
+
+    Returns the versions applied by this run.
+    """
+    applied_now = []
+
+    for version, name, path in discover_migrations(directory):
+        with pool.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            _ensure_migrations_table(cursor)
+
+            cursor.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+            if cursor.fetchone():
+                continue
+
+            baseline_table = BASELINE_TABLES.get(version)
+            if baseline_table and _table_exists(cursor, baseline_table):
+                print(f"Recording existing {baseline_table} table as migration {version:04d}_{name}.")
+            else:
+                print(f"Applying migration {version:04d}_{name}...")
+                cursor.execute(path.read_text())
+                applied_now.append(version)
+
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (version, name)
+            )
+
+    return applied_now
+
+
+def plan_indexes(plan: Dict[str, Any]) -> List[str]:
+    """Collect every index name referenced anywhere in an EXPLAIN (FORMAT JSON) plan tree"""
+    found = []
+    if plan.get("Index Name"):
+        found.append(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        found.extend(plan_indexes(child))
+    return found
+
+
+def plan_has_seq_scan(plan: Dict[str, Any], table: str) -> bool:
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") == table:
+        return True
+    return any(plan_has_seq_scan(child, table) for child in plan.get("Plans", []))
+
+
+def hot_queries() -> List[Tuple[str, str, list, Iterable[str]]]:
+    """The queries behind /schedule, /cargo/<id> and /cargo/batch, with the indexes each may use"""
+    now = datetime.datetime(2025, 1, 1)
+    window = {"pickup_from": now, "pickup_to": now + datetime.timedelta(days=1)}
+    after = (now, "00000000-0000-0000-0000-000000000000")
+    build = CargoScheduler._schedule_query
+
+    return [
+        ("cargo detail by cargo_id", CARGO_DETAIL_QUERY, ["00000000-0000-0000-0000-000000000000"],
+         {"idx_cargo_schedule_cargo_id"}),
+        ("cargo details batch", CARGO_BATCH_DETAIL_QUERY, [["00000000-0000-0000-0000-000000000000"]],
+         {"idx_cargo_schedule_cargo_id"}),
+        ("schedule page after cursor", *build({}, after=after, limit=501),
+         {"idx_cargo_schedule_pickup_time_id", "idx_cargo_schedule_pickup_time_criticality"}),
+        ("schedule window by criticality", *build(dict(window, criticality=["high"]), limit=501),
+         {"idx_cargo_schedule_pickup_time_criticality", "idx_cargo_schedule_pickup_time_id"}),
+        ("schedule by pickup location", *build({"pickup_location": "dfw-terminal-c"}, limit=501),
+         {"idx_cargo_schedule_pickup_name"}),
+        ("schedule by dropoff location", *build({"dropoff_location": "Ups-station"}, limit=501),
+         {"idx_cargo_schedule_dropoff_name"}),
+    ]
+
+
+def check_query_plans(pool, force_index: bool = True) -> bool:
+    """EXPLAIN each hot query and report whether it is served by one of its indexes.
+
+    Development tables are tiny, so the planner rightly prefers sequential
+    scans there. With force_index the check disables seq scans for the
+    EXPLAIN so it proves the index is usable by the query as written; run
+    it with force_index=False against production-sized data.
+    """
+    ok = True
+    for label, query, params, expected in hot_queries():
+        with pool.cursor() as cursor:
+            if force_index:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cursor.fetchone()[0][0]["Plan"]
+
+        used = plan_indexes(plan)
+        matched = [name for name in used if name in expected]
+        seq_scan = plan_has_seq_scan(plan, "cargo_schedule")
+
+        if matched and not seq_scan:
+            print(f"  OK    {label}: {', '.join(matched)}")
+        else:
+            ok = False
+            detail = "seq scan on cargo_schedule" if seq_scan else f"indexes used: {', '.join(used) or 'none'}"
+            print(f"  FAIL  {label}: {detail}")
+
+    return ok
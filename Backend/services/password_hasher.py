@@ -0,0 +1,135 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+from werkzeug.security import generate_password_hash, check_password_hash
+from .process_local import ProcessLocal
+
+# Werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+# Changing it makes existing hashes get upgraded on the user's next login.
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+
+
+class HasherBusy(Exception):
+    """Raised when too many hashes are already queued; callers should answer 503."""
+
+
+def _hash(password: str, method: str) -> str:
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash: str, password: str) -> bool:
+    return check_password_hash(pwhash, password)
+
+
+class PasswordHasher:
+    """Runs CPU-bound password hashing in a dedicated process pool.
+
+    Request threads block only on their own result, never on the GIL held by
+    another thread's hash. ``max_pending`` bounds how much hashing work can be
+    queued at once; beyond that callers wait up to ``queue_timeout`` seconds
+    and then get HasherBusy instead of piling up behind a login burst.
+    With ``workers=0`` hashing runs inline, which is what tests use.
+    """
+
+    def __init__(
+        self,
+        method: str = PASSWORD_HASH_METHOD,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        queue_timeout: float = 2.0,
+        start_method: Optional[str] = None,
+    ):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or max(self.workers, 1) * 4
+        self.queue_timeout = queue_timeout
+        self._start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+        # Hash once to learn the full method string werkzeug writes
+        # (e.g. "pbkdf2:sha256" expands to include the iteration count)
+        self.method = generate_password_hash("", method=method).split("$", 1)[0]
+
+        self._stats_lock = threading.Lock()
+        self._completed = 0
+        self._rejected = 0
+        self._in_flight = 0
+        self._busy_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    context = multiprocessing.get_context(self._start_method) if self._start_method else None
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._stats_lock:
+                self._rejected += 1
+            raise HasherBusy("Password hashing queue is full")
+
+        start = time.monotonic()
+        with self._stats_lock:
+            self._in_flight += 1
+        try:
+            if self.workers == 0:
+                return fn(*args)
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+            with self._stats_lock:
+                self._in_flight -= 1
+                self._completed += 1
+                self._busy_seconds += time.monotonic() - start
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.method)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        return self._run(_verify, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        return pwhash.split("$", 1)[0] != self.method
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "method": self.method,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_ms": round(self._busy_seconds * 1000 / self._completed, 3) if self._completed else 0.0,
+            }
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+def _hasher_from_env() -> PasswordHasher:
+    workers = os.getenv("PASSWORD_HASH_WORKERS")
+    max_pending = os.getenv("PASSWORD_HASH_MAX_PENDING")
+    return PasswordHasher(
+        workers=int(workers) if workers is not None else None,
+        max_pending=int(max_pending) if max_pending else None,
+        queue_timeout=float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "2")),
+    )
+
+
+# Per process: an executor inherited across a fork has no worker processes behind it
+_hasher: ProcessLocal[PasswordHasher] = ProcessLocal(_hasher_from_env)
+
+
+def get_hasher() -> PasswordHasher:
+    """Return this process's hasher configured from the environment"""
+    return _hasher.get()
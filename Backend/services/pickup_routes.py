@@ -0,0 +1,264 @@
+import os
+import math
+import atexit
+import datetime
+from flask import Blueprint, request, jsonify
+from .cargo_scheduler import CargoScheduler
+from .dock_assignment import terminal_code
+from .event_hub import schedule_topic
+from .event_routes import event_hub
+from .leader_lock import LeaderLock
+from .leader_proxy import FORWARDED_HEADER, LeaderServer, forward
+from .metrics import errors
+from .pickup_scheduler import Pickup, PickupFeed, scheduler_from_env
+from .process_local import ProcessLocal
+from .schedule_cache import schedule_version
+
+try:
+    from apscheduler.schedulers.background import BackgroundScheduler
+except ImportError:
+    BackgroundScheduler = None
+
+pickup_bp = Blueprint('pickups', __name__, url_prefix='/pickups')
+
+# Seconds between background ticks; 0 leaves ticking to POST /pickups/tick
+PICKUP_TICK_SECONDS = float(os.getenv("PICKUP_TICK_SECONDS", "30"))
+
+# The pickup plan lives in one process; 0 keeps this one from ever being it
+PICKUP_SCHEDULER_ENABLED = os.getenv("PICKUP_SCHEDULER_ENABLED", "1") == "1"
+# 1 elects a single scheduler among the enabled processes; 0 trusts there is only one
+PICKUP_SCHEDULER_LOCK = os.getenv("PICKUP_SCHEDULER_LOCK", "1") == "1"
+# Where the elected scheduler listens for requests the other workers forward to it
+PICKUP_SCHEDULER_BIND = os.getenv("PICKUP_SCHEDULER_BIND", "127.0.0.1")
+PICKUP_SCHEDULER_PORT = int(os.getenv("PICKUP_SCHEDULER_PORT", "0"))
+# The address the others use, when it is not the bind address (e.g. binding 0.0.0.0)
+PICKUP_SCHEDULER_HOST = os.getenv("PICKUP_SCHEDULER_HOST")
+PICKUP_FORWARD_TIMEOUT = float(os.getenv("PICKUP_FORWARD_TIMEOUT", "10"))
+# Largest move, either way, POST /pickups/<id>/delay accepts in minutes (a week)
+PICKUP_MAX_DELAY_MINUTES = float(os.getenv("PICKUP_MAX_DELAY_MINUTES", str(7 * 24 * 60)))
+
+pickup_scheduler = scheduler_from_env()
+
+def _fetch_pickups(filters):
+    # Raises on database errors, so a failed read never looks like an empty schedule
+    return list(CargoScheduler().stream_schedule_items(filters))
+
+pickup_feed = PickupFeed(
+    pickup_scheduler,
+    _fetch_pickups,
+    version=schedule_version,
+    horizon_hours=float(os.getenv("PICKUP_HORIZON_HOURS", "6")),
+    resync_seconds=float(os.getenv("PICKUP_RESYNC_SECONDS", "300")),
+)
+
+def notify_assignments(assignments):
+    """Push new dock windows to drivers following those schedules"""
+    for assignment in assignments:
+        event_type = "reassignment" if assignment["reassigned"] else "assignment"
+        event_hub.publish(schedule_topic(assignment["scheduleId"]), event_type, assignment)
+    return assignments
+
+# Blueprints whose state lives in the scheduler process; see serve_from_scheduler
+SCHEDULER_BLUEPRINTS = [pickup_bp]
+
+# Per process, started when this process is elected
+_scheduler_server = ProcessLocal(lambda: LeaderServer(
+    SCHEDULER_BLUEPRINTS, PICKUP_SCHEDULER_BIND, PICKUP_SCHEDULER_PORT, PICKUP_SCHEDULER_HOST))
+
+def _leader_lock():
+    if not PICKUP_SCHEDULER_LOCK:
+        return None
+    # Processes that may not lead still use it to find the one that does
+    return LeaderLock("pickup_scheduler", advertise=lambda: _scheduler_server.get().start())
+
+# Per process: the lock is held on this process's own connection
+_leader = ProcessLocal(_leader_lock)
+
+def is_pickup_scheduler():
+    """Whether this process owns the pickup plan"""
+    if not PICKUP_SCHEDULER_ENABLED:
+        return False
+    lock = _leader.get()
+    return lock is None or lock.is_leader()
+
+def run_pickup_tick():
+    try:
+        return notify_assignments(pickup_feed.tick())
+    except Exception as e:
+        print(f"Error running pickup tick: {e}")
+        errors.labels("pickup_tick").inc()
+        return []
+
+def _scheduled_tick():
+    lock = _leader.get()
+    if lock is not None:
+        acquired = lock.acquired
+        lock.refresh()
+        if lock.acquired != acquired:
+            # Whatever this process planned before it last lost the lock is out of date
+            pickup_feed.invalidate()
+    if is_pickup_scheduler():
+        run_pickup_tick()
+
+def _background_ticks():
+    if PICKUP_TICK_SECONDS <= 0 or not PICKUP_SCHEDULER_ENABLED:
+        return None
+    if BackgroundScheduler is None:
+        print("APScheduler is not installed; pickups only tick through POST /pickups/tick")
+        return None
+    background = BackgroundScheduler(daemon=True)
+    # One tick at a time; ticks missed while one overran collapse into one
+    background.add_job(_scheduled_tick, "interval", seconds=PICKUP_TICK_SECONDS,
+                       id="pickup_tick", max_instances=1, coalesce=True)
+    background.start()
+    atexit.register(background.shutdown, wait=False)
+    return background
+
+# Per process: a scheduler inherited across a fork has no thread behind it
+_background = ProcessLocal(_background_ticks)
+
+def start_pickup_ticks():
+    """Start the background tick once per process"""
+    _background.get()
+
+def forward_to_scheduler():
+    """Answer the current request from the scheduler process, or 503 if it cannot be reached"""
+    lock = _leader.get()
+    # A forwarded request reaching a process that is no longer the scheduler is not passed on again
+    url = lock.leader_url() if lock is not None and FORWARDED_HEADER not in request.headers else None
+    response = forward(url, PICKUP_FORWARD_TIMEOUT) if url else None
+    if response is None:
+        if lock is not None:
+            lock.forget_leader_url()
+        response = jsonify({"error": "The pickup scheduler cannot be reached", "scheduler": False})
+        return response, 503, {"Retry-After": "5"}
+    return response
+
+def require_scheduler():
+    # The plan lives in the scheduler process; any other worker passes the request on to it
+    if request.endpoint == 'pickups.get_pickup_stats' or is_pickup_scheduler():
+        return None
+    return forward_to_scheduler()
+
+def serve_from_scheduler(blueprint):
+    """Answer ``blueprint``'s routes only in the scheduler process, forwarding them from the others"""
+    if blueprint not in SCHEDULER_BLUEPRINTS:
+        SCHEDULER_BLUEPRINTS.append(blueprint)
+    blueprint.before_request(require_scheduler)
+
+pickup_bp.before_request(require_scheduler)
+
+def _parse_time(value, field):
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be an ISO timestamp")
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{field} must be an ISO timestamp")
+
+def _parse_pickup(raw):
+    if not isinstance(raw, dict):
+        raise ValueError("pickup must be an object")
+    schedule_id = raw.get("scheduleId")
+    if not schedule_id or not isinstance(schedule_id, str):
+        raise ValueError("scheduleId is required")
+    if not raw.get("terminal"):
+        raise ValueError("terminal is required")
+    return Pickup(
+        schedule_id,
+        raw.get("cargoId"),
+        terminal_code(raw["terminal"]),
+        raw.get("criticality", "low"),
+        _parse_time(raw.get("pickupTime"), "pickupTime"),
+        bool(raw.get("delayed", False)),
+    )
+
+@pickup_bp.route('/queue', methods=['GET'])
+def get_pickup_queue():
+    try:
+        limit = int(request.args.get('limit', 50))
+        queue = pickup_scheduler.queue(limit, request.args.get('terminal'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"pickups": queue}), 200
+
+@pickup_bp.route('/plan', methods=['GET'])
+def get_pickup_plan():
+    try:
+        plan = pickup_scheduler.plan(request.args.get('terminal'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"assignments": plan}), 200
+
+@pickup_bp.route('/stats', methods=['GET'])
+def get_pickup_stats():
+    return jsonify(dict(pickup_feed.stats(), scheduler=is_pickup_scheduler())), 200
+
+@pickup_bp.route('/<string:schedule_id>', methods=['GET'])
+def get_pickup(schedule_id):
+    assignment = pickup_scheduler.assignment(schedule_id)
+    if not assignment:
+        return jsonify({"error": "Pickup not scheduled"}), 404
+
+    return jsonify(assignment), 200
+
+@pickup_bp.route('', methods=['POST'])
+def upsert_pickups():
+    data = request.get_json(silent=True)
+
+    if data is None:
+        return jsonify({"error": "No input data provided"}), 400
+
+    raw_pickups = data if isinstance(data, list) else [data]
+    try:
+        pickups = [_parse_pickup(raw) for raw in raw_pickups]
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    changed = sum(pickup_scheduler.upsert(pickup) for pickup in pickups)
+    return jsonify({"changed": changed}), 200
+
+@pickup_bp.route('/<string:schedule_id>/delay', methods=['POST'])
+def delay_pickup(schedule_id):
+    data = request.get_json(silent=True)
+
+    if not isinstance(data, dict) or not ('minutes' in data or 'pickupTime' in data):
+        return jsonify({"error": "Provide minutes or pickupTime"}), 400
+
+    current = pickup_scheduler.assignment(schedule_id)
+    if not current:
+        return jsonify({"error": "Pickup not scheduled"}), 404
+
+    scheduled = datetime.datetime.fromisoformat(current["pickupTime"])
+    try:
+        if 'pickupTime' in data:
+            minutes = (_parse_time(data['pickupTime'], "pickupTime") - scheduled).total_seconds() / 60
+        else:
+            minutes = float(data['minutes'])
+        # Bounded before any date arithmetic, which overflows past the year 9999
+        if not math.isfinite(minutes) or abs(minutes) > PICKUP_MAX_DELAY_MINUTES:
+            raise ValueError(f"The new pickup time must be within {PICKUP_MAX_DELAY_MINUTES:g} minutes of the current one")
+        pickup_time = scheduled + datetime.timedelta(minutes=minutes)
+    except (TypeError, ValueError, OverflowError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    pickup_scheduler.delay(schedule_id, pickup_time)
+    event_hub.publish(schedule_topic(schedule_id), "delay", {
+        "scheduleId": schedule_id,
+        "pickupTime": pickup_time.isoformat(),
+    })
+    return jsonify(pickup_scheduler.assignment(schedule_id)), 200
+
+@pickup_bp.route('/<string:schedule_id>/complete', methods=['POST'])
+def complete_pickup(schedule_id):
+    if not pickup_scheduler.complete(schedule_id):
+        return jsonify({"error": "Pickup not scheduled"}), 404
+
+    return jsonify({"scheduleId": schedule_id, "status": "completed"}), 200
+
+@pickup_bp.route('/tick', methods=['POST'])
+def tick_pickups():
+    """Run a tick now instead of waiting for the background scheduler"""
+    return jsonify({"assigned": run_pickup_tick(), "stats": pickup_feed.stats()}), 200
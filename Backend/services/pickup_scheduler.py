@@ -0,0 +1,493 @@
+import os
+import time
+import heapq
+import datetime
+import itertools
+import threading
+from collections import namedtuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .dock_assignment import CRITICALITY_RANK, dock_action, dock_message, parse_capacity, terminal_code
+from .eta_engine import CRITICALITY_PRIORITY_MINUTES
+
+Pickup = namedtuple("Pickup", ["schedule_id", "cargo_id", "terminal", "criticality", "pickup_time", "delayed"])
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def pickup_from_item(item: Dict[str, Any]) -> Pickup:
+    """A Pickup from a CargoScheduler schedule item; ValueError for an unknown terminal"""
+    return Pickup(
+        item["id"],
+        item["cargoId"],
+        terminal_code(item["pickupLocation"]),
+        item["criticality"],
+        datetime.datetime.fromisoformat(item["pickupTime"]),
+        False,
+    )
+
+
+class PickupScheduler:
+    """Hands upcoming pickups dock windows and trucks in deadline order.
+
+    Pending pickups sit in one heap keyed by their deadline, which is the
+    pickup time pulled forward by the criticality credit the ETA engine
+    already uses, then by criticality. Each ``tick`` pops what falls due
+    within ``lead_minutes`` and gives it the first slot at its terminal with a
+    free dock, at or after its pickup time, and the truck that frees up
+    first. Inserting, delaying or completing a pickup is O(log n); superseded
+    heap entries are skipped when popped rather than searched for.
+
+    ``trucks=0`` plans dock windows only, for fleets dispatched elsewhere.
+
+    This is the one dock model: every pickup also carries the ``action`` its
+    driver is told (bay, parking or rest area), so a dock is never promised
+    by two plans.
+    """
+
+    def __init__(self, docks: Optional[Dict[str, int]] = None, default_docks: int = 2, trucks: int = 0,
+                 slot_minutes: int = 15, lead_minutes: float = 60.0, turnaround_minutes: float = 60.0,
+                 max_wait_slots: int = 96):
+        if slot_minutes <= 0:
+            raise ValueError("slot_minutes must be positive")
+        self._lock = threading.Lock()
+        self._docks = {terminal_code(t): n for t, n in (docks or {}).items()}
+        self.default_docks = default_docks
+        self.slot = datetime.timedelta(minutes=slot_minutes)
+        self.lead = datetime.timedelta(minutes=lead_minutes)
+        self.turnaround = datetime.timedelta(minutes=turnaround_minutes)
+        self.max_wait_slots = max_wait_slots
+
+        self._seq = itertools.count()
+        self._heap: List[Tuple] = []
+        # Live heap entry per pending pickup; anything else in the heap is stale
+        self._entries: Dict[str, int] = {}
+        self._pending: Dict[str, Pickup] = {}
+
+        self._dispatched: Dict[str, Tuple[Pickup, Dict[str, Any]]] = {}
+        self._busy: Dict[Tuple[str, int], Dict[int, str]] = {}
+        self._busy_slots: List[Tuple[int, str]] = []
+        self._trucks: List[Tuple[datetime.datetime, int]] = [(_EPOCH, n) for n in range(1, trucks + 1)]
+        self._truck_count = trucks
+        self._reassigned = set()
+        self._completed: Dict[str, datetime.datetime] = {}
+
+        self._ticks = 0
+        self._assigned = 0
+        self._unplaced = 0
+        self._stale = 0
+        self._last_tick_ms = 0.0
+
+    def _slot_index(self, at: datetime.datetime) -> int:
+        return (at - _EPOCH) // self.slot
+
+    def _slot_start(self, index: int) -> datetime.datetime:
+        return _EPOCH + self.slot * index
+
+    def _dock_count(self, terminal: str) -> int:
+        return self._docks.get(terminal, self.default_docks)
+
+    @staticmethod
+    def _deadline(pickup: Pickup) -> datetime.datetime:
+        credit = CRITICALITY_PRIORITY_MINUTES.get(pickup.criticality, 0.0)
+        return pickup.pickup_time - datetime.timedelta(minutes=credit)
+
+    def _push(self, pickup: Pickup):
+        seq = next(self._seq)
+        self._pending[pickup.schedule_id] = pickup
+        self._entries[pickup.schedule_id] = seq
+        heapq.heappush(self._heap, (
+            self._deadline(pickup), CRITICALITY_RANK.get(pickup.criticality, len(CRITICALITY_RANK)),
+            pickup.pickup_time, pickup.schedule_id, seq,
+        ))
+        # Rebuild once stale entries outnumber live ones, so the heap stays O(pending)
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._entries):
+            self._heap = [entry for entry in self._heap if self._entries.get(entry[3]) == entry[4]]
+            heapq.heapify(self._heap)
+
+    def _drop(self, schedule_id: str) -> Optional[Pickup]:
+        """Forget a pickup, pending or dispatched, releasing its dock and truck"""
+        self._entries.pop(schedule_id, None)
+        pickup = self._pending.pop(schedule_id, None)
+        if pickup is not None:
+            return pickup
+        dispatched = self._dispatched.pop(schedule_id, None)
+        if dispatched is None:
+            return None
+        pickup, assignment = dispatched
+        docks = self._busy.get((pickup.terminal, assignment["slot"]))
+        if docks is not None:
+            docks.pop(assignment["dock"], None)
+        if assignment["truck"] is not None:
+            self._release_truck(assignment)
+        return pickup
+
+    def _release_truck(self, assignment: Dict[str, Any]):
+        # Only the truck's latest job can be handed back; earlier ones are already chained behind
+        busy_until = datetime.datetime.fromisoformat(assignment["truckFreeAt"])
+        for i, (free_at, truck) in enumerate(self._trucks):
+            if truck == assignment["truck"]:
+                if free_at == busy_until:
+                    self._trucks[i] = (assignment["_truckWasFree"], truck)
+                    heapq.heapify(self._trucks)
+                return
+
+    def upsert(self, pickup: Pickup) -> bool:
+        """Add or update one pickup; returns False when nothing changed.
+
+        A dispatched pickup whose time or terminal changes gives its dock
+        and truck back and queues again.
+        """
+        pickup = pickup._replace(terminal=terminal_code(pickup.terminal))
+        with self._lock:
+            self._completed.pop(pickup.schedule_id, None)
+            return self._upsert(pickup)
+
+    def _upsert(self, pickup: Pickup) -> bool:
+        current = self._current(pickup.schedule_id)
+        if current == pickup:
+            return False
+        if pickup.schedule_id in self._dispatched:
+            self._reassigned.add(pickup.schedule_id)
+        self._drop(pickup.schedule_id)
+        self._push(pickup)
+        return True
+
+    def _current(self, schedule_id: str) -> Optional[Pickup]:
+        pickup = self._pending.get(schedule_id)
+        if pickup is None and schedule_id in self._dispatched:
+            pickup = self._dispatched[schedule_id][0]
+        return pickup
+
+    def delay(self, schedule_id: str, pickup_time: datetime.datetime) -> Optional[Pickup]:
+        """Move a pickup to a new time; None if the pickup is unknown"""
+        with self._lock:
+            pickup = self._current(schedule_id)
+            if pickup is None:
+                return None
+            pickup = pickup._replace(pickup_time=pickup_time, delayed=True)
+            self._upsert(pickup)
+            return pickup
+
+    def complete(self, schedule_id: str) -> bool:
+        """Take a served or cancelled pickup out of the plan, freeing its dock window"""
+        with self._lock:
+            pickup = self._drop(schedule_id)
+            if pickup is None:
+                return False
+            self._reassigned.discard(schedule_id)
+            # Remembered so a resync from the schedule table does not queue it again
+            self._completed[schedule_id] = pickup.pickup_time
+            return True
+
+    def sync(self, pickups: Iterable[Pickup], window_from: datetime.datetime, window_to: datetime.datetime,
+             full: bool = False) -> int:
+        """Merge the schedule rows with pickup times in [window_from, window_to).
+
+        With ``full``, pickups in the window that are no longer in ``pickups``
+        were deleted and are dropped. Completed pickups stay completed, and
+        delays reported through ``delay`` win over the stored pickup time.
+        Returns how many pickups changed.
+        """
+        changed = 0
+        with self._lock:
+            seen = set()
+            for pickup in pickups:
+                pickup = pickup._replace(terminal=terminal_code(pickup.terminal))
+                seen.add(pickup.schedule_id)
+                if pickup.schedule_id in self._completed:
+                    continue
+                current = self._current(pickup.schedule_id)
+                if current is not None and current.delayed:
+                    continue
+                changed += self._upsert(pickup)
+
+            if full:
+                known = itertools.chain(self._pending.values(), (p for p, _ in self._dispatched.values()))
+                gone = [p.schedule_id for p in known
+                        if not p.delayed and window_from <= p.pickup_time < window_to and p.schedule_id not in seen]
+                for schedule_id in gone:
+                    self._drop(schedule_id)
+                    self._reassigned.discard(schedule_id)
+                changed += len(gone)
+                self._completed = {key: at for key, at in self._completed.items() if at >= window_from}
+        return changed
+
+    def _place(self, pickup: Pickup, now: datetime.datetime) -> Optional[Dict[str, Any]]:
+        earliest = max(pickup.pickup_time, now)
+        truck = None
+        if self._truck_count:
+            was_free, truck = self._trucks[0]
+            earliest = max(earliest, was_free)
+
+        docks = self._dock_count(pickup.terminal)
+        if docks <= 0:
+            return None
+        first = self._slot_index(earliest)
+        for index in range(first, first + self.max_wait_slots):
+            busy = self._busy.get((pickup.terminal, index))
+            if busy is not None and len(busy) >= docks:
+                continue
+            dock = next(d for d in range(1, docks + 1) if not busy or d not in busy)
+            break
+        else:
+            return None
+
+        if busy is None:
+            busy = self._busy[(pickup.terminal, index)] = {}
+            heapq.heappush(self._busy_slots, (index, pickup.terminal))
+        busy[dock] = pickup.schedule_id
+        start = self._slot_start(index)
+        action = dock_action(True, pickup.delayed)
+        assignment = {
+            "scheduleId": pickup.schedule_id,
+            "cargoId": pickup.cargo_id,
+            "terminal": pickup.terminal,
+            "criticality": pickup.criticality,
+            "pickupTime": pickup.pickup_time.isoformat(),
+            "delayed": pickup.delayed,
+            "dock": dock,
+            "slot": index,
+            "slotStart": start.isoformat(),
+            "slotEnd": (start + self.slot).isoformat(),
+            "waitMinutes": max(0.0, round((start - pickup.pickup_time).total_seconds() / 60, 1)),
+            "truck": truck,
+            "truckFreeAt": None,
+            "reassigned": pickup.schedule_id in self._reassigned,
+            "action": action,
+            "message": dock_message(action, pickup.terminal, pickup.delayed),
+            "spotReserved": True,
+        }
+        if truck is not None:
+            free_at = start + self.slot + self.turnaround
+            heapq.heapreplace(self._trucks, (free_at, truck))
+            assignment["truckFreeAt"] = free_at.isoformat()
+            assignment["_truckWasFree"] = was_free
+        self._reassigned.discard(pickup.schedule_id)
+        return assignment
+
+    def tick(self, now: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+        """Dispatch every pickup due within the lead time; returns the new assignments"""
+        now = now or datetime.datetime.utcnow()
+        start = time.perf_counter()
+        assigned, unplaced = [], []
+        with self._lock:
+            due = now + self.lead
+            while self._heap and self._heap[0][0] <= due:
+                entry = heapq.heappop(self._heap)
+                schedule_id, seq = entry[3], entry[4]
+                if self._entries.get(schedule_id) != seq:
+                    self._stale += 1
+                    continue
+                pickup = self._pending[schedule_id]
+                assignment = self._place(pickup, now)
+                if assignment is None:
+                    unplaced.append(entry)
+                    continue
+                del self._pending[schedule_id]
+                del self._entries[schedule_id]
+                self._dispatched[schedule_id] = (pickup, assignment)
+                assigned.append(self._public(assignment))
+
+            # Try the unplaceable ones again next tick, when the window has moved on
+            for entry in unplaced:
+                heapq.heappush(self._heap, entry)
+            self._expire(now)
+
+            elapsed = time.perf_counter() - start
+            self._ticks += 1
+            self._assigned += len(assigned)
+            self._unplaced += len(unplaced)
+            self._last_tick_ms = elapsed * 1000
+        return assigned
+
+    def _expire(self, now: datetime.datetime):
+        """Forget dock windows that have closed, and the pickups that held them"""
+        current = self._slot_index(now)
+        while self._busy_slots and self._busy_slots[0][0] < current:
+            index, terminal = heapq.heappop(self._busy_slots)
+            for schedule_id in self._busy.pop((terminal, index), {}).values():
+                self._dispatched.pop(schedule_id, None)
+
+    @staticmethod
+    def _public(assignment: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in assignment.items() if not key.startswith("_")}
+
+    def assignment(self, schedule_id: str) -> Optional[Dict[str, Any]]:
+        """The dispatched slot, or the pending pickup's deadline and place in the queue"""
+        with self._lock:
+            if schedule_id in self._dispatched:
+                return dict(self._public(self._dispatched[schedule_id][1]), status="dispatched")
+            pickup = self._pending.get(schedule_id)
+            if pickup is None:
+                return None
+            seq = self._entries[schedule_id]
+            key = next(entry for entry in self._heap if entry[4] == seq)
+            ahead = sum(1 for entry in self._heap if entry < key and self._entries.get(entry[3]) == entry[4])
+            return dict(self._pending_view(pickup), queuePosition=ahead + 1)
+
+    def _pending_view(self, pickup: Pickup) -> Dict[str, Any]:
+        action = dock_action(False, pickup.delayed)
+        return {
+            "scheduleId": pickup.schedule_id,
+            "cargoId": pickup.cargo_id,
+            "terminal": pickup.terminal,
+            "criticality": pickup.criticality,
+            "pickupTime": pickup.pickup_time.isoformat(),
+            "delayed": pickup.delayed,
+            "deadline": self._deadline(pickup).isoformat(),
+            "status": "pending",
+            "action": action,
+            "message": dock_message(action, pickup.terminal, pickup.delayed),
+            "spotReserved": False,
+        }
+
+    def queue(self, limit: Optional[int] = 50, terminal: Optional[str] = None) -> List[Dict[str, Any]]:
+        """The next ``limit`` pending pickups in dispatch order; all of them without a limit"""
+        terminal = terminal_code(terminal) if terminal else None
+        with self._lock:
+            live = (entry for entry in self._heap if self._entries.get(entry[3]) == entry[4]
+                    and (terminal is None or self._pending[entry[3]].terminal == terminal))
+            entries = sorted(live) if limit is None else heapq.nsmallest(limit, live)
+            return [self._pending_view(self._pending[entry[3]]) for entry in entries]
+
+    def plan(self, terminal: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Dispatched pickups by terminal, slot and dock"""
+        terminal = terminal_code(terminal) if terminal else None
+        with self._lock:
+            plan = [self._public(a) for _, a in self._dispatched.values()
+                    if terminal is None or a["terminal"] == terminal]
+        return sorted(plan, key=lambda a: (a["terminal"], a["slot"], a["dock"]))
+
+    def set_docks(self, terminal: str, docks: int, now: Optional[datetime.datetime] = None) -> List[str]:
+        """Change one terminal's dock count; returns the pickups that lost their window.
+
+        Windows from the current slot on at docks past the new count are
+        given back and their pickups queue again, ahead of the next tick.
+        Other terminals are not touched.
+        """
+        if docks < 0:
+            raise ValueError("Docks cannot be negative")
+        terminal = terminal_code(terminal)
+        now = now or datetime.datetime.utcnow()
+        with self._lock:
+            self._docks[terminal] = docks
+            current = self._slot_index(now)
+            released = [schedule_id for (t, index), busy in self._busy.items() if t == terminal and index >= current
+                        for dock, schedule_id in busy.items() if dock > docks]
+            for schedule_id in released:
+                pickup = self._dispatched[schedule_id][0]
+                self._reassigned.add(schedule_id)
+                self._drop(schedule_id)
+                self._push(pickup)
+            return released
+
+    def docks(self) -> Dict[str, int]:
+        """Docks per terminal set so far; any other terminal has ``default_docks``"""
+        with self._lock:
+            return dict(self._docks)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "dispatched": len(self._dispatched),
+                "completed": len(self._completed),
+                "heap_entries": len(self._heap),
+                "trucks": self._truck_count,
+                "ticks": self._ticks,
+                "assigned": self._assigned,
+                "unplaced": self._unplaced,
+                "stale_skipped": self._stale,
+                "last_tick_ms": round(self._last_tick_ms, 3),
+            }
+
+
+class PickupFeed:
+    """Keeps a PickupScheduler loaded with the pickups inside its look-ahead horizon.
+
+    Each tick reads only the slice of the schedule that has newly come into
+    the horizon. The whole horizon is re-read when ``version`` (the schedule
+    table's change counter) moves, or every ``resync_seconds`` while it is
+    unknown. A failed read leaves the scheduler as it was and still ticks.
+    """
+
+    def __init__(self, scheduler: PickupScheduler, fetch: Callable[[Dict[str, Any]], Iterable[Dict[str, Any]]],
+                 version: Callable[[], Optional[int]] = lambda: None, horizon_hours: float = 6.0,
+                 resync_seconds: float = 300.0):
+        self.scheduler = scheduler
+        self.fetch = fetch
+        self.version = version
+        self.horizon = datetime.timedelta(hours=horizon_hours)
+        self.resync_seconds = resync_seconds
+
+        self._loaded_to: Optional[datetime.datetime] = None
+        self._loaded_version: Optional[int] = None
+        self._last_full = 0.0
+        self.full_loads = 0
+        self.partial_loads = 0
+        self.load_failures = 0
+
+    def _pickups(self, window_from, window_to) -> List[Pickup]:
+        pickups = []
+        for item in self.fetch({"pickup_from": window_from, "pickup_to": window_to}):
+            try:
+                pickups.append(pickup_from_item(item))
+            except ValueError:
+                print(f"Skipping schedule {item['id']} with unknown pickup terminal")
+        return pickups
+
+    def refresh(self, now: datetime.datetime):
+        version = self.version()
+        window_to = now + self.horizon
+        full = (self._loaded_to is None or version != self._loaded_version
+                or (version is None and time.monotonic() - self._last_full >= self.resync_seconds))
+        window_from = now if full else self._loaded_to
+        if not full and window_to <= window_from:
+            return
+
+        try:
+            pickups = self._pickups(window_from, window_to)
+        except Exception as e:
+            print(f"Error loading pickups: {e}")
+            self.load_failures += 1
+            return
+
+        self.scheduler.sync(pickups, window_from, window_to, full=full)
+        self._loaded_to = window_to
+        self._loaded_version = version
+        if full:
+            self._last_full = time.monotonic()
+            self.full_loads += 1
+        else:
+            self.partial_loads += 1
+
+    def invalidate(self):
+        """Re-read the whole horizon on the next tick"""
+        self._loaded_to = None
+
+    def tick(self, now: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+        now = now or datetime.datetime.utcnow()
+        self.refresh(now)
+        return self.scheduler.tick(now)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            self.scheduler.stats(),
+            full_loads=self.full_loads,
+            partial_loads=self.partial_loads,
+            load_failures=self.load_failures,
+            loaded_to=self._loaded_to.isoformat() if self._loaded_to else None,
+        )
+
+
+def scheduler_from_env() -> PickupScheduler:
+    spec = os.getenv("PICKUP_DOCKS")
+    return PickupScheduler(
+        docks=parse_capacity(spec) if spec else None,
+        default_docks=int(os.getenv("PICKUP_DEFAULT_DOCKS", "2")),
+        trucks=int(os.getenv("PICKUP_TRUCKS", "0")),
+        slot_minutes=int(os.getenv("PICKUP_SLOT_MINUTES", "15")),
+        lead_minutes=float(os.getenv("PICKUP_LEAD_MINUTES", "60")),
+        turnaround_minutes=float(os.getenv("PICKUP_TURNAROUND_MINUTES", "60")),
+    )
@@ -0,0 +1,238 @@
+import math
+import heapq
+import time
+import datetime
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .geo import KM_PER_DEGREE_LAT, haversine_km
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _epoch_seconds(value) -> float:
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return (value - _EPOCH).total_seconds()
+    return float(value)
+
+
+class PositionIndex:
+    """Latest known position per schedule, with a uniform grid for spatial queries.
+
+    Positions live in parallel ``array`` columns indexed by slot, so an entry
+    costs a few dozen bytes rather than a dict per truck. The grid maps
+    ``cell_deg``-sized lat/lon cells to the slots inside them; radius and
+    nearest-N queries only look at cells that can contain a match.
+    """
+
+    def __init__(self, cell_deg: float = 0.01):
+        self.cell_deg = cell_deg
+        self._lock = threading.RLock()
+
+        self._lat = array("d")
+        self._lon = array("d")
+        self._ts = array("d")
+        self._keys: List[Optional[str]] = []
+        self._cargo_ids: List[Optional[str]] = []
+        self._cells: List[Optional[Tuple[int, int]]] = []
+        self._free: List[int] = []
+
+        self._slot_by_key: Dict[str, int] = {}
+        self._slot_by_cargo: Dict[str, int] = {}
+        self._grid: Dict[Tuple[int, int], set] = {}
+        self._bounds: Optional[List[int]] = None  # min_i, max_i, min_j, max_j
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def _grow_bounds(self, cell: Tuple[int, int]):
+        i, j = cell
+        if self._bounds is None:
+            self._bounds = [i, i, j, j]
+        else:
+            b = self._bounds
+            b[0], b[1], b[2], b[3] = min(b[0], i), max(b[1], i), min(b[2], j), max(b[3], j)
+
+    def update(self, key: str, lat: float, lon: float, timestamp=None, cargo_id: Optional[str] = None) -> bool:
+        """Record a fix; older fixes than the stored one are ignored. Returns True if stored."""
+        ts = _epoch_seconds(timestamp) if timestamp is not None else time.time()
+        cell = self._cell(lat, lon)
+
+        with self._lock:
+            slot = self._slot_by_key.get(key)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                    self._lat[slot], self._lon[slot], self._ts[slot] = lat, lon, ts
+                    self._keys[slot], self._cargo_ids[slot], self._cells[slot] = key, cargo_id, cell
+                else:
+                    slot = len(self._keys)
+                    self._lat.append(lat)
+                    self._lon.append(lon)
+                    self._ts.append(ts)
+                    self._keys.append(key)
+                    self._cargo_ids.append(cargo_id)
+                    self._cells.append(cell)
+                self._slot_by_key[key] = slot
+            else:
+                if ts < self._ts[slot]:
+                    return False
+                old_cell = self._cells[slot]
+                if old_cell != cell:
+                    members = self._grid.get(old_cell)
+                    if members is not None:
+                        members.discard(slot)
+                        if not members:
+                            del self._grid[old_cell]
+                self._lat[slot], self._lon[slot], self._ts[slot] = lat, lon, ts
+                self._cells[slot] = cell
+                if cargo_id:
+                    self._cargo_ids[slot] = cargo_id
+
+            if cargo_id:
+                self._slot_by_cargo[cargo_id] = slot
+            self._grid.setdefault(cell, set()).add(slot)
+            self._grow_bounds(cell)
+            return True
+
+    def update_points(self, points: Iterable[Any]):
+        """Ingestor listener: apply a batch of LocationPoint tuples"""
+        for p in points:
+            self.update(p.schedule_id, p.latitude, p.longitude, p.recorded_at, cargo_id=p.cargo_id)
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            slot = self._slot_by_key.pop(key, None)
+            if slot is None:
+                return False
+            cargo_id = self._cargo_ids[slot]
+            if cargo_id and self._slot_by_cargo.get(cargo_id) == slot:
+                del self._slot_by_cargo[cargo_id]
+            members = self._grid.get(self._cells[slot])
+            if members is not None:
+                members.discard(slot)
+                if not members:
+                    del self._grid[self._cells[slot]]
+            self._keys[slot] = self._cargo_ids[slot] = self._cells[slot] = None
+            self._free.append(slot)
+            return True
+
+    def _entry(self, slot: int, distance_km: Optional[float] = None) -> Dict[str, Any]:
+        entry = {
+            "scheduleId": self._keys[slot],
+            "cargoId": self._cargo_ids[slot],
+            "latitude": self._lat[slot],
+            "longitude": self._lon[slot],
+            "timestamp": datetime.datetime.utcfromtimestamp(self._ts[slot]).isoformat(),
+        }
+        if distance_km is not None:
+            entry["distanceKm"] = round(distance_km, 3)
+        return entry
+
+    def latest(self, key: str) -> Optional[Dict[str, Any]]:
+        """Latest fix by schedule id, falling back to cargo id"""
+        with self._lock:
+            slot = self._slot_by_key.get(key)
+            if slot is None:
+                slot = self._slot_by_cargo.get(key)
+            return self._entry(slot) if slot is not None else None
+
+    def positions(self, keys: Iterable[str]) -> Dict[str, Tuple[float, float]]:
+        """(lat, lon) of the latest fix for each key that has one"""
+        with self._lock:
+            found = {}
+            for key in keys:
+                slot = self._slot_by_key.get(key)
+                if slot is not None:
+                    found[key] = (self._lat[slot], self._lon[slot])
+            return found
+
+    def _ring(self, ci: int, cj: int, r: int):
+        if r == 0:
+            yield ci, cj
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield ci - r, j
+            yield ci + r, j
+        for i in range(ci - r + 1, ci + r):
+            yield i, cj - r
+            yield i, cj + r
+
+    def _ring_limit(self, ci: int, cj: int) -> int:
+        if self._bounds is None:
+            return -1
+        min_i, max_i, min_j, max_j = self._bounds
+        return max(abs(ci - min_i), abs(ci - max_i), abs(cj - min_j), abs(cj - max_j))
+
+    def _scan(self, lat: float, lon: float, r: int, min_ts: float, results: List[Tuple[float, int]]):
+        ci, cj = self._cell(lat, lon)
+        for cell in self._ring(ci, cj, r):
+            for slot in self._grid.get(cell, ()):
+                if self._ts[slot] < min_ts:
+                    continue
+                results.append((haversine_km(lat, lon, self._lat[slot], self._lon[slot]), slot))
+
+    def _cell_km(self, lat: float) -> float:
+        # Shortest side of a cell near this latitude, padded for curvature
+        return self.cell_deg * KM_PER_DEGREE_LAT * math.cos(math.radians(min(abs(lat) + 1.0, 89.0)))
+
+    def within_radius(self, lat: float, lon: float, radius_km: float, limit: Optional[int] = None,
+                      max_age_seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+        min_ts = time.time() - max_age_seconds if max_age_seconds else float("-inf")
+        with self._lock:
+            ci, cj = self._cell(lat, lon)
+            max_ring = min(int(math.ceil(radius_km / self._cell_km(lat))), self._ring_limit(ci, cj))
+            found: List[Tuple[float, int]] = []
+            if (2 * max_ring + 1) ** 2 > len(self._grid):
+                # Fewer occupied cells than cells in range: walk the occupied ones
+                for (i, j), members in self._grid.items():
+                    if abs(i - ci) <= max_ring and abs(j - cj) <= max_ring:
+                        for slot in members:
+                            if self._ts[slot] >= min_ts:
+                                found.append((haversine_km(lat, lon, self._lat[slot], self._lon[slot]), slot))
+            else:
+                for r in range(max_ring + 1):
+                    self._scan(lat, lon, r, min_ts, found)
+            matches = sorted(item for item in found if item[0] <= radius_km)
+            if limit is not None:
+                matches = matches[:limit]
+            return [self._entry(slot, distance) for distance, slot in matches]
+
+    def nearest(self, lat: float, lon: float, n: int = 5, max_radius_km: Optional[float] = None,
+                max_age_seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+        """The n closest trucks, expanding the search one ring of cells at a time"""
+        min_ts = time.time() - max_age_seconds if max_age_seconds else float("-inf")
+        with self._lock:
+            ci, cj = self._cell(lat, lon)
+            cell_km = self._cell_km(lat)
+            max_ring = self._ring_limit(ci, cj)
+            if max_radius_km is not None:
+                max_ring = min(max_ring, int(math.ceil(max_radius_km / cell_km)))
+
+            found: List[Tuple[float, int]] = []
+            for r in range(max_ring + 1):
+                self._scan(lat, lon, r, min_ts, found)
+                # Everything outside ring r is at least r cells away
+                if len(found) >= n and heapq.nsmallest(n, found)[-1][0] <= r * cell_km:
+                    break
+
+            matches = sorted(found)
+            if max_radius_km is not None:
+                matches = [item for item in matches if item[0] <= max_radius_km]
+            return [self._entry(slot, distance) for distance, slot in matches[:n]]
+
+    def __len__(self) -> int:
+        return len(self._slot_by_key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            column_bytes = sum(col.itemsize * len(col) for col in (self._lat, self._lon, self._ts))
+            return {
+                "positions": len(self._slot_by_key),
+                "slots": len(self._keys),
+                "grid_cells": len(self._grid),
+                "cell_deg": self.cell_deg,
+                "column_bytes": column_bytes,
+            }
@@ -0,0 +1,55 @@
+import os
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class ProcessLocal(Generic[T]):
+    """A value built on first use in each process.
+
+    ``get`` calls ``factory`` the first time it is asked in a process and
+    again in any process forked from it, so a gunicorn worker never shares
+    its master's sockets, threads or executor. Nothing is built at import.
+    The parent's value is dropped in the child, not closed: closing it would
+    talk over connections the parent is still using.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._value: Optional[T] = None
+        # The lock may have been held by another thread when the process forked.
+        # Windows has no fork (or register_at_fork), and spawned children import afresh
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._value = self._factory()
+                    self._pid = pid
+        return self._value
+
+    def peek(self) -> Optional[T]:
+        """This process's value, or None when it has not been built here yet"""
+        return self._value if self._pid == os.getpid() else None
+
+    def set(self, value: T):
+        with self._lock:
+            self._value = value
+            self._pid = os.getpid()
+
+    def reset(self) -> Optional[T]:
+        """Forget this process's value and return it so the caller can close it"""
+        with self._lock:
+            value = self.peek()
+            self._value = None
+            self._pid = None
+        return value
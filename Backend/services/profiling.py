@@ -0,0 +1,96 @@
+import io
+import os
+import time
+import random
+import pstats
+import cProfile
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+
+class RequestProfiler:
+    """Runs cProfile on a random sample of requests and keeps the latest reports.
+
+    At most one request is profiled at a time; a sampled request that finds
+    the profiler busy simply runs unprofiled. ``sample_rate`` can be changed
+    while the app is running, and 0 costs one comparison per request.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, keep: int = 20, top: int = 25):
+        self.sample_rate = sample_rate
+        self.top = top
+        self._busy = threading.Lock()
+        self._reports = deque(maxlen=keep)
+        self._reports_lock = threading.Lock()
+        self._sampled = 0
+
+    def set_sample_rate(self, rate: float):
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError("sampleRate must be between 0 and 1")
+        self.sample_rate = rate
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """A running profile if this request is sampled, else None"""
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except (ValueError, RuntimeError):
+            # Another profiler (a debugger, a sampling tool) owns the hook
+            self._busy.release()
+            return None
+        return profile
+
+    def finish(self, profile: cProfile.Profile, method: str, path: str, status: int, seconds: float):
+        profile.disable()
+        self._busy.release()
+
+        # Formatting takes milliseconds, so it waits until someone reads the report
+        with self._reports_lock:
+            self._sampled += 1
+            self._reports.append({
+                "method": method,
+                "path": path,
+                "status": status,
+                "ms": round(seconds * 1000, 3),
+                "at": time.time(),
+                "profile": profile,
+            })
+
+    def _format(self, profile) -> str:
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(self.top)
+        return out.getvalue()
+
+    def reports(self) -> List[Dict[str, Any]]:
+        with self._reports_lock:
+            reports = list(reversed(self._reports))
+        return [dict(report, profile=self._format(report["profile"])) for report in reports]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._reports_lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "sampled": self._sampled,
+                "kept": len(self._reports),
+            }
+
+
+_profiler: Optional[RequestProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> RequestProfiler:
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = RequestProfiler(
+                    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+                    keep=int(os.getenv("PROFILE_KEEP", "20")),
+                )
+    return _profiler
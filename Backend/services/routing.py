@@ -0,0 +1,413 @@
+import os
+import json
+import math
+import time
+import heapq
+import threading
+from array import array
+from collections import namedtuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .geo import haversine_km
+from .position_index import PositionIndex
+from .sites import DROPOFF_SITES
+
+INF = float("inf")
+
+# Seconds added to every edge into an intersection watched by a DALI agent in this state
+STATE_PENALTY_SECONDS = {
+    "G": 0.0,
+    "B": 0.0,
+    "Y": float(os.getenv("ROUTING_YELLOW_PENALTY_SECONDS", "120")),
+    "R": float(os.getenv("ROUTING_RED_PENALTY_SECONDS", "900")),
+}
+
+RouteTree = namedtuple("RouteTree", ["target", "dist", "next_edge"])
+
+
+def encode_polyline(points: Iterable[Tuple[float, float]]) -> str:
+    """Google's encoded polyline format, which the mobile app already decodes"""
+    out = []
+    previous_lat = previous_lon = 0
+    for lat, lon in points:
+        lat, lon = round(lat * 1e5), round(lon * 1e5)
+        for delta in (lat - previous_lat, lon - previous_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        previous_lat, previous_lon = lat, lon
+    return "".join(out)
+
+
+class RoadGraph:
+    """Directed road graph in compressed adjacency arrays.
+
+    Out-edges of node ``u`` are ``offsets[u]:offsets[u + 1]`` in ``targets``,
+    ``base`` (free-flow seconds), ``length`` (metres) and ``highway``; the
+    reverse index lists the in-edges of each node the same way. Live weights
+    are the base time scaled by a per-edge ``factor`` (at least 1) plus the
+    ``penalty`` of the node the edge enters, so both can change in place.
+
+    The file is JSON: ``nodes`` as [lat, lon], ``sites`` mapping names to
+    nodes and ``edges`` as [from, to, metres, km/h, highway, oneway].
+    """
+
+    def __init__(self, nodes: List[List[float]], edges: List[List[float]], sites: Optional[Dict[str, int]] = None):
+        count = len(nodes)
+        self.lat = array("d", (node[0] for node in nodes))
+        self.lon = array("d", (node[1] for node in nodes))
+        self.sites = dict(sites or {})
+
+        directed = []
+        for u, v, metres, speed, highway, oneway in edges:
+            u, v = int(u), int(v)
+            if not (0 <= u < count and 0 <= v < count) or speed <= 0:
+                raise ValueError(f"Invalid edge {u}->{v}")
+            seconds = metres / (speed / 3.6)
+            directed.append((u, v, seconds, metres, highway))
+            if not oneway:
+                directed.append((v, u, seconds, metres, highway))
+        directed.sort(key=lambda edge: edge[0])
+
+        self.offsets = array("l", [0] * (count + 1))
+        for u, *_ in directed:
+            self.offsets[u + 1] += 1
+        for u in range(count):
+            self.offsets[u + 1] += self.offsets[u]
+        self.sources = array("l", (edge[0] for edge in directed))
+        self.targets = array("l", (edge[1] for edge in directed))
+        self.base = array("d", (edge[2] for edge in directed))
+        self.length = array("d", (edge[3] for edge in directed))
+        self.highway = bytearray(bool(edge[4]) for edge in directed)
+        self.factor = array("d", [1.0]) * len(directed)
+        self.penalty = array("d", [0.0]) * count
+
+        by_target = sorted(range(len(directed)), key=lambda e: self.targets[e])
+        self.in_offsets = array("l", [0] * (count + 1))
+        for e in by_target:
+            self.in_offsets[self.targets[e] + 1] += 1
+        for v in range(count):
+            self.in_offsets[v + 1] += self.in_offsets[v]
+        self.in_edges = array("l", by_target)
+
+        # Seconds per straight-line km on the fastest edge: keeps the A* estimate a lower bound
+        self.pace = min((self.base[e] / straight for e in range(len(directed))
+                         for straight in [self._straight_km(self.sources[e], self.targets[e])] if straight > 0),
+                        default=0.0)
+
+        self._index = PositionIndex(cell_deg=0.01)
+        for node in range(count):
+            self._index.update(str(node), self.lat[node], self.lon[node], 0)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RoadGraph":
+        return cls(data["nodes"], data["edges"], data.get("sites"))
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def _straight_km(self, u: int, v: int) -> float:
+        return haversine_km(self.lat[u], self.lon[u], self.lat[v], self.lon[v])
+
+    @property
+    def node_count(self) -> int:
+        return len(self.lat)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    def weight(self, e: int) -> float:
+        return self.base[e] * self.factor[e] + self.penalty[self.targets[e]]
+
+    def edge(self, u: int, v: int) -> Optional[int]:
+        for e in range(self.offsets[u], self.offsets[u + 1]):
+            if self.targets[e] == v:
+                return e
+        return None
+
+    def nearest(self, lat: float, lon: float, max_km: Optional[float] = None) -> Optional[Tuple[int, float]]:
+        """(node, km) closest to a point"""
+        found = self._index.nearest(lat, lon, 1, max_radius_km=max_km)
+        return (int(found[0]["scheduleId"]), found[0]["distanceKm"]) if found else None
+
+
+class Router:
+    """Shortest paths by live travel time, with a route tree kept per destination.
+
+    Each tree holds every node's time to its destination and the first edge
+    to take, built by a Dijkstra over the in-edges. When an edge weight
+    changes only the part of each tree it touches is redone: a cheaper edge
+    propagates outwards from its tail, and a dearer tree edge re-solves just
+    the nodes whose route used it. Other destinations, and routes that avoid
+    highways, go through A*.
+
+    DALI agents are attached to their nearest intersection; the penalty of
+    its worst state is added to the edges entering it.
+    """
+
+    def __init__(self, graph: RoadGraph, destinations: Optional[Iterable[str]] = None, snap_km: float = 1.0):
+        self.graph = graph
+        self.snap_km = snap_km
+        self._lock = threading.RLock()
+        self._agent_nodes: Dict[str, int] = {}
+        self._node_agents: Dict[int, Dict[str, str]] = {}
+
+        self.repairs = 0
+        self.repaired_nodes = 0
+        self.repair_seconds = 0.0
+        self.tree_routes = 0
+        self.searches = 0
+        self.search_seconds = 0.0
+
+        names = [name for name in (destinations or DROPOFF_SITES) if name in graph.sites]
+        self.trees: Dict[str, RouteTree] = {name: self._build_tree(graph.sites[name]) for name in names}
+
+    def _build_tree(self, target: int) -> RouteTree:
+        g = self.graph
+        dist = array("d", [INF]) * g.node_count
+        next_edge = array("l", [-1]) * g.node_count
+        dist[target] = 0.0
+        self._propagate(dist, next_edge, [(0.0, target)])
+        return RouteTree(target, dist, next_edge)
+
+    def _propagate(self, dist: array, next_edge: array, heap: List[Tuple[float, int]]) -> int:
+        """Dijkstra towards the tree's target from the nodes already in ``heap``"""
+        g = self.graph
+        sources, in_offsets, in_edges, weight = g.sources, g.in_offsets, g.in_edges, g.weight
+        settled = 0
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[node]:
+                continue
+            settled += 1
+            for i in range(in_offsets[node], in_offsets[node + 1]):
+                e = in_edges[i]
+                u = sources[e]
+                nd = d + weight(e)
+                if nd < dist[u]:
+                    dist[u] = nd
+                    next_edge[u] = e
+                    heapq.heappush(heap, (nd, u))
+        return settled
+
+    def rebuild(self):
+        with self._lock:
+            self.trees = {name: self._build_tree(tree.target) for name, tree in self.trees.items()}
+
+    def _repair(self, tree: RouteTree, e: int, old: float, new: float) -> int:
+        g = self.graph
+        dist, next_edge = tree.dist, tree.next_edge
+        u, v = g.sources[e], g.targets[e]
+        if new < old:
+            nd = new + dist[v]
+            if nd >= dist[u]:
+                return 0
+            dist[u], next_edge[u] = nd, e
+            return self._propagate(dist, next_edge, [(nd, u)])
+        if next_edge[u] != e:
+            return 0
+
+        # Nodes whose route runs through u: walk the tree backwards from it
+        affected = {u}
+        stack = [u]
+        while stack:
+            node = stack.pop()
+            for i in range(g.in_offsets[node], g.in_offsets[node + 1]):
+                e2 = g.in_edges[i]
+                p = g.sources[e2]
+                if next_edge[p] == e2 and p not in affected:
+                    affected.add(p)
+                    stack.append(p)
+        for node in affected:
+            dist[node], next_edge[node] = INF, -1
+
+        # Re-enter each from its best neighbour outside the subtree, then settle the rest
+        heap = []
+        for node in affected:
+            for e2 in range(g.offsets[node], g.offsets[node + 1]):
+                y = g.targets[e2]
+                if y not in affected and dist[y] < INF:
+                    nd = g.weight(e2) + dist[y]
+                    if nd < dist[node]:
+                        dist[node], next_edge[node] = nd, e2
+            if dist[node] < INF:
+                heap.append((dist[node], node))
+        heapq.heapify(heap)
+        self._propagate(dist, next_edge, heap)
+        return len(affected)
+
+    def _changed(self, edges: Iterable[int], old_weights: List[float]):
+        started = time.perf_counter()
+        for e, old in zip(edges, old_weights):
+            new = self.graph.weight(e)
+            if new == old:
+                continue
+            self.repairs += 1
+            for tree in self.trees.values():
+                self.repaired_nodes += self._repair(tree, e, old, new)
+        self.repair_seconds += time.perf_counter() - started
+
+    def set_edge_factor(self, u: int, v: int, factor: float) -> bool:
+        """Scale the free-flow time of edge u->v (1 = free flow); returns False if there is no such edge"""
+        if not factor >= 1.0 or math.isinf(factor):
+            raise ValueError("factor must be a finite number of at least 1")
+        with self._lock:
+            e = self.graph.edge(u, v) if 0 <= u < self.graph.node_count else None
+            if e is None:
+                return False
+            old = self.graph.weight(e)
+            self.graph.factor[e] = factor
+            self._changed([e], [old])
+            return True
+
+    def set_node_penalty(self, node: int, seconds: float):
+        """Delay added to every edge entering ``node``"""
+        g = self.graph
+        with self._lock:
+            if g.penalty[node] == seconds:
+                return
+            edges = [g.in_edges[i] for i in range(g.in_offsets[node], g.in_offsets[node + 1])]
+            old = [g.weight(e) for e in edges]
+            g.penalty[node] = seconds
+            self._changed(edges, old)
+
+    def update_agents(self, agents: Iterable[Any]):
+        """TrafficState listener: attach agents to intersections and apply their state penalties"""
+        with self._lock:
+            touched = set()
+            for agent in agents:
+                previous = self._agent_nodes.pop(agent.code, None)
+                if previous is not None:
+                    self._node_agents[previous].pop(agent.code, None)
+                    touched.add(previous)
+                found = self.graph.nearest(agent.latitude, agent.longitude, self.snap_km)
+                if found is None:
+                    continue
+                node = found[0]
+                self._agent_nodes[agent.code] = node
+                self._node_agents.setdefault(node, {})[agent.code] = agent.state
+                touched.add(node)
+            for node in touched:
+                states = self._node_agents.get(node) or {}
+                self.set_node_penalty(node, max((STATE_PENALTY_SECONDS[s] for s in states.values()), default=0.0))
+                if not states:
+                    self._node_agents.pop(node, None)
+
+    def _astar(self, source: int, target: int, avoid_highways: bool) -> Optional[Tuple[float, List[int]]]:
+        g = self.graph
+        lat, lon, pace = g.lat[target], g.lon[target], g.pace
+        dist = array("d", [INF]) * g.node_count
+        prev = array("l", [-1]) * g.node_count
+        dist[source] = 0.0
+        heap = [(haversine_km(g.lat[source], g.lon[source], lat, lon) * pace, source)]
+        while heap:
+            _, node = heapq.heappop(heap)
+            if node == target:
+                break
+            d = dist[node]
+            for e in range(g.offsets[node], g.offsets[node + 1]):
+                if avoid_highways and g.highway[e]:
+                    continue
+                v = g.targets[e]
+                nd = d + g.weight(e)
+                if nd < dist[v]:
+                    dist[v] = nd
+                    prev[v] = e
+                    heapq.heappush(heap, (nd + haversine_km(g.lat[v], g.lon[v], lat, lon) * pace, v))
+        if dist[target] == INF:
+            return None
+        edges = []
+        node = target
+        while node != source:
+            edges.append(prev[node])
+            node = g.sources[prev[node]]
+        edges.reverse()
+        return dist[target], edges
+
+    def _tree_path(self, tree: RouteTree, source: int) -> Optional[Tuple[float, List[int]]]:
+        if tree.dist[source] == INF:
+            return None
+        edges = []
+        node = source
+        while node != tree.target:
+            e = tree.next_edge[node]
+            edges.append(e)
+            node = self.graph.targets[e]
+        return tree.dist[source], edges
+
+    def route(self, lat: float, lon: float, destination: Any, avoid_highways: bool = False) -> Optional[Dict[str, Any]]:
+        """Fastest route from a point to a site name or a (lat, lon); None when unreachable.
+
+        Raises ValueError when either end is further than ``snap_km`` from the graph.
+        """
+        g = self.graph
+        start = g.nearest(lat, lon, self.snap_km)
+        if start is None:
+            raise ValueError("Origin is not near the road graph")
+        if isinstance(destination, str):
+            if destination not in g.sites:
+                raise ValueError(f"Unknown destination: {destination}")
+            target = g.sites[destination]
+        else:
+            end = g.nearest(destination[0], destination[1], self.snap_km)
+            if end is None:
+                raise ValueError("Destination is not near the road graph")
+            target = end[0]
+
+        with self._lock:
+            tree = self.trees.get(destination) if isinstance(destination, str) and not avoid_highways else None
+            if tree is not None:
+                found = self._tree_path(tree, start[0])
+                self.tree_routes += 1
+            else:
+                started = time.perf_counter()
+                found = self._astar(start[0], target, avoid_highways)
+                self.searches += 1
+                self.search_seconds += time.perf_counter() - started
+            if found is None:
+                return None
+            seconds, edges = found
+            nodes = [start[0]] + [g.targets[e] for e in edges]
+            agents = [{"code": code, "state": state}
+                      for node in nodes for code, state in sorted(self._node_agents.get(node, {}).items())]
+
+        return {
+            "destination": destination if isinstance(destination, str) else None,
+            "source": "tree" if tree is not None else "search",
+            "durationSeconds": round(seconds, 1),
+            "distanceKm": round(sum(g.length[e] for e in edges) / 1000, 3),
+            "snapKm": start[1],
+            "nodes": len(nodes),
+            "agents": agents,
+            "polyline": encode_polyline((g.lat[node], g.lon[node]) for node in nodes),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "nodes": self.graph.node_count,
+                "edges": self.graph.edge_count,
+                "trees": len(self.trees),
+                "agents_attached": len(self._agent_nodes),
+                "penalised_nodes": sum(1 for p in self.graph.penalty if p),
+                "repairs": self.repairs,
+                "repaired_nodes": self.repaired_nodes,
+                "avg_repair_ms": round(self.repair_seconds * 1000 / self.repairs, 3) if self.repairs else 0.0,
+                "tree_routes": self.tree_routes,
+                "searches": self.searches,
+                "avg_search_ms": round(self.search_seconds * 1000 / self.searches, 3) if self.searches else 0.0,
+            }
+
+
+def graph_from_env() -> RoadGraph:
+    """The graph file named by ROUTING_GRAPH_PATH, or the synthetic street grid"""
+    path = os.getenv("ROUTING_GRAPH_PATH")
+    if path:
+        return RoadGraph.load(path)
+    from .synthetic_data import road_graph
+    print("ROUTING_GRAPH_PATH is not set; routing over the synthetic street grid")
+    return RoadGraph.from_dict(road_graph(int(os.getenv("ROUTING_GRAPH_SEED", "1"))))
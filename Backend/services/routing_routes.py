@@ -0,0 +1,69 @@
+import os
+import math
+from flask import Blueprint, request, jsonify
+from .event_routes import publish_denied, relay_state, state_handlers
+from .routing import Router, graph_from_env
+from .traffic_routes import traffic_state
+
+routing_bp = Blueprint('routing', __name__, url_prefix='/routing')
+
+router = Router(graph_from_env(), snap_km=float(os.getenv("ROUTING_SNAP_KM", "1.0")))
+
+# DALI agents weigh on the intersections nearest to them, now and as their states change
+router.update_agents(traffic_state.agent_states())
+traffic_state.add_listener(router.update_agents)
+
+# Edge factors set on one worker are set on every other one too
+state_handlers["routing_edges"] = lambda items: [router.set_edge_factor(u, v, factor) for u, v, factor in items]
+
+def _point(args, lat_key, lon_key):
+    try:
+        return float(args[lat_key]), float(args[lon_key])
+    except KeyError as e:
+        raise ValueError(f"{e.args[0]} is required")
+
+@routing_bp.route('/route', methods=['GET'])
+def get_route():
+    """Fastest route from a point to a site, or to toLat/toLon"""
+    try:
+        lat, lon = _point(request.args, 'fromLat', 'fromLon')
+        destination = request.args.get('to') or _point(request.args, 'toLat', 'toLon')
+        avoid = request.args.get('avoid', '')
+        if avoid not in ('', 'highways'):
+            raise ValueError("avoid must be 'highways'")
+        route = router.route(lat, lon, destination, avoid_highways=avoid == 'highways')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if route is None:
+        return jsonify({"error": "No route found"}), 404
+
+    return jsonify(route), 200
+
+@routing_bp.route('/edges', methods=['POST'])
+def set_edge_factors():
+    """Slow down (or restore) road segments: {"from", "to", "factor"} or a list of them"""
+    denied = publish_denied()
+    if denied:
+        return denied
+
+    data = request.get_json(silent=True)
+
+    if data is None:
+        return jsonify({"error": "No input data provided"}), 400
+
+    changes = data if isinstance(data, list) else [data]
+    try:
+        edges = [(int(raw['from']), int(raw['to']), float(raw.get('factor', 1.0))) for raw in changes]
+        if any(not factor >= 1.0 or math.isinf(factor) for _, _, factor in edges):
+            raise ValueError("factor must be a finite number of at least 1")
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid edge: {e}"}), 400
+
+    updated = sum(router.set_edge_factor(u, v, factor) for u, v, factor in edges)
+    relay_state("routing_edges", edges)
+    return jsonify({"updated": updated, "missing": len(changes) - updated}), 200
+
+@routing_bp.route('/stats', methods=['GET'])
+def get_routing_stats():
+    return jsonify(router.stats()), 200
@@ -0,0 +1,235 @@
+import os
+import select
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import psycopg2
+
+from .db_pool import connection_params
+from .process_local import ProcessLocal
+from .ttl_cache import TTLCache
+
+CHANGE_CHANNEL = "cargo_schedule_changed"
+
+_MISSING = object()
+
+
+def cache_key(*parts) -> tuple:
+    """Hashable key for a cached read; dicts and lists (e.g. schedule filters) are frozen"""
+    def freeze(value):
+        if isinstance(value, dict):
+            return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+        if isinstance(value, (list, tuple)):
+            return tuple(freeze(v) for v in value)
+        return value
+    return tuple(freeze(part) for part in parts)
+
+
+class ScheduleCache:
+    """Read-through cache for cargo_schedule reads, invalidated by table changes.
+
+    ``version`` mirrors the database change counter maintained by the
+    cargo_schedule trigger. Whenever it moves the whole cache is dropped,
+    and ETags are derived from it so every worker hands out the same tag
+    for the same data. While the version is unknown (the listener is not
+    connected) reads bypass the cache and no ETags are issued, unless the
+    cache runs in TTL-only mode (``listening=False``).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0, listening: bool = True):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.listening = listening
+        self.version: Optional[int] = None
+        # Bumped on every invalidation so loads that raced one are not stored
+        self._generation = 0
+        self.bypassed = 0
+        self.not_modified = 0
+
+    @property
+    def active(self) -> bool:
+        return self.version is not None or not self.listening
+
+    def set_version(self, version: Optional[int]):
+        with self._lock:
+            if version is not None and self.version is not None and version <= self.version:
+                return
+            self.version = version
+            self._generation += 1
+            self._cache.clear()
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable, default: Any = _MISSING) -> Any:
+        if not self.active:
+            self.bypassed += 1
+            return default
+        return self._cache.get(key, default)
+
+    def put(self, key: Hashable, value: Any, generation: int):
+        """Store a value loaded while ``generation`` was current; dropped if it is stale"""
+        with self._lock:
+            if generation == self._generation and self.active:
+                self._cache.set(key, value)
+
+    def fetch(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Cached value for ``key``, calling ``loader`` on a miss; loader errors are not cached"""
+        value = self.get(key)
+        if value is not _MISSING:
+            return value
+        generation = self._generation
+        value = loader()
+        self.put(key, value, generation)
+        return value
+
+    def etag(self, key: Hashable) -> Optional[str]:
+        version = self.version
+        if version is None:
+            return None
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+        return f"{version}-{digest}"
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        stats.update({
+            "version": self.version,
+            "listening": self.listening,
+            "bypassed": self.bypassed,
+            "not_modified": self.not_modified,
+        })
+        return stats
+
+
+class ChangeListener:
+    """Background LISTEN on the cargo_schedule change channel.
+
+    Holds one dedicated connection outside the pool. On connect it reads
+    the current counter, then applies every NOTIFY payload to the cache.
+    If the connection drops, notifications may have been missed, so the
+    cache is disabled until the listener reconnects and re-reads the counter.
+    """
+
+    def __init__(self, cache: ScheduleCache, channel: str = CHANGE_CHANNEL, poll_interval: float = 5.0,
+                 max_retry_delay: float = 30.0, connect: Callable[[], Any] = None):
+        self.cache = cache
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self.max_retry_delay = max_retry_delay
+        self._connect = connect or (lambda: psycopg2.connect(**connection_params()))
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.reconnects = 0
+
+    def _listen(self, conn):
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+            cursor.execute("SELECT version FROM cargo_schedule_version")
+            row = cursor.fetchone()
+        # Without the migration there is nothing to listen to; stay disabled
+        if row is None:
+            raise RuntimeError("cargo_schedule_version is empty")
+        self.cache.set_version(row[0])
+
+        while not self._stopping.is_set():
+            if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                continue
+            conn.poll()
+            versions = [int(notify.payload) for notify in conn.notifies if notify.channel == self.channel]
+            conn.notifies.clear()
+            if versions:
+                self.cache.set_version(max(versions))
+
+    def _run(self):
+        delay = 1.0
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                delay = 1.0
+                self._listen(conn)
+            except Exception as e:
+                print(f"Schedule cache listener error: {e}")
+                self.cache.set_version(None)
+                self.reconnects += 1
+                self._stopping.wait(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="schedule-cache-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_schedule_cache: Optional[ScheduleCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_schedule_cache() -> Optional[ScheduleCache]:
+    """Process-wide schedule cache, or None when SCHEDULE_CACHE_SIZE is 0.
+
+    Building it starts nothing; each process follows changes once
+    ``start_schedule_cache_listener`` is called there.
+    """
+    global _schedule_cache
+    if _schedule_cache is None:
+        with _cache_lock:
+            if _schedule_cache is None:
+                maxsize = int(os.getenv("SCHEDULE_CACHE_SIZE", "1024"))
+                if maxsize < 1:
+                    return None
+                _schedule_cache = ScheduleCache(
+                    maxsize=maxsize,
+                    ttl=float(os.getenv("SCHEDULE_CACHE_TTL", "30")),
+                    listening=os.getenv("SCHEDULE_CACHE_LISTEN", "1") != "0",
+                )
+    return _schedule_cache
+
+
+def _listener_for_cache() -> Optional[ChangeListener]:
+    cache = get_schedule_cache()
+    if cache is None or not cache.listening:
+        return None
+    listener = ChangeListener(cache)
+    listener.start()
+    return listener
+
+
+# Threads do not survive a fork, so every worker starts its own
+_listener: ProcessLocal[Optional[ChangeListener]] = ProcessLocal(_listener_for_cache)
+
+
+def start_schedule_cache_listener():
+    """Follow cargo_schedule changes in this process, once"""
+    _listener.get()
+
+
+def schedule_version() -> Optional[int]:
+    """The cargo_schedule change counter as last announced to this process, or None if unknown"""
+    cache = get_schedule_cache()
+    return cache.version if cache is not None and cache.listening else None
+
+
+def stop_schedule_cache_listener():
+    listener = _listener.peek()
+    if listener is not None:
+        listener.stop()
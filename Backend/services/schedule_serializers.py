@@ -0,0 +1,137 @@
+import json
+import decimal
+from json.encoder import encode_basestring_ascii
+from typing import Any, Dict, Optional, Tuple
+
+from .cargo_scheduler import CARGO_DETAIL_QUERY, SCHEDULE_COLUMNS, CargoScheduler, split_page
+
+
+def _json_default(value):
+    # Matches Flask's JSON provider for the types these payloads contain
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps(value) -> str:
+    """Same output as Flask's jsonify in non-debug mode, without the trailing newline"""
+    return json.dumps(value, default=_json_default, sort_keys=True, separators=(",", ":"))
+
+
+def _string(value) -> str:
+    return "null" if value is None else encode_basestring_ascii(value)
+
+
+def _number_or_string(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, decimal.Decimal):
+        return encode_basestring_ascii(str(value))
+    return json.dumps(value)
+
+
+class DictSerializer:
+    """Builds the same per-row dicts as CargoScheduler, then dumps them.
+
+    The reference encoder: output is byte-identical to ``jsonify``.
+    """
+
+    name = "dict"
+    page_columns = SCHEDULE_COLUMNS
+    detail_query = CARGO_DETAIL_QUERY
+
+    def encode_page(self, rows, limit: int) -> Tuple[str, Optional[str]]:
+        rows, next_cursor = split_page(rows, limit)
+        return _dumps([CargoScheduler._schedule_item(row) for row in rows]), next_cursor
+
+    def encode_detail(self, row) -> Optional[str]:
+        return _dumps(CargoScheduler._cargo_detail(row)) if row else None
+
+
+class TupleSerializer(DictSerializer):
+    """Formats row tuples straight into JSON text, skipping the dict per row.
+
+    Keys are emitted in the sorted order jsonify uses and strings go through
+    the C escaper, so output stays byte-identical to ``DictSerializer``.
+    """
+
+    name = "tuple"
+
+    SCHEDULE_ITEM = (
+        '{{"cargoId":"{}","criticality":{},"dropoffLocation":{},"id":"{}",'
+        '"pickupLocation":{},"pickupTime":"{}"}}'
+    )
+    CARGO_DETAIL = (
+        '{{"cargoId":"{}","criticality":{},"description":{},"dropoffLocation":{},'
+        '"pickupLocation":{},"pickupTime":"{}","weight":{}}}'
+    )
+
+    def encode_page(self, rows, limit: int) -> Tuple[str, Optional[str]]:
+        rows, next_cursor = split_page(rows, limit)
+        item = self.SCHEDULE_ITEM.format
+        body = ",".join([
+            item(row[1], _string(row[3]), _string(row[5]), row[0], _string(row[4]), row[2].isoformat())
+            for row in rows
+        ])
+        return f"[{body}]", next_cursor
+
+    def encode_detail(self, row) -> Optional[str]:
+        if not row:
+            return None
+        return self.CARGO_DETAIL.format(
+            row[0], _string(row[5]), _string(row[1]), _string(row[4]),
+            _string(row[3]), row[6].isoformat(), _number_or_string(row[2])
+        )
+
+
+# pickup_time formatted like datetime.isoformat(): microseconds only when non-zero.
+# The modulo is escaped because these queries always run with parameters.
+_PG_ISO_PICKUP_TIME = """
+    to_char(pickup_time, CASE WHEN date_part('microseconds', pickup_time)::int %% 1000000 = 0
+                              THEN 'YYYY-MM-DD"T"HH24:MI:SS' ELSE 'YYYY-MM-DD"T"HH24:MI:SS.US' END)
+"""
+
+
+class PostgresJsonSerializer:
+    """Has PostgreSQL render each row with ``row_to_json`` and passes the text through.
+
+    Python only joins the rows. The JSON decodes to the same values as the
+    other encoders but is not byte-identical, since PostgreSQL leaves
+    non-ASCII characters unescaped.
+    """
+
+    name = "pg"
+    # JSON text first, then the keyset columns the next-page cursor needs
+    page_columns = f"""
+        (SELECT row_to_json(j) FROM (
+            SELECT cargo_id AS "cargoId", criticality, dropoff_location AS "dropoffLocation", id,
+                   pickup_location AS "pickupLocation", {_PG_ISO_PICKUP_TIME} AS "pickupTime"
+        ) j)::text, pickup_time, id
+    """
+    detail_query = f"""
+        SELECT (SELECT row_to_json(j) FROM (
+            SELECT cargo_id AS "cargoId", criticality, description, dropoff_location AS "dropoffLocation",
+                   pickup_location AS "pickupLocation", {_PG_ISO_PICKUP_TIME} AS "pickupTime", weight::text AS weight
+        ) j)::text
+        FROM cargo_schedule
+        WHERE cargo_id = %s
+    """
+
+    def encode_page(self, rows, limit: int) -> Tuple[str, Optional[str]]:
+        rows, next_cursor = split_page(rows, limit, time_index=1, id_index=2)
+        return "[" + ",".join([row[0] for row in rows]) + "]", next_cursor
+
+    def encode_detail(self, row) -> Optional[str]:
+        return row[0] if row else None
+
+
+SERIALIZERS: Dict[str, Any] = {
+    serializer.name: serializer for serializer in (DictSerializer, TupleSerializer, PostgresJsonSerializer)
+}
+
+
+def get_serializer(name: str):
+    try:
+        return SERIALIZERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown schedule serializer '{name}', expected one of {', '.join(SERIALIZERS)}")
@@ -0,0 +1,537 @@
+import os
+import sys
+import time
+import datetime
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .cargo_scheduler import CargoScheduler, encode_cursor
+from .db_pool import get_pool
+from .metrics import errors
+
+# Must match the history kept by the 0008 change-log trigger
+CHANGE_LOG_VERSIONS = 10000
+
+# Width of an id in the packed id columns: the canonical 36-character UUID text
+ID_WIDTH = 36
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+SNAPSHOT_COLUMNS = """
+    id, cargo_id, pickup_time, criticality,
+    pickup_location, dropoff_location, pickup_name, dropoff_name
+"""
+
+CHANGED_ROWS_QUERY = """
+    SELECT c.id, s.cargo_id, s.pickup_time, s.criticality,
+           s.pickup_location, s.dropoff_location, s.pickup_name, s.dropoff_name, c.id IS NULL
+    FROM (SELECT DISTINCT id FROM cargo_schedule_changes WHERE version > %s AND version <= %s) c
+    LEFT JOIN cargo_schedule s ON s.id = c.id
+"""
+
+
+def to_micros(value: datetime.datetime) -> int:
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def from_micros(value: int) -> datetime.datetime:
+    return _EPOCH + datetime.timedelta(microseconds=value)
+
+
+_SECONDS = [f":{second:02d}" for second in range(60)]
+
+
+def _minute_prefix(minute: int) -> str:
+    return from_micros(minute * 60_000_000).isoformat()[:16]
+
+
+def _packed_id(value) -> bytes:
+    # A NULL cargo_id renders as "None", like str() on the row does
+    return str(value).encode().ljust(ID_WIDTH)
+
+
+class ScheduleSnapshot:
+    """The schedules in a rolling pickup-time window, held column by column.
+
+    Rows are kept in (pickup_time, id) order across parallel arrays: epoch
+    microseconds in an ``array('q')``, ids and cargo ids as fixed-width
+    ASCII in two bytearrays, and criticality and locations as codes into one
+    table of interned strings, each with its JSON encoding precomputed. A row
+    costs about 90 bytes instead of the ~1 KB of the dict
+    ``get_schedule_items`` builds, and a page is written straight from the
+    columns into JSON text.
+
+    The snapshot follows the table through the 0008 change log: when
+    ``version`` (the listener's change counter) moves, or every
+    ``refresh_seconds`` while it is unknown, only the ids changed since the
+    last refresh are re-read. Reads the window cannot answer return None so
+    the caller falls back to the database.
+    """
+
+    def __init__(self, pool=None, hours_before: Optional[float] = 24.0, hours_after: Optional[float] = 48.0,
+                 refresh_seconds: float = 5.0, version: Callable[[], Optional[int]] = lambda: None,
+                 rebuild_fraction: float = 0.05):
+        # Resolved on first refresh, so a snapshot can be built from rows without a database
+        self.pool = pool
+        self.hours_before = hours_before
+        self.hours_after = hours_after
+        self.refresh_seconds = refresh_seconds
+        self.version_source = version
+        self.rebuild_fraction = rebuild_fraction
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._times = array("q")
+        self._ids = bytearray()
+        self._cargo_ids = bytearray()
+        self._criticality = array("I")
+        self._pickup = array("I")
+        self._dropoff = array("I")
+        # Ids by hash, sorted, with each row's pickup time: apply_changes finds a row by bisecting
+        # here and then its pickup time, instead of searching the whole id column
+        self._id_hashes = array("q")
+        self._id_times = array("q")
+
+        self._strings: List[Optional[str]] = []
+        self._encoded: List[str] = []
+        self._names: List[Optional[str]] = []
+        self._codes: Dict[Optional[str], int] = {}
+        # "YYYY-MM-DDTHH:MM" per minute seen on a page; datetime.isoformat costs microseconds a row
+        self._minutes: Dict[int, str] = {}
+
+        self.version: Optional[int] = None
+        self.window: Optional[Tuple[Optional[int], Optional[int]]] = None
+        self._checked = 0.0
+        self._loader: Optional[threading.Thread] = None
+        self._failed_at = 0.0
+
+        self.full_loads = 0
+        self.refreshes = 0
+        self.rows_changed = 0
+        self.served = 0
+        self.fallbacks = 0
+        self.last_refresh_ms = 0.0
+
+    # -- building ---------------------------------------------------------
+
+    def _code(self, value: Optional[str], name: Optional[str] = None) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._strings)
+            self._strings.append(sys.intern(value) if value is not None else None)
+            self._encoded.append("null" if value is None else encode_basestring_ascii(value))
+            self._names.append(name)
+        elif name is not None and self._names[code] is None:
+            self._names[code] = name
+        return code
+
+    def _clear(self):
+        self._times = array("q")
+        self._ids = bytearray()
+        self._cargo_ids = bytearray()
+        self._criticality = array("I")
+        self._pickup = array("I")
+        self._dropoff = array("I")
+        self._id_hashes = array("q")
+        self._id_times = array("q")
+
+    def _append(self, row):
+        self._times.append(to_micros(row[2]))
+        self._ids += _packed_id(row[0])
+        self._cargo_ids += _packed_id(row[1])
+        self._criticality.append(self._code(row[3]))
+        self._pickup.append(self._code(row[4], row[6]))
+        self._dropoff.append(self._code(row[5], row[7]))
+
+    def load_rows(self, rows: Iterable[tuple], window: Optional[Tuple[Optional[int], Optional[int]]] = None,
+                  version: Optional[int] = None):
+        """Replace the contents with ``rows`` in SNAPSHOT_COLUMNS order, sorted by (pickup_time, id)"""
+        with self._lock:
+            self._clear()
+            for row in rows:
+                self._append(row)
+            self._reindex()
+            self.window = window or (None, None)
+            self.version = version
+
+    def _reindex(self):
+        ids, times = self._ids, self._times
+        pairs = sorted((hash(bytes(ids[i * ID_WIDTH:(i + 1) * ID_WIDTH])), times[i]) for i in range(len(times)))
+        self._id_hashes = array("q", [key for key, _ in pairs])
+        self._id_times = array("q", [time_us for _, time_us in pairs])
+
+    def _position(self, time_us: int, packed: bytes) -> int:
+        """Where (time_us, packed) sits in the sort order"""
+        lo, hi = bisect_left(self._times, time_us), bisect_right(self._times, time_us)
+        while lo < hi and self._ids[lo * ID_WIDTH:(lo + 1) * ID_WIDTH] < packed:
+            lo += 1
+        return lo
+
+    def _find(self, packed: bytes) -> Tuple[int, int]:
+        """(slot in the id index, row) holding ``packed``, or (-1, -1)"""
+        key = hash(packed)
+        # Ids whose hashes collide sit next to each other; the one whose row holds packed wins
+        slot = bisect_left(self._id_hashes, key)
+        while slot < len(self._id_hashes) and self._id_hashes[slot] == key:
+            time_us = self._id_times[slot]
+            i = self._position(time_us, packed)
+            if i < len(self._times) and self._times[i] == time_us and self._ids[i * ID_WIDTH:(i + 1) * ID_WIDTH] == packed:
+                return slot, i
+            slot += 1
+        return -1, -1
+
+    def _delete(self, slot: int, i: int):
+        del self._id_hashes[slot]
+        del self._id_times[slot]
+        del self._times[i]
+        del self._ids[i * ID_WIDTH:(i + 1) * ID_WIDTH]
+        del self._cargo_ids[i * ID_WIDTH:(i + 1) * ID_WIDTH]
+        del self._criticality[i]
+        del self._pickup[i]
+        del self._dropoff[i]
+
+    def _insert(self, row):
+        time_us, packed = to_micros(row[2]), _packed_id(row[0])
+        slot = bisect_right(self._id_hashes, hash(packed))
+        self._id_hashes.insert(slot, hash(packed))
+        self._id_times.insert(slot, time_us)
+        i = self._position(time_us, packed)
+        self._times.insert(i, time_us)
+        self._ids[i * ID_WIDTH:i * ID_WIDTH] = packed
+        self._cargo_ids[i * ID_WIDTH:i * ID_WIDTH] = _packed_id(row[1])
+        self._criticality.insert(i, self._code(row[3]))
+        self._pickup.insert(i, self._code(row[4], row[6]))
+        self._dropoff.insert(i, self._code(row[5], row[7]))
+
+    def _in_window(self, time_us: int) -> bool:
+        start, end = self.window
+        return (start is None or time_us >= start) and (end is None or time_us < end)
+
+    def apply_changes(self, rows: Iterable[tuple]):
+        """Apply change-log rows: (id, cargo_id, pickup_time, ...) with NULLs for deleted ids"""
+        changed = 0
+        with self._lock:
+            for row in rows:
+                slot, i = self._find(_packed_id(row[0]))
+                if i != -1:
+                    self._delete(slot, i)
+                if row[2] is not None and self._in_window(to_micros(row[2])):
+                    self._insert(row)
+                changed += 1
+        self.rows_changed += changed
+
+    # -- refreshing -------------------------------------------------------
+
+    def target_window(self, now: Optional[datetime.datetime] = None) -> Tuple[Optional[int], Optional[int]]:
+        # Anchored on the hour, so the window rolls forward once an hour rather than on every read
+        now = (now or datetime.datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+        start = to_micros(now - datetime.timedelta(hours=self.hours_before)) if self.hours_before is not None else None
+        end = to_micros(now + datetime.timedelta(hours=self.hours_after)) if self.hours_after is not None else None
+        return start, end
+
+    def _window_filters(self, window) -> Dict[str, Any]:
+        filters = {}
+        if window[0] is not None:
+            filters["pickup_from"] = from_micros(window[0])
+        if window[1] is not None:
+            filters["pickup_to"] = from_micros(window[1])
+        return filters
+
+    def _select(self, cursor, window):
+        query, params = CargoScheduler._schedule_query(self._window_filters(window), columns=SNAPSHOT_COLUMNS)
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+    def refresh(self, now: Optional[datetime.datetime] = None):
+        """Catch up with the table: changed ids, a rolled window, or a full reload"""
+        with self._refresh_lock:
+            started = time.perf_counter()
+            window = self.target_window(now)
+            pool = self.pool if self.pool is not None else get_pool()
+            with pool.cursor() as cursor:
+                cursor.execute("SELECT version FROM cargo_schedule_version")
+                version = cursor.fetchone()[0]
+
+                behind = self.version is None or version - self.version > CHANGE_LOG_VERSIONS
+                changes = []
+                if not behind and version != self.version:
+                    cursor.execute(CHANGED_ROWS_QUERY, (self.version, version))
+                    changes = cursor.fetchall()
+                    # A TRUNCATE, or more churn than re-sorting is worth
+                    behind = (any(row[-1] for row in changes)
+                              or len(changes) > max(1000, self.rebuild_fraction * len(self._times)))
+
+                if behind:
+                    rows = self._select(cursor, window)
+                elif window != self.window:
+                    new_start, new_end = window
+                    old_start, old_end = self.window
+                    # Only the slice that has come into view; rows before the new start are dropped below
+                    slice_from = old_end if old_end is not None and (new_start is None or old_end > new_start) else new_start
+                    rows = self._select(cursor, (slice_from, new_end)) if new_end != old_end else []
+
+            if behind:
+                self.load_rows(rows, window, version)
+                self.full_loads += 1
+            else:
+                self.apply_changes(change[:-1] for change in changes)
+                if window != self.window:
+                    self._roll(window, rows)
+                self.version = version
+            self.refreshes += 1
+            self._checked = time.monotonic()
+            self.last_refresh_ms = (time.perf_counter() - started) * 1000
+
+    def _roll(self, window, rows):
+        with self._lock:
+            start = window[0]
+            if start is not None:
+                drop = bisect_left(self._times, start)
+                if drop:
+                    del self._times[:drop]
+                    del self._ids[:drop * ID_WIDTH]
+                    del self._cargo_ids[:drop * ID_WIDTH]
+                    del self._criticality[:drop]
+                    del self._pickup[:drop]
+                    del self._dropoff[:drop]
+            # The slice starts where the old window ended, so it sorts after every row held
+            for row in rows:
+                self._append(row)
+            # Once an hour, and an hour of rows either way; cheaper to sort again than to splice
+            self._reindex()
+            self.window = window
+
+    def _load_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Error loading schedule snapshot: {e}")
+            errors.labels("schedule_snapshot").inc()
+            self._failed_at = time.monotonic()
+
+    def ready(self) -> bool:
+        """True when the snapshot is current enough to answer reads.
+
+        The first load runs on a background thread while reads fall back to
+        the database; after that, a stale snapshot refreshes in the calling
+        request, which costs one small query when few rows changed.
+        """
+        if self.version is None:
+            loader = self._loader
+            if (loader is None or not loader.is_alive()) and time.monotonic() - self._failed_at >= self.refresh_seconds:
+                self._loader = threading.Thread(target=self._load_in_background, daemon=True,
+                                                name="schedule-snapshot-load")
+                self._loader.start()
+            return False
+
+        version = self.version_source()
+        stale = version > self.version if version is not None else (
+            time.monotonic() - self._checked >= self.refresh_seconds)
+        if stale or self.target_window() != self.window:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing schedule snapshot: {e}")
+                errors.labels("schedule_snapshot").inc()
+                return False
+        return True
+
+    # -- reading ----------------------------------------------------------
+
+    def _bounds(self, filters: Dict[str, Any], after) -> Optional[Tuple[int, int, Optional[int]]]:
+        """(first row index, last time bound, window end) for a read, or None if the window misses its start"""
+        try:
+            start_us = to_micros(filters["pickup_from"]) if "pickup_from" in filters else None
+            end_us = to_micros(filters["pickup_to"]) if "pickup_to" in filters else None
+            after_us = to_micros(after[0]) if after else None
+        except TypeError:
+            # Timezone-aware bounds compare differently in PostgreSQL; let it answer
+            return None
+        if after_us is not None and (start_us is None or after_us > start_us):
+            start_us = after_us
+
+        window_start, window_end = self.window
+        if window_start is not None and (start_us is None or start_us < window_start):
+            return None
+
+        first = bisect_left(self._times, start_us) if start_us is not None else 0
+        if after:
+            packed = after[1].encode()
+            n = len(self._times)
+            while first < n and self._times[first] == after_us and self._ids[first * ID_WIDTH:(first + 1) * ID_WIDTH] <= packed:
+                first += 1
+        return first, end_us, window_end
+
+    def _matches(self, filters: Dict[str, Any]):
+        criticality = pickup = dropoff = None
+        if "criticality" in filters:
+            criticality = {self._codes[level] for level in filters["criticality"] if level in self._codes}
+        if "pickup_location" in filters:
+            pickup = {code for code, name in enumerate(self._names) if name == filters["pickup_location"]}
+        if "dropoff_location" in filters:
+            dropoff = {code for code, name in enumerate(self._names) if name == filters["dropoff_location"]}
+        return criticality, pickup, dropoff
+
+    def _scan(self, filters: Dict[str, Any], after, count: Optional[int]) -> Optional[List[int]]:
+        """Indexes of up to ``count`` matching rows; None if the answer may lie outside the window"""
+        bounds = self._bounds(filters, after)
+        if bounds is None:
+            return None
+        first, end_us, window_end = bounds
+        criticality, pickup, dropoff = self._matches(filters)
+        times, crit_codes, pickup_codes, dropoff_codes = self._times, self._criticality, self._pickup, self._dropoff
+
+        found = []
+        n = len(times)
+        i = first
+        while i < n and (count is None or len(found) < count):
+            if end_us is not None and times[i] >= end_us:
+                return found
+            if ((criticality is None or crit_codes[i] in criticality)
+                    and (pickup is None or pickup_codes[i] in pickup)
+                    and (dropoff is None or dropoff_codes[i] in dropoff)):
+                found.append(i)
+            i += 1
+
+        if count is not None and len(found) >= count:
+            return found
+        # Ran off the end of the snapshot: complete only if the read stops inside the window
+        if window_end is None or (end_us is not None and end_us <= window_end):
+            return found
+        return None
+
+    def _row_id(self, column: bytearray, i: int) -> str:
+        return column[i * ID_WIDTH:(i + 1) * ID_WIDTH].decode().rstrip()
+
+    def _isoformat(self, time_us: int) -> str:
+        """datetime.isoformat() of a stored pickup time"""
+        minute, rest = divmod(time_us, 60_000_000)
+        prefix = self._minutes.get(minute)
+        if prefix is None:
+            if len(self._minutes) >= 100_000:
+                self._minutes.clear()
+            prefix = self._minutes[minute] = _minute_prefix(minute)
+        second, micros = divmod(rest, 1_000_000)
+        return prefix + _SECONDS[second] + (".%06d" % micros if micros else "")
+
+    def _item(self, i: int) -> Dict[str, Any]:
+        return {
+            "id": self._row_id(self._ids, i),
+            "cargoId": self._row_id(self._cargo_ids, i),
+            "pickupTime": self._isoformat(self._times[i]),
+            "criticality": self._strings[self._criticality[i]],
+            "pickupLocation": self._strings[self._pickup[i]],
+            "dropoffLocation": self._strings[self._dropoff[i]],
+        }
+
+    def _next_cursor(self, found: List[int], limit: int) -> Optional[str]:
+        if len(found) <= limit:
+            return None
+        last = found[limit - 1]
+        return encode_cursor(from_micros(self._times[last]), self._row_id(self._ids, last))
+
+    def serve(self, read: str, *args):
+        """Refresh if stale, then answer with ``page_body``, ``page``, ``items`` or ``items_body``; None to ask the database"""
+        if not self.ready():
+            self.fallbacks += 1
+            return None
+        return getattr(self, read)(*args)
+
+    def _read(self, filters, after, count, render):
+        with self._lock:
+            found = self._scan(filters or {}, after, count) if self.window is not None else None
+            if found is None:
+                self.fallbacks += 1
+                return None
+            self.served += 1
+            return render(found)
+
+    def _body(self, rows: List[int]) -> str:
+        ids, cargo_ids, times, encoded = self._ids, self._cargo_ids, self._times, self._encoded
+        criticality, pickup, dropoff, isoformat = self._criticality, self._pickup, self._dropoff, self._isoformat
+        # Same text TupleSerializer writes, so pages are byte-identical whichever path served them
+        body = ",".join([
+            f'{{"cargoId":"{cargo_ids[i * ID_WIDTH:(i + 1) * ID_WIDTH].decode().rstrip()}",'
+            f'"criticality":{encoded[criticality[i]]},"dropoffLocation":{encoded[dropoff[i]]},'
+            f'"id":"{ids[i * ID_WIDTH:(i + 1) * ID_WIDTH].decode().rstrip()}",'
+            f'"pickupLocation":{encoded[pickup[i]]},"pickupTime":"{isoformat(times[i])}"}}'
+            for i in rows
+        ])
+        return f"[{body}]"
+
+    def page_body(self, limit: int, after=None, filters: Optional[Dict[str, Any]] = None):
+        """(JSON array text, next cursor) for a /schedule page, or None to ask the database"""
+        return self._read(filters, after, limit + 1,
+                          lambda found: (self._body(found[:limit]), self._next_cursor(found, limit)))
+
+    def page(self, limit: int, after=None, filters: Optional[Dict[str, Any]] = None):
+        """(items, next cursor) like CargoScheduler.get_schedule_page, or None to ask the database"""
+        return self._read(filters, after, limit + 1,
+                          lambda found: ([self._item(i) for i in found[:limit]], self._next_cursor(found, limit)))
+
+    def items(self, filters: Optional[Dict[str, Any]] = None):
+        """Every matching item, or None to ask the database"""
+        return self._read(filters, None, None, lambda found: [self._item(i) for i in found])
+
+    def items_body(self, filters: Optional[Dict[str, Any]] = None):
+        """Every matching item as JSON array text, or None to ask the database"""
+        return self._read(filters, None, None, self._body)
+
+    # -- reporting --------------------------------------------------------
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the columns and the interned string table"""
+        with self._lock:
+            columns = sum(sys.getsizeof(column) for column in (
+                self._times, self._ids, self._cargo_ids, self._criticality, self._pickup, self._dropoff,
+                self._id_hashes, self._id_times))
+            strings = sum(sys.getsizeof(s) for s in self._strings if s is not None)
+            strings += sum(sys.getsizeof(s) for s in self._encoded)
+            strings += sys.getsizeof(self._codes) + sys.getsizeof(self._strings) + sys.getsizeof(self._encoded)
+            strings += sys.getsizeof(self._minutes) + sum(sys.getsizeof(p) for p in self._minutes.values())
+            return columns + strings
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def stats(self) -> Dict[str, Any]:
+        rows = len(self)
+        memory = self.memory_bytes()
+        start, end = self.window or (None, None)
+        return {
+            "rows": rows,
+            "version": self.version,
+            "window_from": from_micros(start).isoformat() if start is not None else None,
+            "window_to": from_micros(end).isoformat() if end is not None else None,
+            "interned_strings": len(self._strings),
+            "memory_bytes": memory,
+            "bytes_per_row": round(memory / rows, 1) if rows else 0.0,
+            "mb_per_100k_rows": round(memory / rows * 100_000 / 2 ** 20, 2) if rows else 0.0,
+            "full_loads": self.full_loads,
+            "refreshes": self.refreshes,
+            "rows_changed": self.rows_changed,
+            "served": self.served,
+            "fallbacks": self.fallbacks,
+            "last_refresh_ms": round(self.last_refresh_ms, 3),
+        }
+
+
+def _hours(name: str, default: str) -> Optional[float]:
+    value = os.getenv(name, default).strip()
+    return float(value) if value else None
+
+
+def snapshot_from_env(version: Callable[[], Optional[int]] = lambda: None) -> Optional[ScheduleSnapshot]:
+    """The per-worker snapshot configured by SCHEDULE_SNAPSHOT_*, or None when disabled"""
+    if os.getenv("SCHEDULE_SNAPSHOT_ENABLED", "1") != "1":
+        return None
+    return ScheduleSnapshot(
+        hours_before=_hours("SCHEDULE_SNAPSHOT_HOURS_BEFORE", "24"),
+        hours_after=_hours("SCHEDULE_SNAPSHOT_HOURS_AFTER", "48"),
+        refresh_seconds=float(os.getenv("SCHEDULE_SNAPSHOT_REFRESH_SECONDS", "5")),
+        version=version,
+    )
@@ -0,0 +1,37 @@
+import re
+from typing import Dict, Optional, Tuple
+
+# Airport cargo terminals where loads are picked up
+TERMINALS: Dict[str, Tuple[float, float]] = {
+    "dfw-terminal-a": (32.90499459590296, -97.03632986050778),
+    "dfw-terminal-b": (32.90534203342366, -97.04491644516602),
+    "dfw-terminal-c": (32.89774624126012, -97.03576044516623),
+    "dfw-terminal-d": (32.89824196997102, -97.04478174516632),
+    "dfw-terminal-e": (32.890938252888326, -97.03569488515262),
+}
+
+# Warehouses and stores where loads are dropped off
+DROPOFF_SITES: Dict[str, Tuple[float, float]] = {
+    "Ups-station": (32.99859322829199, -96.77238661872248),
+    "Fedex-store": (33.024281196004594, -96.79414555014056),
+    "Amazon-warehouse": (32.9801807167563, -96.73806753096646),
+    "Amazon-warehouse-2": (32.990626003517455, -96.78415098302702),
+    "Ups-store2": (32.82222393256571, -96.80966655288424),
+}
+
+SITES: Dict[str, Tuple[float, float]] = {**TERMINALS, **DROPOFF_SITES}
+
+_PACKED_LOCATION_RE = re.compile(r"^(.*)_\(\s*(-?[0-9.]+)\s*,\s*(-?[0-9.]+)\s*\)$")
+
+
+def format_location(name: str) -> str:
+    """Packed "name_(lat, lon)" form stored in cargo_schedule and sent to the mobile app"""
+    lat, lon = SITES[name]
+    return f"{name}_({lat}, {lon})"
+
+
+def parse_location(packed: str) -> Tuple[str, Optional[float], Optional[float]]:
+    match = _PACKED_LOCATION_RE.match(packed or "")
+    if not match:
+        return packed, None, None
+    return match.group(1), float(match.group(2)), float(match.group(3))
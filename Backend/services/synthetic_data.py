@@ -0,0 +1,262 @@
+import json
+import math
+import uuid
+import random
+import datetime
+from collections import namedtuple
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .dock_assignment import CRITICALITY_RANK, terminal_code
+from .geo import haversine_km
+from .location_ingest import LocationPoint
+from .sites import DROPOFF_SITES, TERMINALS, format_location
+
+# Rows per generation unit. Fixed so a seed produces the same data whatever
+# the number of worker processes; only the last chunk may be shorter.
+CHUNK_SIZE = 10_000
+
+SCHEDULE_COLUMNS = (
+    "id", "cargo_id", "pickup_time", "criticality",
+    "pickup_location", "dropoff_location", "description", "weight",
+)
+
+DESCRIPTIONS = {
+    "high": "Perishable goods/ medicines requiring immediate delivery.",
+    "medium": "Standard shipment. Handle with care as it contains delicate items.",
+    "low": "Low priority shipment. Non-perishable items. Can be delivered with no urgency.",
+}
+
+# DALI agent vocabulary, from its migrations and the app:simulate-traffic command
+AGENT_TYPES = ("checkpoint", "intersection", "traffic_light", "highway_point")
+AGENT_LABELS = {
+    "checkpoint": "Checkpoint",
+    "intersection": "Intersection",
+    "traffic_light": "Signal",
+    "highway_point": "Highway Point",
+}
+AGENT_STATES = ("R",) + ("G",) * 11 + ("Y",)
+DALI_TIMESTAMP = "%Y-%m-%d %H:%M:%S"
+
+GeneratorConfig = namedtuple(
+    "GeneratorConfig",
+    ["seed", "schedules", "criticality_mix", "terminal_weights", "start", "days", "hours",
+     "trace_rate", "gps_interval", "delay_rate"],
+)
+
+DaliAgent = namedtuple("DaliAgent", ["id", "name", "code", "type", "latitude", "longitude", "state",
+                                     "created_at", "updated_at"])
+DaliEvent = namedtuple("DaliEvent", ["agent_id", "from_state", "to_state", "at"])
+
+
+def parse_weights(spec: str, key: Callable[[str], str] = str.strip) -> Dict[str, float]:
+    """Parse a weight list such as high=0.2,medium=0.5,low=0.3"""
+    weights = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, weight = part.partition("=")
+        weights[key(name)] = float(weight)
+    if not weights or any(w < 0 for w in weights.values()) or not sum(weights.values()):
+        raise ValueError(f"Invalid weights: {spec}")
+    return weights
+
+
+def criticality_mix(spec: Optional[str]) -> Tuple[Tuple[str, float], ...]:
+    mix = parse_weights(spec) if spec else dict.fromkeys(CRITICALITY_RANK, 1.0)
+    unknown = set(mix) - set(CRITICALITY_RANK)
+    if unknown:
+        raise ValueError(f"Unknown criticality: {', '.join(sorted(unknown))}")
+    return tuple(mix.items())
+
+
+def terminal_weights(spec: Optional[str]) -> Tuple[Tuple[str, float], ...]:
+    """Pickup weight per terminal site name, from letters such as A=3,B=1 (unlisted terminals get 0)"""
+    names = {terminal_code(name): name for name in TERMINALS}
+    if not spec:
+        return tuple((name, 1.0) for name in TERMINALS)
+    weights = parse_weights(spec, key=terminal_code)
+    unknown = set(weights) - set(names)
+    if unknown:
+        raise ValueError(f"Unknown terminal: {', '.join(sorted(unknown))}")
+    return tuple((names[code], weight) for code, weight in weights.items())
+
+
+def chunk_count(config: GeneratorConfig) -> int:
+    return -(-config.schedules // CHUNK_SIZE)
+
+
+def stream_rng(seed: int, stream: str, index: int = 0) -> random.Random:
+    """Independent, reproducible generator per (stream, chunk)"""
+    return random.Random(f"{seed}:{stream}:{index}")
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def schedule_chunk(config: GeneratorConfig, index: int) -> List[tuple]:
+    """Rows for chunk ``index``, in SCHEDULE_COLUMNS order"""
+    rng = stream_rng(config.seed, "schedules", index)
+    count = min(CHUNK_SIZE, config.schedules - index * CHUNK_SIZE)
+    levels, level_weights = zip(*config.criticality_mix)
+    terminals, weights = zip(*config.terminal_weights)
+    dropoffs = list(DROPOFF_SITES)
+    first_second, last_second = config.hours[0] * 3600, config.hours[1] * 3600
+
+    rows = []
+    for criticality, terminal in zip(rng.choices(levels, level_weights, k=count),
+                                     rng.choices(terminals, weights, k=count)):
+        pickup_time = config.start + datetime.timedelta(
+            days=rng.randrange(config.days), seconds=rng.randrange(first_second, last_second))
+        rows.append((
+            _uuid(rng), _uuid(rng), pickup_time, criticality,
+            format_location(terminal), format_location(rng.choice(dropoffs)),
+            DESCRIPTIONS[criticality], round(rng.uniform(5, 50), 2),
+        ))
+    return rows
+
+
+def _site(packed: str) -> Tuple[float, float]:
+    name = packed.rpartition("_(")[0]
+    return TERMINALS.get(name) or DROPOFF_SITES[name]
+
+
+def trace_points(config: GeneratorConfig, index: int, rows: Sequence[tuple]) -> Iterator[LocationPoint]:
+    """GPS fixes for the share of ``rows`` that get a trip, terminal to dropoff from pickup time"""
+    rng = stream_rng(config.seed, "traces", index)
+    for row in rows:
+        if rng.random() >= config.trace_rate:
+            continue
+        (lat0, lon0), (lat1, lon1) = _site(row[4]), _site(row[5])
+        speed_kmh = rng.uniform(35, 65)
+        # Roads are longer than the straight line; same factor as the ETA engine default
+        seconds = haversine_km(lat0, lon0, lat1, lon1) * 1.3 / speed_kmh * 3600
+        fixes = max(2, int(seconds // config.gps_interval) + 1)
+        for i in range(fixes):
+            fraction = i / (fixes - 1)
+            recorded_at = row[2] + datetime.timedelta(seconds=i * config.gps_interval)
+            yield LocationPoint(
+                row[0], row[1],
+                round(lat0 + (lat1 - lat0) * fraction + rng.gauss(0, 0.0003), 7),
+                round(lon0 + (lon1 - lon0) * fraction + rng.gauss(0, 0.0003), 7),
+                recorded_at,
+                recorded_at + datetime.timedelta(milliseconds=rng.randrange(200, 3000)),
+                0.0,
+            )
+
+
+def delay_status(config: GeneratorConfig, index: int, rows: Sequence[tuple]) -> Dict[str, bool]:
+    """Airport Mock delay flag per cargo id, in /import-cargo form"""
+    rng = stream_rng(config.seed, "delays", index)
+    return {row[1]: rng.random() < config.delay_rate for row in rows}
+
+
+def driver_rows(seed: int, count: int, password_hash: str) -> List[tuple]:
+    """users rows (id, email, password_hash, full_name, is_google_account) for driver accounts"""
+    rng = stream_rng(seed, "drivers")
+    return [(_uuid(rng), driver_email(i), password_hash, f"Driver {i + 1}", False) for i in range(count)]
+
+
+def driver_email(index: int) -> str:
+    return f"driver-{index + 1}@synthetic.example"
+
+
+def dali_agents(seed: int, count: int, start: datetime.datetime) -> List[DaliAgent]:
+    """Traffic agents scattered along the terminal-to-dropoff corridors"""
+    rng = stream_rng(seed, "agents")
+    corridors = [(TERMINALS[t], DROPOFF_SITES[d]) for t in TERMINALS for d in DROPOFF_SITES]
+    created = start.strftime(DALI_TIMESTAMP)
+    agents = []
+    for agent_id in range(1, count + 1):
+        (lat0, lon0), (lat1, lon1) = rng.choice(corridors)
+        fraction = rng.uniform(0.05, 0.95)
+        agent_type = rng.choice(AGENT_TYPES)
+        agents.append(DaliAgent(
+            agent_id, f"{AGENT_LABELS[agent_type]} {agent_id}", f"Agent{agent_id}", agent_type,
+            round(lat0 + (lat1 - lat0) * fraction + rng.uniform(-0.002, 0.002), 7),
+            round(lon0 + (lon1 - lon0) * fraction + rng.uniform(-0.002, 0.002), 7),
+            "G", created, created,
+        ))
+    return agents
+
+
+def dali_events(seed: int, agents: List[DaliAgent], start: datetime.datetime, days: int,
+                per_hour: float) -> Tuple[List[DaliAgent], List[DaliEvent]]:
+    """State changes over the window as app:simulate-traffic records them.
+
+    Each agent changes state as a Poisson process at ``per_hour``, moving to
+    a different state drawn from the simulator's weights. Returns the agents
+    with their final state and the events in time order.
+    """
+    end = start + datetime.timedelta(days=days)
+    events = []
+    final = []
+    for agent in agents:
+        rng = stream_rng(seed, "agent-events", agent.id)
+        state, at, changed = agent.state, start, start
+        while per_hour > 0:
+            at += datetime.timedelta(seconds=rng.expovariate(per_hour / 3600))
+            if at >= end:
+                break
+            new_state = rng.choice([s for s in AGENT_STATES if s != state])
+            events.append(DaliEvent(agent.id, state, new_state, at))
+            state, changed = new_state, at
+        final.append(agent._replace(state=state, updated_at=changed.strftime(DALI_TIMESTAMP)))
+    events.sort(key=lambda e: (e.at, e.agent_id))
+    return final, events
+
+
+def dali_log_rows(agents: List[DaliAgent], events: List[DaliEvent]) -> Tuple[List[tuple], List[tuple]]:
+    """event_logs and notification_logs rows, with ids in insert order"""
+    names = {agent.id: agent.name for agent in agents}
+    event_logs, notification_logs = [], []
+    for log_id, event in enumerate(events, start=1):
+        at = event.at.strftime(DALI_TIMESTAMP)
+        metadata = json.dumps({"from": event.from_state, "to": event.to_state}, separators=(",", ":"))
+        message = f"Agent {names[event.agent_id]} changed state from {event.from_state} to {event.to_state}"
+        event_logs.append((log_id, event.agent_id, "STATE_CHANGE", metadata, at, at))
+        notification_logs.append((log_id, event.agent_id, "STATUS_CHANGE", message, at, at))
+    return event_logs, notification_logs
+
+
+def road_graph(seed: int, spacing_km: float = 1.0, highway_every: int = 5, closed_rate: float = 0.1) -> Dict:
+    """A street grid over the terminals and dropoff sites, in the routing graph file format.
+
+    Every ``highway_every``-th row and column is a highway; the other streets
+    run at 40-60 km/h and ``closed_rate`` of them are left out so routes are
+    not all straight lines. Each site is a node joined to its three nearest
+    intersections by access roads.
+    """
+    rng = stream_rng(seed, "roads")
+    sites = {**TERMINALS, **DROPOFF_SITES}
+    lats, lons = [lat for lat, _ in sites.values()], [lon for _, lon in sites.values()]
+    step_lat = spacing_km / 111.32
+    step_lon = step_lat / math.cos(math.radians((min(lats) + max(lats)) / 2))
+    lat0, lon0 = min(lats) - step_lat, min(lons) - step_lon
+    rows = int((max(lats) - lat0) / step_lat) + 2
+    cols = int((max(lons) - lon0) / step_lon) + 2
+
+    nodes = [[round(lat0 + i * step_lat, 6), round(lon0 + j * step_lon, 6)] for i in range(rows) for j in range(cols)]
+    edges = []
+
+    def join(u, v, speed, highway):
+        straight = haversine_km(nodes[u][0], nodes[u][1], nodes[v][0], nodes[v][1])
+        edges.append([u, v, round(straight * 1000 * rng.uniform(1.0, 1.15), 1), speed, highway, 0])
+
+    for i in range(rows):
+        for j in range(cols):
+            node = i * cols + j
+            for ni, nj, line in ((i, j + 1, i), (i + 1, j, j)):
+                if ni >= rows or nj >= cols:
+                    continue
+                highway = int(line % highway_every == 0)
+                if not highway and rng.random() < closed_rate:
+                    continue
+                join(node, ni * cols + nj, 100 if highway else rng.choice((40, 50, 60)), highway)
+
+    site_nodes = {}
+    for name, (lat, lon) in sites.items():
+        site_nodes[name] = len(nodes)
+        nodes.append([lat, lon])
+        nearest = sorted(range(rows * cols), key=lambda n: haversine_km(lat, lon, nodes[n][0], nodes[n][1]))[:3]
+        for node in nearest:
+            join(site_nodes[name], node, 30, 0)
+    return {"version": 1, "nodes": nodes, "sites": site_nodes, "edges": edges}
@@ -0,0 +1,165 @@
+import os
+import atexit
+from flask import Blueprint, request, jsonify
+from .event_routes import publish_denied, relay_state, state_handlers, state_relay_stats
+from .process_local import ProcessLocal
+from .sites import parse_location
+from .traffic_state import (
+    TRAFFIC_MAX_BATCH, AgentEvent, DaliLogFollower, TrafficAgent, TrafficState, corridor_name, parse_agent_events,
+    parse_agents,
+)
+
+traffic_bp = Blueprint('traffic', __name__, url_prefix='/traffic')
+
+traffic_state = TrafficState(
+    corridor_km=float(os.getenv("TRAFFIC_CORRIDOR_KM", "0.5")),
+    window_seconds=float(os.getenv("TRAFFIC_WINDOW_SECONDS", "900")),
+    near_km=float(os.getenv("TRAFFIC_NEAR_KM", "1.0")),
+)
+
+# Agents and events posted to one worker are applied by every other one too. Each worker
+# tails DALI itself, so what the follower reads is not relayed.
+state_handlers["traffic_agents"] = lambda items: traffic_state.register([TrafficAgent(*item) for item in items])
+state_handlers["traffic_events"] = lambda items: traffic_state.apply([AgentEvent(*item) for item in items])
+
+# DALI's SQLite database to tail for agent state changes; unset leaves ingestion to POST /traffic/events
+DALI_DATABASE = os.getenv("DALI_DATABASE")
+
+dali_follower = DaliLogFollower(
+    traffic_state, DALI_DATABASE, poll_seconds=float(os.getenv("DALI_POLL_SECONDS", "1.0"))
+) if DALI_DATABASE else None
+
+def _follow_dali():
+    if dali_follower is None:
+        return None
+    dali_follower.start()
+    atexit.register(dali_follower.stop)
+    return dali_follower
+
+# Per process: the tailing thread and its sqlite connection do not survive a fork
+_following = ProcessLocal(_follow_dali)
+
+def start_traffic_follower():
+    """Start tailing DALI once per process"""
+    _following.get()
+
+def _route_query(raw):
+    """(corridor, lat, lon) for a driver, from corridor or pickup/dropoff names"""
+    if not isinstance(raw, dict):
+        raise ValueError("query must be an object")
+    corridor = raw.get('corridor')
+    if not corridor:
+        if not raw.get('pickup') or not raw.get('dropoff'):
+            raise ValueError("corridor or pickup and dropoff are required")
+        # Packed "name_(lat, lon)" schedule locations work as well as bare names
+        corridor = corridor_name(parse_location(raw['pickup'])[0], parse_location(raw['dropoff'])[0])
+    try:
+        return corridor, float(raw['latitude']), float(raw['longitude'])
+    except KeyError as e:
+        raise ValueError(f"{e.args[0]} is required")
+
+@traffic_bp.route('/agents', methods=['POST'])
+def register_agents():
+    denied = publish_denied()
+    if denied:
+        return denied
+
+    data = request.get_json(silent=True)
+
+    if data is None:
+        return jsonify({"error": "No input data provided"}), 400
+
+    try:
+        agents = parse_agents(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    added = traffic_state.register(agents)
+    relay_state("traffic_agents", agents)
+    return jsonify({"registered": len(agents), "added": added}), 200
+
+@traffic_bp.route('/events', methods=['POST'])
+def ingest_events():
+    denied = publish_denied()
+    if denied:
+        return denied
+
+    data = request.get_json(silent=True)
+
+    if data is None:
+        return jsonify({"error": "No input data provided"}), 400
+
+    # {"agents": [...], "events": [...]}, or the events alone
+    body = data if isinstance(data, dict) and ('events' in data or 'agents' in data) else {"events": data}
+    try:
+        agents = parse_agents(body.get('agents', []))
+        events = parse_agent_events(body.get('events', []))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    traffic_state.register(agents)
+    result = traffic_state.apply(events)
+    relay_state("traffic_agents", agents)
+    relay_state("traffic_events", events)
+    return jsonify(result), 202
+
+@traffic_bp.route('/agents/<string:code>', methods=['GET'])
+def get_agent(code):
+    agent = traffic_state.agent(code)
+    if not agent:
+        return jsonify({"error": "Unknown agent"}), 404
+
+    return jsonify(agent), 200
+
+@traffic_bp.route('/corridors', methods=['GET'])
+def get_corridors():
+    limit = request.args.get('limit', type=int)
+    return jsonify({"corridors": traffic_state.congestion(limit)}), 200
+
+@traffic_bp.route('/corridors/<string:name>', methods=['GET'])
+def get_corridor(name):
+    corridor = traffic_state.corridor(name)
+    if not corridor:
+        return jsonify({"error": f"Unknown corridor: {name}"}), 404
+
+    limit = request.args.get('ahead', 0, type=int)
+    if limit and 'latitude' in request.args:
+        try:
+            lat, lon = float(request.args['latitude']), float(request.args['longitude'])
+        except (KeyError, ValueError):
+            return jsonify({"error": "latitude and longitude must be numbers"}), 400
+        corridor["ahead"] = traffic_state.ahead(name, lat, lon, limit)
+    return jsonify(corridor), 200
+
+@traffic_bp.route('/next', methods=['GET'])
+def get_next_agent():
+    """Next agent on a driver's route, answered from memory in DALI's /driver/location shape"""
+    try:
+        return jsonify(traffic_state.next_agent(*_route_query(request.args.to_dict()))), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@traffic_bp.route('/next', methods=['POST'])
+def get_next_agents():
+    data = request.get_json(silent=True)
+    queries = data.get('drivers') if isinstance(data, dict) else data
+
+    if not isinstance(queries, list) or not queries:
+        return jsonify({"error": "drivers must be a non-empty list"}), 400
+    if len(queries) > TRAFFIC_MAX_BATCH:
+        return jsonify({"error": f"At most {TRAFFIC_MAX_BATCH} drivers per request"}), 400
+
+    try:
+        results = [traffic_state.next_agent(*_route_query(raw)) for raw in queries]
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"results": results}), 200
+
+@traffic_bp.route('/stats', methods=['GET'])
+def get_traffic_stats():
+    stats = traffic_state.stats()
+    if dali_follower is not None:
+        stats["dali"] = dali_follower.stats()
+    stats["relay"] = state_relay_stats()
+    return jsonify(stats), 200
@@ -0,0 +1,564 @@
+import json
+import math
+import time
+import bisect
+import sqlite3
+import datetime
+import threading
+from array import array
+from collections import deque, namedtuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .geo import KM_PER_DEGREE_LAT
+from .sites import DROPOFF_SITES, TERMINALS
+
+TRAFFIC_MAX_BATCH = 5000
+
+# DALI agent states (agents.state enum) and how much each one slows a corridor
+AGENT_STATES = ("G", "Y", "R", "B")
+STATE_WEIGHTS = {"G": 0.0, "B": 0.0, "Y": 0.5, "R": 1.0}
+
+# One line per state, in the tone of DALI's NotificationMessageResolver
+STATE_MESSAGES = {
+    "G": "Route is clear. ✅",
+    "Y": "Proceed with caution. 🟠",
+    "R": "Incident ahead. Consider alternate route. ⚠️",
+    "B": "ℹ️ Unknown state. Proceed carefully.",
+}
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# Later timestamps are refused: states only move forward, so one far ahead would pin its agent
+# until then. Seeded DALI databases run a month or so past today.
+MAX_FUTURE_SECONDS = 366 * 24 * 3600.0
+
+TrafficAgent = namedtuple("TrafficAgent", ["code", "agent_id", "name", "type", "latitude", "longitude", "state", "at"])
+AgentEvent = namedtuple("AgentEvent", ["code", "agent_id", "state", "at"])
+
+
+def _epoch_seconds(value) -> float:
+    now = time.time()
+    if value is None:
+        return now
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        seconds = (value - _EPOCH).total_seconds()
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Epoch milliseconds from the Android client, seconds otherwise
+        seconds = value / 1000 if value > 1e11 else float(value)
+    else:
+        raise ValueError("timestamp must be epoch seconds/milliseconds or an ISO-8601 string")
+    if not 0 <= seconds <= now + MAX_FUTURE_SECONDS:
+        raise ValueError("timestamp must be after 1970 and at most a year ahead")
+    return seconds
+
+
+def _isoformat(seconds: float) -> str:
+    return datetime.datetime.utcfromtimestamp(seconds).isoformat()
+
+
+def _state(value) -> str:
+    if value not in AGENT_STATES:
+        raise ValueError(f"state must be one of {', '.join(AGENT_STATES)}")
+    return value
+
+
+def default_corridors() -> Dict[str, Tuple[Tuple[float, float], Tuple[float, float]]]:
+    """Straight terminal-to-dropoff legs, named "terminal:site" """
+    return {f"{t}:{d}": (TERMINALS[t], DROPOFF_SITES[d]) for t in TERMINALS for d in DROPOFF_SITES}
+
+
+def corridor_name(pickup: str, dropoff: str) -> str:
+    return f"{pickup}:{dropoff}"
+
+
+def _items(payload, key):
+    if isinstance(payload, dict) and key in payload:
+        payload = payload[key]
+    items = payload if isinstance(payload, list) else [payload]
+    if len(items) > TRAFFIC_MAX_BATCH:
+        raise ValueError(f"At most {TRAFFIC_MAX_BATCH} {key} per request")
+    return items
+
+
+def parse_agents(payload) -> List[TrafficAgent]:
+    """Agents as DALI lists them (/live-agents or agents rows), raising ValueError on bad input"""
+    agents = []
+    for index, raw in enumerate(_items(payload, "agents")):
+        try:
+            if not isinstance(raw, dict):
+                raise ValueError("agent must be an object")
+            code = raw.get("code")
+            if not code or not isinstance(code, str):
+                raise ValueError("code is required")
+            latitude, longitude = float(raw["latitude"]), float(raw["longitude"])
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValueError("latitude/longitude out of range")
+            agents.append(TrafficAgent(
+                code, raw.get("id"), raw.get("name"), raw.get("type"), latitude, longitude,
+                _state(raw.get("state", "G")), _epoch_seconds(raw.get("updated_at")),
+            ))
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            detail = f"missing {e}" if isinstance(e, KeyError) else str(e)
+            raise ValueError(f"Invalid agent at index {index}: {detail}")
+    return agents
+
+
+def parse_agent_events(payload) -> List[AgentEvent]:
+    """State changes as {"code", "state", "timestamp"} or DALI event_logs rows, raising ValueError on bad input"""
+    events = []
+    for index, raw in enumerate(_items(payload, "events")):
+        try:
+            if not isinstance(raw, dict):
+                raise ValueError("event must be an object")
+            if raw.get("event_type", "STATE_CHANGE") != "STATE_CHANGE":
+                raise ValueError("only STATE_CHANGE events are accepted")
+            code, agent_id = raw.get("code") or raw.get("agent_code"), raw.get("agent_id")
+            if not code and agent_id is None:
+                raise ValueError("code or agent_id is required")
+            state = raw.get("state")
+            if state is None:
+                metadata = raw.get("metadata") or {}
+                if isinstance(metadata, str):
+                    metadata = json.loads(metadata)
+                state = metadata.get("to")
+            at = raw.get("timestamp", raw.get("created_at"))
+            events.append(AgentEvent(code, agent_id, _state(state), _epoch_seconds(at)))
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            detail = f"missing {e}" if isinstance(e, KeyError) else str(e)
+            raise ValueError(f"Invalid event at index {index}: {detail}")
+    return events
+
+
+class Corridor:
+    """Agents along one straight leg, ordered by distance from its start.
+
+    ``level`` is the summed state weight of the agents on it; every change is
+    logged with its time so the average over the last ``window`` seconds can
+    be read without rescanning agents.
+    """
+
+    def __init__(self, name: str, start: Tuple[float, float], end: Tuple[float, float]):
+        self.name = name
+        self.start = start
+        self.end = end
+        self._kx = math.cos(math.radians(start[0])) * KM_PER_DEGREE_LAT
+        self.dx, self.dy = self._xy(*end)
+        self.length_km = math.hypot(self.dx, self.dy)
+
+        self.members: List[Tuple[float, int]] = []  # (along_km, slot), sorted
+        self.counts = dict.fromkeys(AGENT_STATES, 0)
+        self.level = 0.0
+        self.changes: deque = deque()  # (at, state) of each state change
+        self.levels: deque = deque()   # (at, level) from when the level last moved
+
+    def _xy(self, lat: float, lon: float) -> Tuple[float, float]:
+        return (lon - self.start[1]) * self._kx, (lat - self.start[0]) * KM_PER_DEGREE_LAT
+
+    def project(self, lat: float, lon: float) -> Tuple[float, float]:
+        """(km along the leg, km off it)"""
+        x, y = self._xy(lat, lon)
+        if not self.length_km:
+            return 0.0, math.hypot(x, y)
+        return (x * self.dx + y * self.dy) / self.length_km, abs(x * self.dy - y * self.dx) / self.length_km
+
+    def record(self, at: float, level_delta: float, state: Optional[str] = None):
+        if self.levels and at < self.levels[-1][0]:
+            at = self.levels[-1][0]
+        self.level += level_delta
+        if self.levels and self.levels[-1][0] == at:
+            self.levels[-1] = (at, self.level)
+        else:
+            self.levels.append((at, self.level))
+        if state is not None:
+            self.changes.append((at, state))
+
+    def prune(self, since: float):
+        while self.changes and self.changes[0][0] < since:
+            self.changes.popleft()
+        # Keep the last level set before the window, it still applies at its start
+        while len(self.levels) > 1 and self.levels[1][0] <= since:
+            self.levels.popleft()
+
+    def average_level(self, since: float, now: float) -> float:
+        """Time-weighted level over [since, now], after prune(since)"""
+        if now <= since:
+            return self.level
+        total, level, previous = 0.0, 0.0, since
+        for at, value in self.levels:
+            if at > since:
+                at = min(at, now)
+                total += level * (at - previous)
+                previous = at
+            level = value
+        return (total + level * (now - previous)) / (now - since)
+
+
+class TrafficState:
+    """Current state of every DALI agent and rolling congestion per corridor.
+
+    Agents within ``corridor_km`` of a corridor's straight leg belong to it,
+    sorted by how far along it they sit, so the next agent ahead of a driver
+    is one bisect away. State changes older than the agent's last known
+    change are ignored, so batches may arrive out of order or twice.
+    """
+
+    def __init__(self, corridors: Optional[Dict[str, Tuple[Tuple[float, float], Tuple[float, float]]]] = None,
+                 corridor_km: float = 0.5, window_seconds: float = 900, near_km: float = 1.0):
+        self.corridor_km = corridor_km
+        self.window_seconds = window_seconds
+        self.near_km = near_km
+        self._lock = threading.RLock()
+        self.corridors: Dict[str, Corridor] = {
+            name: Corridor(name, start, end) for name, (start, end) in (corridors or default_corridors()).items()
+        }
+
+        self._codes: List[str] = []
+        self._names: List[Optional[str]] = []
+        self._types: List[Optional[str]] = []
+        self._lat = array("d")
+        self._lon = array("d")
+        self._changed_at = array("d")
+        self._states: List[str] = []
+        self._placed: List[List[Corridor]] = []
+        self._slot_by_code: Dict[str, int] = {}
+        self._code_by_id: Dict[Any, str] = {}
+
+        self.events = 0
+        self.applied = 0
+        self.stale = 0
+        self.unknown = 0
+        self._listeners: List[Callable[[List[TrafficAgent]], None]] = []
+
+    def _place(self, slot: int, at: float):
+        weight = STATE_WEIGHTS[self._states[slot]]
+        for corridor in self.corridors.values():
+            along, across = corridor.project(self._lat[slot], self._lon[slot])
+            if across <= self.corridor_km and -self.corridor_km <= along <= corridor.length_km + self.corridor_km:
+                bisect.insort(corridor.members, (along, slot))
+                corridor.counts[self._states[slot]] += 1
+                corridor.record(at, weight)
+                self._placed[slot].append(corridor)
+
+    def _unplace(self, slot: int, at: float):
+        weight = STATE_WEIGHTS[self._states[slot]]
+        for corridor in self._placed[slot]:
+            corridor.members = [m for m in corridor.members if m[1] != slot]
+            corridor.counts[self._states[slot]] -= 1
+            corridor.record(at, -weight)
+        self._placed[slot] = []
+
+    def add_listener(self, callback: Callable[[List[TrafficAgent]], None]):
+        """Register a callback that sees agents whose state or position changed"""
+        self._listeners.append(callback)
+
+    def _notify(self, slots: List[int]):
+        if not slots or not self._listeners:
+            return
+        with self._lock:
+            changed = [self._agent_tuple(slot) for slot in slots]
+        for listener in self._listeners:
+            try:
+                listener(changed)
+            except Exception as e:
+                print(f"Error in traffic listener: {e}")
+
+    def _agent_tuple(self, slot: int) -> TrafficAgent:
+        return TrafficAgent(self._codes[slot], None, self._names[slot], self._types[slot], self._lat[slot],
+                            self._lon[slot], self._states[slot], self._changed_at[slot])
+
+    def agent_states(self) -> List[TrafficAgent]:
+        with self._lock:
+            return [self._agent_tuple(slot) for slot in range(len(self._codes))]
+
+    def register(self, agents: Iterable[TrafficAgent]) -> int:
+        """Add agents or move/rename known ones; returns how many were new"""
+        added = 0
+        changed = []
+        with self._lock:
+            for agent in agents:
+                slot = self._slot_by_code.get(agent.code)
+                if slot is None:
+                    slot = len(self._codes)
+                    self._codes.append(agent.code)
+                    self._names.append(agent.name)
+                    self._types.append(agent.type)
+                    self._lat.append(agent.latitude)
+                    self._lon.append(agent.longitude)
+                    self._changed_at.append(agent.at)
+                    self._states.append(agent.state)
+                    self._placed.append([])
+                    self._slot_by_code[agent.code] = slot
+                    self._place(slot, agent.at)
+                    added += 1
+                    changed.append(slot)
+                else:
+                    self._names[slot] = agent.name or self._names[slot]
+                    self._types[slot] = agent.type or self._types[slot]
+                    moved = (agent.latitude, agent.longitude) != (self._lat[slot], self._lon[slot])
+                    if moved:
+                        self._unplace(slot, agent.at)
+                        self._lat[slot], self._lon[slot] = agent.latitude, agent.longitude
+                        self._place(slot, agent.at)
+                    if self._apply(slot, agent.state, agent.at) or moved:
+                        changed.append(slot)
+                if agent.agent_id is not None:
+                    self._code_by_id[agent.agent_id] = agent.code
+        self._notify(changed)
+        return added
+
+    def _apply(self, slot: int, state: str, at: float) -> bool:
+        if at < self._changed_at[slot]:
+            self.stale += 1
+            return False
+        self._changed_at[slot] = at
+        old = self._states[slot]
+        if state == old:
+            return False
+        self._states[slot] = state
+        delta = STATE_WEIGHTS[state] - STATE_WEIGHTS[old]
+        for corridor in self._placed[slot]:
+            corridor.counts[old] -= 1
+            corridor.counts[state] += 1
+            corridor.record(at, delta, state)
+            corridor.prune(at - self.window_seconds)
+        self.applied += 1
+        return True
+
+    def apply(self, events: Iterable[AgentEvent]) -> Dict[str, int]:
+        """Apply state changes in order; returns counts of applied, stale and unknown-agent events"""
+        applied = stale = unknown = received = 0
+        changed = []
+        with self._lock:
+            for event in events:
+                received += 1
+                code = event.code or self._code_by_id.get(event.agent_id)
+                slot = self._slot_by_code.get(code)
+                if slot is None:
+                    unknown += 1
+                    continue
+                before = self.stale
+                if self._apply(slot, event.state, event.at):
+                    applied += 1
+                    changed.append(slot)
+                stale += self.stale - before
+            self.events += received
+            self.unknown += unknown
+        self._notify(changed)
+        return {"received": received, "applied": applied, "stale": stale, "unknown": unknown}
+
+    def knows(self, agent_id) -> bool:
+        return agent_id in self._code_by_id
+
+    def _agent(self, slot: int) -> Dict[str, Any]:
+        state = self._states[slot]
+        return {
+            "code": self._codes[slot],
+            "name": self._names[slot],
+            "type": self._types[slot],
+            "state": state,
+            "latitude": self._lat[slot],
+            "longitude": self._lon[slot],
+            "changedAt": _isoformat(self._changed_at[slot]),
+            "message": STATE_MESSAGES[state],
+        }
+
+    def agent(self, code: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            slot = self._slot_by_code.get(code)
+            if slot is None:
+                return None
+            return dict(self._agent(slot), corridors=[c.name for c in self._placed[slot]])
+
+    def ahead(self, corridor: str, lat: float, lon: float, limit: int = 1) -> List[Dict[str, Any]]:
+        """Agents ahead of a driver on a corridor, nearest first, with the distance left to each"""
+        leg = self.corridors.get(corridor)
+        if leg is None:
+            raise ValueError(f"Unknown corridor: {corridor}")
+        along, _ = leg.project(lat, lon)
+        with self._lock:
+            members = leg.members
+            start = bisect.bisect_right(members, (along, math.inf))
+            return [dict(self._agent(slot), distanceKm=round(position - along, 3))
+                    for position, slot in members[start:start + limit]]
+
+    def next_agent(self, corridor: str, lat: float, lon: float) -> Dict[str, Any]:
+        """The next agent on the driver's corridor, shaped like DALI's /driver/location answer"""
+        found = self.ahead(corridor, lat, lon)
+        if not found:
+            return {"status": "ok", "near": False, "corridor": corridor, "agent_code": None,
+                    "agent_state": None, "message": STATE_MESSAGES["G"]}
+        agent = found[0]
+        return {
+            "status": "ok",
+            "near": agent["distanceKm"] <= self.near_km,
+            "corridor": corridor,
+            "agent_code": agent["code"],
+            "agent_type": agent["type"],
+            "agent_state": agent["state"],
+            "message": agent["message"],
+            "distanceKm": agent["distanceKm"],
+        }
+
+    def _aggregate(self, corridor: Corridor, now: float) -> Dict[str, Any]:
+        since = now - self.window_seconds
+        corridor.prune(since)
+        agents = len(corridor.members)
+        return {
+            "corridor": corridor.name,
+            "lengthKm": round(corridor.length_km, 3),
+            "agents": agents,
+            "states": dict(corridor.counts),
+            "congestion": round(corridor.level / agents, 3) if agents else 0.0,
+            "avgCongestion": round(corridor.average_level(since, now) / agents, 3) if agents else 0.0,
+            "changes": len(corridor.changes),
+            "degraded": sum(1 for _, state in corridor.changes if STATE_WEIGHTS[state] > 0),
+            "windowSeconds": self.window_seconds,
+        }
+
+    def corridor(self, name: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            corridor = self.corridors.get(name)
+            return self._aggregate(corridor, now or time.time()) if corridor else None
+
+    def congestion(self, limit: Optional[int] = None, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Per-corridor aggregates, most congested first"""
+        now = now or time.time()
+        with self._lock:
+            rows = [self._aggregate(corridor, now) for corridor in self.corridors.values()]
+        rows.sort(key=lambda row: (-row["congestion"], -row["avgCongestion"], row["corridor"]))
+        return rows[:limit] if limit is not None else rows
+
+    def congestion_levels(self, now: Optional[float] = None) -> Dict[str, float]:
+        """Current congestion of every corridor that has any, by name"""
+        now = now or time.time()
+        with self._lock:
+            rows = [self._aggregate(corridor, now) for corridor in self.corridors.values() if corridor.level]
+        return {row["corridor"]: row["congestion"] for row in rows}
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            states = dict.fromkeys(AGENT_STATES, 0)
+            for state in self._states:
+                states[state] += 1
+            return {
+                "agents": len(self._codes),
+                "placed_agents": sum(1 for placed in self._placed if placed),
+                "corridors": len(self.corridors),
+                "states": states,
+                "events": self.events,
+                "applied": self.applied,
+                "stale": self.stale,
+                "unknown": self.unknown,
+            }
+
+
+class DaliLogFollower:
+    """Tails a DALI SQLite database into a TrafficState.
+
+    Each poll reads the ``event_logs`` rows past the last id it saw and then
+    the ``agents`` rows updated since the last poll. The second read catches
+    scenario commands such as AccidentAtCoit, which set agent states without
+    logging events, and agents added after startup.
+    """
+
+    def __init__(self, state: TrafficState, path: str, poll_seconds: float = 1.0, batch_size: int = 1000):
+        self.state = state
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_event_id: Optional[int] = None
+        self._agents_since: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.polls = 0
+        self.poll_failures = 0
+        self.events_read = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=5, check_same_thread=False)
+        return self._conn
+
+    def _read_agents(self, conn: sqlite3.Connection):
+        query = "SELECT id, code, name, type, latitude, longitude, state, updated_at FROM agents"
+        # Timestamps have one-second resolution: re-read the last second, repeats are no-ops
+        rows = (conn.execute(query + " WHERE updated_at >= ?", (self._agents_since,)) if self._agents_since
+                else conn.execute(query)).fetchall()
+        self.state.register(parse_agents([
+            dict(zip(("id", "code", "name", "type", "latitude", "longitude", "state", "updated_at"), row))
+            for row in rows
+        ]))
+        self._agents_since = max((row[7] for row in rows if row[7]), default=self._agents_since)
+
+    def poll(self) -> int:
+        """Read what changed since the last poll; returns the number of events read"""
+        conn = self._connect()
+        if self._last_event_id is None:
+            # Current states come from the agents table; history before startup is skipped
+            self._last_event_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM event_logs").fetchone()[0]
+            self._read_agents(conn)
+
+        read = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, agent_id, metadata, created_at FROM event_logs "
+                "WHERE id > ? AND event_type = 'STATE_CHANGE' ORDER BY id LIMIT ?",
+                (self._last_event_id, self.batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            if any(not self.state.knows(row[1]) for row in rows):
+                self._read_agents(conn)
+            self.state.apply(parse_agent_events([
+                {"agent_id": agent_id, "metadata": metadata, "created_at": created_at}
+                for _, agent_id, metadata, created_at in rows
+            ]))
+            self._last_event_id = rows[-1][0]
+            read += len(rows)
+            if len(rows) < self.batch_size:
+                break
+
+        self._read_agents(conn)
+        self.polls += 1
+        self.events_read += read
+        return read
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.poll()
+            except (sqlite3.Error, ValueError) as e:
+                print(f"Error reading DALI events: {e}")
+                self.poll_failures += 1
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="dali-follower", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "polls": self.polls,
+            "poll_failures": self.poll_failures,
+            "events_read": self.events_read,
+            "last_event_id": self._last_event_id,
+        }
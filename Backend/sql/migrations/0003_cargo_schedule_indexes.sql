@@ -0,0 +1,11 @@
+-- /cargo/<cargo_id> lookups
+CREATE INDEX IF NOT EXISTS idx_cargo_schedule_cargo_id
+    ON cargo_schedule (cargo_id);
+
+-- Pickup time windows filtered by criticality
+CREATE INDEX IF NOT EXISTS idx_cargo_schedule_pickup_time_criticality
+    ON cargo_schedule (pickup_time, criticality);
+
+-- Keyset pagination order used by /schedule
+CREATE INDEX IF NOT EXISTS idx_cargo_schedule_pickup_time_id
+    ON cargo_schedule (pickup_time, id);
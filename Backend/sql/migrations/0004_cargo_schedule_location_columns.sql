@@ -0,0 +1,56 @@
+-- Split the packed "name_(lat, lon)" location strings into typed columns.
+-- The packed columns stay as the API representation; a trigger keeps the
+-- typed columns in sync so existing writers do not need to change.
+ALTER TABLE cargo_schedule
+    ADD COLUMN IF NOT EXISTS pickup_name TEXT,
+    ADD COLUMN IF NOT EXISTS pickup_lat DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS pickup_lon DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS dropoff_name TEXT,
+    ADD COLUMN IF NOT EXISTS dropoff_lat DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS dropoff_lon DOUBLE PRECISION;
+
+CREATE OR REPLACE FUNCTION cargo_schedule_split_locations() RETURNS trigger AS $$
+DECLARE
+    parts TEXT[];
+BEGIN
+    parts := regexp_match(NEW.pickup_location, '^(.*)_\(\s*(-?[0-9.]+)\s*,\s*(-?[0-9.]+)\s*\)$');
+    IF parts IS NULL THEN
+        NEW.pickup_name := NEW.pickup_location;
+        NEW.pickup_lat := NULL;
+        NEW.pickup_lon := NULL;
+    ELSE
+        NEW.pickup_name := parts[1];
+        NEW.pickup_lat := parts[2]::DOUBLE PRECISION;
+        NEW.pickup_lon := parts[3]::DOUBLE PRECISION;
+    END IF;
+
+    parts := regexp_match(NEW.dropoff_location, '^(.*)_\(\s*(-?[0-9.]+)\s*,\s*(-?[0-9.]+)\s*\)$');
+    IF parts IS NULL THEN
+        NEW.dropoff_name := NEW.dropoff_location;
+        NEW.dropoff_lat := NULL;
+        NEW.dropoff_lon := NULL;
+    ELSE
+        NEW.dropoff_name := parts[1];
+        NEW.dropoff_lat := parts[2]::DOUBLE PRECISION;
+        NEW.dropoff_lon := parts[3]::DOUBLE PRECISION;
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_cargo_schedule_split_locations ON cargo_schedule;
+CREATE TRIGGER trg_cargo_schedule_split_locations
+    BEFORE INSERT OR UPDATE OF pickup_location, dropoff_location ON cargo_schedule
+    FOR EACH ROW EXECUTE FUNCTION cargo_schedule_split_locations();
+
+-- Backfill existing rows through the trigger
+UPDATE cargo_schedule
+SET pickup_location = pickup_location, dropoff_location = dropoff_location;
+
+-- Location filters, kept in pickup order so filtered pages avoid a sort
+CREATE INDEX IF NOT EXISTS idx_cargo_schedule_pickup_name
+    ON cargo_schedule (pickup_name, pickup_time, id);
+
+CREATE INDEX IF NOT EXISTS idx_cargo_schedule_dropoff_name
+    ON cargo_schedule (dropoff_name, pickup_time, id);
@@ -0,0 +1,4 @@
+-- Bumped to revoke every token issued to a user; tokens carry the version
+-- they were issued with in their "ver" claim.
+ALTER TABLE users
+    ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
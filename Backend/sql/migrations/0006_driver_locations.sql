@@ -0,0 +1,14 @@
+-- GPS fixes reported by driver apps, written in batches by the location ingestor
+CREATE TABLE IF NOT EXISTS driver_locations (
+    id BIGSERIAL PRIMARY KEY,
+    schedule_id TEXT NOT NULL,
+    cargo_id TEXT,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    recorded_at TIMESTAMP NOT NULL,
+    received_at TIMESTAMP NOT NULL
+);
+
+-- Track history per schedule, newest first
+CREATE INDEX IF NOT EXISTS idx_driver_locations_schedule_recorded
+    ON driver_locations (schedule_id, recorded_at DESC);
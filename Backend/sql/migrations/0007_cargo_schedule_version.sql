@@ -0,0 +1,28 @@
+-- Change counter for cargo_schedule. Every statement that modifies the
+-- table bumps it and announces the new value on the cargo_schedule_changed
+-- channel, so app workers can drop cached reads without polling.
+CREATE TABLE IF NOT EXISTS cargo_schedule_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL
+);
+
+INSERT INTO cargo_schedule_version (id, version) VALUES (TRUE, 1)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION cargo_schedule_bump_version() RETURNS trigger AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    UPDATE cargo_schedule_version SET version = version + 1 WHERE id
+    RETURNING version INTO new_version;
+    -- Delivered to listeners when the writing transaction commits
+    PERFORM pg_notify('cargo_schedule_changed', new_version::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement level, so bulk loads bump the counter once rather than per row
+DROP TRIGGER IF EXISTS cargo_schedule_changed ON cargo_schedule;
+CREATE TRIGGER cargo_schedule_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON cargo_schedule
+    FOR EACH STATEMENT EXECUTE FUNCTION cargo_schedule_bump_version();
@@ -0,0 +1,60 @@
+-- Ids touched by each cargo_schedule change, tagged with the change counter
+-- from 0007, so in-process snapshots can re-read just the rows that moved.
+-- Writers serialise on the counter row, so a reader that sees counter N
+-- can already see every change logged at N or below.
+CREATE TABLE IF NOT EXISTS cargo_schedule_changes (
+    version BIGINT NOT NULL,
+    id UUID  -- NULL after a TRUNCATE: every row changed
+);
+
+CREATE INDEX IF NOT EXISTS idx_cargo_schedule_changes_version
+    ON cargo_schedule_changes (version);
+
+-- Runs after cargo_schedule_changed (triggers fire in name order), so the
+-- counter already holds this statement's version. Keeps the last 10000
+-- versions; readers further behind reload in full.
+CREATE OR REPLACE FUNCTION cargo_schedule_log_changes() RETURNS trigger AS $$
+DECLARE
+    current_version BIGINT;
+BEGIN
+    SELECT version INTO current_version FROM cargo_schedule_version WHERE id;
+
+    IF TG_OP = 'TRUNCATE' THEN
+        INSERT INTO cargo_schedule_changes (version, id) VALUES (current_version, NULL);
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO cargo_schedule_changes (version, id) SELECT current_version, id FROM new_rows;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO cargo_schedule_changes (version, id)
+        SELECT current_version, id FROM old_rows UNION SELECT current_version, id FROM new_rows;
+    ELSE
+        INSERT INTO cargo_schedule_changes (version, id) SELECT current_version, id FROM old_rows;
+    END IF;
+
+    DELETE FROM cargo_schedule_changes WHERE version <= current_version - 10000;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement level with transition tables: a bulk load logs its ids in one INSERT ... SELECT
+DROP TRIGGER IF EXISTS cargo_schedule_log_insert ON cargo_schedule;
+CREATE TRIGGER cargo_schedule_log_insert
+    AFTER INSERT ON cargo_schedule
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION cargo_schedule_log_changes();
+
+DROP TRIGGER IF EXISTS cargo_schedule_log_update ON cargo_schedule;
+CREATE TRIGGER cargo_schedule_log_update
+    AFTER UPDATE ON cargo_schedule
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION cargo_schedule_log_changes();
+
+DROP TRIGGER IF EXISTS cargo_schedule_log_delete ON cargo_schedule;
+CREATE TRIGGER cargo_schedule_log_delete
+    AFTER DELETE ON cargo_schedule
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION cargo_schedule_log_changes();
+
+DROP TRIGGER IF EXISTS cargo_schedule_log_truncate ON cargo_schedule;
+CREATE TRIGGER cargo_schedule_log_truncate
+    AFTER TRUNCATE ON cargo_schedule
+    FOR EACH STATEMENT EXECUTE FUNCTION cargo_schedule_log_changes();
@@ -0,0 +1,5 @@
+-- Ids for the events pushed to drivers. Every app worker takes them from
+-- this sequence, so a Last-Event-ID means the same thing whichever worker
+-- a reconnecting client lands on. The events travel on the cargo_events
+-- channel and are not stored.
+CREATE SEQUENCE IF NOT EXISTS cargo_event_ids;
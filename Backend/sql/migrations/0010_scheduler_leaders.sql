@@ -0,0 +1,8 @@
+-- Where each elected process can be reached. The holder of a LeaderLock
+-- writes its internal address here after taking the advisory lock, and the
+-- other workers forward requests for its in-memory state to that address.
+CREATE TABLE IF NOT EXISTS scheduler_leaders (
+    name TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,168 @@
+import os
+import sys
+import uuid
+import asyncio
+import datetime
+from contextlib import asynccontextmanager, contextmanager
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+asgi = pytest.importorskip("asgi")
+
+from services.cargo_scheduler import CargoScheduler
+
+
+def make_detail_rows(count):
+    start = datetime.datetime(2025, 1, 1, 8, 0)
+    return [
+        (uuid.UUID(int=i + 1), f"Cargo {i}", 12.5, f"dfw-terminal-{'abc'[i % 3]}",
+         "Ups-station", "high", start + datetime.timedelta(minutes=i))
+        for i in range(count)
+    ]
+
+
+class CannedPool:
+    """Sync and async stand-in pools returning the same rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @contextmanager
+    def cursor(self, **kwargs):
+        rows = self.rows
+
+        class Cursor:
+            def execute(self, query, params=None):
+                pass
+
+            def fetchall(self):
+                return rows
+
+            def fetchone(self):
+                return rows[0] if rows else None
+
+        yield Cursor()
+
+
+class AsyncCannedPool(CannedPool):
+    @asynccontextmanager
+    async def cursor(self, **kwargs):
+        rows = self.rows
+
+        class Cursor:
+            async def execute(self, query, params=None):
+                pass
+
+            async def fetchall(self):
+                return rows
+
+            async def fetchone(self):
+                return rows[0] if rows else None
+
+        yield Cursor()
+
+
+def call_asgi(app, method, path, query=b"", headers=(), body=b""):
+    scope = {
+        "type": "http", "method": method, "path": path, "query_string": query,
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+        "scheme": "http", "root_path": "",
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = sent[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+@pytest.fixture
+def app(monkeypatch):
+    rows = make_detail_rows(3)
+    monkeypatch.setattr(asgi.backend, "cargo_scheduler", CargoScheduler(CannedPool(rows)))
+    app = asgi.AsgiApp()
+    app.routes = asgi.AsyncRoutes(AsyncCannedPool(rows))
+    return app
+
+
+def assert_same(app, method, path, query="", headers=(), body=b""):
+    status, sent_headers, sent_body = call_asgi(app, method, path, query.encode(), headers, body)
+    flask = asgi.flask_app.test_client().open(
+        path, method=method, query_string=query, headers=list(headers), data=body
+    )
+    assert status == flask.status_code
+    assert sent_body == flask.data
+    assert sent_headers[b"content-type"].decode() == flask.headers["Content-Type"]
+    return status, sent_body
+
+
+def test_native_routes_match_flask_responses(app):
+    cargo_id = str(uuid.UUID(int=1))
+    origin = [("Origin", "http://driver.app")]
+
+    assert assert_same(app, "GET", f"/cargo/{cargo_id}", headers=origin)[0] == 200
+    assert assert_same(app, "GET", "/schedule", "limit=x")[0] == 400
+    assert assert_same(app, "GET", "/schedule", "cursor=bogus")[0] == 400
+    assert assert_same(app, "GET", "/events")[0] == 400
+    assert assert_same(app, "GET", "/auth/me")[0] == 401
+
+    json_body = [("Content-Type", "application/json")]
+    ids = f'{{"cargoIds": ["{cargo_id}", "{uuid.UUID(int=99)}"]}}'.encode()
+    status, body = assert_same(app, "POST", "/cargo/batch", headers=json_body, body=ids)
+    assert status == 200 and str(uuid.UUID(int=99)).encode() in body
+    assert assert_same(app, "POST", "/cargo/batch", headers=json_body, body=b'{"cargoIds": []}')[0] == 400
+    assert assert_same(app, "POST", "/cargo/batch", body=b"not json")[0] == 400
+
+
+def test_cors_headers_applied_to_native_routes(app):
+    _, headers, _ = call_asgi(app, "GET", f"/cargo/{uuid.UUID(int=1)}", headers=[("Origin", "http://driver.app")])
+    assert headers[b"access-control-allow-origin"] == b"http://driver.app"
+
+
+def test_unmatched_routes_fall_back_to_flask(app):
+    assert app.routes.match({"method": "GET", "path": "/health/db"}) is None
+    assert app.routes.match({"method": "GET", "path": "/schedule", "query_string": b"stream=ndjson"}) is None
+    assert app.routes.match({"method": "GET", "path": "/schedule", "query_string": b"limit=5"}) == app.routes.schedule
+    assert app.routes.match({"method": "GET", "path": "/schedule"}) is None
+    assert app.routes.match({"method": "GET", "path": "/schedule", "query_string": b"sort=eta"}) == app.routes.schedule
+
+
+class FailingPool:
+    """Both pools raise the way a dropped database connection does"""
+
+    @contextmanager
+    def cursor(self, **kwargs):
+        raise ConnectionError("server closed the connection unexpectedly")
+        yield
+
+    @asynccontextmanager
+    async def async_cursor(self, **kwargs):
+        raise ConnectionError("server closed the connection unexpectedly")
+        yield
+
+
+def test_failed_schedule_reads_are_errors_without_an_etag(monkeypatch):
+    failing = FailingPool()
+    monkeypatch.setattr(asgi.backend, "cargo_scheduler", CargoScheduler(failing))
+    app = asgi.AsgiApp()
+    app.routes = asgi.AsyncRoutes(failing)
+    monkeypatch.setattr(app.routes.scheduler.pool, "cursor", failing.async_cursor)
+    if asgi.backend.schedule_cache is not None:
+        # A version is known, so a successful page would be tagged
+        monkeypatch.setattr(asgi.backend.schedule_cache, "etag", lambda key: '"42-665d78b75150e804"')
+
+    for query in ("limit=5", "limit=5&sort=eta"):
+        status, headers, body = call_asgi(app, "GET", "/schedule", query.encode())
+        flask = asgi.flask_app.test_client().get("/schedule", query_string=query)
+        assert status == flask.status_code == 500
+        assert body == flask.data and b"Failed to fetch" in body
+        assert b"etag" not in headers and "ETag" not in flask.headers
+        assert b"cache-control" not in headers
@@ -0,0 +1,170 @@
+import os
+import sys
+import threading
+import time
+
+import psycopg2
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.db_pool import ConnectionPool, PoolTimeout, _counting_cursor
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if self.conn.fail_queries:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.fail_queries = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(**kwargs):
+    opened = []
+
+    def connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    kwargs.setdefault("minconn", 0)
+    return ConnectionPool(connect=connect, **kwargs), opened
+
+
+def test_connection_is_reused_and_committed():
+    """A clean block commits and hands the same connection to the next caller"""
+    pool, opened = make_pool(maxconn=2)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    assert len(opened) == 1
+    assert first.commits == 2
+
+
+def test_failed_block_rolls_back():
+    """An exception inside the block rolls back instead of poisoning the connection"""
+    pool, _ = make_pool(maxconn=1)
+
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("boom")
+
+    assert conn.rollbacks == 1
+    assert pool.stats()["idle"] == 1
+
+
+def test_broken_connection_is_replaced():
+    """Connection-level errors discard the connection and the next checkout reconnects"""
+    pool, opened = make_pool(maxconn=1)
+
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.connection():
+            raise psycopg2.OperationalError("connection reset")
+
+    with pool.connection() as conn:
+        pass
+
+    assert len(opened) == 2
+    assert opened[0].closed
+    assert conn is opened[1]
+
+
+def test_health_check_reconnects_stale_connection():
+    """Idle connections past the interval are pinged and replaced when dead"""
+    pool, opened = make_pool(maxconn=1, health_check_interval=0)
+
+    with pool.connection():
+        pass
+    opened[0].fail_queries = True
+
+    with pool.connection() as conn:
+        pass
+
+    assert conn is opened[1]
+    assert pool.stats()["reconnects"] == 1
+    assert pool.stats()["health_check_failures"] == 1
+
+
+def test_pool_is_bounded_and_times_out():
+    """Checkouts beyond maxconn wait and then raise PoolTimeout"""
+    pool, _ = make_pool(maxconn=1, timeout=0.05)
+    held = pool.getconn()
+
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+
+    pool.putconn(held)
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_waiters_are_woken_and_wait_time_recorded():
+    """A blocked checkout proceeds once a connection is returned"""
+    pool, opened = make_pool(maxconn=1, timeout=2)
+    held = pool.getconn()
+
+    def release():
+        time.sleep(0.05)
+        pool.putconn(held)
+
+    threading.Thread(target=release).start()
+    with pool.connection():
+        pass
+
+    stats = pool.stats()
+    assert len(opened) == 1
+    assert stats["peak_in_use"] == 1
+    assert stats["wait_time_max_ms"] >= 40
+
+
+def test_query_counting_covers_any_cursor_factory():
+    pool, _ = make_pool(count_queries=True)
+    assert make_pool()[0].stats()["queries"] is None
+
+    class DictCursor(FakeCursor):
+        def execute(self, query, params=None):
+            return "dict rows"
+
+    seen = []
+    pool.query_observer = seen.append
+    conn = FakeConnection()
+    conn.on_query = pool._count_query
+    counting = _counting_cursor(DictCursor)
+    assert counting is _counting_cursor(DictCursor)
+
+    cursor = counting(conn)
+    cursor.connection = conn
+    assert cursor.execute("SELECT 1") == "dict rows"
+    cursor.execute("SELECT 2")
+    assert pool.stats()["queries"] == 2
+    assert len(seen) == 2 and all(seconds >= 0 for seconds in seen)
@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.directions import (
+    DirectionsProxy, DirectionsUnavailable, GoogleDirectionsUpstream, normalise_avoid, parse_point,
+)
+from services.single_flight import SingleFlight
+from services.ttl_cache import TTLCache
+
+
+def directions_body(origin, destination, status="OK"):
+    if status != "OK":
+        return {"status": status, "routes": []}
+    return {
+        "status": "OK",
+        "geocoded_waypoints": [{"place_id": "somewhere"}],
+        "routes": [{
+            "summary": "TX-114",
+            "overview_polyline": {"points": "_p~iF~ps|U_ulLnnqC"},
+            "warnings": [],
+            "legs": [{
+                "distance": {"text": "12 km", "value": 12000},
+                "duration": {"text": "14 mins", "value": 840},
+                "start_location": {"lat": origin[0], "lng": origin[1]},
+                "end_location": {"lat": destination[0], "lng": destination[1]},
+                "steps": [
+                    {"html_instructions": "Head <b>north</b>", "polyline": {"points": "abc"},
+                     "start_location": {"lat": origin[0], "lng": origin[1]}},
+                    {"maneuver": "turn-right", "html_instructions": "Turn <b>right</b>",
+                     "start_location": {"lat": 32.9, "lng": -97.0}},
+                ],
+            }],
+        }],
+    }
+
+
+class FakeUpstream:
+    """Counts calls; holds each one until ``release`` is set"""
+
+    def __init__(self, status="OK"):
+        self.status = status
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, origin, destination, avoid):
+        self.calls.append((origin, destination, avoid))
+        self.release.wait(5)
+        if self.status == "down":
+            raise DirectionsUnavailable("connection refused")
+        return directions_body(origin, destination, self.status)
+
+
+@pytest.fixture
+def fake_server():
+    """A Directions API look-alike on localhost that records what it was asked"""
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+            seen.append(query)
+            if query.get("key") != "test-key":
+                self.send_response(403)
+                self.end_headers()
+                return
+            origin = parse_point(query["origin"], "origin")
+            destination = parse_point(query["destination"], "destination")
+            time.sleep(0.05)
+            payload = json.dumps(directions_body(origin, destination)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/maps/api/directions/json", seen
+    server.shutdown()
+    server.server_close()
+
+
+def test_nearby_requests_share_a_key():
+    proxy = DirectionsProxy(FakeUpstream(), quantum=0.001)
+
+    a = proxy.key((32.90012, -97.03648), (32.8501, -97.0), "highways")
+    b = proxy.key((32.90049, -97.03551), (32.85014, -97.00004), "HIGHWAYS|highways")
+    assert a == b
+    assert a.origin == (32.9, -97.036) and a.avoid == "highways"
+    assert proxy.key((32.9006, -97.0365), (32.85, -97.0)) != a
+    assert normalise_avoid("tolls|highways") == "highways|tolls"
+    with pytest.raises(ValueError):
+        normalise_avoid("potholes")
+    with pytest.raises(ValueError):
+        parse_point("32.9", "origin")
+
+
+def test_concurrent_identical_requests_make_one_upstream_call():
+    upstream = FakeUpstream()
+    upstream.release.clear()
+    proxy = DirectionsProxy(upstream)
+    results = []
+
+    def ask(i):
+        results.append(proxy.get((32.9 + i * 1e-5, -97.036), (32.85, -97.0)))
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    while proxy.stats()["coalesced"] < 19:
+        time.sleep(0.001)
+    upstream.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(upstream.calls) == 1
+    assert len({body for body, _ in results}) == 1
+    assert sorted(how for _, how in results) == ["coalesced"] * 19 + ["miss"]
+    assert proxy.get((32.9, -97.036), (32.85, -97.0))[1] == "hit"
+
+
+def test_cached_bodies_are_trimmed_to_what_the_app_reads():
+    proxy = DirectionsProxy(FakeUpstream())
+    body = json.loads(proxy.get((32.9, -97.036), (32.85, -97.0))[0])
+
+    route = body["routes"][0]
+    assert body["status"] == "OK" and "geocoded_waypoints" not in body
+    assert route["overview_polyline"]["points"] == "_p~iF~ps|U_ulLnnqC"
+    steps = route["legs"][0]["steps"]
+    assert steps[1] == {"maneuver": "turn-right", "start_location": {"lat": 32.9, "lng": -97.0}}
+    assert "html_instructions" not in steps[0] and "polyline" not in steps[0]
+
+
+def test_entries_expire_and_evict_and_failures_are_not_cached():
+    now = [0.0]
+    upstream = FakeUpstream()
+    proxy = DirectionsProxy(upstream, cache=TTLCache(maxsize=2, ttl=60, clock=lambda: now[0]), negative_ttl=5)
+
+    proxy.get((32.9, -97.0), (32.8, -97.0))
+    proxy.get((32.9, -97.0), (32.8, -97.0))
+    now[0] = 61
+    assert proxy.get((32.9, -97.0), (32.8, -97.0))[1] == "miss"
+    assert len(upstream.calls) == 2
+
+    proxy.get((32.9, -97.1), (32.8, -97.0))
+    proxy.get((32.9, -97.2), (32.8, -97.0))
+    assert proxy.stats()["cache_evictions"] == 1
+
+    upstream.status = "ZERO_RESULTS"
+    proxy.get((10.0, 10.0), (11.0, 11.0))
+    assert proxy.get((10.0, 10.0), (11.0, 11.0))[1] == "hit"
+    now[0] = 67
+    assert proxy.get((10.0, 10.0), (11.0, 11.0))[1] == "miss"
+
+    for status in ("OVER_QUERY_LIMIT", "down"):
+        upstream.status = status
+        for _ in range(2):
+            with pytest.raises(DirectionsUnavailable):
+                proxy.get((20.0, 20.0), (21.0, 21.0))
+    assert proxy.stats()["upstream_errors"] == 4
+
+
+def test_single_flight_shares_errors_with_waiters():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    def call(fn):
+        try:
+            flight.do("k", fn)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call, args=(fail,))
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=call, args=(lambda: pytest.fail("waiter ran its own call"),))
+    waiter.start()
+    while flight.stats()["shared"] < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join()
+    waiter.join()
+
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert flight.in_flight() == 0
+    assert flight.do("k", lambda: 42) == (42, False)
+
+
+def test_google_upstream_against_a_local_fake_server(fake_server):
+    url, seen = fake_server
+    proxy = DirectionsProxy(GoogleDirectionsUpstream("test-key", url=url, timeout=2))
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(proxy.get((32.90012, -97.03648), (32.85, -97.0),
+                                                                        "highways")))
+               for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(seen) == 1
+    assert seen[0] == {"origin": "32.9,-97.036", "destination": "32.85,-97.0", "avoid": "highways", "key": "test-key"}
+    assert json.loads(results[0][0])["routes"][0]["legs"][0]["duration"]["value"] == 840
+
+    refused = DirectionsProxy(GoogleDirectionsUpstream("wrong-key", url=url, timeout=2))
+    with pytest.raises(DirectionsUnavailable, match="403"):
+        refused.get((32.9, -97.0), (32.85, -97.0))
+    closed = DirectionsProxy(GoogleDirectionsUpstream("test-key", url="http://127.0.0.1:9/", timeout=0.5))
+    with pytest.raises(DirectionsUnavailable):
+        closed.get((32.9, -97.0), (32.85, -97.0))
+
+
+def test_directions_endpoint_speaks_the_directions_api(monkeypatch):
+    from flask import Flask
+    from services import directions_routes
+
+    from services import auth_routes
+    from services.process_local import ProcessLocal
+
+    class FakeAuthService:
+        def verify_token(self, token):
+            return {"id": "driver-1"} if token == "good-token" else None
+
+    upstream = FakeUpstream()
+    monkeypatch.setattr(directions_routes, "directions_proxy", DirectionsProxy(upstream))
+    monkeypatch.setattr(auth_routes, "_auth_service", ProcessLocal(FakeAuthService))
+    app = Flask(__name__)
+    app.register_blueprint(directions_routes.directions_bp)
+    client = app.test_client()
+
+    path = "/directions/json?origin=32.9001,-97.0364&destination=32.85,-97.0&avoid=highways&key=ignored"
+    # Every miss spends the API key, so anonymous callers never reach the upstream
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer forged"}).status_code == 401
+    assert upstream.calls == []
+
+    client.environ_base["HTTP_AUTHORIZATION"] = "Bearer good-token"
+    first, second = client.get(path), client.get(path)
+    assert first.status_code == second.status_code == 200
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("miss", "hit")
+    assert first.get_json()["routes"][0]["overview_polyline"]["points"]
+    assert upstream.calls == [((32.9, -97.036), (32.85, -97.0), "highways")]
+
+    assert client.get("/directions/json?origin=32.9,-97.0").status_code == 400
+    assert client.get("/directions/json?origin=32.9,-97.0&destination=1,2&avoid=mud").status_code == 400
+    upstream.status = "down"
+    assert client.get("/directions/json?origin=1,1&destination=2,2").status_code == 502
+    assert client.get("/directions/stats").get_json()["upstream_calls"] == 2
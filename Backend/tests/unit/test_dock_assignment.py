@@ -0,0 +1,124 @@
+import os
+import sys
+import datetime
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from flask import Flask
+
+from services import dock_routes, pickup_routes
+from services.dock_assignment import BAY_AREA, PARKING, PULL_UP, parse_capacity, terminal_code
+from services.pickup_scheduler import Pickup, PickupScheduler
+from services.process_local import ProcessLocal
+
+NOW = datetime.datetime(2025, 5, 1, 8, 0)
+
+
+def pickup(i, terminal="C", criticality="low", minutes=0, delayed=False):
+    return Pickup(f"sched-{i}", f"cargo-{i}", terminal, criticality, NOW + datetime.timedelta(minutes=minutes), delayed)
+
+
+def test_terminal_code_accepts_site_names_and_letters():
+    assert terminal_code("dfw-terminal-c_(32.89774624126012, -97.03576044516623)") == "C"
+    assert terminal_code("dfw-terminal-a") == "A"
+    assert terminal_code("e") == "E"
+    assert parse_capacity("A=10, b=0,C=1") == {"A": 10, "B": 0, "C": 1}
+    with pytest.raises(ValueError):
+        terminal_code("Ups-station")
+
+
+def test_last_dock_goes_to_exactly_one_truck():
+    """The Airport Mock would send both trucks to Terminal C's single spot"""
+    scheduler = PickupScheduler(docks={"C": 1}, max_wait_slots=1)
+    scheduler.upsert(pickup(1))
+    scheduler.upsert(pickup(2, criticality="high"))
+
+    assert [a["scheduleId"] for a in scheduler.tick(NOW)] == ["sched-2"]
+    assert scheduler.assignment("sched-2")["action"] == BAY_AREA
+    assert scheduler.assignment("sched-1")["action"] == PARKING
+    assert sum(a["spotReserved"] for a in scheduler.plan() + scheduler.queue(None)) == 1
+
+
+def test_delayed_trucks_park_with_a_window_and_pull_up_without_one():
+    scheduler = PickupScheduler(docks={"A": 1, "B": 0})
+    scheduler.upsert(pickup(1, "A", delayed=True))
+    scheduler.upsert(pickup(2, "B", delayed=True))
+    scheduler.tick(NOW)
+
+    assert scheduler.assignment("sched-1")["action"] == PARKING
+    assert scheduler.assignment("sched-2")["action"] == PULL_UP
+    assert "rest area" in scheduler.assignment("sched-2")["message"]
+
+
+def test_fewer_docks_release_only_that_terminals_later_windows():
+    scheduler = PickupScheduler(docks={"A": 2, "D": 2}, max_wait_slots=1)
+    for i, terminal in enumerate("AADD"):
+        scheduler.upsert(pickup(i, terminal))
+    scheduler.tick(NOW)
+    docks = {a["scheduleId"]: a["dock"] for a in scheduler.plan()}
+
+    released = scheduler.set_docks("dfw-terminal-a", 1, NOW)
+
+    assert released == [key for key, dock in docks.items() if key in ("sched-0", "sched-1") and dock == 2]
+    assert scheduler.assignment(released[0])["status"] == "pending"
+    assert len(scheduler.plan("D")) == 2
+    assert scheduler.docks() == {"A": 1, "D": 2}
+    # Released pickups wait at the head of the queue, and come back flagged as reassigned
+    scheduler.set_docks("A", 2, NOW)
+    assert [(a["scheduleId"], a["reassigned"]) for a in scheduler.tick(NOW)] == [(released[0], True)]
+    with pytest.raises(ValueError):
+        scheduler.set_docks("A", -1, NOW)
+
+
+def test_dock_routes_share_the_pickup_plan(monkeypatch):
+    scheduler = PickupScheduler(docks={"C": 1}, max_wait_slots=1)
+    published = []
+    monkeypatch.setattr(pickup_routes, "pickup_scheduler", scheduler)
+    monkeypatch.setattr(dock_routes, "pickup_scheduler", scheduler)
+    monkeypatch.setattr(pickup_routes.pickup_feed, "scheduler", scheduler)
+    monkeypatch.setattr(pickup_routes.pickup_feed, "fetch", lambda filters: [])
+    monkeypatch.setattr(pickup_routes.event_hub, "publish", lambda *args: published.append(args))
+    monkeypatch.setattr(pickup_routes, "PICKUP_SCHEDULER_LOCK", False)
+    monkeypatch.setattr(pickup_routes, "_leader", ProcessLocal(lambda: None))
+    app = Flask(__name__)
+    app.register_blueprint(dock_routes.dock_bp)
+    app.register_blueprint(pickup_routes.pickup_bp)
+    client = app.test_client()
+
+    response = client.post("/docks/arrivals", json=[
+        {"scheduleId": "sched-1", "terminal": "dfw-terminal-c", "etaMinutes": 0},
+        {"scheduleId": "sched-2", "terminal": "C", "etaMinutes": 0, "criticality": "high"},
+    ])
+    assert [a["scheduleId"] for a in response.get_json()["changed"]] == ["sched-2"]
+    # One model: the dock routes and the pickup routes answer from the same windows
+    assert client.get("/pickups/sched-2").get_json()["action"] == BAY_AREA
+    assert client.get("/docks/assignment/sched-1").get_json()["action"] == PARKING
+    assert [a["scheduleId"] for a in client.get("/docks/plan?terminal=C").get_json()["assignments"]] == [
+        "sched-2", "sched-1"]
+
+    assert client.delete("/docks/arrivals/sched-2").status_code == 200
+    assert client.get("/docks/assignment/sched-1").get_json()["spotReserved"]
+    assert client.put("/docks/capacity", json={"C": -1}).status_code == 400
+    assert client.post("/docks/arrivals", json={"scheduleId": "x", "terminal": "C", "etaMinutes": 1e10}).status_code == 400
+    # Every window is published once, by the pickup scheduler
+    assert [(args[1], args[2]["scheduleId"]) for args in published] == [
+        ("assignment", "sched-2"), ("assignment", "sched-1")]
+
+
+def test_dock_routes_answer_only_in_the_scheduler_process(monkeypatch):
+    app = Flask(__name__)
+    app.register_blueprint(dock_routes.dock_bp)
+    client = app.test_client()
+    # The elected process serves the dock routes to the others too
+    assert dock_routes.dock_bp in pickup_routes.SCHEDULER_BLUEPRINTS
+
+    monkeypatch.setattr(pickup_routes, "PICKUP_SCHEDULER_LOCK", False)
+    monkeypatch.setattr(pickup_routes, "_leader", ProcessLocal(lambda: None))
+    assert client.get("/docks/plan").status_code == 200
+
+    # Not the scheduler, and no election to find it through
+    monkeypatch.setattr(pickup_routes, "PICKUP_SCHEDULER_ENABLED", False)
+    response = client.put("/docks/capacity", json={"C": 1})
+    assert response.status_code == 503 and response.headers["Retry-After"] == "5"
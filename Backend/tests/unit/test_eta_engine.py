@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import random
+import datetime
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.eta_engine import EtaEngine, haversine_matrix
+from services.geo import haversine_km
+from services.sites import DROPOFF_SITES, SITES, TERMINALS, format_location
+
+NOW = datetime.datetime(2025, 4, 24, 12, 0)
+
+
+def schedule(i, terminal, dropoff, minutes_ahead, criticality="low"):
+    return {
+        "id": f"sched-{i}",
+        "cargoId": f"cargo-{i}",
+        "pickupTime": (NOW + datetime.timedelta(minutes=minutes_ahead)).isoformat(),
+        "criticality": criticality,
+        "pickupLocation": format_location(terminal),
+        "dropoffLocation": format_location(dropoff),
+    }
+
+
+def random_schedules(count, seed=3):
+    rng = random.Random(seed)
+    return [
+        schedule(i, rng.choice(list(TERMINALS)), rng.choice(list(DROPOFF_SITES)),
+                 rng.randint(10, 600), rng.choice(["high", "medium", "low"]))
+        for i in range(count)
+    ]
+
+
+def test_haversine_matrix_matches_scalar():
+    names = list(SITES)
+    lats = [SITES[n][0] for n in names]
+    lons = [SITES[n][1] for n in names]
+    matrix = haversine_matrix(lats, lons, lats, lons)
+    assert matrix.shape == (len(names), len(names))
+    for i, a in enumerate(names):
+        for j, b in enumerate(names):
+            assert matrix[i, j] == pytest.approx(haversine_km(*SITES[a], *SITES[b]), abs=1e-9)
+
+
+def test_numpy_and_python_paths_agree():
+    items = random_schedules(200)
+    positions = {"sched-5": (32.95, -96.9), "sched-17": (32.80, -97.2)}
+    fast, slow = EtaEngine(use_numpy=True), EtaEngine(use_numpy=False)
+    for engine in (fast, slow):
+        engine.set_congestion("dfw-terminal-a", "Ups-store2", 1.8)
+
+    for by in ("eta", "urgency"):
+        fast_ranked = fast.rank(items, positions, now=NOW, by=by)
+        slow_ranked = slow.rank(items, positions, now=NOW, by=by)
+        assert [i["id"] for i in fast_ranked] == [i["id"] for i in slow_ranked]
+        for a, b in zip(fast_ranked, slow_ranked):
+            assert a["etaMinutes"] == pytest.approx(b["etaMinutes"], abs=0.11)
+            assert a["slackMinutes"] == pytest.approx(b["slackMinutes"], abs=0.11)
+
+    distances, names = fast.site_eta_matrix([32.9], [-97.0])
+    python_distances, _ = slow.site_eta_matrix([32.9], [-97.0])
+    assert list(distances[0]) == pytest.approx(python_distances[0])
+    assert names == list(SITES)
+
+
+def test_congestion_scales_only_its_segment():
+    engine = EtaEngine()
+    items = [schedule(1, "dfw-terminal-a", "Ups-store2", 60), schedule(2, "dfw-terminal-b", "Ups-store2", 60)]
+    before = {i["id"]: i["etaMinutes"] for i in engine.rank(items, now=NOW, by="eta")}
+
+    engine.set_congestion("dfw-terminal-a", "Ups-store2", 2.0)
+    after = {i["id"]: i["etaMinutes"] for i in engine.rank(items, now=NOW, by="eta")}
+
+    assert after["sched-1"] == pytest.approx(before["sched-1"] * 2, abs=0.1)
+    assert after["sched-2"] == before["sched-2"]
+    with pytest.raises(ValueError):
+        engine.set_congestion("dfw-terminal-a", "Ups-store2", 0)
+
+
+def test_corridor_congestion_slows_the_delivery_leg():
+    engine = EtaEngine(congestion_slowdown=1.0)
+    items = [schedule(1, "dfw-terminal-a", "Ups-store2", 60), schedule(2, "dfw-terminal-b", "Ups-store2", 60)]
+    before = {i["id"]: i["etaMinutes"] for i in engine.rank(items, now=NOW, by="eta")}
+
+    # Half the DALI agents on A's corridor are red
+    engine.set_traffic(lambda: {"dfw-terminal-a:Ups-store2": 0.5})
+    after = {i["id"]: i["etaMinutes"] for i in engine.rank(items, now=NOW, by="eta")}
+    assert after["sched-1"] == pytest.approx(before["sched-1"] * 1.5, abs=0.1)
+    assert after["sched-2"] == before["sched-2"]
+
+    # A fixed multiplier wins over live traffic until it is set back to 1
+    engine.set_congestion("dfw-terminal-a", "Ups-store2", 1.2)
+    assert engine.congestion("dfw-terminal-a", "Ups-store2") == 1.2
+    engine.set_congestion("dfw-terminal-a", "Ups-store2", 1.0)
+    assert engine.congestion("dfw-terminal-a", "Ups-store2") == 1.5
+
+
+def test_urgency_uses_truck_position_and_criticality():
+    engine = EtaEngine(speed_kmh=60, detour_factor=1.0)
+    items = [
+        schedule(1, "dfw-terminal-a", "Ups-station", 120),
+        schedule(2, "dfw-terminal-b", "Ups-station", 90),
+        schedule(3, "dfw-terminal-c", "Ups-station", 130, criticality="high"),
+    ]
+    # The truck for sched-1 is ~100 km out, so it is nearly out of slack
+    positions = {"sched-1": (33.8, -97.0)}
+    ranked = engine.rank(items, positions, now=NOW, by="urgency")
+
+    assert [i["id"] for i in ranked] == ["sched-1", "sched-3", "sched-2"]
+    assert ranked[0]["slackMinutes"] < 30
+    assert ranked[2]["slackMinutes"] == 90.0
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_unknown_locations_sort_last_without_nan(use_numpy):
+    engine = EtaEngine(use_numpy=use_numpy)
+    items = [schedule(1, "dfw-terminal-a", "Ups-station", 60), schedule(2, "dfw-terminal-a", "Ups-station", 30)]
+    items[1]["dropoffLocation"] = "somewhere-else"
+    ranked = engine.rank(items, now=NOW, by="eta")
+    assert [i["id"] for i in ranked] == ["sched-1", "sched-2"]
+    assert ranked[1]["etaMinutes"] is None
+
+
+def test_ranks_thousands_of_rows_quickly():
+    engine = EtaEngine()
+    items = random_schedules(5000)
+    engine.rank(items, now=NOW)
+
+    start = time.perf_counter()
+    ranked = engine.rank(items, now=NOW, by="urgency")
+    elapsed = time.perf_counter() - start
+
+    assert len(ranked) == 5000
+    # Generous bound for shared CI machines; typically a few milliseconds
+    assert elapsed < 0.5
@@ -0,0 +1,157 @@
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.event_hub import KEEPALIVE_FRAME, EventHub, HubFull, stream_frames
+from services.event_relay import PgEventRelay
+
+
+def test_publish_reaches_only_topic_subscribers():
+    hub = EventHub()
+    driver_a = hub.subscribe(["schedule:a"])
+    driver_b = hub.subscribe(["schedule:b", "schedule:c"])
+
+    assert hub.publish("schedule:a", "assignment", {"action": "Bay_Area"}) == 1
+    assert hub.publish("schedule:c", "delay", {"minutes": 20}) == 1
+
+    (frame,) = driver_a.drain()
+    assert frame == b'id: 1\nevent: assignment\ndata: {"action":"Bay_Area"}\n\n'
+    assert driver_b.drain() == [b'id: 2\nevent: delay\ndata: {"minutes":20}\n\n']
+    assert hub.stats()["fanout"] == 2
+
+
+def test_slow_subscriber_drops_oldest_and_gets_resync():
+    hub = EventHub(max_queue=3)
+    slow = hub.subscribe(["schedule:a"])
+    for i in range(5):
+        hub.publish("schedule:a", "parking", {"n": i})
+
+    frames = slow.drain()
+    assert frames[0].startswith(b"event: resync\n")
+    assert [f.split(b"\n")[0] for f in frames[1:]] == [b"id: 3", b"id: 4", b"id: 5"]
+    assert hub.stats()["dropped"] == 2
+    # Once caught up the stream is clean again
+    hub.publish("schedule:a", "parking", {"n": 5})
+    assert slow.drain()[0].startswith(b"id: 6")
+
+
+def test_reconnect_replays_missed_events():
+    hub = EventHub(history=10)
+    first = hub.subscribe(["schedule:a"])
+    for i in range(4):
+        hub.publish("schedule:a", "delay", {"n": i})
+        hub.publish("schedule:z", "delay", {"n": i})
+    hub.unsubscribe(first)
+
+    again = hub.subscribe(["schedule:a"], last_event_id=3)
+    assert [f.split(b"\n")[0] for f in again.drain()] == [b"id: 5", b"id: 7"]
+
+
+def test_subscriber_limit_and_unsubscribe():
+    hub = EventHub(max_subscribers=1)
+    subscription = hub.subscribe(["schedule:a"])
+    with pytest.raises(HubFull):
+        hub.subscribe(["schedule:b"])
+
+    hub.unsubscribe(subscription)
+    hub.unsubscribe(subscription)
+    assert hub.stats()["subscribers"] == 0
+    assert hub.stats()["topics"] == 0
+    assert hub.publish("schedule:a", "delay", {}) == 0
+    hub.subscribe(["schedule:b"])
+
+
+def test_stream_wakes_on_publish_and_sends_keepalives():
+    hub = EventHub()
+    subscription = hub.subscribe(["schedule:a"])
+    stream = stream_frames(subscription, keepalive=0.01)
+
+    assert next(stream).startswith(b"retry:")
+    assert next(stream) == KEEPALIVE_FRAME
+
+    timer = threading.Timer(0.05, hub.publish, ("schedule:a", "assignment", {"action": "Parking"}))
+    timer.start()
+    frame = next(frame for frame in stream if frame != KEEPALIVE_FRAME)
+    assert b"event: assignment" in frame
+
+    hub.unsubscribe(subscription)
+    assert list(stream) in ([], [KEEPALIVE_FRAME])
+
+
+class NotifyPool:
+    """Stands in for the database: hands out sequence ids and keeps what was NOTIFYed"""
+
+    def __init__(self):
+        self.next_id = 100
+        self.sent = []
+        self.down = False
+
+    @contextmanager
+    def cursor(self):
+        if self.down:
+            raise ConnectionError("database is down")
+        pool = self
+
+        class Cursor:
+            def execute(self, sql, params=None):
+                if "pg_notify" in sql:
+                    pool.sent.append(params[1])
+                else:
+                    pool.next_id += 1
+
+            def fetchone(self):
+                return (pool.next_id,)
+
+        yield Cursor()
+
+
+def test_relay_carries_events_between_workers():
+    pool = NotifyPool()
+    hubs = [EventHub(), EventHub()]
+    relays = [PgEventRelay(hub, pool=pool) for hub in hubs]
+    for hub, relay in zip(hubs, relays):
+        hub.relay = relay
+    here, there = (hub.subscribe(["schedule:a"]) for hub in hubs)
+
+    assert hubs[0].publish("schedule:a", "delay", {"minutes": 5}) == 1
+    # Every worker's listener hears the NOTIFY, the publishing one included
+    for payload in pool.sent:
+        for relay in relays:
+            relay._deliver(payload)
+
+    frame = b'id: 101\nevent: delay\ndata: {"minutes":5}\n\n'
+    assert here.drain() == [frame]
+    assert there.drain() == [frame]
+    assert relays[0].stats()["published"] == 1 and relays[1].stats()["received"] == 1
+    assert hubs[0].stats()["relayed"] == 0 and hubs[1].stats()["relayed"] == 1
+    # Ids come from one sequence, so Last-Event-ID means the same thing in every worker
+    assert hubs[1].subscribe(["schedule:a"], last_event_id=100).drain() == [frame]
+
+
+def test_relay_failure_still_reaches_local_subscribers():
+    pool = NotifyPool()
+    hub = EventHub()
+    hub.relay = PgEventRelay(hub, pool=pool)
+    driver = hub.subscribe(["schedule:a"])
+    pool.down = True
+
+    assert hub.publish("schedule:a", "delay", {"minutes": 5}) == 1
+    assert driver.drain() == [b'event: delay\ndata: {"minutes":5}\n\n']
+    assert hub.stats()["relay_failures"] == 1 and hub.relay.stats()["errors"] == 1
+
+    pool.down = False
+    with pytest.raises(ValueError, match="too large"):
+        hub.relay.publish("schedule:a", "delay", {"note": "x" * 9000})
+
+
+def test_resync_all_reaches_every_subscriber():
+    hub = EventHub()
+    drivers = [hub.subscribe(["schedule:a"]), hub.subscribe(["schedule:b", "schedule:c"])]
+    hub.resync_all()
+    for driver in drivers:
+        assert driver.drain() == [b'event: resync\ndata: {"dropped":0}\n\n']
@@ -0,0 +1,114 @@
+import os
+import sys
+import datetime
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.location_ingest import LocationIngestor, RejectedBatch, parse_location_points
+
+
+def make_points(count, schedule_id="sched-1"):
+    return parse_location_points([
+        {"scheduleId": schedule_id, "latitude": 32.9, "longitude": -97.0 + i * 1e-4}
+        for i in range(count)
+    ])
+
+
+def test_parse_single_and_batched_points():
+    """The Android single-point body and batched bodies parse to the same shape"""
+    single = parse_location_points({
+        "scheduleId": "sched-1", "latitude": 32.9, "longitude": -97.0, "timestamp": 1745500000000,
+    })
+    batched = parse_location_points({"points": [{"cargoId": "cargo-1", "latitude": 32.9, "longitude": -97.0}]})
+
+    assert single[0].recorded_at == datetime.datetime(2025, 4, 24, 13, 6, 40)
+    assert batched[0].schedule_id == "cargo-1"
+
+    with pytest.raises(ValueError):
+        parse_location_points({"scheduleId": "sched-1", "latitude": 95, "longitude": 0})
+    with pytest.raises(ValueError):
+        parse_location_points({"points": []})
+
+
+def test_flushes_in_batches():
+    """Points are written to the sink in batch_size chunks"""
+    batches = []
+    ingestor = LocationIngestor(batches.append, batch_size=3, autostart=False)
+
+    ingestor.submit(make_points(7))
+    while ingestor.flush():
+        pass
+
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert ingestor.stats()["flushed"] == 7
+
+
+def test_full_buffer_drops_and_signals_backpressure():
+    """Points beyond max_buffer are rejected and counted"""
+    ingestor = LocationIngestor(lambda batch: None, max_buffer=5, high_watermark=0.8, autostart=False)
+
+    assert ingestor.submit(make_points(4)) == (4, 0)
+    assert ingestor.backpressure
+    assert ingestor.submit(make_points(3)) == (1, 2)
+    assert ingestor.stats()["dropped"] == 2
+
+
+def test_failed_flush_keeps_points_for_retry():
+    """A sink failure puts the batch back instead of losing it"""
+    calls = []
+
+    def flaky_sink(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+
+    ingestor = LocationIngestor(flaky_sink, batch_size=10, autostart=False)
+    ingestor.submit(make_points(4))
+
+    assert ingestor.flush() == 0
+    assert ingestor.flush() == 4
+    assert ingestor.stats()["flush_failures"] == 1
+    assert ingestor.stats()["pending"] == 0
+
+
+def test_background_thread_flushes_on_interval():
+    """A partial batch is flushed once flush_interval elapses"""
+    batches = []
+    ingestor = LocationIngestor(batches.append, batch_size=100, flush_interval=0.05)
+    ingestor.submit(make_points(2))
+    ingestor.stop()
+
+    assert sum(len(batch) for batch in batches) == 2
+
+
+def test_implausible_timestamps_and_ids_are_refused():
+    for timestamp in (1e20, 1e300, float("inf"), float("nan"), 10 ** 400, -1, "9999-12-31T00:00:00",
+                      "0001-01-01T00:00:00+01:00"):
+        with pytest.raises(ValueError):
+            parse_location_points({"scheduleId": "sched-1", "latitude": 32.9, "longitude": -97.0,
+                                   "timestamp": timestamp})
+    for ids in ({"scheduleId": "sched\x00-1"}, {"scheduleId": "sched-1", "cargoId": "cargo\x00"},
+                {"scheduleId": "sched-1", "cargoId": {"id": 1}}):
+        with pytest.raises(ValueError):
+            parse_location_points(dict(ids, latitude=32.9, longitude=-97.0))
+
+
+def test_rejected_points_are_dead_lettered_not_retried():
+    """A batch the database refuses is bisected until the bad point is found"""
+    written = []
+
+    def picky_sink(batch):
+        if any(p.longitude == -97.0 + 5e-4 for p in batch):
+            raise RejectedBatch("invalid input syntax")
+        written.extend(batch)
+
+    ingestor = LocationIngestor(picky_sink, batch_size=8, autostart=False)
+    ingestor.submit(make_points(8))
+
+    assert ingestor.flush() == 7
+    assert [p.longitude for p in written] == [-97.0 + i * 1e-4 for i in range(8) if i != 5]
+    assert [p.longitude for p in ingestor.dead_letters] == [-97.0 + 5e-4]
+    stats = ingestor.stats()
+    assert (stats["rejected"], stats["pending"], stats["flush_failures"]) == (1, 0, 0)
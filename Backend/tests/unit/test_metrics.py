@@ -0,0 +1,118 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.metrics import (
+    Histogram, MetricsRegistry, auth_failures, begin_request, end_request, record_query,
+    stats_collector,
+)
+from services.profiling import RequestProfiler, get_profiler
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.labels("/schedule").observe(value)
+
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{route="/schedule",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/schedule",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{route="/schedule",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/schedule"} 4' in lines
+    assert 'latency_seconds_sum{route="/schedule"} 3.65' in lines
+
+
+def test_counter_labels_are_escaped_and_registry_dedupes():
+    metrics = MetricsRegistry()
+    counter = metrics.counter("failures_total", "Failures", ("reason",))
+    assert metrics.counter("failures_total", "Failures", ("reason",)) is counter
+    counter.labels('bad "quote"\n').inc(2)
+    assert 'failures_total{reason="bad \\"quote\\"\\n"} 2' in metrics.render()
+
+
+def test_stats_collector_types_fields():
+    collect = stats_collector("pool", lambda: {"checkouts": 5, "in_use": 2, "healthy": True, "name": "x",
+                                               "queries": None}, counters=("checkouts",))
+    lines = collect()
+    assert "# TYPE pool_checkouts_total counter" in lines and "pool_checkouts_total 5" in lines
+    assert "pool_in_use 2" in lines and "pool_healthy 1" in lines
+    assert not any("name" in line or "queries" in line for line in lines)
+
+
+def test_queries_are_charged_to_the_current_request_only():
+    record_query(0.5)
+    stats = begin_request()
+    record_query(0.01)
+    record_query(0.02)
+    assert end_request() is stats
+    record_query(0.5)
+    assert stats.queries == 2 and abs(stats.db_seconds - 0.03) < 1e-9
+
+
+def test_profiler_samples_one_request_at_a_time():
+    profiler = RequestProfiler(sample_rate=0.0)
+    assert profiler.start() is None
+
+    profiler.set_sample_rate(1.0)
+    profile = profiler.start()
+    assert profile is not None
+    assert profiler.start() is None
+    sum(range(1000))
+    profiler.finish(profile, "GET", "/schedule", 200, 0.012)
+
+    report, = profiler.reports()
+    assert report["path"] == "/schedule" and "function calls" in report["profile"]
+    profile = profiler.start()
+    assert profile is not None
+    profiler.finish(profile, "GET", "/cargo/<string:cargo_id>", 404, 0.001)
+    assert len(profiler.reports()) == 2
+
+
+def test_metrics_endpoint_reports_routes_and_auth_failures():
+    import app as backend
+    client = backend.create_app().test_client()
+    before = auth_failures.labels("missing_token").value
+
+    assert client.get("/protected").status_code == 401
+    assert auth_failures.labels("missing_token").value == before + 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    body = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="GET",route="/protected",status="401"}' in body
+    assert 'http_request_db_queries_bucket{route="/protected",le="0"}' in body
+    assert "db_pool_checkouts_total" in body and "event_hub_subscribers" in body
+
+
+def test_profiling_can_be_switched_on_at_runtime(monkeypatch):
+    import app as backend
+    from services import event_routes, metrics_routes
+    relayed = []
+    monkeypatch.setattr(metrics_routes, "relay_state", lambda kind, items: relayed.append((kind, items)))
+    client = backend.create_app().test_client()
+    try:
+        # Without a key anyone may read, but nobody may switch profiling on
+        assert client.post("/metrics/profiling", json={"sampleRate": 1}).status_code == 403
+        assert client.get("/metrics/profiling").status_code == 200
+
+        monkeypatch.setattr(metrics_routes, "METRICS_KEY", "secret")
+        key = {"Authorization": "Bearer secret"}
+        assert client.post("/metrics/profiling", json={"sampleRate": 1}).status_code == 401
+        assert client.post("/metrics/profiling", json={"sampleRate": 1},
+                           headers={"Authorization": "Bearer wrong"}).status_code == 401
+        assert client.post("/metrics/profiling", json={"sampleRate": 2}, headers=key).status_code == 400
+        assert client.post("/metrics/profiling", json={"sampleRate": "often"}, headers=key).status_code == 400
+        assert client.post("/metrics/profiling", json={"sampleRate": 1}, headers=key).get_json()["sample_rate"] == 1.0
+        # The other workers switch too
+        assert relayed == [("profiling", [1.0])]
+        event_routes.state_handlers["profiling"]([0.5])
+        assert get_profiler().sample_rate == 0.5
+        get_profiler().set_sample_rate(1.0)
+
+        client.get("/health/cache")
+        reports = client.get("/metrics/profiling", headers=key).get_json()["reports"]
+        assert any(report["path"] == "/health/cache" for report in reports)
+    finally:
+        get_profiler().set_sample_rate(0.0)
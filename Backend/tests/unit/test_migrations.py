@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.migrations import discover_migrations, plan_has_seq_scan, plan_indexes
+
+
+def test_discover_migrations_in_version_order():
+    """Shipped migrations are numbered contiguously from 0001"""
+    versions = [version for version, _, _ in discover_migrations()]
+
+    assert versions == list(range(1, len(versions) + 1))
+
+
+def test_discover_migrations_rejects_duplicates(tmp_path):
+    """Two files with the same version number are an error"""
+    (tmp_path / "0001_first.sql").write_text("SELECT 1;")
+    (tmp_path / "0001_second.sql").write_text("SELECT 1;")
+
+    with pytest.raises(ValueError):
+        discover_migrations(tmp_path)
+
+
+def test_plan_walkers_find_nested_nodes():
+    """Index names and seq scans are found anywhere in the plan tree"""
+    plan = {
+        "Node Type": "Limit",
+        "Plans": [{
+            "Node Type": "Bitmap Heap Scan",
+            "Relation Name": "cargo_schedule",
+            "Plans": [{"Node Type": "Bitmap Index Scan", "Index Name": "idx_cargo_schedule_pickup_name"}],
+        }],
+    }
+
+    assert plan_indexes(plan) == ["idx_cargo_schedule_pickup_name"]
+    assert not plan_has_seq_scan(plan, "cargo_schedule")
+    assert plan_has_seq_scan({"Node Type": "Seq Scan", "Relation Name": "cargo_schedule"}, "cargo_schedule")
@@ -0,0 +1,260 @@
+import os
+import sys
+import uuid
+import threading
+import importlib.util
+import multiprocessing
+
+import pytest
+
+MOCK_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "Airport Mock"))
+sys.path.insert(0, MOCK_DIR)
+
+import state_store
+from state_store import MemoryStateStore, SQLiteStateStore, SharedMemoryStateStore
+
+BACKENDS = ("memory", "sqlite", "shm")
+
+
+def open_store(backend, where):
+    """A fresh store for ``backend``; ``where`` is a file path or shared-memory name"""
+    if backend == "memory":
+        return MemoryStateStore()
+    if backend == "sqlite":
+        return SQLiteStateStore(where)
+    return SharedMemoryStateStore(where, slots=8192)
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request, tmp_path):
+    backend = request.param
+    if backend == "shm" and state_store.fcntl is None:
+        pytest.skip("the shm backend needs fcntl")
+    where = str(tmp_path / "state.db") if backend == "sqlite" else f"cc_test_{uuid.uuid4().hex[:12]}"
+    store = open_store(backend, where)
+    store.backend, store.where = backend, where
+    yield store
+    if backend == "shm":
+        store.unlink()
+
+
+def _reserve_all(backend, where, attempts):
+    store = open_store(backend, where)
+    return sum(store.reserve("C") is not None for _ in range(attempts))
+
+
+def test_concurrent_reserve_never_goes_below_zero(store):
+    store.set_parking("C", 50)
+    taken = []
+
+    def grab():
+        taken.append(sum(store.reserve("C") is not None for _ in range(30)))
+
+    threads = [threading.Thread(target=grab) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(taken) == 50
+    assert store.parking("C") == 0
+    assert store.reserve("C") is None
+
+    if store.backend == "memory":
+        return
+    # Workers are separate processes for the shared backends
+    store.set_parking("C", 40)
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        taken = pool.starmap(_reserve_all, [(store.backend, store.where, 25)] * 4)
+    assert sum(taken) == 40
+    assert store.parking("C") == 0
+
+
+def test_release_gives_a_spot_back(store):
+    store.set_parking("B", 0)
+    assert store.reserve("B") is None
+    assert store.release("B") == 1
+    assert store.reserve("B") == 0
+    assert store.release("E") == 1 and store.parking("E") == 1
+    assert store.terminal_parking()["B"] == 0
+
+
+def test_bulk_import_of_thousands_of_ids(store):
+    delays = {str(uuid.UUID(int=i + 1)): i % 3 == 0 for i in range(3000)}
+    store.set_delays(delays)
+    store.set_delays({cid: not delayed for cid, delayed in list(delays.items())[:100]})
+
+    status = store.cargo_delay_status()
+    assert len(status) == 3000
+    for i, (cid, delayed) in enumerate(delays.items()):
+        assert store.is_delayed(cid) is (not delayed if i < 100 else delayed)
+    assert store.is_delayed(str(uuid.uuid4())) is False
+
+
+def test_seed_only_fills_an_empty_store(store):
+    defaults = (state_store.DEFAULT_TERMINAL_PARKING, state_store.DEFAULT_CARGO_DELAY_STATUS)
+    store.seed(*defaults)
+    store.set_parking("A", 3)
+    # A restarted worker seeds again, or attaches to the block another worker created
+    again = store if store.backend == "memory" else open_store(store.backend, store.where)
+    again.seed(*defaults)
+    assert again.parking("A") == 3 and again.parking("D") == 100
+    assert again.is_delayed("d0bea113-d248-457e-80b4-f4a2bf8703a5")
+
+
+def test_reads_stay_consistent_while_a_writer_runs(store):
+    cargo = [str(uuid.UUID(int=i + 1)) for i in range(200)]
+    store.set_parking("A", 3)
+    store.set_delays({cid: False for cid in cargo})
+    stop = threading.Event()
+    seen, errors = set(), []
+
+    def write():
+        flip = False
+        while not stop.is_set():
+            flip = not flip
+            store.set_parking("A", 7 if flip else 3)
+            store.set_delays({cid: flip for cid in cargo})
+
+    def read():
+        try:
+            for i in range(300):
+                seen.add(store.parking("A"))
+                assert store.is_delayed(cargo[0]) in (True, False)
+                if i % 30 == 0:
+                    assert len(store.cargo_delay_status()) == 200
+        except Exception as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    stop.set()
+    writer.join()
+
+    assert not errors
+    assert seen <= {3, 7}
+
+
+def test_shm_table_full_and_bad_ids(tmp_path):
+    if state_store.fcntl is None:
+        pytest.skip("the shm backend needs fcntl")
+    store = SharedMemoryStateStore(f"cc_test_{uuid.uuid4().hex[:12]}", slots=16)
+    try:
+        # Three quarters of 16 slots
+        store.set_delays({str(uuid.UUID(int=i + 1)): False for i in range(12)})
+        with pytest.raises(ValueError, match="MOCK_SHM_SLOTS"):
+            store.set_delays({str(uuid.UUID(int=100)): True})
+        assert len(store.cargo_delay_status()) == 12
+        # Updating an id already there needs no new slot
+        store.set_delays({str(uuid.UUID(int=1)): True})
+        assert store.is_delayed(str(uuid.UUID(int=1)))
+
+        with pytest.raises(ValueError, match="UUID"):
+            store.set_delays({"not-a-uuid": True})
+        with pytest.raises(ValueError, match="Unknown terminal"):
+            store.reserve("AA")
+        assert store.is_delayed("not-a-uuid") is False
+    finally:
+        store.unlink()
+
+
+def test_shm_recovers_from_a_writer_that_died_mid_change(monkeypatch):
+    if state_store.fcntl is None:
+        pytest.skip("the shm backend needs fcntl")
+    monkeypatch.setattr(SharedMemoryStateStore, "READ_TIMEOUT", 0.05)
+    store = SharedMemoryStateStore(f"cc_test_{uuid.uuid4().hex[:12]}", slots=16)
+    try:
+        store.set_parking("A", 4)
+        # What a writer leaves behind when it dies between its two bumps
+        store._bump()
+        assert store._sequence() % 2
+        assert store.terminal_parking() == {"A": 4}
+        assert store._sequence() % 2 == 0
+
+        # A writer that stays stuck with the lock held makes readers raise rather than spin
+        monkeypatch.setattr(store, "_write_lock", lambda: threading.Lock())
+        store._bump()
+        with pytest.raises(RuntimeError, match="stuck"):
+            store.terminal_parking()
+    finally:
+        store.unlink()
+
+
+@pytest.fixture
+def mock_client(store, monkeypatch):
+    spec = importlib.util.spec_from_file_location("airport_mock", os.path.join(MOCK_DIR, "script.py"))
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setenv("MOCK_STATE_BACKEND", "memory")
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, "store", store)
+    return module.app.test_client()
+
+
+def test_parking_endpoints(mock_client, store):
+    store.set_parking("C", 1)
+    assert mock_client.post("/reserve-parking", json={}).status_code == 400
+    assert mock_client.post("/release-parking", data={}).status_code == 400
+
+    first = mock_client.post("/reserve-parking", json={"terminal": "c"})
+    assert first.status_code == 200 and first.get_json() == {"reserved": True, "remaining": 0}
+    second = mock_client.post("/reserve-parking", data={"terminal": "C"})
+    assert second.status_code == 409 and second.get_json()["reserved"] is False
+
+    assert mock_client.post("/release-parking", json={"terminal": "C"}).get_json() == {"available": 1}
+    if store.backend == "shm":
+        assert mock_client.post("/reserve-parking", json={"terminal": "CC"}).status_code == 400
+
+
+def test_import_cargo_endpoint(mock_client, store):
+    ids = [str(uuid.UUID(int=i + 1)) for i in range(500)]
+    response = mock_client.post("/import-cargo", json=[{"cargo_id": cid, "delayed": True} for cid in ids])
+    assert response.status_code == 200 and response.get_json() == {"imported": 500}
+    assert mock_client.post("/import-cargo", json={ids[0]: False}).get_json() == {"imported": 1}
+    assert not store.is_delayed(ids[0]) and store.is_delayed(ids[1])
+
+    assert mock_client.post("/import-cargo", json="nope").status_code == 400
+    assert mock_client.post("/import-cargo", json=[{"delayed": True}]).status_code == 400
+    bad_id = mock_client.post("/import-cargo", json={"not-a-uuid": True})
+    assert bad_id.status_code == (400 if store.backend == "shm" else 200)
+
+    status = mock_client.get(f"/get-cargo-status?cargo_id={ids[1]}&terminal=Z").get_json()
+    assert status["action"] == "Pull_Up"
+
+
+def test_only_the_shm_backend_needs_fcntl(monkeypatch):
+    # As on Windows, where fcntl does not exist
+    monkeypatch.setattr(state_store, "fcntl", None)
+    assert state_store.create_state_store("memory").parking("D") == 100
+    with pytest.raises(RuntimeError, match="fcntl"):
+        SharedMemoryStateStore("cc_test_unused")
+
+
+def test_cargo_status_batch_endpoint(mock_client, store):
+    ids = [str(uuid.UUID(int=i + 1)) for i in range(3)]
+    store.set_delays({ids[0]: True, ids[1]: False})
+    store.set_parking("A", 0)
+    store.set_parking("B", 2)
+
+    cargo = [{"cargo_id": ids[0], "terminal": "a"}, {"cargo_id": ids[1], "terminal": "B"},
+             {"cargo_id": ids[2], "terminal": "a"}]
+    response = mock_client.post("/get-cargo-status/batch", json={"cargo": cargo})
+    assert response.status_code == 200
+    statuses = response.get_json()["statuses"]
+    assert [(s["cargo_id"], s["terminal"], s["action"]) for s in statuses] == [
+        (ids[0], "A", "Pull_Up"), (ids[1], "B", "Bay_Area"), (ids[2], "A", "Parking")]
+    # A bare list works too, and gives what the single lookup gives
+    single = mock_client.get(f"/get-cargo-status?cargo_id={ids[1]}&terminal=B").get_json()
+    assert mock_client.post("/get-cargo-status/batch", json=cargo[1:2]).get_json()["statuses"][0]["action"] == \
+        single["action"]
+
+    for body in ([], {"cargo": "x"}, "nope", [{"cargo_id": "x"}], ["x"],
+                 [{"cargo_id": "x", "terminal": 5}], [{"cargo_id": 7, "terminal": "A"}],
+                 [{"cargo_id": ["x"], "terminal": "A"}]):
+        assert mock_client.post("/get-cargo-status/batch", json=body).status_code == 400, body
+    too_many = [{"cargo_id": ids[0], "terminal": "A"}] * 1001
+    assert mock_client.post("/get-cargo-status/batch", json=too_many).status_code == 400
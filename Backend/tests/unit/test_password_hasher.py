@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.password_hasher import HasherBusy, PasswordHasher
+
+
+def test_hash_and_verify_in_worker_process():
+    """Hashes made in the process pool verify and carry the configured method"""
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=1)
+    try:
+        pwhash = hasher.hash("demo123")
+
+        assert pwhash.startswith("pbkdf2:sha256:1000$")
+        assert hasher.verify(pwhash, "demo123")
+        assert not hasher.verify(pwhash, "wrong")
+    finally:
+        hasher.shutdown()
+
+
+def test_needs_rehash_when_work_factor_changes():
+    """Hashes from an older work factor are flagged for upgrade"""
+    old = PasswordHasher(method="pbkdf2:sha256:1000", workers=0)
+    new = PasswordHasher(method="pbkdf2:sha256:2000", workers=0)
+    pwhash = old.hash("demo123")
+
+    assert not old.needs_rehash(pwhash)
+    assert new.needs_rehash(pwhash)
+    assert new.verify(pwhash, "demo123")
+
+
+def test_full_queue_raises_busy():
+    """Callers beyond max_pending are turned away instead of queueing forever"""
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=0, max_pending=1, queue_timeout=0.01)
+    hasher._slots.acquire()
+
+    with pytest.raises(HasherBusy):
+        hasher.hash("demo123")
+
+    hasher._slots.release()
+    assert hasher.stats()["rejected"] == 1
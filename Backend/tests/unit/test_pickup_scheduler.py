@@ -0,0 +1,343 @@
+import os
+import sys
+import random
+import datetime
+from contextlib import contextmanager
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from flask import Blueprint, Flask, jsonify, request
+
+from services import pickup_routes
+from services.leader_lock import LeaderLock
+from services.leader_proxy import FORWARDED_HEADER, LeaderServer
+from services.pickup_scheduler import Pickup, PickupFeed, PickupScheduler, pickup_from_item
+from services.process_local import ProcessLocal
+
+NOW = datetime.datetime(2025, 5, 1, 8, 0)
+
+
+def pickup(i, minutes, terminal="A", criticality="low", delayed=False):
+    return Pickup(f"sched-{i}", f"cargo-{i}", terminal, criticality, NOW + datetime.timedelta(minutes=minutes), delayed)
+
+
+def item(i, minutes, terminal="dfw-terminal-a", criticality="low"):
+    return {
+        "id": f"sched-{i}",
+        "cargoId": f"cargo-{i}",
+        "pickupTime": (NOW + datetime.timedelta(minutes=minutes)).isoformat(),
+        "criticality": criticality,
+        "pickupLocation": f"{terminal}_(32.9, -97.0)",
+        "dropoffLocation": "Ups-station_(32.8, -97.1)",
+    }
+
+
+def test_tick_dispatches_only_pickups_within_the_lead_time():
+    scheduler = PickupScheduler(lead_minutes=60)
+    scheduler.upsert(pickup(1, 30))
+    scheduler.upsert(pickup(2, 90))
+
+    assigned = scheduler.tick(NOW)
+
+    assert [a["scheduleId"] for a in assigned] == ["sched-1"]
+    assert assigned[0]["slotStart"] == "2025-05-01T08:30:00"
+    assert scheduler.assignment("sched-2")["status"] == "pending"
+    assert [a["scheduleId"] for a in scheduler.tick(NOW + datetime.timedelta(minutes=30))] == ["sched-2"]
+
+
+def test_criticality_credit_wins_the_last_dock():
+    """A high load due a little later still gets the slot before a low one"""
+    scheduler = PickupScheduler(docks={"A": 1}, lead_minutes=120)
+    scheduler.upsert(pickup(1, 30, criticality="low"))
+    scheduler.upsert(pickup(2, 40, criticality="high"))
+
+    assigned = {a["scheduleId"]: a for a in scheduler.tick(NOW)}
+
+    assert assigned["sched-2"]["slotStart"] == "2025-05-01T08:30:00"
+    assert assigned["sched-1"]["slotStart"] == "2025-05-01T08:45:00"
+    assert assigned["sched-1"]["waitMinutes"] == 15.0
+
+
+def test_docks_are_never_double_booked():
+    rng = random.Random(5)
+    scheduler = PickupScheduler(docks={"A": 2, "B": 1}, lead_minutes=24 * 60)
+    for i in range(300):
+        scheduler.upsert(pickup(i, rng.randrange(0, 600), rng.choice("AB"), rng.choice(["high", "medium", "low"])))
+    scheduler.tick(NOW)
+
+    seen = set()
+    for a in scheduler.plan():
+        key = (a["terminal"], a["slot"], a["dock"])
+        assert key not in seen
+        seen.add(key)
+        assert a["dock"] <= {"A": 2, "B": 1}[a["terminal"]]
+        assert a["slotEnd"] > a["pickupTime"]
+    assert len(seen) + scheduler.stats()["pending"] == 300
+
+
+def test_trucks_are_chained_with_turnaround():
+    scheduler = PickupScheduler(docks={"A": 5}, trucks=1, slot_minutes=15, turnaround_minutes=30)
+    scheduler.upsert(pickup(1, 0))
+    scheduler.upsert(pickup(2, 5))
+
+    first, second = scheduler.tick(NOW)
+
+    assert first["truck"] == second["truck"] == 1
+    assert first["truckFreeAt"] == "2025-05-01T08:45:00"
+    assert second["slotStart"] == "2025-05-01T08:45:00"
+    assert "_truckWasFree" not in second
+
+
+def test_delay_releases_the_slot_and_requeues():
+    scheduler = PickupScheduler(docks={"A": 1})
+    scheduler.upsert(pickup(1, 10))
+    scheduler.upsert(pickup(2, 12))
+    scheduler.tick(NOW)
+    assert scheduler.assignment("sched-2")["slotStart"] == "2025-05-01T08:15:00"
+
+    scheduler.delay("sched-1", NOW + datetime.timedelta(hours=3))
+    assert scheduler.assignment("sched-1")["status"] == "pending"
+
+    # Dispatched pickups keep their windows; only sched-1 is planned again
+    assert scheduler.tick(NOW) == []
+    assigned = scheduler.tick(NOW + datetime.timedelta(hours=2, minutes=30))
+    assert [(a["scheduleId"], a["reassigned"]) for a in assigned] == [("sched-1", True)]
+
+
+def test_complete_frees_the_dock_and_survives_resync():
+    scheduler = PickupScheduler(docks={"A": 1})
+    scheduler.upsert(pickup(1, 0))
+    scheduler.tick(NOW)
+    assert scheduler.complete("sched-1")
+
+    scheduler.sync([pickup(1, 0)], NOW, NOW + datetime.timedelta(hours=6), full=True)
+    scheduler.upsert(pickup(2, 0))
+
+    assert scheduler.tick(NOW)[0]["slotStart"] == "2025-05-01T08:00:00"
+    assert scheduler.assignment("sched-1") is None
+    assert not scheduler.complete("sched-1")
+
+
+def test_heap_compacts_after_many_updates():
+    scheduler = PickupScheduler()
+    for minutes in range(1000):
+        scheduler.upsert(pickup(1, minutes % 50 + 100))
+    stats = scheduler.stats()
+
+    assert stats["pending"] == 1
+    assert stats["heap_entries"] <= 65
+    assert [p["scheduleId"] for p in scheduler.queue()] == ["sched-1"]
+
+
+def test_queue_orders_by_deadline_and_filters_terminal():
+    scheduler = PickupScheduler()
+    scheduler.upsert(pickup(1, 50, "A", "low"))
+    scheduler.upsert(pickup(2, 70, "B", "high"))
+    scheduler.upsert(pickup(3, 40, "A", "medium"))
+
+    assert [p["scheduleId"] for p in scheduler.queue()] == ["sched-2", "sched-3", "sched-1"]
+    assert [p["scheduleId"] for p in scheduler.queue(terminal="a")] == ["sched-3", "sched-1"]
+    assert scheduler.assignment("sched-1")["queuePosition"] == 3
+
+
+def test_feed_reads_only_new_horizon_until_the_version_moves():
+    calls = []
+    version = [1]
+    rows = [item(1, 30), item(2, 200), item(3, 30, "Ups-station")]
+
+    def fetch(filters):
+        calls.append((filters["pickup_from"], filters["pickup_to"]))
+        return [r for r in rows
+                if filters["pickup_from"] <= datetime.datetime.fromisoformat(r["pickupTime"]) < filters["pickup_to"]]
+
+    feed = PickupFeed(PickupScheduler(), fetch, version=lambda: version[0], horizon_hours=3)
+    assert [a["scheduleId"] for a in feed.tick(NOW)] == ["sched-1"]
+    assert feed.tick(NOW + datetime.timedelta(minutes=30)) == []
+    assert calls[1] == (NOW + datetime.timedelta(hours=3), NOW + datetime.timedelta(hours=3, minutes=30))
+    assert feed.scheduler.assignment("sched-2")["status"] == "pending"
+
+    rows.pop(1)
+    version[0] = 2
+    feed.tick(NOW + datetime.timedelta(minutes=31))
+    assert calls[2][0] == NOW + datetime.timedelta(minutes=31)
+    assert feed.scheduler.assignment("sched-2") is None
+    assert feed.stats()["full_loads"] == 2
+
+
+def test_feed_keeps_state_when_a_read_fails():
+    def fetch(filters):
+        raise RuntimeError("database down")
+
+    scheduler = PickupScheduler()
+    scheduler.upsert(pickup(1, 10))
+    feed = PickupFeed(scheduler, fetch)
+
+    assert [a["scheduleId"] for a in feed.tick(NOW)] == ["sched-1"]
+    assert feed.stats()["load_failures"] == 1
+    assert feed.stats()["loaded_to"] is None
+
+
+def test_pickup_from_item_reads_schedule_items():
+    p = pickup_from_item(item(7, 15, "dfw-terminal-c", "high"))
+    assert p == Pickup("sched-7", "cargo-7", "C", "high", NOW + datetime.timedelta(minutes=15), False)
+
+
+class AdvisoryServer:
+    """Session advisory locks as PostgreSQL keeps them: held until the holding connection closes"""
+
+    def __init__(self):
+        self.holders = {}
+        self.urls = {}
+
+    def drop(self, conn):
+        """The connection dies; the server releases what it held"""
+        conn.close()
+        conn.broken = True
+
+    def connect(self):
+        server = self
+
+        class Connection:
+            autocommit = False
+            broken = False
+
+            def cursor(self):
+                return Cursor(self)
+
+            def close(self):
+                for key, holder in list(server.holders.items()):
+                    if holder is self:
+                        del server.holders[key]
+
+        class Cursor:
+            def __init__(self, conn):
+                self.conn = conn
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                if self.conn.broken:
+                    raise ConnectionError("server closed the connection")
+                if "pg_try_advisory_lock" in sql:
+                    self.held = server.holders.setdefault(params[0], self.conn) is self.conn
+                elif "INSERT INTO scheduler_leaders" in sql:
+                    server.urls[params[0]] = params[1]
+
+            def fetchone(self):
+                return (self.held,)
+
+        return Connection()
+
+    @contextmanager
+    def cursor(self):
+        """The pool side: reads the advertised addresses"""
+        server = self
+
+        class Cursor:
+            def execute(self, sql, params):
+                self.row = (server.urls[params[0]],) if params[0] in server.urls else None
+
+            def fetchone(self):
+                return self.row
+
+        yield Cursor()
+
+
+def test_only_one_process_holds_the_leader_lock():
+    server, now = AdvisoryServer(), [0.0]
+    first, second = (LeaderLock("pickup_scheduler", connect=server.connect, clock=lambda: now[0])
+                     for _ in range(2))
+
+    assert first.is_leader()
+    assert not second.is_leader()
+    # Followers retry at most every retry_seconds
+    assert not second.refresh()
+
+    server.drop(first._conn)
+    now[0] += 5
+    assert second.refresh() and second.is_leader()
+    assert first.refresh() is False and first.stats()["lost"] == 1
+    assert not first.is_leader()
+
+    second.release()
+    assert first.refresh(force=True) and first.stats() == {"leader": True, "acquired": 2, "lost": 1}
+
+
+def test_leader_lock_without_a_database_leads_nowhere():
+    def connect():
+        raise ConnectionError("could not connect to server")
+
+    assert not LeaderLock("pickup_scheduler", connect=connect).is_leader()
+
+
+def test_pickup_requests_are_forwarded_to_the_scheduler_process(monkeypatch):
+    app = Flask(__name__)
+    app.register_blueprint(pickup_routes.pickup_bp)
+    client = app.test_client()
+    server = AdvisoryServer()
+
+    # The scheduler elected elsewhere, reduced to an echo of what reaches it
+    echo = Blueprint("echo", __name__, url_prefix="/pickups")
+
+    @echo.route("/<path:rest>", methods=["GET", "POST"])
+    def echo_request(rest):
+        return jsonify({"method": request.method, "path": request.full_path, "body": request.get_json(silent=True),
+                        "forwarded": request.headers.get(FORWARDED_HEADER)}), 202
+
+    elsewhere_server = LeaderServer([echo])
+    elsewhere = LeaderLock("pickup_scheduler", connect=server.connect, advertise=elsewhere_server.start)
+    assert elsewhere.is_leader()
+
+    monkeypatch.setattr(pickup_routes, "_leader", ProcessLocal(
+        lambda: LeaderLock("pickup_scheduler", connect=server.connect, pool=server)))
+    try:
+        for method, path in (("get", "/pickups/queue?limit=5"), ("post", "/pickups/sched-1/delay"),
+                             ("post", "/pickups/sched-1/complete"), ("post", "/pickups/tick")):
+            response = getattr(client, method)(path, json={"minutes": 5})
+            assert response.status_code == 202
+            echoed = response.get_json()
+            assert (echoed["method"], echoed["path"].rstrip("?")) == (method.upper(), path)
+            assert echoed["body"] == {"minutes": 5} and echoed["forwarded"] == "1"
+        assert client.get("/pickups/stats").get_json()["scheduler"] is False
+
+        # A forwarded request is never passed on a second time
+        assert client.get("/pickups/queue", headers={FORWARDED_HEADER: "1"}).status_code == 503
+    finally:
+        elsewhere_server.stop()
+    response = client.get("/pickups/queue")
+    assert response.status_code == 503 and response.headers["Retry-After"] == "5"
+
+    # Once the other scheduler is gone this process takes over
+    elsewhere.release()
+    pickup_routes._leader.get().release()
+    assert client.get("/pickups/queue").status_code == 200
+    assert client.get("/pickups/stats").get_json()["scheduler"] is True
+
+    monkeypatch.setattr(pickup_routes, "PICKUP_SCHEDULER_ENABLED", False)
+    assert client.post("/pickups/sched-1/complete").status_code == 503
+    assert pickup_routes._background_ticks() is None
+
+
+def test_delay_rejects_moves_past_the_bound(monkeypatch):
+    scheduler = PickupScheduler()
+    scheduler.upsert(pickup(1, 30))
+    monkeypatch.setattr(pickup_routes, "pickup_scheduler", scheduler)
+    monkeypatch.setattr(pickup_routes, "PICKUP_SCHEDULER_LOCK", False)
+    monkeypatch.setattr(pickup_routes, "_leader", ProcessLocal(lambda: None))
+    monkeypatch.setattr(pickup_routes.event_hub, "publish", lambda *args: None)
+    app = Flask(__name__)
+    app.register_blueprint(pickup_routes.pickup_bp)
+    client = app.test_client()
+
+    for body in ({"minutes": 1e10}, {"minutes": -1e10}, {"minutes": "inf"}, {"minutes": 7 * 24 * 60 + 1},
+                 {"pickupTime": "9999-12-31T23:59:00"}):
+        response = client.post("/pickups/sched-1/delay", json=body)
+        assert response.status_code == 400, body
+
+    response = client.post("/pickups/sched-1/delay", json={"minutes": 90})
+    assert response.status_code == 200
+    assert response.get_json()["pickupTime"] == "2025-05-01T10:00:00"
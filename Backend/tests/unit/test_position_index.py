@@ -0,0 +1,89 @@
+import os
+import sys
+import random
+import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.geo import haversine_km
+from services.position_index import PositionIndex
+from services.sites import TERMINALS
+
+TERMINAL_C = TERMINALS["dfw-terminal-c"]
+
+
+def scatter(index, count, seed=7):
+    rng = random.Random(seed)
+    positions = {}
+    for i in range(count):
+        lat = 32.85 + rng.random() * 0.2
+        lon = -97.1 + rng.random() * 0.4
+        index.update(f"sched-{i}", lat, lon, 1745500000 + i)
+        positions[f"sched-{i}"] = (lat, lon)
+    return positions
+
+
+def test_latest_keeps_newest_fix_and_cargo_alias():
+    """Out-of-order fixes are ignored and cargo ids resolve to their schedule"""
+    index = PositionIndex()
+    index.update("sched-1", 32.90, -97.03, datetime.datetime(2025, 4, 24, 13, 0), cargo_id="cargo-1")
+    index.update("sched-1", 32.91, -97.04, datetime.datetime(2025, 4, 24, 12, 0))
+
+    latest = index.latest("cargo-1")
+    assert latest["scheduleId"] == "sched-1"
+    assert latest["latitude"] == 32.90
+
+
+def test_within_radius_matches_brute_force():
+    """The grid returns exactly the trucks a full scan would"""
+    index = PositionIndex()
+    positions = scatter(index, 2000)
+
+    found = {t["scheduleId"] for t in index.within_radius(*TERMINAL_C, radius_km=3)}
+    expected = {key for key, (lat, lon) in positions.items() if haversine_km(*TERMINAL_C, lat, lon) <= 3}
+
+    assert found == expected
+
+
+def test_nearest_matches_brute_force():
+    """Nearest-N agrees with sorting every truck by distance"""
+    index = PositionIndex()
+    positions = scatter(index, 2000)
+
+    found = [t["scheduleId"] for t in index.nearest(*TERMINAL_C, n=5)]
+    expected = sorted(positions, key=lambda key: haversine_km(*TERMINAL_C, *positions[key]))[:5]
+
+    assert found == expected
+
+
+def test_moving_and_removing_updates_grid():
+    """A truck that moves away or is removed no longer shows up near its old cell"""
+    index = PositionIndex()
+    index.update("sched-1", *TERMINAL_C, 1)
+    index.update("sched-1", 33.02, -96.79, 2)
+
+    assert index.within_radius(*TERMINAL_C, radius_km=1) == []
+    assert index.remove("sched-1")
+    assert index.nearest(33.02, -96.79, n=1) == []
+    assert len(index) == 0
+
+
+def test_nearby_rejects_non_finite_and_out_of_range_queries(monkeypatch):
+    from flask import Flask
+    from services import location_routes
+
+    index = PositionIndex()
+    index.update("sched-1", *TERMINAL_C, 1)
+    monkeypatch.setattr(location_routes, "position_index", index)
+    app = Flask(__name__)
+    app.register_blueprint(location_routes.location_bp)
+    client = app.test_client()
+    lat, lon = TERMINAL_C
+
+    response = client.get(f"/location/nearby?lat={lat}&lon={lon}&radiusKm=5")
+    assert [t["scheduleId"] for t in response.get_json()["trucks"]] == ["sched-1"]
+    for query in ("lat=nan&lon=-97", "lat=32.9&lon=inf", "lat=91&lon=-97", "lat=x&lon=-97",
+                  f"lat={lat}&lon={lon}&radiusKm=inf", f"lat={lat}&lon={lon}&radiusKm=-1",
+                  f"lat={lat}&lon={lon}&radiusKm=nan", f"lat={lat}&lon={lon}&maxAgeSeconds=-inf",
+                  f"lat={lat}&lon={lon}&limit=0", "site=nowhere", "lon=-97"):
+        assert client.get(f"/location/nearby?{query}").status_code == 400, query
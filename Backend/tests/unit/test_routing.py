@@ -0,0 +1,167 @@
+import os
+import sys
+import random
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.routing import RoadGraph, Router, encode_polyline
+from services.sites import DROPOFF_SITES, TERMINALS
+from services.synthetic_data import road_graph
+from services.traffic_state import TrafficState, parse_agent_events, parse_agents
+
+# A -> B -> D is quicker than A -> C -> D; the B leg is a highway
+DIAMOND = {
+    "nodes": [[33.0, -97.0], [33.01, -96.99], [32.99, -96.99], [33.0, -96.98]],
+    "sites": {"A": 0, "D": 3},
+    "edges": [
+        [0, 1, 1400, 100, 1, 0], [1, 3, 1400, 100, 1, 0],
+        [0, 2, 1400, 50, 0, 0], [2, 3, 1400, 50, 0, 1],
+    ],
+}
+
+
+@pytest.fixture(scope="module")
+def grid():
+    return road_graph(1)
+
+
+def test_polyline_matches_the_reference_encoding():
+    assert encode_polyline([(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def test_graph_arrays_hold_both_directions_unless_oneway():
+    graph = RoadGraph.from_dict(DIAMOND)
+
+    assert graph.edge_count == 7
+    assert graph.edge(3, 2) is None and graph.edge(2, 3) is not None
+    assert graph.weight(graph.edge(0, 1)) == pytest.approx(50.4)
+    assert sorted(graph.sources[graph.in_edges[i]] for i in range(graph.in_offsets[3], graph.in_offsets[4])) == [1, 2]
+    assert graph.nearest(33.0001, -96.98)[0] == 3
+
+
+def test_tree_routes_match_a_fresh_search(grid):
+    graph = RoadGraph.from_dict(grid)
+    router = Router(graph)
+    rng = random.Random(2)
+
+    assert set(router.trees) == set(DROPOFF_SITES)
+    for _ in range(20):
+        lat, lon = graph.lat[rng.randrange(graph.node_count)], graph.lon[rng.randrange(graph.node_count)]
+        for name in DROPOFF_SITES:
+            tree = router.route(lat, lon, name)
+            searched = router.route(lat, lon, DROPOFF_SITES[name])
+            assert tree["source"] == "tree" and searched["source"] == "search"
+            assert tree["durationSeconds"] == pytest.approx(searched["durationSeconds"], abs=0.1)
+
+
+def test_repairs_match_a_full_rebuild(grid):
+    graph = RoadGraph.from_dict(grid)
+    router = Router(graph)
+    rng = random.Random(3)
+
+    for _ in range(200):
+        e = rng.randrange(graph.edge_count)
+        router.set_edge_factor(graph.sources[e], graph.targets[e], rng.choice([1.0, 1.5, 4.0, 20.0]))
+        if rng.random() < 0.2:
+            router.set_node_penalty(rng.randrange(graph.node_count), rng.choice([0.0, 120.0, 900.0]))
+
+    repaired = {name: list(tree.dist) for name, tree in router.trees.items()}
+    router.rebuild()
+    for name, tree in router.trees.items():
+        assert list(tree.dist) == pytest.approx(repaired[name])
+    assert router.stats()["repairs"] > 0
+
+
+def test_red_agent_reroutes_and_green_restores():
+    graph = RoadGraph.from_dict(DIAMOND)
+    router = Router(graph, destinations=["D"])
+    traffic = TrafficState(corridors={})
+    traffic.add_listener(router.update_agents)
+    traffic.register(parse_agents([{"code": "Agent3", "latitude": 33.01, "longitude": -96.99,
+                                    "updated_at": "2025-05-01T08:00:00"}]))
+
+    assert router.route(33.0, -97.0, "D")["nodes"] == 3
+    assert router.route(33.0, -97.0, "D")["agents"] == [{"code": "Agent3", "state": "G"}]
+
+    traffic.apply(parse_agent_events([{"code": "Agent3", "state": "R", "timestamp": "2025-05-01T08:05:00"}]))
+    detour = router.route(33.0, -97.0, "D")
+    assert detour["agents"] == [] and detour["durationSeconds"] == pytest.approx(201.6)
+
+    traffic.apply(parse_agent_events([{"code": "Agent3", "state": "G", "timestamp": "2025-05-01T08:10:00"}]))
+    assert router.route(33.0, -97.0, "D")["durationSeconds"] == pytest.approx(100.8)
+
+
+def test_avoiding_highways_searches_without_them():
+    router = Router(RoadGraph.from_dict(DIAMOND), destinations=["D"])
+
+    route = router.route(33.0, -97.0, "D", avoid_highways=True)
+    assert route["source"] == "search" and route["durationSeconds"] == pytest.approx(201.6)
+    # The only way back from D is the B highway
+    assert router.route(33.0, -96.98, "A", avoid_highways=True) is None
+    with pytest.raises(ValueError):
+        router.route(40.0, -97.0, "D")
+
+
+def test_routing_endpoints(monkeypatch):
+    from flask import Flask
+    from services import event_routes
+    from services.routing_routes import routing_bp
+
+    monkeypatch.setattr(event_routes, "EVENTS_PUBLISH_KEY", "test-key")
+    key = {"X-Publish-Key": "test-key"}
+    app = Flask(__name__)
+    app.register_blueprint(routing_bp)
+    client = app.test_client()
+    lat, lon = TERMINALS["dfw-terminal-c"]
+
+    response = client.get(f"/routing/route?fromLat={lat}&fromLon={lon}&to=Fedex-store")
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["source"] == "tree" and body["polyline"] and body["distanceKm"] > 0
+
+    assert client.get(f"/routing/route?fromLat={lat}&fromLon={lon}&to=nowhere").status_code == 400
+    assert client.get(f"/routing/route?fromLat={lat}&to=Fedex-store").status_code == 400
+    assert client.post("/routing/edges", json={"from": 0, "to": 1, "factor": 2}).status_code == 401
+    assert client.post("/routing/edges", json={"from": 0, "to": 1, "factor": 0.5}, headers=key).status_code == 400
+    assert client.post("/routing/edges", json={"from": 0, "to": 10 ** 6, "factor": 2},
+                       headers=key).get_json()["missing"] == 1
+
+
+def test_edge_factors_reach_every_worker(monkeypatch):
+    from contextlib import contextmanager
+    from flask import Flask
+    from services import event_routes, routing_routes
+    from services.event_relay import PgStateRelay
+    from services.process_local import ProcessLocal
+
+    sent = []
+
+    class NotifyPool:
+        @contextmanager
+        def cursor(self):
+            class Cursor:
+                def execute(self, sql, params=None):
+                    sent.append(params[1])
+            yield Cursor()
+
+    here = PgStateRelay(event_routes.state_handlers, pool=NotifyPool())
+    monkeypatch.setattr(event_routes, "_state_relay", ProcessLocal(lambda: here))
+    event_routes._state_relay.get()
+    monkeypatch.setattr(event_routes, "EVENTS_PUBLISH_KEY", "test-key")
+    monkeypatch.setattr(routing_routes, "router", Router(RoadGraph.from_dict(DIAMOND)))
+    app = Flask(__name__)
+    app.register_blueprint(routing_routes.routing_bp)
+
+    response = app.test_client().post("/routing/edges", json=[{"from": 0, "to": 1, "factor": 3}, {"from": 1, "to": 3}],
+                                      headers={"X-Publish-Key": "test-key"})
+    assert response.get_json() == {"updated": 2, "missing": 0}
+
+    there = Router(RoadGraph.from_dict(DIAMOND))
+    other_worker = PgStateRelay({"routing_edges": event_routes.state_handlers["routing_edges"]})
+    monkeypatch.setattr(routing_routes, "router", there)
+    for payload in sent:
+        other_worker._deliver(payload)
+    assert there.graph.factor[there.graph.edge(0, 1)] == 3
+    assert there.route(33.0, -97.0, "D")["durationSeconds"] == pytest.approx(201.6)
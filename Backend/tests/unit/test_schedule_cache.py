@@ -0,0 +1,108 @@
+import os
+import sys
+import uuid
+import datetime
+from contextlib import contextmanager
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.cargo_scheduler import CargoScheduler
+from services.schedule_cache import ScheduleCache, cache_key
+
+
+class CountingPool:
+    """Stand-in pool that counts queries and can be told to fail"""
+
+    def __init__(self, row):
+        self.row = row
+        self.queries = 0
+        self.fail = False
+
+    @contextmanager
+    def cursor(self, **kwargs):
+        pool = self
+
+        class Cursor:
+            def execute(self, query, params=None):
+                if pool.fail:
+                    raise RuntimeError("connection lost")
+                pool.queries += 1
+
+            def fetchone(self):
+                return pool.row
+
+            def fetchall(self):
+                return [pool.row]
+
+        yield Cursor()
+
+
+def make_detail_row():
+    return (uuid.UUID(int=1), "Pallets", 12.5, "dfw-terminal-a", "Ups-station", "high",
+            datetime.datetime(2025, 1, 1, 8, 0))
+
+
+def test_cache_key_freezes_filters():
+    assert cache_key("page", 10, None, {"criticality": ["high"], "pickup_location": "a"}) == \
+        cache_key("page", 10, None, {"pickup_location": "a", "criticality": ["high"]})
+
+
+def test_reads_bypass_cache_until_version_known():
+    cache = ScheduleCache()
+    loads = []
+    assert cache.fetch("k", lambda: loads.append(1) or "v") == "v"
+    assert cache.fetch("k", lambda: loads.append(1) or "v") == "v"
+    assert len(loads) == 2 and cache.etag("k") is None
+
+    cache.set_version(7)
+    cache.fetch("k", lambda: loads.append(1) or "v")
+    cache.fetch("k", lambda: loads.append(1) or "v")
+    assert len(loads) == 3
+    assert cache.etag("k").startswith("7-")
+
+
+def test_version_change_invalidates_and_retags():
+    cache = ScheduleCache()
+    cache.set_version(1)
+    cache.fetch("k", lambda: "old")
+    etag = cache.etag("k")
+
+    cache.set_version(2)
+    assert cache.fetch("k", lambda: "new") == "new"
+    assert cache.etag("k") != etag
+    # Late or duplicate notifications never move the version backwards
+    cache.set_version(1)
+    assert cache.version == 2 and cache.fetch("k", lambda: "newer") == "new"
+
+
+def test_load_racing_an_invalidation_is_not_stored():
+    cache = ScheduleCache()
+    cache.set_version(1)
+
+    def load():
+        cache.set_version(2)
+        return "stale"
+
+    assert cache.fetch("k", load) == "stale"
+    assert cache.fetch("k", lambda: "fresh") == "fresh"
+
+
+def test_scheduler_reads_through_cache_and_skips_errors():
+    pool = CountingPool(make_detail_row())
+    cache = ScheduleCache(listening=False)
+    scheduler = CargoScheduler(pool, cache=cache)
+    cargo_id = str(uuid.UUID(int=1))
+
+    pool.fail = True
+    assert scheduler.get_cargo_detail(cargo_id) is None
+    pool.fail = False
+    assert scheduler.get_cargo_detail(cargo_id)["description"] == "Pallets"
+    assert scheduler.get_cargo_detail(cargo_id)["description"] == "Pallets"
+    assert pool.queries == 1
+
+    row = make_detail_row()
+    pool.row = (uuid.UUID(int=2), row[0], row[6], "high", row[3], row[4])
+    assert scheduler.get_schedule_page(10)[0][0]["cargoId"] == cargo_id
+    scheduler.get_schedule_page(10)
+    scheduler.get_schedule_page(10, filters={"criticality": ["high"]})
+    assert pool.queries == 3
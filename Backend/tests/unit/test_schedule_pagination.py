@@ -0,0 +1,205 @@
+import os
+import sys
+import uuid
+import datetime
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.cargo_scheduler import (
+    CargoScheduler,
+    decode_cursor,
+    encode_cursor,
+    parse_schedule_filters,
+)
+
+
+class RecordingPool:
+    """Stand-in pool that records executed SQL and returns canned rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    @contextmanager
+    def cursor(self, **kwargs):
+        pool = self
+
+        class Cursor:
+            def execute(self, query, params=None):
+                pool.queries.append((query, params))
+
+            def fetchall(self):
+                limit = pool.queries[-1][1][-1]
+                return pool.rows[:limit]
+
+        yield Cursor()
+
+
+class WholeTablePool(RecordingPool):
+    """Returns every row, as unpaged reads carry no LIMIT"""
+
+    @contextmanager
+    def cursor(self, **kwargs):
+        pool = self
+
+        class Cursor:
+            def execute(self, query, params=None):
+                pool.queries.append((query, params))
+
+            def fetchall(self):
+                return pool.rows
+
+        yield Cursor()
+
+
+def make_rows(count):
+    start = datetime.datetime(2025, 4, 1, 8, 0)
+    return [
+        (uuid.uuid4(), uuid.uuid4(), start + datetime.timedelta(minutes=i), "high",
+         "dfw-terminal-a_(32.9, -97.0)", "Ups-station_(32.9, -96.7)")
+        for i in range(count)
+    ]
+
+
+def test_cursor_round_trip():
+    """Cursors encode the (pickup_time, id) keyset position"""
+    schedule_id = str(uuid.uuid4())
+    pickup_time = datetime.datetime(2025, 4, 1, 8, 30)
+
+    assert decode_cursor(encode_cursor(pickup_time, schedule_id)) == (pickup_time, schedule_id)
+
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_parse_schedule_filters():
+    """Query string filters are validated and normalised"""
+    filters = parse_schedule_filters({
+        "pickupFrom": "2025-04-01T00:00:00",
+        "criticality": "High, low",
+        "dropoffLocation": "Ups-station",
+    })
+
+    assert filters == {
+        "pickup_from": datetime.datetime(2025, 4, 1),
+        "criticality": ["high", "low"],
+        "dropoff_location": "Ups-station",
+    }
+
+    with pytest.raises(ValueError):
+        parse_schedule_filters({"criticality": "urgent"})
+    with pytest.raises(ValueError):
+        parse_schedule_filters({"pickupTo": "tomorrow"})
+
+
+def test_schedule_page_returns_next_cursor():
+    """A full page fetches limit + 1 rows and hands back a cursor for the last item"""
+    rows = make_rows(3)
+    scheduler = CargoScheduler(pool=RecordingPool(rows))
+
+    items, next_cursor = scheduler.get_schedule_page(2, filters={"criticality": ["high"]})
+
+    assert [item["id"] for item in items] == [str(rows[0][0]), str(rows[1][0])]
+    assert decode_cursor(next_cursor) == (rows[1][2], str(rows[1][0]))
+
+    query, params = scheduler.pool.queries[-1]
+    assert "criticality = ANY(%s)" in query
+    assert "ORDER BY pickup_time, id" in query
+    assert params == [["high"], 3]
+
+
+def test_schedule_page_continues_after_cursor():
+    """The keyset predicate is applied when a cursor is supplied"""
+    rows = make_rows(1)
+    scheduler = CargoScheduler(pool=RecordingPool(rows))
+    cursor = encode_cursor(datetime.datetime(2025, 4, 1, 7, 0), str(uuid.uuid4()))
+
+    items, next_cursor = scheduler.get_schedule_page(5, cursor=cursor, filters={"pickup_location": "dfw-terminal-a"})
+
+    assert len(items) == 1
+    assert next_cursor is None
+    query, params = scheduler.pool.queries[-1]
+    assert "(pickup_time, id) > (%s, %s)" in query
+    assert "pickup_name = %s" in query
+    assert params[0] == "dfw-terminal-a"
+
+
+def test_cargo_details_use_one_query():
+    """A batch of cargo ids is fetched with a single ANY() query, missing ids reported"""
+    rows = [
+        (str(uuid.uuid4()), "Medical supplies", 12.5, "dfw-terminal-a_(32.9, -97.0)",
+         "Ups-station_(32.9, -96.7)", "high", datetime.datetime(2025, 4, 1, 8, 0))
+        for _ in range(3)
+    ]
+    absent = str(uuid.uuid4())
+
+    class BatchPool(RecordingPool):
+        @contextmanager
+        def cursor(self, **kwargs):
+            pool = self
+
+            class Cursor:
+                def execute(self, query, params=None):
+                    pool.queries.append((query, params))
+
+                def fetchall(self):
+                    return pool.rows
+
+            yield Cursor()
+
+    pool = BatchPool(rows)
+    requested = [rows[2][0], absent, rows[0][0].upper(), rows[1][0], rows[2][0]]
+    items, missing = CargoScheduler(pool=pool).get_cargo_details(requested)
+
+    assert len(pool.queries) == 1
+    query, params = pool.queries[0]
+    assert "ANY(%s::uuid[])" in query
+    assert params == ([rows[2][0], absent, rows[0][0], rows[1][0]],)
+    assert [item["cargoId"] for item in items] == [rows[2][0], rows[0][0], rows[1][0]]
+    assert missing == [absent]
+
+    with pytest.raises(ValueError):
+        CargoScheduler(pool=pool).get_cargo_details(["not-a-uuid"])
+
+
+def test_schedule_without_paging_returns_every_row_from_the_cache(monkeypatch):
+    import app as backend
+    from services.schedule_cache import ScheduleCache
+
+    assert backend.parse_schedule_args({})[2:] == (None, None)
+    assert backend.parse_schedule_args({"criticality": "high"})[2:] == (None, None)
+    assert backend.parse_schedule_args({"stream": "json"})[2:] == ("json", None)
+    assert backend.parse_schedule_args({"limit": "5"})[2:] == (None, 5)
+    assert backend.parse_schedule_args({"sort": "eta"})[2:] == (None, backend.SCHEDULE_PAGE_SIZE)
+    # Ranking skips pickups long past unless the client asks for them
+    assert "pickup_from" in backend.parse_schedule_args({"sort": "urgency"})[0]
+    assert backend.parse_schedule_args({"sort": "eta", "pickupFrom": "2025-01-01T00:00:00"})[0]["pickup_from"] == \
+        datetime.datetime(2025, 1, 1)
+    with pytest.raises(ValueError):
+        backend.parse_schedule_args({"cursor": "x", "limit": ""})
+
+    # More rows than a page, as the driver app's getSchedules() expects them
+    rows = make_rows(backend.SCHEDULE_PAGE_SIZE * 2 + 1)
+    pool = WholeTablePool(rows)
+    cache = ScheduleCache()
+    cache.version = 7
+    monkeypatch.setattr(backend, "schedule_cache", cache)
+    monkeypatch.setattr(backend, "cargo_scheduler", CargoScheduler(pool=pool, cache=cache))
+    monkeypatch.setattr(backend.cargo_scheduler, "stream_schedule_items", lambda filters, chunk_size: iter([]))
+    client = backend.create_app().test_client()
+
+    response = client.get("/schedule")
+    assert response.status_code == 200 and response.headers["Cache-Control"] == "no-cache"
+    assert [item["id"] for item in response.get_json()] == [str(row[0]) for row in rows]
+    etag = response.headers["ETag"]
+
+    # Served from the cache, and revalidated like a page
+    assert client.get("/schedule").get_json() == response.get_json() and len(pool.queries) == 1
+    assert client.get("/schedule", headers={"If-None-Match": etag}).status_code == 304
+    # Streaming is only ever an explicit choice
+    assert client.get("/schedule?stream=json").get_json() == []
+    assert len(pool.queries) == 1
+
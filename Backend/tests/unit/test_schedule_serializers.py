@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import uuid
+import decimal
+import datetime
+
+import pytest
+from flask import Flask
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.cargo_scheduler import CargoScheduler, decode_cursor
+from services.schedule_serializers import SERIALIZERS, get_serializer
+
+
+def make_rows(count):
+    start = datetime.datetime(2025, 1, 1, 8, 0)
+    return [
+        (str(uuid.UUID(int=i + 1)), str(uuid.UUID(int=1000 + i)),
+         start + datetime.timedelta(minutes=i, microseconds=i * 250000 % 1000000),
+         (None, "high", "medium")[i % 3], f"dfw-terminal-{'abc'[i % 3]}_(32.9, -97.0)",
+         'Zürich "depot"\n' if i % 2 else "Ups-station")
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def jsonify_bytes(app, value):
+    with app.app_context():
+        return app.json.response(value).get_data(as_text=True).rstrip("\n")
+
+
+@pytest.mark.parametrize("name", ["dict", "tuple"])
+def test_page_matches_jsonify_byte_for_byte(app, name):
+    rows = make_rows(6)
+    body, next_cursor = get_serializer(name).encode_page(rows, 5)
+
+    expected, expected_cursor = CargoScheduler._page(rows, 5)
+    assert body == jsonify_bytes(app, expected)
+    assert next_cursor == expected_cursor
+    assert decode_cursor(next_cursor) == (rows[4][2], rows[4][0])
+
+
+@pytest.mark.parametrize("weight", [decimal.Decimal("12.50"), 3.25, None])
+def test_detail_matches_jsonify_byte_for_byte(app, weight):
+    row = (str(uuid.UUID(int=7)), "Käse", weight, "dfw-terminal-a", "Ups-station", None,
+           datetime.datetime(2025, 1, 1, 8, 0))
+    expected = jsonify_bytes(app, CargoScheduler._cargo_detail(row))
+
+    assert get_serializer("tuple").encode_detail(row) == expected
+    assert get_serializer("dict").encode_detail(row) == expected
+    assert get_serializer("tuple").encode_detail(None) is None
+
+
+def test_pg_serializer_passes_row_json_through():
+    serializer = get_serializer("pg")
+    when = datetime.datetime(2025, 1, 1, 8, 0)
+    rows = [('{"id":"a"}', when, str(uuid.UUID(int=1))), ('{"id":"b"}', when, str(uuid.UUID(int=2)))]
+
+    body, next_cursor = serializer.encode_page(rows, 1)
+    assert json.loads(body) == [{"id": "a"}]
+    assert decode_cursor(next_cursor) == (when, str(uuid.UUID(int=1)))
+    assert "row_to_json" in serializer.page_columns
+
+
+def test_unknown_serializer_is_rejected():
+    assert set(SERIALIZERS) == {"dict", "tuple", "pg"}
+    with pytest.raises(ValueError):
+        get_serializer("msgpack")
@@ -0,0 +1,252 @@
+import os
+import sys
+import uuid
+import random
+import datetime
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services import schedule_snapshot
+from services.cargo_scheduler import CargoScheduler, decode_cursor
+from services.schedule_serializers import TupleSerializer
+from services.schedule_snapshot import ScheduleSnapshot, to_micros
+
+NOW = datetime.datetime(2025, 5, 1, 12, 0)
+LOCATIONS = [
+    ("dfw-terminal-a_(32.9, -97.0)", "dfw-terminal-a"),
+    ("dfw-terminal-c_(32.8, -97.1)", "dfw-terminal-c"),
+    ('Ups-"station"_(32.7, -97.2)', 'Ups-"station"'),
+]
+
+
+def make_row(rng, minutes=None):
+    pickup, dropoff = rng.choice(LOCATIONS), rng.choice(LOCATIONS)
+    minutes = rng.uniform(-600, 600) if minutes is None else minutes
+    pickup_time = NOW + datetime.timedelta(minutes=minutes)
+    if rng.random() < 0.7:
+        pickup_time = pickup_time.replace(microsecond=0)
+    return (
+        str(uuid.UUID(int=rng.getrandbits(128))),
+        None if rng.random() < 0.05 else str(uuid.UUID(int=rng.getrandbits(128))),
+        pickup_time, rng.choice(["high", "medium", "low"]),
+        pickup[0], dropoff[0], pickup[1], dropoff[1],
+    )
+
+
+def ordered(rows):
+    return sorted(rows, key=lambda row: (row[2], row[0]))
+
+
+def expected_page(rows, limit, after=None, filters=None):
+    """TupleSerializer over the rows a database page query would return"""
+    filters = filters or {}
+    selected = [
+        row[:6] for row in ordered(rows)
+        if (after is None or (row[2], row[0]) > after)
+        and ("pickup_from" not in filters or row[2] >= filters["pickup_from"])
+        and ("pickup_to" not in filters or row[2] < filters["pickup_to"])
+        and ("criticality" not in filters or row[3] in filters["criticality"])
+        and ("pickup_location" not in filters or row[6] == filters["pickup_location"])
+        and ("dropoff_location" not in filters or row[7] == filters["dropoff_location"])
+    ]
+    return TupleSerializer().encode_page(selected[:limit + 1], limit)
+
+
+class TablePool:
+    """Stand-in for cargo_schedule, its change counter and the 0008 change log"""
+
+    def __init__(self, rows):
+        self.rows = {row[0]: row for row in rows}
+        self.version = 1
+        self.log = []
+        self.queries = []
+
+    def write(self, row=None, delete=None, truncate=False):
+        self.version += 1
+        if truncate:
+            self.rows.clear()
+            self.log.append((self.version, None))
+        elif delete:
+            del self.rows[delete]
+            self.log.append((self.version, delete))
+        else:
+            self.rows[row[0]] = row
+            self.log.append((self.version, row[0]))
+
+    @contextmanager
+    def cursor(self, **kwargs):
+        pool = self
+
+        class Cursor:
+            def execute(self, query, params=None):
+                pool.queries.append(query)
+                params = list(params or [])
+                if "FROM cargo_schedule_version" in query:
+                    self.result = [(pool.version,)]
+                elif "cargo_schedule_changes" in query:
+                    since, until = params
+                    ids = {i for version, i in pool.log if since < version <= until}
+                    self.result = [
+                        (i,) + (pool.rows[i][1:] if i in pool.rows else (None,) * 7) + (i is None,)
+                        for i in ids
+                    ]
+                else:
+                    low = params.pop(0) if "pickup_time >=" in query else None
+                    high = params.pop(0) if "pickup_time <" in query else None
+                    self.result = [row for row in ordered(pool.rows.values())
+                                   if (low is None or row[2] >= low) and (high is None or row[2] < high)]
+
+            def fetchone(self):
+                return self.result[0]
+
+            def fetchall(self):
+                return self.result
+
+        yield Cursor()
+
+
+def test_pages_match_the_tuple_serializer_byte_for_byte():
+    rng = random.Random(3)
+    rows = [make_row(rng) for _ in range(400)]
+    snapshot = ScheduleSnapshot()
+    snapshot.load_rows(ordered(rows))
+
+    cases = [
+        {},
+        {"pickup_from": NOW},
+        {"pickup_from": NOW - datetime.timedelta(hours=2), "pickup_to": NOW + datetime.timedelta(hours=1)},
+        {"criticality": ["high", "low"]},
+        {"pickup_location": "dfw-terminal-c", "dropoff_location": 'Ups-"station"'},
+        {"pickup_location": "nowhere"},
+    ]
+    for filters in cases:
+        cursor = None
+        for _ in range(10):
+            after = decode_cursor(cursor) if cursor else None
+            expected = expected_page(rows, 25, after, filters)
+            assert snapshot.page_body(25, after, filters) == expected
+            cursor = expected[1]
+            if not cursor:
+                break
+        assert snapshot.items_body(filters) == expected_page(rows, len(rows), None, filters)[0]
+
+
+def test_dict_pages_match_cargo_scheduler_items():
+    rng = random.Random(4)
+    rows = ordered(make_row(rng) for _ in range(50))
+    snapshot = ScheduleSnapshot()
+    snapshot.load_rows(rows)
+
+    items, cursor = snapshot.page(20)
+    assert items == [CargoScheduler._schedule_item(row) for row in rows[:20]]
+    assert decode_cursor(cursor) == (rows[19][2], rows[19][0])
+    assert snapshot.items({"criticality": ["high"]}) == [
+        CargoScheduler._schedule_item(row) for row in rows if row[3] == "high"]
+
+
+@pytest.mark.parametrize("collide", [False, True])
+def test_changes_keep_the_sort_order(monkeypatch, collide):
+    if collide:
+        # Every id in one hash bucket, so each lookup has to check the candidates' rows
+        monkeypatch.setattr(schedule_snapshot, "hash", lambda packed: 7, raising=False)
+    rng = random.Random(5)
+    rows = {row[0]: row for row in (make_row(rng) for _ in range(300))}
+    snapshot = ScheduleSnapshot()
+    snapshot.load_rows(ordered(rows.values()))
+
+    changes = []
+    for key in rng.sample(sorted(rows), 40):
+        moved = make_row(rng)
+        rows[key] = (key,) + moved[1:]
+        changes.append(rows[key])
+    for key in rng.sample(sorted(rows), 30):
+        del rows[key]
+        changes.append((key,) + (None,) * 7)
+    for _ in range(20):
+        row = make_row(rng)
+        rows[row[0]] = row
+        changes.append(row)
+    snapshot.apply_changes(changes)
+
+    assert len(snapshot) == len(rows) == len(snapshot._id_hashes)
+    assert snapshot.page_body(1000) == expected_page(list(rows.values()), 1000)
+
+
+def test_refresh_reads_only_changed_ids_and_reloads_after_truncate():
+    rng = random.Random(6)
+    pool = TablePool([make_row(rng) for _ in range(100)])
+    snapshot = ScheduleSnapshot(pool, hours_before=None, hours_after=None)
+    snapshot.refresh(NOW)
+    assert snapshot.stats()["full_loads"] == 1 and len(snapshot) == 100
+
+    added = make_row(rng, minutes=5)
+    pool.write(added)
+    pool.write(delete=next(iter(pool.rows)))
+    pool.queries.clear()
+    snapshot.refresh(NOW)
+
+    assert not any("ORDER BY pickup_time" in query for query in pool.queries)
+    assert snapshot.version == pool.version and snapshot.rows_changed == 2
+    assert snapshot.page_body(500) == expected_page(list(pool.rows.values()), 500)
+
+    pool.write(truncate=True)
+    snapshot.refresh(NOW)
+    assert snapshot.stats()["full_loads"] == 2 and len(snapshot) == 0
+
+
+def test_window_rolls_forward_and_reads_outside_it_fall_back():
+    rng = random.Random(7)
+    pool = TablePool([make_row(rng, minutes=m) for m in range(-300, 300, 7)])
+    snapshot = ScheduleSnapshot(pool, hours_before=1, hours_after=2)
+    snapshot.refresh(NOW)
+
+    assert snapshot.window == (to_micros(NOW - datetime.timedelta(hours=1)), to_micros(NOW + datetime.timedelta(hours=2)))
+    assert snapshot._scan({}, None, 10) is None
+    assert snapshot._scan({"pickup_from": NOW - datetime.timedelta(hours=3)}, None, 10) is None
+    # Runs past the window end before filling the page
+    assert snapshot._scan({"pickup_from": NOW}, None, 1000) is None
+    assert len(snapshot._scan({"pickup_from": NOW}, None, 5)) == 5
+    bounded = {"pickup_from": NOW, "pickup_to": NOW + datetime.timedelta(hours=1)}
+    assert snapshot._scan(bounded, None, 1000) is not None
+
+    later = NOW + datetime.timedelta(hours=2)
+    snapshot.refresh(later)
+    expected = [row for row in pool.rows.values()
+                if later - datetime.timedelta(hours=1) <= row[2] < later + datetime.timedelta(hours=2)]
+    assert snapshot.full_loads == 1 and len(snapshot) == len(expected)
+    window = {"pickup_from": later - datetime.timedelta(hours=1), "pickup_to": later + datetime.timedelta(hours=2)}
+    assert snapshot.page_body(1000, filters=window) == expected_page(expected, 1000)
+
+
+def test_scheduler_serves_from_the_snapshot_and_falls_back_to_the_database():
+    rng = random.Random(8)
+    rows = ordered(make_row(rng) for _ in range(30))
+    pool = TablePool(rows)
+    snapshot = ScheduleSnapshot(pool, hours_before=None, hours_after=None)
+    snapshot.refresh(NOW)
+    scheduler = CargoScheduler(pool, snapshot=snapshot)
+
+    pool.queries.clear()
+    body, _ = scheduler.get_schedule_page_body(TupleSerializer(), 10)
+    assert body == expected_page(rows, 10)[0]
+    assert all("cargo_schedule_version" in query for query in pool.queries)
+
+    # A window around the real clock cannot answer a read from the start of the table
+    snapshot.hours_before = 24
+    pool.queries.clear()
+    scheduler.get_schedule_page(10)
+    assert any("ORDER BY pickup_time" in query for query in pool.queries)
+    assert snapshot.fallbacks == 1
+
+
+def test_memory_stays_under_a_tenth_of_the_dict_rows():
+    rng = random.Random(9)
+    snapshot = ScheduleSnapshot()
+    snapshot.load_rows(ordered(make_row(rng) for _ in range(5000)))
+    stats = snapshot.stats()
+
+    assert stats["rows"] == 5000 and stats["interned_strings"] <= 7
+    assert stats["bytes_per_row"] < 120
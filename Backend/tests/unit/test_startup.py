@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(BACKEND)
+
+from services.process_local import ProcessLocal
+
+# Imports the app, builds it, serves one request; reports what was started along the way
+STARTUP_PROBE = """
+import sys, json, threading
+# Only the report goes to stdout; the app's own messages go to stderr
+report, sys.stdout = sys.stdout, sys.stderr
+from services import db_pool
+from services.auth_routes import _auth_service
+
+def state():
+    return {
+        "threads": sorted(t.name for t in threading.enumerate() if t is not threading.main_thread()),
+        "pool": db_pool._pool.peek() is not None,
+        "auth": _auth_service.peek() is not None,
+    }
+
+import app
+imported = state()
+client = app.create_app().test_client()
+created = state()
+status = client.get("/location/stats").status_code
+report.write(json.dumps({"imported": imported, "created": created, "served": state(), "status": status}))
+"""
+
+
+def test_process_local_builds_once_per_process():
+    built = []
+    value = ProcessLocal(lambda: built.append(os.getpid()) or len(built))
+
+    assert value.peek() is None
+    assert value.get() == value.get() == 1
+    assert value.peek() == 1
+
+    if not hasattr(os, "fork"):
+        pytest.skip("needs os.fork")
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        os.write(write_end, json.dumps([value.peek(), value.get(), value.get()]).encode())
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        child = json.loads(pipe.read())
+    os.waitpid(pid, 0)
+
+    # The child starts without the parent's value and builds its own, once
+    assert child == [None, 2, 2]
+    assert value.get() == 1
+    assert value.reset() == 1 and value.peek() is None
+
+
+def test_process_local_works_without_register_at_fork(monkeypatch):
+    # As on Windows, where os has no register_at_fork
+    monkeypatch.delattr(os, "register_at_fork", raising=False)
+    value = ProcessLocal(lambda: "built")
+    assert value.get() == "built" and value.peek() == "built"
+
+
+def test_importing_the_app_connects_to_nothing_and_starts_no_threads():
+    env = dict(os.environ, DB_HOST="127.0.0.1", DB_PORT="1", PICKUP_TICK_SECONDS="3600", METRICS_ENABLED="1")
+    env.pop("DALI_DATABASE", None)
+    result = subprocess.run([sys.executable, "-c", STARTUP_PROBE], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout)
+
+    nothing = {"threads": [], "pool": False, "auth": False}
+    assert report["imported"] == nothing
+    assert report["created"] == nothing
+    assert report["status"] == 200
+    # The first request starts this worker's background work, and still no pool or auth service
+    served = report["served"]
+    assert {"location-ingestor", "schedule-cache-listener"} <= set(served["threads"])
+    assert not served["pool"] and not served["auth"]
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import datetime
+from collections import Counter
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.dock_assignment import terminal_code
+from services.sites import DROPOFF_SITES, TERMINALS
+from services.synthetic_data import (
+    CHUNK_SIZE, GeneratorConfig, chunk_count, criticality_mix, dali_agents, dali_events, dali_log_rows,
+    delay_status, schedule_chunk, terminal_weights, trace_points,
+)
+
+START = datetime.datetime(2025, 5, 1)
+
+
+def make_config(**overrides):
+    values = dict(seed=7, schedules=CHUNK_SIZE + 500, criticality_mix=criticality_mix(None),
+                  terminal_weights=terminal_weights(None), start=START, days=14, hours=(6, 22),
+                  trace_rate=0.5, gps_interval=60, delay_rate=0.2)
+    values.update(overrides)
+    return GeneratorConfig(**values)
+
+
+def test_chunks_are_reproducible_and_independent():
+    config = make_config()
+    assert chunk_count(config) == 2
+    first, last = schedule_chunk(config, 0), schedule_chunk(config, 1)
+    assert len(first) == CHUNK_SIZE and len(last) == 500
+
+    # Any worker can build any chunk and get the same rows
+    assert schedule_chunk(config, 1) == last
+    assert schedule_chunk(make_config(seed=8), 1) != last
+    assert len({row[0] for row in first + last}) == CHUNK_SIZE + 500
+
+
+def test_mix_terminals_and_window_are_respected():
+    config = make_config(criticality_mix=criticality_mix("high=0.2,medium=0.8"),
+                         terminal_weights=terminal_weights("A=3,D=1"))
+    rows = schedule_chunk(config, 0)
+
+    levels = Counter(row[3] for row in rows)
+    assert set(levels) == {"high", "medium"}
+    assert 0.17 < levels["high"] / len(rows) < 0.23
+    terminals = Counter(terminal_code(row[4]) for row in rows)
+    assert set(terminals) == {"A", "D"} and terminals["A"] > 2.5 * terminals["D"]
+    for row in rows:
+        assert START <= row[2] < START + datetime.timedelta(days=14)
+        assert 6 <= row[2].hour < 22
+
+
+def test_bad_weights_are_rejected():
+    with pytest.raises(ValueError):
+        criticality_mix("urgent=1")
+    with pytest.raises(ValueError):
+        terminal_weights("Z=1")
+    with pytest.raises(ValueError):
+        criticality_mix("high=0")
+
+
+def test_traces_run_from_terminal_to_dropoff():
+    config = make_config(schedules=20, trace_rate=1.0)
+    rows = schedule_chunk(config, 0)
+    points = list(trace_points(config, 0, rows))
+    assert points == list(trace_points(config, 0, rows))
+
+    trip = [p for p in points if p.schedule_id == rows[0][0]]
+    start, end = TERMINALS[rows[0][4].rpartition("_(")[0]], DROPOFF_SITES[rows[0][5].rpartition("_(")[0]]
+    assert abs(trip[0].latitude - start[0]) < 0.01 and abs(trip[-1].longitude - end[1]) < 0.01
+    assert trip[0].recorded_at == rows[0][2]
+    assert all(b.recorded_at - a.recorded_at == datetime.timedelta(minutes=1) for a, b in zip(trip, trip[1:]))
+    assert all(p.received_at > p.recorded_at for p in trip)
+
+
+def test_delays_cover_every_cargo_in_the_chunk():
+    config = make_config(schedules=1000)
+    rows = schedule_chunk(config, 0)
+    delays = delay_status(config, 0, rows)
+    assert set(delays) == {row[1] for row in rows}
+    assert 150 < sum(delays.values()) < 250
+
+
+def test_dali_events_chain_states_like_the_simulator():
+    agents = dali_agents(3, 5, START)
+    agents, events = dali_events(3, agents, START, 1, per_hour=4)
+    event_logs, notification_logs = dali_log_rows(agents, events)
+
+    assert [e.at for e in events] == sorted(e.at for e in events)
+    assert [row[0] for row in event_logs] == list(range(1, len(events) + 1))
+    for agent in agents:
+        own = [e for e in events if e.agent_id == agent.id]
+        assert own[0].from_state == "G"
+        assert all(a.to_state == b.from_state for a, b in zip(own, own[1:]))
+        assert all(e.from_state != e.to_state for e in own)
+        assert agent.state == own[-1].to_state
+
+    first = events[0]
+    assert json.loads(event_logs[0][3]) == {"from": first.from_state, "to": first.to_state}
+    assert notification_logs[0][3].endswith(f"changed state from {first.from_state} to {first.to_state}")
@@ -0,0 +1,155 @@
+import os
+import sys
+import datetime
+from contextlib import contextmanager
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.auth_service import AuthService
+from services.password_hasher import PasswordHasher
+from services.ttl_cache import TTLCache
+
+DEMO_USER = {
+    "id": "550e8400-e29b-41d4-a716-446655440000",
+    "email": "demo@cargolive.com",
+    "password_hash": "hash",
+    "full_name": "Demo User",
+    "is_google_account": False,
+    "created_at": datetime.datetime(2025, 4, 1),
+    "updated_at": datetime.datetime(2025, 4, 1),
+    "token_version": 0,
+}
+
+
+class UserTablePool:
+    """Stand-in pool serving SELECT ... WHERE id lookups from a dict and counting them"""
+
+    def __init__(self, users):
+        self.users = users
+        self.lookups = 0
+
+    @contextmanager
+    def cursor(self, **kwargs):
+        pool = self
+
+        class Cursor:
+            row = None
+
+            def execute(self, query, params=None):
+                if "WHERE id = %s" in query:
+                    pool.lookups += 1
+                    self.row = pool.users.get(params[0])
+                else:
+                    self.row = None
+
+            def fetchone(self):
+                return dict(self.row) if self.row else None
+
+        yield Cursor()
+
+
+def make_service():
+    pool = UserTablePool({DEMO_USER["id"]: dict(DEMO_USER)})
+    return AuthService(pool=pool, hasher=PasswordHasher(method="pbkdf2:sha256:1000", workers=0)), pool
+
+
+def test_ttl_cache_expires_and_evicts():
+    """Entries expire after the TTL and the least recently used entry is evicted first"""
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    now[0] = 11
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_verify_token_hits_db_only_on_cache_miss():
+    """Repeated verification of a valid token is served from the profile cache"""
+    service, pool = make_service()
+    token = service._generate_token(DEMO_USER)
+
+    for _ in range(3):
+        user = service.verify_token(token)
+
+    assert user["email"] == "demo@cargolive.com"
+    assert "password_hash" not in user and "token_version" not in user
+    assert pool.lookups == 1
+
+
+def test_revoked_token_is_rejected():
+    """Bumping token_version rejects tokens issued before the bump"""
+    service, pool = make_service()
+    old_token = service._generate_token(DEMO_USER)
+    assert service.verify_token(old_token)
+
+    pool.users[DEMO_USER["id"]]["token_version"] = 1
+    service.invalidate_user(DEMO_USER["id"])
+
+    assert service.verify_token(old_token) is None
+    assert service.verify_token(service._generate_token(pool.users[DEMO_USER["id"]]))
+
+
+def test_newer_token_refreshes_stale_cache():
+    """A token from after a revocation in another worker reloads the cached profile"""
+    service, pool = make_service()
+    service.verify_token(service._generate_token(DEMO_USER))
+
+    pool.users[DEMO_USER["id"]]["token_version"] = 1
+    new_token = service._generate_token(pool.users[DEMO_USER["id"]])
+
+    assert service.verify_token(new_token)
+    assert pool.lookups == 2
+
+
+class RegisteringPool:
+    """Stand-in pool with an empty users table that notes how many cursors are open"""
+
+    def __init__(self):
+        self.emails = set()
+        self.open = 0
+
+    @contextmanager
+    def cursor(self, **kwargs):
+        pool = self
+
+        class Cursor:
+            row = None
+
+            def execute(self, query, params=None):
+                self.row = None
+                if query.lstrip().startswith("INSERT") and params[1] not in pool.emails:
+                    pool.emails.add(params[1])
+                    self.row = dict(DEMO_USER, id=params[0], email=params[1], full_name=params[3])
+
+            def fetchone(self):
+                return self.row
+
+        self.open += 1
+        try:
+            yield Cursor()
+        finally:
+            self.open -= 1
+
+
+def test_passwords_are_hashed_with_no_connection_checked_out():
+    pool = RegisteringPool()
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=0)
+    open_while_hashing = []
+    hash_password = hasher.hash
+    hasher.hash = lambda password: open_while_hashing.append(pool.open) or hash_password(password)
+
+    service = AuthService(pool=pool, hasher=hasher)
+    result = service.register_user("New@Example.com", "secret1", "New Driver")
+
+    assert result["user"]["email"] == "new@example.com"
+    assert open_while_hashing == [0, 0]  # the demo user, then the registration
+    # Losing a race for the email is settled by the insert, not a second lookup
+    assert service.register_user("new@example.com", "secret1", "Again") is None
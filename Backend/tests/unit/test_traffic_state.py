@@ -0,0 +1,227 @@
+import os
+import sys
+import sqlite3
+import datetime
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from services.sites import DROPOFF_SITES, TERMINALS
+from services.synthetic_data import dali_agents, dali_events, dali_log_rows
+from services.traffic_state import (
+    AgentEvent, DaliLogFollower, TrafficAgent, TrafficState, corridor_name, parse_agent_events, parse_agents,
+)
+
+START = datetime.datetime(2025, 5, 1, 8, 0)
+T0 = (START - datetime.datetime(1970, 1, 1)).total_seconds()
+
+# A north-south leg about 11 km long
+CORRIDORS = {"north": ((33.0, -97.0), (33.1, -97.0))}
+
+
+def agent(code, lat, state="G", lon=-97.0, agent_id=None, updated_at=START):
+    return {"id": agent_id, "code": code, "name": code, "type": "traffic_light",
+            "latitude": lat, "longitude": lon, "state": state, "updated_at": updated_at.isoformat()}
+
+
+def event(code, state, minutes):
+    return {"code": code, "state": state, "timestamp": (START + datetime.timedelta(minutes=minutes)).isoformat()}
+
+
+def make_state(**kwargs):
+    state = TrafficState(CORRIDORS, **kwargs)
+    state.register(parse_agents([
+        agent("A1", 33.02), agent("A2", 33.05), agent("A3", 33.08),
+        agent("OFF", 33.05, lon=-96.9),  # about 9 km east, on no corridor
+    ]))
+    return state
+
+
+def test_next_agent_is_the_first_one_ahead_of_the_driver():
+    state = make_state()
+    state.apply(parse_agent_events([event("A2", "R", 1)]))
+
+    answer = state.next_agent("north", 33.03, -97.0005)
+    assert (answer["agent_code"], answer["agent_state"]) == ("A2", "R")
+    assert answer["distanceKm"] == pytest.approx(2.23, abs=0.01)
+    assert not answer["near"]
+    assert state.next_agent("north", 33.045, -97.0)["near"]
+
+    assert [a["code"] for a in state.ahead("north", 33.0, -97.0, limit=5)] == ["A1", "A2", "A3"]
+    assert state.next_agent("north", 33.09, -97.0)["agent_code"] is None
+    assert state.agent("OFF")["corridors"] == []
+
+
+def test_out_of_order_and_repeated_events_are_ignored():
+    state = make_state()
+    result = state.apply(parse_agent_events([
+        event("A1", "R", 5), event("A1", "Y", 2), event("A1", "R", 5), event("nobody", "R", 5),
+    ]))
+
+    assert result == {"received": 4, "applied": 1, "stale": 1, "unknown": 1}
+    assert state.agent("A1")["state"] == "R"
+
+
+def test_corridor_aggregates_roll_over_the_window():
+    state = make_state(window_seconds=600)
+    state.apply(parse_agent_events([event("A1", "R", 0), event("A2", "Y", 5)]))
+
+    now = T0 + 10 * 60
+    aggregate = state.corridor("north", now)
+    assert aggregate["agents"] == 3
+    assert aggregate["states"] == {"G": 1, "Y": 1, "R": 1, "B": 0}
+    assert aggregate["congestion"] == 0.5
+    # R for all 10 minutes, Y for the last 5: (1 * 10 + 0.5 * 5) / 10 / 3 agents
+    assert aggregate["avgCongestion"] == pytest.approx(12.5 / 30, abs=0.001)
+    assert aggregate["changes"] == aggregate["degraded"] == 2
+    assert state.congestion_levels(now) == {"north": 0.5}
+
+    state.apply(parse_agent_events([event("A1", "G", 20), event("A2", "G", 20)]))
+    later = state.corridor("north", T0 + 40 * 60)
+    assert later["congestion"] == later["avgCongestion"] == 0.0
+    assert state.congestion_levels(T0 + 40 * 60) == {}
+    assert later["changes"] == 0
+
+
+def test_moving_an_agent_updates_corridor_membership():
+    state = make_state()
+    state.register(parse_agents([agent("OFF", 33.06, state="R")]))
+
+    assert [a["code"] for a in state.ahead("north", 33.04, -97.0, limit=2)] == ["A2", "OFF"]
+    assert state.corridor("north", T0)["states"]["R"] == 1
+
+
+def test_parses_dali_event_log_rows():
+    events = parse_agent_events({"events": [
+        {"agent_id": 3, "event_type": "STATE_CHANGE", "metadata": '{"from":"G","to":"Y"}',
+         "created_at": "2025-05-01 08:00:00"},
+    ]})
+    assert (events[0].agent_id, events[0].state, events[0].at) == (3, "Y", T0)
+
+    with pytest.raises(ValueError, match="index 0"):
+        parse_agent_events([{"code": "A1", "state": "purple"}])
+    assert corridor_name("dfw-terminal-a", "Ups-station") in TrafficState().corridors
+
+
+def test_follower_tails_a_dali_database(tmp_path):
+    path = str(tmp_path / "dali.sqlite")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE agents (id INTEGER PRIMARY KEY, name TEXT, code TEXT, type TEXT, latitude REAL,
+                             longitude REAL, state TEXT, created_at TEXT, updated_at TEXT);
+        CREATE TABLE event_logs (id INTEGER PRIMARY KEY, agent_id INTEGER, event_type TEXT, metadata TEXT,
+                                 created_at TEXT, updated_at TEXT);
+    """)
+    agents = dali_agents(1, 20, START)
+    agents, events = dali_events(1, agents, START, 1, 2.0)
+    event_logs, _ = dali_log_rows(agents, events)
+    conn.executemany("INSERT INTO agents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     [a._replace(state="G", updated_at=a.created_at) for a in agents])
+    conn.commit()
+
+    state = TrafficState()
+    follower = DaliLogFollower(state, path, batch_size=7)
+    follower.poll()
+    assert len(state) == 20 and state.stats()["placed_agents"] == 20
+
+    conn.executemany("INSERT INTO event_logs VALUES (?, ?, ?, ?, ?, ?)", event_logs)
+    conn.commit()
+    assert follower.poll() == len(event_logs)
+    assert {a.code: a.state for a in agents} == {a.code: state.agent(a.code)["state"] for a in agents}
+
+    # A scenario command changes states without logging events
+    conn.execute("UPDATE agents SET state = 'R', updated_at = '2025-05-03 00:00:00' WHERE code = 'Agent3'")
+    conn.commit()
+    follower.poll()
+    assert state.agent("Agent3")["state"] == "R"
+    conn.close()
+
+
+def test_traffic_routes_answer_from_memory(monkeypatch):
+    from flask import Flask
+    from services import event_routes, traffic_routes
+
+    app = Flask(__name__)
+    app.register_blueprint(traffic_routes.traffic_bp)
+    client = app.test_client()
+    key = {"X-Publish-Key": "test-key"}
+
+    # With no key configured, publishing is refused outside debug
+    monkeypatch.setattr(event_routes, "EVENTS_PUBLISH_KEY", None)
+    assert client.post("/traffic/events", json=[]).status_code == 403
+    monkeypatch.setattr(event_routes, "EVENTS_PUBLISH_KEY", "test-key")
+    assert client.post("/traffic/events", json=[], headers={"X-Publish-Key": "wrong"}).status_code == 401
+
+    # Halfway along the terminal A to Ups-station leg
+    (lat0, lon0), (lat1, lon1) = TERMINALS["dfw-terminal-a"], DROPOFF_SITES["Ups-station"]
+    response = client.post("/traffic/events", json={
+        "agents": [agent("T1", (lat0 + lat1) / 2, lon=(lon0 + lon1) / 2)],
+        "events": [{"code": "T1", "state": "R", "timestamp": "2025-05-01T09:00:00"}],
+    }, headers=key)
+    assert response.status_code == 202 and response.get_json()["applied"] == 1
+
+    response = client.post("/traffic/next", json={"drivers": [
+        {"pickup": "dfw-terminal-a_(32.90499459590296, -97.03632986050778)", "dropoff": "Ups-station",
+         "latitude": 32.905, "longitude": -97.036},
+    ]})
+    body = response.get_json()["results"][0]
+    assert body["corridor"] == "dfw-terminal-a:Ups-station"
+    assert (body["agent_code"], body["agent_state"]) == ("T1", "R")
+
+    assert client.get("/traffic/next?corridor=nowhere&latitude=1&longitude=2").status_code == 400
+    assert client.get("/traffic/agents/T1").get_json()["state"] == "R"
+    assert client.post("/traffic/events", json=[{"code": "T1", "state": "X"}], headers=key).status_code == 400
+    # Timestamps that would pin the agent, or fail to render later, are refused up front
+    for timestamp in (1e20, "9999-12-31T00:00:00", -1, "0001-01-01T00:00:00+01:00", 10 ** 400):
+        response = client.post("/traffic/events", json=[{"code": "T1", "state": "G", "timestamp": timestamp}],
+                               headers=key)
+        assert response.status_code == 400, timestamp
+    response = client.post("/traffic/events", data='[{"code": "T1", "state": "G", "timestamp": Infinity}]',
+                           content_type="application/json", headers=key)
+    assert response.status_code == 400
+    assert client.get("/traffic/agents/T1").status_code == 200
+
+
+def test_posted_traffic_reaches_every_worker(monkeypatch):
+    from flask import Flask
+    from services import event_routes, traffic_routes
+    from services.event_relay import PgStateRelay
+    from services.process_local import ProcessLocal
+
+    sent = []
+
+    class NotifyPool:
+        @contextmanager
+        def cursor(self):
+            class Cursor:
+                def execute(self, sql, params=None):
+                    sent.append(params[1])
+            yield Cursor()
+
+    here = PgStateRelay(event_routes.state_handlers, pool=NotifyPool())
+    monkeypatch.setattr(event_routes, "_state_relay", ProcessLocal(lambda: here))
+    event_routes._state_relay.get()
+    monkeypatch.setattr(event_routes, "EVENTS_PUBLISH_KEY", "test-key")
+    monkeypatch.setattr(traffic_routes, "traffic_state", TrafficState(CORRIDORS))
+    app = Flask(__name__)
+    app.register_blueprint(traffic_routes.traffic_bp)
+
+    # Enough agents to need several notifications
+    agents = [agent(f"T{i}", 33.0 + i / 100000) for i in range(300)]
+    response = app.test_client().post("/traffic/events", json={"agents": agents, "events": [event("T7", "R", 5)]},
+                                      headers={"X-Publish-Key": "test-key"})
+    assert response.status_code == 202
+
+    there = TrafficState(CORRIDORS)
+    other_worker = PgStateRelay({
+        "traffic_agents": lambda items: there.register([TrafficAgent(*item) for item in items]),
+        "traffic_events": lambda items: there.apply([AgentEvent(*item) for item in items]),
+    })
+    assert len(sent) > 2 and all(len(payload.encode()) < 8000 for payload in sent)
+    for payload in sent:
+        here._deliver(payload)
+        other_worker._deliver(payload)
+    assert len(there) == 300 and there.agent("T7")["state"] == "R"
+    assert traffic_routes.traffic_state.stats() == there.stats()